@@ -0,0 +1,39 @@
+"""Add query_embeddings cache table
+
+Revision ID: 3f1c9a2e7b4d
+Revises: a7495d878893
+Create Date: 2026-10-16 09:12:40.118204
+
+"""
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from pgvector.sqlalchemy import Vector
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = '3f1c9a2e7b4d'
+down_revision: Union[str, None] = 'a7495d878893'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'query_embeddings',
+        sa.Column('query', sa.Text(), nullable=False),
+        sa.Column('model', sa.String(length=100), nullable=False),
+        sa.Column('embedding', Vector(384), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('query', 'model'),
+    )
+    op.create_index(
+        op.f('ix_query_embeddings_created_at'), 'query_embeddings', ['created_at'],
+        unique=False,
+    )
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_query_embeddings_created_at'), table_name='query_embeddings')
+    op.drop_table('query_embeddings')
@@ -0,0 +1,33 @@
+"""Add videos.embedding_model
+
+Revision ID: 8c2d4e6f1a3b
+Revises: 3f1c9a2e7b4d
+Create Date: 2026-10-16 11:40:03.552917
+
+"""
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = '8c2d4e6f1a3b'
+down_revision: Union[str, None] = '3f1c9a2e7b4d'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        'videos', sa.Column('embedding_model', sa.String(length=100), nullable=True)
+    )
+    # Every vector stored so far came from Cloudflare's bge-small-en-v1.5
+    op.execute(
+        "UPDATE videos SET embedding_model = '@cf/baai/bge-small-en-v1.5' "
+        "WHERE embedding IS NOT NULL"
+    )
+
+
+def downgrade() -> None:
+    op.drop_column('videos', 'embedding_model')
@@ -0,0 +1,53 @@
+"""Add youtube_quota_usage ledger, ingestion_jobs.priority and a search-count index
+
+Revision ID: a2c4e6b8d0f3
+Revises: f1b3d5a7c9e2
+Create Date: 2026-10-16 18:41:53.902114
+
+"""
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = 'a2c4e6b8d0f3'
+down_revision: Union[str, None] = 'f1b3d5a7c9e2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'youtube_quota_usage',
+        sa.Column('day', sa.Date(), nullable=False),
+        sa.Column('endpoint', sa.String(length=20), nullable=False),
+        sa.Column('units', sa.Integer(), nullable=False),
+        sa.Column('calls', sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint('day', 'endpoint'),
+    )
+    op.add_column(
+        'ingestion_jobs',
+        sa.Column('priority', sa.Float(), nullable=False, server_default='0'),
+    )
+    op.drop_index('ix_ingestion_jobs_queued', table_name='ingestion_jobs')
+    op.create_index(
+        'ix_ingestion_jobs_queued', 'ingestion_jobs', [sa.text('priority DESC'), 'id'],
+        unique=False, postgresql_where=sa.text("status = 'queued'"),
+    )
+    op.create_index(
+        'ix_user_searches_query_lower', 'user_searches',
+        [sa.text('lower(query)'), 'search_time'], unique=False,
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_user_searches_query_lower', table_name='user_searches')
+    op.drop_index('ix_ingestion_jobs_queued', table_name='ingestion_jobs')
+    op.create_index(
+        'ix_ingestion_jobs_queued', 'ingestion_jobs', ['id'],
+        unique=False, postgresql_where=sa.text("status = 'queued'"),
+    )
+    op.drop_column('ingestion_jobs', 'priority')
+    op.drop_table('youtube_quota_usage')
@@ -0,0 +1,31 @@
+"""Add HNSW index on videos.embedding
+
+Revision ID: b51e07c9d2a4
+Revises: 8c2d4e6f1a3b
+Create Date: 2026-10-16 14:05:27.903114
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = 'b51e07c9d2a4'
+down_revision: Union[str, None] = '8c2d4e6f1a3b'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # CONCURRENTLY cannot run inside a transaction block
+    with op.get_context().autocommit_block():
+        op.execute(
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_videos_embedding_hnsw "
+            "ON videos USING hnsw (embedding vector_cosine_ops) "
+            "WITH (m = 16, ef_construction = 64)"
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.execute("DROP INDEX CONCURRENTLY IF EXISTS ix_videos_embedding_hnsw")
@@ -0,0 +1,34 @@
+"""Add videos.stats_refreshed_at and an interaction-time index
+
+Revision ID: b7e9d1f3a5c8
+Revises: a2c4e6b8d0f3
+Create Date: 2026-10-16 20:12:07.418263
+
+"""
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = 'b7e9d1f3a5c8'
+down_revision: Union[str, None] = 'a2c4e6b8d0f3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # NULL = never refreshed, so existing rows are due on the first run
+    op.add_column('videos',
+                  sa.Column('stats_refreshed_at', sa.DateTime(), nullable=True))
+    op.create_index(
+        'ix_user_interactions_interaction_time', 'user_interactions',
+        ['interaction_time'], unique=False,
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_user_interactions_interaction_time',
+                  table_name='user_interactions')
+    op.drop_column('videos', 'stats_refreshed_at')
@@ -0,0 +1,40 @@
+"""Add videos.popularity_prior
+
+Revision ID: c5d7e9f1a3b6
+Revises: b7e9d1f3a5c8
+Create Date: 2026-10-16 22:04:51.730194
+
+"""
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = 'c5d7e9f1a3b6'
+down_revision: Union[str, None] = 'b7e9d1f3a5c8'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Stored generated column, recomputed by Postgres whenever ingestion or the
+    # stats refresh writes view_count / like_count. Adding it rewrites the table once.
+    op.add_column('videos', sa.Column(
+        'popularity_prior',
+        sa.Float(),
+        sa.Computed(
+            "LEAST(1.0, "
+            "0.5 * ln(1 + GREATEST(COALESCE(view_count, 0), 0)::double precision)"
+            " / ln(10000001) + "
+            "0.5 * ln(1 + GREATEST(COALESCE(like_count, 0), 0)::double precision)"
+            " / ln(100001))",
+            persisted=True,
+        ),
+        nullable=True,
+    ))
+
+
+def downgrade() -> None:
+    op.drop_column('videos', 'popularity_prior')
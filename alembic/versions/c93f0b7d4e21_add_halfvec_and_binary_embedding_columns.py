@@ -0,0 +1,46 @@
+"""Add halfvec and binary-quantized embedding columns
+
+Revision ID: c93f0b7d4e21
+Revises: e4a7c2d91f06
+Create Date: 2026-10-16 16:48:12.604391
+
+"""
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from pgvector.sqlalchemy import BIT, HALFVEC
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = 'c93f0b7d4e21'
+down_revision: Union[str, None] = 'e4a7c2d91f06'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Requires the pgvector extension >= 0.7 (halfvec, bit ops, binary_quantize).
+    # Existing rows are filled by `python -m scraper.backfill --compact`.
+    op.add_column('videos', sa.Column('embedding_half', HALFVEC(384), nullable=True))
+    op.add_column('videos', sa.Column('embedding_bit', BIT(384), nullable=True))
+    # CONCURRENTLY cannot run inside a transaction block
+    with op.get_context().autocommit_block():
+        op.execute(
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_videos_embedding_half_hnsw "
+            "ON videos USING hnsw (embedding_half halfvec_cosine_ops) "
+            "WITH (m = 16, ef_construction = 64)"
+        )
+        op.execute(
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_videos_embedding_bit_hnsw "
+            "ON videos USING hnsw (embedding_bit bit_hamming_ops) "
+            "WITH (m = 16, ef_construction = 64)"
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.execute("DROP INDEX CONCURRENTLY IF EXISTS ix_videos_embedding_bit_hnsw")
+        op.execute("DROP INDEX CONCURRENTLY IF EXISTS ix_videos_embedding_half_hnsw")
+    op.drop_column('videos', 'embedding_bit')
+    op.drop_column('videos', 'embedding_half')
@@ -0,0 +1,54 @@
+"""Add videos.duration_bucket with per-bucket partial HNSW indexes
+
+Revision ID: d6f2b8a1c4e7
+Revises: c93f0b7d4e21
+Create Date: 2026-10-16 17:12:08.546217
+
+"""
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = 'd6f2b8a1c4e7'
+down_revision: Union[str, None] = 'c93f0b7d4e21'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+BUCKETS = ("short", "medium", "long")
+
+
+def upgrade() -> None:
+    # Stored generated column, kept in step with `duration` by Postgres.
+    # Adding it rewrites the table once.
+    op.add_column('videos', sa.Column(
+        'duration_bucket',
+        sa.String(length=6),
+        sa.Computed(
+            "CASE WHEN duration < 240 THEN 'short' "
+            "WHEN duration < 1200 THEN 'medium' "
+            "ELSE 'long' END",
+            persisted=True,
+        ),
+        nullable=True,
+    ))
+    # CONCURRENTLY cannot run inside a transaction block
+    with op.get_context().autocommit_block():
+        for bucket in BUCKETS:
+            op.execute(
+                "CREATE INDEX CONCURRENTLY IF NOT EXISTS "
+                f"ix_videos_embedding_hnsw_{bucket} "
+                "ON videos USING hnsw (embedding vector_cosine_ops) "
+                "WITH (m = 16, ef_construction = 64) "
+                f"WHERE duration_bucket = '{bucket}'"
+            )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        for bucket in BUCKETS:
+            op.execute("DROP INDEX CONCURRENTLY IF EXISTS "
+                       f"ix_videos_embedding_hnsw_{bucket}")
+    op.drop_column('videos', 'duration_bucket')
@@ -0,0 +1,53 @@
+"""Add videos.search_vector full-text column with GIN and trigram indexes
+
+Revision ID: e4a7c2d91f06
+Revises: b51e07c9d2a4
+Create Date: 2026-10-16 15:22:41.318806
+
+"""
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = 'e4a7c2d91f06'
+down_revision: Union[str, None] = 'b51e07c9d2a4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Stored generated column: title (weight A) ranks above description (weight B).
+    # Adding it rewrites the table once.
+    op.add_column('videos', sa.Column(
+        'search_vector',
+        postgresql.TSVECTOR(),
+        sa.Computed(
+            "setweight(to_tsvector('english', coalesce(title, '')), 'A') || "
+            "setweight(to_tsvector('english', coalesce(description, '')), 'B')",
+            persisted=True,
+        ),
+        nullable=True,
+    ))
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    # CONCURRENTLY cannot run inside a transaction block
+    with op.get_context().autocommit_block():
+        op.execute(
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_videos_search_vector "
+            "ON videos USING gin (search_vector)"
+        )
+        # Used only when TEXT_SEARCH_FUZZY=true (typo-tolerant title matching)
+        op.execute(
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_videos_title_trgm "
+            "ON videos USING gin (title gin_trgm_ops)"
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.execute("DROP INDEX CONCURRENTLY IF EXISTS ix_videos_title_trgm")
+        op.execute("DROP INDEX CONCURRENTLY IF EXISTS ix_videos_search_vector")
+    op.drop_column('videos', 'search_vector')
@@ -0,0 +1,50 @@
+"""Add ingestion_jobs queue table
+
+Revision ID: f1b3d5a7c9e2
+Revises: d6f2b8a1c4e7
+Create Date: 2026-10-16 18:05:27.330918
+
+"""
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = 'f1b3d5a7c9e2'
+down_revision: Union[str, None] = 'd6f2b8a1c4e7'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'ingestion_jobs',
+        sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+        sa.Column('query', sa.Text(), nullable=False),
+        sa.Column('video_duration', sa.String(length=10), nullable=False),
+        sa.Column('max_results', sa.Integer(), nullable=False),
+        sa.Column('status', sa.String(length=10), nullable=False),
+        sa.Column('attempts', sa.Integer(), nullable=False),
+        sa.Column('inserted', sa.Integer(), nullable=True),
+        sa.Column('error', sa.Text(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.Column('started_at', sa.DateTime(), nullable=True),
+        sa.Column('finished_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index(
+        'ix_ingestion_jobs_active', 'ingestion_jobs', ['query', 'video_duration'],
+        unique=True, postgresql_where=sa.text("status IN ('queued', 'running')"),
+    )
+    op.create_index(
+        'ix_ingestion_jobs_queued', 'ingestion_jobs', ['id'],
+        unique=False, postgresql_where=sa.text("status = 'queued'"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_ingestion_jobs_queued', table_name='ingestion_jobs')
+    op.drop_index('ix_ingestion_jobs_active', table_name='ingestion_jobs')
+    op.drop_table('ingestion_jobs')
@@ -3,31 +3,60 @@ FastAPI application for Edu Video Recommender.
 Migrated from Flask to FastAPI for async support and type safety.
 """
 
+import asyncio
 import logging
 import os
 from contextlib import asynccontextmanager
 from pathlib import Path
+from typing import Optional
 
 from dotenv import load_dotenv
-from fastapi import Depends, FastAPI, HTTPException, Request, status
+from fastapi import Depends, FastAPI, HTTPException, Query, Request, status
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import FileResponse, JSONResponse
 from fastapi.staticfiles import StaticFiles
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 
 load_dotenv()
 
 from backend import auth
-from backend.database import get_db, init_db, test_connection
+from backend.database import (
+    async_test_connection,
+    dispose_async_engine,
+    get_async_db,
+    init_db,
+)
 from backend.models import UserInteraction, Video
 from backend.schemas import (
     HealthResponse,
     InteractionRequest,
     InteractionResponse,
+    IngestionJobResponse,
+    MetricsResponse,
     RecommendationResponse,
+    RefreshJob,
     VideoResult,
 )
-from scraper.semantic_search import log_search, recommend
+from scraper.backfill import BACKFILL_ENABLED, backfill_loop
+from scraper.corpus_state import corpus_state
+from scraper.embedding_batcher import coalescer_stats
+from scraper.embedding_cache import embedding_cache
+from scraper.embeddings import get_backend
+from scraper.fetch_guard import youtube_fetch_guard
+from scraper.http_client import client_stats, close_async_clients
+from scraper.ingestion_queue import (
+    INGESTION_QUEUE_ENABLED,
+    ingestion_loop,
+    ingestion_queue,
+    ingestion_stats,
+)
+from scraper.result_cache import result_cache
+from scraper.semantic_search import alog_search, arecommend
+from scraper.stages import stage_timings
+from scraper.stats_refresh import STATS_REFRESH_ENABLED, stats_refresh_loop
+from scraper.vector_index import VECTOR_INDEX_ENABLED, vector_index, vector_index_loop
+from scraper.youtube_quota import youtube_quota
 
 # Logging setup
 logging.basicConfig(level=logging.INFO)
@@ -50,9 +79,39 @@ async def lifespan(app: FastAPI):
         # User requested fail-fast for secrets, implies we should fail fast here too.
         raise
     
+    backfill_task = None
+    if BACKFILL_ENABLED:
+        logger.info("Starting embedding backfill task...")
+        backfill_task = asyncio.create_task(backfill_loop())
+
+    vector_index_task = None
+    if VECTOR_INDEX_ENABLED:
+        logger.info("Starting vector index refresh task...")
+        vector_index_task = asyncio.create_task(vector_index_loop())
+
+    ingestion_task = None
+    if INGESTION_QUEUE_ENABLED:
+        logger.info("Starting YouTube ingestion workers...")
+        ingestion_task = asyncio.create_task(ingestion_loop())
+
+    stats_refresh_task = None
+    if STATS_REFRESH_ENABLED:
+        logger.info("Starting video statistics refresh task...")
+        stats_refresh_task = asyncio.create_task(stats_refresh_loop())
+
     yield
     
     logger.info("Shutting down...")
+    if backfill_task:
+        backfill_task.cancel()
+    if vector_index_task:
+        vector_index_task.cancel()
+    if ingestion_task:
+        ingestion_task.cancel()
+    if stats_refresh_task:
+        stats_refresh_task.cancel()
+    await close_async_clients()
+    await dispose_async_engine()
 
 # --- App Definition ---
 app = FastAPI(
@@ -145,33 +204,18 @@ async def serve_video():
 @app.get("/api/health", response_model=HealthResponse)
 async def health():
     """Health check endpoint."""
-    # Note: test_connection is sync, blocking.
-    db_success, db_message = test_connection()
+    db_success, db_message = await async_test_connection()
     
-    # Simple ORM check
+    # Corpus stats come from the cached corpus state rather than a COUNT per request
+    # (a refresh uses a sync session, so it runs in a worker thread)
     orm_status = "unknown"
+    corpus = None
     try:
-        # We need a fresh session here. 
-        # Since get_db is a generator, we must iterate or use context manager if we adapted it.
-        # But for quick check we can use the engine directly or the raw connection?
-        # Let's use the generator manually for this check to be safe.
-
-        from backend.database import get_db
-        
-        # Check connection via engine (already done in test_connection roughly)
-        # Check models via session
-        gen = get_db()
-        session = next(gen)
-        try:
-            # Avoid importing models just for count if we can query generic
-            # But let's verify ORM mapping works
-            from backend import models
-            video_count = session.query(models.Video).count()
-            orm_status = f"working (videos: {video_count})"
-        finally:
-            # We must close/next
-            gen.close()
-            
+        model_id = get_backend().model_id
+        snapshot = await asyncio.to_thread(corpus_state.snapshot, model_id)
+        videos = 'present' if snapshot['has_videos'] else 'none'
+        orm_status = f"working (videos: {videos})"
+        corpus = corpus_state.stats()
     except Exception as e:
         orm_status = f"error: {str(e)}"
     
@@ -180,18 +224,38 @@ async def health():
         message="Edu Video Recommender API",
         database="connected" if db_success else f"disconnected: {db_message}",
         orm=orm_status,
+        corpus=corpus,
         environment=os.getenv('ENV', 'production')
     )
 
+@app.get("/api/metrics", response_model=MetricsResponse)
+async def metrics():
+    """Operational counters for upstream caches and HTTP clients."""
+    return MetricsResponse(
+        embedding_cache=embedding_cache.stats(),
+        embedding_batcher=coalescer_stats(),
+        upstreams=client_stats(),
+        vector_index=vector_index.stats(),
+        recommend_stages=stage_timings.stats(),
+        result_cache=result_cache.stats(),
+        ingestion=await ingestion_stats(),
+        youtube_fetches=youtube_fetch_guard.stats(),
+        youtube_quota=await asyncio.to_thread(youtube_quota.stats),
+    )
+
 @app.get("/api/recommend", response_model=RecommendationResponse)
 async def get_recommendations(
     query: str,
     duration: str = "any",
+    ef_search: Optional[int] = Query(None, ge=1, le=1000),
+    candidate_k: Optional[int] = Query(None, ge=1, le=500),
     current_user: str = Depends(get_current_user_id),
-    db: Session = Depends(get_db)  # Injected session
+    db: AsyncSession = Depends(get_async_db)  # Injected async session
 ):
     """
     Get video recommendations.
+    `ef_search` optionally overrides the HNSW search breadth (recall vs latency).
+    `candidate_k` optionally overrides how many lexical and vector candidates are fused.
     """
     allowed_durations = {"any", "short", "medium", "long"}
     duration = duration.lower() if duration else "any"
@@ -206,8 +270,19 @@ async def get_recommendations(
     
     try:
         # Pass the injected session to helper functions
-        log_search(query, user_id=current_user, db_session=db)
-        results = recommend(query, top_n=10, user_id=current_user, video_duration=duration, db_session=db)
+        await alog_search(query, db, user_id=current_user)
+        # Identical concurrent queries share one computation; repeats within
+        # RESULT_CACHE_TTL are served from the result cache
+        results = await result_cache.aget_or_compute(
+            result_cache.key(
+                query, duration, 10, get_backend().model_id, ef_search, candidate_k
+            ),
+            lambda: arecommend(
+                query, db, top_n=10, user_id=current_user, video_duration=duration,
+                ef_search=ef_search, candidate_k=candidate_k
+            ),
+            tags=result_cache.tags(query, duration),
+        )
         
         # Convert dict results to Pydantic models
         valid_results = []
@@ -215,7 +290,9 @@ async def get_recommendations(
             # Ensure safety if keys missing
             valid_results.append(VideoResult(**r))
 
-        return RecommendationResponse(results=valid_results)
+        return RecommendationResponse(
+            results=valid_results, refresh=await _refresh_job(query, duration)
+        )
     
     except Exception as e:
         logger.error(f"Error in /api/recommend: {e}", exc_info=True)
@@ -225,18 +302,68 @@ async def get_recommendations(
         )
 
 
+async def _refresh_job(query, duration):
+    """The queued/running supply refresh for this query, if any."""
+    if not INGESTION_QUEUE_ENABLED:
+        return None
+    try:
+        job = await ingestion_queue.active_job(query, duration)
+    except Exception as e:
+        logger.warning(f"Looking up the refresh job failed: {e}")
+        return None
+    if job is None:
+        return None
+    return RefreshJob(
+        job_id=job["id"],
+        status=job["status"],
+        poll=f"/api/recommend/refresh/{job['id']}",
+    )
+
+
+@app.get("/api/recommend/refresh/{job_id}", response_model=IngestionJobResponse)
+async def get_refresh_job(
+    job_id: int,
+    wait: float = Query(0, ge=0, le=30),
+    current_user: str = Depends(get_current_user_id),
+):
+    """
+    Status of a supply-refresh job from /api/recommend.
+    `wait` long-polls up to that many seconds for the job to finish; once it is
+    done, repeating the recommend request returns the refreshed results.
+    """
+    job = await ingestion_queue.wait_finished(job_id, wait)
+    if job is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail="Refresh job not found"
+        )
+    return IngestionJobResponse(
+        job_id=job["id"],
+        query=job["query"],
+        duration=job["video_duration"],
+        status=job["status"],
+        attempts=job["attempts"],
+        inserted=job["inserted"],
+        error=job["error"],
+        created_at=job["created_at"],
+        finished_at=job["finished_at"],
+    )
+
+
 @app.post("/api/interactions", response_model=InteractionResponse, status_code=status.HTTP_201_CREATED)
 async def log_interaction(
     interaction: InteractionRequest,
     current_user: str = Depends(get_current_user_id),
-    db: object = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
 ):
     """
     Log a user interaction (click, watch, like, rating) with a video.
     """
     try:
         # Look up video by youtube_id (string) since frontend sends YouTube IDs
-        video = db.query(Video).filter(Video.youtube_id == interaction.video_id).first()
+        result = await db.execute(
+            select(Video).where(Video.youtube_id == interaction.video_id)
+        )
+        video = result.scalars().first()
         if not video:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
@@ -250,8 +377,8 @@ async def log_interaction(
             rating=interaction.rating,
         )
         db.add(new_interaction)
-        db.commit()
-        db.refresh(new_interaction)
+        await db.commit()
+        await db.refresh(new_interaction)
 
         logger.info(
             f"Logged interaction: user={current_user}, video={interaction.video_id}, type={interaction.interaction_type}"
@@ -265,7 +392,7 @@ async def log_interaction(
     except HTTPException:
         raise
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         logger.error(f"Error logging interaction: {e}", exc_info=True)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -1,13 +1,23 @@
 """
 Database connection and session management for SQLAlchemy ORM.
 Uses Supabase PostgreSQL with pgvector support.
+
+Two engines share the same database:
+- `engine` / `SessionLocal` (psycopg2, sync) for scripts, migrations and
+  background jobs
+- `async_engine` / `get_async_db` (asyncpg) for the API request path,
+  so a slow query or upstream call does not block the event loop
 """
 
+import asyncio
+import inspect
+import logging
 import os
 
 from dotenv import load_dotenv
-from sqlalchemy import create_engine
-from sqlalchemy.orm import declarative_base, sessionmaker
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.orm import Session, declarative_base, sessionmaker
 
 load_dotenv()
 
@@ -20,6 +30,10 @@ DB_NAME = os.getenv("DB_NAME")
 
 # Build PostgreSQL connection string
 DATABASE_URL = f"postgresql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
+ASYNC_DATABASE_URL = f"postgresql+asyncpg://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
+# asyncpg prepared-statement cache; set to 0 behind a transaction-mode pooler
+# (Supabase port 6543 / PgBouncer), which cannot keep prepared statements
+DB_ASYNC_STATEMENT_CACHE_SIZE = int(os.getenv("DB_ASYNC_STATEMENT_CACHE_SIZE", "100"))
 
 # Create SQLAlchemy engine with connection pooling
 engine = create_engine(
@@ -53,6 +67,78 @@ def get_db():
 get_session = get_db
 
 
+# --- Async engine (request path) ---
+# pgvector values travel in their text form ('[0.1, 0.2, ...]'), exactly as on
+# the sync engine: the pgvector SQLAlchemy types render them, and asyncpg
+# passes extension types it has no codec for as text.
+async_engine = create_async_engine(
+    ASYNC_DATABASE_URL,
+    echo=False,
+    pool_pre_ping=True,
+    pool_size=10,
+    max_overflow=20,
+    connect_args={"statement_cache_size": DB_ASYNC_STATEMENT_CACHE_SIZE},
+)
+
+# Async session factory
+AsyncSessionLocal = async_sessionmaker(bind=async_engine, expire_on_commit=False)
+
+
+async def get_async_db():
+    """
+    Async twin of `get_db` for FastAPI routes.
+    Usage: async def route(db: AsyncSession = Depends(get_async_db)):
+    """
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
+async def dispose_async_engine():
+    """Close pooled async connections (call on application shutdown)."""
+    await async_engine.dispose()
+
+
+# --- Post-commit hooks ---
+# Side effects of a write (cache invalidation, memos, wakeups) must only be
+# visible once the write is. They are parked on the session and run by the
+# `after_commit` event of its outermost transaction; a rollback or close
+# discards them.
+_AFTER_COMMIT_KEY = "after_commit_callbacks"
+_after_commit_tasks = set()  # strong refs to scheduled coroutine callbacks
+
+
+def after_commit(session, callback):
+    """
+    Run `callback()` once the current transaction of `session` (a Session or
+    AsyncSession) commits; drop it if the transaction ends any other way.
+    A callback returning a coroutine is scheduled on the running event loop.
+    """
+    session = getattr(session, "sync_session", session)
+    session.info.setdefault(_AFTER_COMMIT_KEY, []).append(callback)
+
+
+@event.listens_for(Session, "after_commit")
+def _run_after_commit(session):
+    if session.in_nested_transaction():
+        return  # a released savepoint; wait for the real commit
+    for callback in session.info.pop(_AFTER_COMMIT_KEY, ()):
+        try:
+            result = callback()
+            if inspect.isawaitable(result):
+                task = asyncio.ensure_future(result)
+                _after_commit_tasks.add(task)
+                task.add_done_callback(_after_commit_tasks.discard)
+        except Exception as e:
+            # The commit already happened; a failed side effect must not undo it
+            logging.warning(f"Post-commit callback failed: {e}")
+
+
+@event.listens_for(Session, "after_transaction_end")
+def _discard_after_commit(session, transaction):
+    if transaction.parent is None:
+        session.info.pop(_AFTER_COMMIT_KEY, None)
+
+
 def init_db():
     """
     Create all tables defined in models.
@@ -72,3 +158,13 @@ def test_connection():
             return True, "Database connection successful"
     except Exception as e:
         return False, f"Database connection failed: {str(e)}"
+
+
+async def async_test_connection():
+    """Async twin of `test_connection` over the asyncpg engine."""
+    try:
+        async with async_engine.connect() as conn:
+            await conn.execute(text("SELECT 1"))
+            return True, "Database connection successful"
+    except Exception as e:
+        return False, f"Database connection failed: {str(e)}"
@@ -3,17 +3,83 @@ SQLAlchemy ORM models for the Edu Video Recommender.
 - Video: YouTube videos with pgvector embeddings
 - UserSearch: Track user search queries
 - UserInteraction: Track user interactions (clicks, watches) with videos
+- QueryEmbedding: Persistent cache of query embeddings
+- IngestionJob: Durable queue of YouTube supply-refresh jobs
+- YouTubeQuotaUsage: Ledger of YouTube Data API quota units spent per day
 """
 
 from datetime import datetime, timezone
 
-from pgvector.sqlalchemy import Vector
-from sqlalchemy import Column, DateTime, ForeignKey, Integer, String, Text
-from sqlalchemy.dialects.postgresql import UUID
-from sqlalchemy.orm import relationship
+from pgvector.sqlalchemy import BIT, HALFVEC, Vector
+from sqlalchemy import (
+    Column,
+    Computed,
+    Date,
+    DateTime,
+    Float,
+    ForeignKey,
+    Index,
+    Integer,
+    String,
+    Text,
+    text,
+)
+from sqlalchemy.dialects.postgresql import TSVECTOR, UUID
+from sqlalchemy.orm import deferred, relationship
 
 from backend.database import Base
 
+# Dimension of stored video/query embeddings (bge-small-en-v1.5)
+EMBEDDING_DIM = 384
+
+# Text search configuration of videos.search_vector; queries must use the same one
+TEXT_SEARCH_CONFIG = "english"
+
+# Generation expression of videos.search_vector: title (weight A) + description (B)
+SEARCH_VECTOR_SQL = (
+    f"setweight(to_tsvector('{TEXT_SEARCH_CONFIG}', coalesce(title, '')), 'A') || "
+    f"setweight(to_tsvector('{TEXT_SEARCH_CONFIG}', coalesce(description, '')), "
+    "'B')"
+)
+
+# `video_duration` filter buckets: (min inclusive, max exclusive) duration in seconds
+DURATION_BUCKETS = {
+    "short": (None, 240),    # < 4 minutes
+    "medium": (240, 1200),   # 4-20 minutes
+    "long": (1200, None),    # >= 20 minutes
+}
+
+# Generation expression of videos.duration_bucket; must agree with DURATION_BUCKETS
+DURATION_BUCKET_SQL = (
+    "CASE WHEN duration < 240 THEN 'short' "
+    "WHEN duration < 1200 THEN 'medium' "
+    "ELSE 'long' END"
+)
+
+
+# videos.popularity_prior: log-scaled views and likes, each divided by the log of a
+# reference count for a widely watched lesson (counts beyond it saturate at 1)
+POPULARITY_VIEWS_SCALE = 10_000_000
+POPULARITY_LIKES_SCALE = 100_000
+
+# Generation expression of videos.popularity_prior (0 - 1)
+POPULARITY_PRIOR_SQL = (
+    "LEAST(1.0, "
+    "0.5 * ln(1 + GREATEST(COALESCE(view_count, 0), 0)::double precision) "
+    f"/ ln({POPULARITY_VIEWS_SCALE + 1}) + "
+    "0.5 * ln(1 + GREATEST(COALESCE(like_count, 0), 0)::double precision) "
+    f"/ ln({POPULARITY_LIKES_SCALE + 1}))"
+)
+
+
+def duration_bucket(duration_seconds):
+    """Bucket name of a duration in seconds (Python twin of DURATION_BUCKET_SQL)."""
+    for bucket, (low, high) in DURATION_BUCKETS.items():
+        if ((low is None or duration_seconds >= low)
+                and (high is None or duration_seconds < high)):
+            return bucket
+    return None
+
 
 class User(Base):
     """
@@ -31,6 +97,46 @@ class User(Base):
 class Video(Base):
     
     __tablename__ = "videos"
+    __table_args__ = (
+        # Approximate nearest-neighbour index for ORDER BY embedding <=> :q LIMIT k
+        Index(
+            "ix_videos_embedding_hnsw",
+            "embedding",
+            postgresql_using="hnsw",
+            postgresql_with={"m": 16, "ef_construction": 64},
+            postgresql_ops={"embedding": "vector_cosine_ops"},
+        ),
+        # One partial HNSW index per duration bucket, so a filtered search walks
+        # a graph of matching rows only instead of post-filtering the full one
+        *(
+            Index(
+                f"ix_videos_embedding_hnsw_{bucket}",
+                "embedding",
+                postgresql_using="hnsw",
+                postgresql_with={"m": 16, "ef_construction": 64},
+                postgresql_ops={"embedding": "vector_cosine_ops"},
+                postgresql_where=text(f"duration_bucket = '{bucket}'"),
+            )
+            for bucket in DURATION_BUCKETS
+        ),
+        # Compact storage: half-precision vectors and a binary-quantized first stage
+        Index(
+            "ix_videos_embedding_half_hnsw",
+            "embedding_half",
+            postgresql_using="hnsw",
+            postgresql_with={"m": 16, "ef_construction": 64},
+            postgresql_ops={"embedding_half": "halfvec_cosine_ops"},
+        ),
+        Index(
+            "ix_videos_embedding_bit_hnsw",
+            "embedding_bit",
+            postgresql_using="hnsw",
+            postgresql_with={"m": 16, "ef_construction": 64},
+            postgresql_ops={"embedding_bit": "bit_hamming_ops"},
+        ),
+        # Full-text index for search_vector @@ websearch_to_tsquery(...)
+        Index("ix_videos_search_vector", "search_vector", postgresql_using="gin"),
+    )
     
     id = Column(Integer, primary_key=True, autoincrement=True)
     youtube_id = Column(String(50), unique=True, nullable=False, index=True)
@@ -38,12 +144,32 @@ class Video(Base):
     description = Column(Text, nullable=True)
     thumbnail = Column(String(500), nullable=True)
     duration = Column(Integer, nullable=False)  # in seconds
+    # Generated by Postgres from `duration`: 'short' | 'medium' | 'long'
+    duration_bucket = Column(String(6), Computed(DURATION_BUCKET_SQL, persisted=True))
     category = Column(String(50), nullable=True)
     upload_date = Column(String(50), nullable=True)  # ISO 8601 format
     view_count = Column(Integer, default=0)
     like_count = Column(Integer, default=0)
-    embedding = Column(Vector(384), nullable=True)  # MiniLM-L6-v2 produces 384-dim vectors (nullable for Phase 1)
+    # When view_count / like_count were last read from YouTube (scraper.stats_refresh)
+    stats_refreshed_at = Column(
+        DateTime, nullable=True, default=lambda: datetime.now(timezone.utc)
+    )
+    # Generated by Postgres from view_count / like_count; the popularity signal
+    # of the ranking
+    popularity_prior = Column(Float, Computed(POPULARITY_PRIOR_SQL, persisted=True))
+    # bge-small-en-v1.5 produces 384-dim vectors (nullable for Phase 1)
+    embedding = Column(Vector(EMBEDDING_DIM), nullable=True)
+    # Model id that produced `embedding`
+    embedding_model = Column(String(100), nullable=True)
+    # Same vector as `embedding` at half precision (768 B) and as sign bits
+    # (48 B); only used in SQL
+    embedding_half = deferred(Column(HALFVEC(EMBEDDING_DIM), nullable=True))
+    embedding_bit = deferred(Column(BIT(EMBEDDING_DIM), nullable=True))
     created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc), nullable=False)
+    # Generated by Postgres (SEARCH_VECTOR_SQL); only used in SQL
+    search_vector = deferred(Column(
+        TSVECTOR, Computed(SEARCH_VECTOR_SQL, persisted=True)
+    ))
     
     # Relationships
     interactions = relationship("UserInteraction", back_populates="video", cascade="all, delete-orphan")
@@ -64,6 +190,10 @@ class UserSearch(Base):
     """
     
     __tablename__ = "user_searches"
+    __table_args__ = (
+        # Search counts per query (YouTube refresh priority)
+        Index("ix_user_searches_query_lower", text("lower(query)"), "search_time"),
+    )
     
     id = Column(Integer, primary_key=True, autoincrement=True)
     user_id = Column(UUID(as_uuid=True), ForeignKey("auth.users.id", ondelete="CASCADE"), nullable=False, index=True)
@@ -92,6 +222,10 @@ class UserInteraction(Base):
     """
     
     __tablename__ = "user_interactions"
+    __table_args__ = (
+        # Recently interacted videos (hot set of the statistics refresh)
+        Index("ix_user_interactions_interaction_time", "interaction_time"),
+    )
     
     id = Column(Integer, primary_key=True, autoincrement=True)
     user_id = Column(UUID(as_uuid=True), ForeignKey("auth.users.id", ondelete="CASCADE"), nullable=False, index=True)
@@ -106,3 +240,112 @@ class UserInteraction(Base):
     
     def __repr__(self):
         return f"<UserInteraction(id={self.id}, user_id={self.user_id}, video_id={self.video_id}, type={self.interaction_type})>"
+
+
+class QueryEmbedding(Base):
+    """
+    Persistent tier of the query-embedding cache.
+
+    Columns:
+    - query: Normalized query text
+    - model: Embedding model id that produced the vector
+    - embedding: 384-dim query vector
+    - created_at: When the vector was computed (used for TTL)
+    """
+
+    __tablename__ = "query_embeddings"
+
+    query = Column(Text, primary_key=True)
+    model = Column(String(100), primary_key=True)
+    embedding = Column(Vector(EMBEDDING_DIM), nullable=False)
+    created_at = Column(
+        DateTime, default=lambda: datetime.now(timezone.utc), nullable=False, index=True
+    )
+
+    def __repr__(self):
+        return f"<QueryEmbedding(model={self.model}, query={self.query[:50]}...)>"
+
+
+class IngestionJob(Base):
+    """
+    Durable queue of YouTube supply-refresh jobs (INGESTION_QUEUE_BACKEND=postgres).
+
+    Columns:
+    - id: Primary key, also the job id clients poll
+    - query: Normalized search query to fetch videos for
+    - video_duration: Duration filter passed to YouTube
+    - max_results: YouTube results to request
+    - status: 'queued', 'running', 'done' or 'failed'
+    - priority: Expected value of the fetch; queued jobs are claimed highest first
+    - attempts: How many times a worker has claimed the job
+    - inserted: Videos the finished job added
+    - error: Last failure message
+    - created_at / started_at / finished_at: Job lifecycle timestamps
+    """
+
+    __tablename__ = "ingestion_jobs"
+    __table_args__ = (
+        # At most one active job per (query, duration); enqueueing a duplicate
+        # returns the active one
+        Index(
+            "ix_ingestion_jobs_active",
+            "query",
+            "video_duration",
+            unique=True,
+            postgresql_where=text("status IN ('queued', 'running')"),
+        ),
+        # Claim order of queued jobs
+        Index(
+            "ix_ingestion_jobs_queued",
+            text("priority DESC"),
+            "id",
+            postgresql_where=text("status = 'queued'"),
+        ),
+    )
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    query = Column(Text, nullable=False)
+    video_duration = Column(String(10), nullable=False)
+    max_results = Column(Integer, nullable=False)
+    status = Column(String(10), nullable=False, default="queued")
+    priority = Column(Float, nullable=False, default=0.0)
+    attempts = Column(Integer, nullable=False, default=0)
+    inserted = Column(Integer, nullable=True)
+    error = Column(Text, nullable=True)
+    created_at = Column(
+        DateTime, default=lambda: datetime.now(timezone.utc), nullable=False
+    )
+    started_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
+
+    def __repr__(self):
+        return (
+            f"<IngestionJob(id={self.id}, status={self.status}, "
+            f"query={self.query[:50]}...)>"
+        )
+
+
+class YouTubeQuotaUsage(Base):
+    """
+    YouTube Data API quota ledger, one row per quota day and endpoint.
+
+    Columns:
+    - day: Quota day (the API resets at midnight Pacific time)
+    - endpoint: 'search', 'videos', or 'external' for usage reported by the
+      API but not made through this app
+    - units: Quota units spent
+    - calls: Requests made
+    """
+
+    __tablename__ = "youtube_quota_usage"
+
+    day = Column(Date, primary_key=True)
+    endpoint = Column(String(20), primary_key=True)
+    units = Column(Integer, nullable=False, default=0)
+    calls = Column(Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return (
+            f"<YouTubeQuotaUsage(day={self.day}, endpoint={self.endpoint}, "
+            f"units={self.units})>"
+        )
@@ -1,6 +1,7 @@
+from datetime import datetime
 from typing import Any, Dict, List, Literal, Optional
 
-from pydantic import BaseModel, field_validator
+from pydantic import BaseModel, field_validator, model_validator
 
 
 class RecommendationRequest(BaseModel):
@@ -15,13 +16,18 @@ class InteractionRequest(BaseModel):
 
     @field_validator("rating")
     @classmethod
-    def validate_rating(cls, v, info):
-        if info.data.get("interaction_type") == "rating" and v is None:
-            raise ValueError("Rating is required for interaction_type 'rating'")
+    def validate_rating(cls, v):
         if v is not None and (v < 1 or v > 5):
             raise ValueError("Rating must be between 1 and 5")
         return v
 
+    @model_validator(mode="after")
+    def require_rating(self):
+        # Field validators skip defaults, so an omitted rating is checked here.
+        if self.interaction_type == "rating" and self.rating is None:
+            raise ValueError("Rating is required for interaction_type 'rating'")
+        return self
+
 
 class InteractionResponse(BaseModel):
     message: str
@@ -37,9 +43,30 @@ class VideoResult(BaseModel):
     score: float
     views: Optional[int] = None
     likes: Optional[int] = None
+    vector_rank: Optional[int] = None  # 1-based rank among vector candidates
+    lexical_rank: Optional[int] = None  # 1-based rank among full-text candidates
+
+class RefreshJob(BaseModel):
+    job_id: int
+    status: str  # 'queued' | 'running' | 'done' | 'failed'
+    poll: str  # URL that reports the job; re-request recommendations once it is done
+
 
 class RecommendationResponse(BaseModel):
     results: List[VideoResult]
+    refresh: Optional[RefreshJob] = None  # set while more videos are being fetched
+
+
+class IngestionJobResponse(BaseModel):
+    job_id: int
+    query: str
+    duration: str
+    status: str
+    attempts: int
+    inserted: Optional[int] = None
+    error: Optional[str] = None
+    created_at: datetime
+    finished_at: Optional[datetime] = None
 
 class HealthResponse(BaseModel):
     status: str
@@ -47,3 +74,15 @@ class HealthResponse(BaseModel):
     database: str
     orm: str
     environment: str
+    corpus: Optional[Dict[str, Any]] = None
+
+class MetricsResponse(BaseModel):
+    embedding_cache: Dict[str, Any]
+    embedding_batcher: Dict[str, Any]
+    upstreams: Dict[str, Any]
+    vector_index: Dict[str, Any]
+    recommend_stages: Dict[str, Any]
+    result_cache: Dict[str, Any]
+    ingestion: Dict[str, Any]
+    youtube_fetches: Dict[str, Any]
+    youtube_quota: Dict[str, Any]
@@ -0,0 +1,127 @@
+"""
+Rows/sec of the video write paths: the row-at-a-time `insert_video` loop
+(SELECT then INSERT per video), the batched upsert and the COPY path of
+scraper.video_store.
+
+Each method writes the same synthetic `videos.list` items (with hashing
+embeddings unless --no-embeddings) under its own youtube_id prefix in one
+transaction, then writes them again with changed statistics to measure the
+refresh path (the loop skips known videos, so it has no refresh figure).
+Rows are deleted afterwards.
+
+Usage:
+    python -m benchmarks.bulk_ingest [--rows 2000] [--batch-size 500]
+                                     [--no-embeddings]
+"""
+
+import argparse
+import time
+import uuid
+
+from sqlalchemy import text
+
+from backend.database import SessionLocal
+from scraper.embeddings import HashingBackend, embed_texts, video_embedding_text
+from scraper.video_store import copy_videos, upsert_videos, video_rows
+from scraper.youtube_scraper import insert_video
+
+
+def synthetic_items(prefix, count, views=100):
+    return [
+        {
+            "id": f"{prefix}{i}",
+            "snippet": {
+                "title": f"Benchmark lesson {i}: cell biology",
+                "description": f"Synthetic description {i} for the ingestion benchmark",
+                "categoryId": "27",
+                "thumbnails": {"high": {"url": f"https://img/{prefix}{i}.jpg"}},
+                "publishedAt": "2024-01-01T00:00:00Z",
+            },
+            "statistics": {"viewCount": str(views + i), "likeCount": str(i)},
+            "contentDetails": {"duration": "PT10M"},
+        }
+        for i in range(count)
+    ]
+
+
+def loop_write(session, items, embeddings, model_id, batch_size):
+    inserted = 0
+    for item, embedding in zip(items, embeddings, strict=True):
+        inserted += insert_video(item, subject="Auto", db_session=session,
+                                 embedding=embedding, embedding_model=model_id)
+    return inserted, 0
+
+
+def upsert_write(session, items, embeddings, model_id, batch_size):
+    return upsert_videos(session, video_rows(items, embeddings, model_id),
+                         batch_size=batch_size)
+
+
+def copy_write(session, items, embeddings, model_id, batch_size):
+    return copy_videos(session, video_rows(items, embeddings, model_id))
+
+
+def timed(method, items, embeddings, model_id, batch_size):
+    session = SessionLocal()
+    try:
+        started = time.perf_counter()
+        counts = method(session, items, embeddings, model_id, batch_size)
+        session.commit()
+        elapsed = time.perf_counter() - started
+    finally:
+        session.close()
+    return counts, len(items) / elapsed
+
+
+def cleanup(prefix):
+    session = SessionLocal()
+    try:
+        session.execute(text("DELETE FROM videos WHERE youtube_id LIKE :p"),
+                        {"p": f"{prefix}%"})
+        session.commit()
+    finally:
+        session.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Benchmark video write paths (rows/sec).")
+    parser.add_argument("--rows", type=int, default=2000)
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--no-embeddings", action="store_true")
+    args = parser.parse_args(argv)
+
+    run_id = uuid.uuid4().hex[:8]
+    backend = HashingBackend()
+    print(f"{args.rows} rows, upsert batch size {args.batch_size}, "
+          f"embeddings {'off' if args.no_embeddings else 'on'}")
+
+    for name, method in (("insert_video loop", loop_write),
+                         ("batched upsert", upsert_write),
+                         ("COPY + merge", copy_write)):
+        prefix = f"bench-{run_id}-{method.__name__}-"
+        items = synthetic_items(prefix, args.rows)
+        if args.no_embeddings:
+            embeddings, model_id = [None] * len(items), None
+        else:
+            texts = [
+                video_embedding_text(i["snippet"]["title"], i["snippet"]["description"])
+                for i in items
+            ]
+            embeddings, model_id = embed_texts(texts, backend=backend), backend.model_id
+        try:
+            (inserted, _), insert_rate = timed(method, items, embeddings, model_id,
+                                               args.batch_size)
+            line = f"{name:<18} insert {insert_rate:9.0f} rows/s ({inserted} new)"
+            if method is not loop_write:
+                refreshed = synthetic_items(prefix, args.rows, views=1000)
+                (_, updated), refresh_rate = timed(method, refreshed, embeddings,
+                                                   model_id, args.batch_size)
+                line += f"   refresh {refresh_rate:9.0f} rows/s ({updated} updated)"
+            print(line)
+        finally:
+            cleanup(prefix)
+
+
+if __name__ == "__main__":
+    main()
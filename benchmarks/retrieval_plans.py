@@ -0,0 +1,167 @@
+"""
+Compare the legacy multi-statement retrieval sequence with the
+single-round-trip plan in scraper.retrieval, and with the ranking statement
+that also fuses and blends RETRIEVAL_CANDIDATE_K candidates per side in SQL.
+
+All plans run against the configured database (DB_* environment variables)
+with the same query embeddings; YouTube fetching is not exercised. Each
+iteration runs in its own transaction, as a request would.
+
+Usage:
+    python -m benchmarks.retrieval_plans [--iterations 50] [--top-n 10]
+                                         [--duration any] [--hashing]
+                                         [query ...]
+"""
+
+import argparse
+import time
+
+from sqlalchemy import text
+
+from backend.database import SessionLocal
+from scraper.embeddings import HashingBackend, get_backend, set_backend
+from scraper.retrieval import (
+    RETRIEVAL_CANDIDATE_K,
+    duration_filter_sql,
+    rank_candidates,
+    retrieve_candidates,
+)
+from scraper.semantic_search import HNSW_EF_SEARCH, create_query_embedding
+
+DEFAULT_QUERIES = [
+    "photosynthesis class 10",
+    "newton laws of motion",
+    "integration by parts",
+    "organic chemistry basics",
+    "python programming for beginners",
+]
+
+DURATIONS = ("any", "short", "medium", "long")
+
+COLUMNS = "youtube_id, title, description, thumbnail, duration, view_count, like_count"
+
+
+def _escape_like(query):
+    return query.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def legacy_plan(session, query, embedding_list, embedding_model,
+                duration_filter_sql, top_n):
+    """
+    The pre-plan sequence: ef_search, supply COUNT, ef_search, vector search,
+    leading-wildcard ILIKE text top-up.
+    """
+    pattern = f"%{_escape_like(query)}%"
+    ef = str(max(HNSW_EF_SEARCH, top_n))
+    set_ef = text("SELECT set_config('hnsw.ef_search', :ef, true)")
+    session.execute(set_ef, {"ef": ef})
+    session.execute(
+        text(f"""
+            SELECT COUNT(*) FROM (
+                SELECT embedding <=> :qe AS distance FROM videos
+                WHERE embedding IS NOT NULL AND embedding_model = :model
+                {duration_filter_sql}
+                ORDER BY embedding <=> :qe LIMIT :limit
+            ) nearest WHERE 1 - distance > 0.6
+        """),
+        {"qe": str(embedding_list), "model": embedding_model, "limit": top_n},
+    ).scalar()
+    session.execute(set_ef, {"ef": ef})
+    list(session.execute(
+        text(f"""
+            SELECT {COLUMNS}, 1 - (embedding <=> :qe) AS similarity_score FROM videos
+            WHERE embedding IS NOT NULL AND embedding_model = :model
+            {duration_filter_sql}
+            ORDER BY embedding <=> :qe ASC LIMIT :limit
+        """),
+        {"qe": str(embedding_list), "model": embedding_model, "limit": top_n},
+    ))
+    list(session.execute(
+        text(f"""
+            SELECT {COLUMNS}, 0.0 AS similarity_score FROM videos
+            WHERE (title ILIKE :query ESCAPE '\\'
+                   OR description ILIKE :query ESCAPE '\\')
+            {duration_filter_sql}
+            ORDER BY view_count DESC NULLS LAST, like_count DESC NULLS LAST LIMIT :limit
+        """),
+        {"query": pattern, "limit": top_n},
+    ))
+
+
+def single_plan(session, query, embedding_list, embedding_model,
+                duration_filter_sql, top_n):
+    retrieve_candidates(
+        session, query, embedding_list, embedding_model, duration_filter_sql,
+        k=top_n, text_limit=top_n, ef_search=HNSW_EF_SEARCH,
+    )
+
+
+def ranked_plan(session, query, embedding_list, embedding_model,
+                duration_filter_sql, top_n):
+    k = max(RETRIEVAL_CANDIDATE_K, top_n)
+    rank_candidates(
+        session, query, embedding_list, embedding_model, duration_filter_sql,
+        top_n=top_n, k=k, text_limit=k, ef_search=HNSW_EF_SEARCH,
+    )
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[int(pct * (len(ordered) - 1))]
+
+
+def run(plan, cases, iterations, top_n, duration_filter_sql):
+    samples = []
+    session = SessionLocal()
+    try:
+        for _ in range(iterations):
+            for query, embedding_list, embedding_model in cases:
+                started = time.perf_counter()
+                plan(session, query, embedding_list, embedding_model,
+                     duration_filter_sql, top_n)
+                samples.append(1000.0 * (time.perf_counter() - started))
+                session.rollback()
+    finally:
+        session.close()
+    return samples
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Benchmark retrieval plans (p50/p95 latency).")
+    parser.add_argument("queries", nargs="*", default=DEFAULT_QUERIES)
+    parser.add_argument("--iterations", type=int, default=50)
+    parser.add_argument("--top-n", type=int, default=10)
+    parser.add_argument("--duration", choices=DURATIONS, default="any")
+    parser.add_argument("--hashing", action="store_true",
+                        help="Embed queries with the hashing backend (no API calls)")
+    args = parser.parse_args(argv)
+
+    if args.hashing:
+        set_backend(HashingBackend())
+    embedding_model = get_backend().model_id
+    cases = []
+    for query in args.queries:
+        vector = create_query_embedding(query)
+        if vector is None:
+            raise SystemExit(f"Could not embed {query!r}; try --hashing")
+        cases.append((query, vector.tolist(), embedding_model))
+
+    bucket_filter_sql = duration_filter_sql(args.duration)
+    # Warm the connection pool and plan caches before measuring
+    run(single_plan, cases, 1, args.top_n, bucket_filter_sql)
+
+    print(f"{len(cases)} queries x {args.iterations} iterations, top_n={args.top_n}")
+    plans = (
+        ("legacy (5 statements)", legacy_plan),
+        ("single round trip", single_plan),
+        ("ranked in SQL", ranked_plan),
+    )
+    for name, plan in plans:
+        samples = run(plan, cases, args.iterations, args.top_n, bucket_filter_sql)
+        print(f"{name:<24} p50 {percentile(samples, 0.50):7.2f} ms   "
+              f"p95 {percentile(samples, 0.95):7.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
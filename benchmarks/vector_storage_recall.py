@@ -0,0 +1,108 @@
+"""
+Recall and latency of the compact vector storages against exact search.
+
+Ground truth for each query is an exact (sequential scan) float32 cosine
+search. Each storage mode of scraper.retrieval then runs the normal
+retrieval plan, and its vector hits are scored as recall@k against that
+ground truth. Run `python -m scraper.backfill --compact` first so the
+halfvec and bit columns are populated.
+
+Usage:
+    python -m benchmarks.vector_storage_recall [--iterations 20] [--k 10]
+                                               [--rerank-factors 2 4 8]
+                                               [--hashing] [query ...]
+"""
+
+import argparse
+import time
+
+from sqlalchemy import text
+
+from backend.database import SessionLocal
+from benchmarks.retrieval_plans import DEFAULT_QUERIES, percentile
+from scraper.embeddings import HashingBackend, get_backend, set_backend
+from scraper.retrieval import retrieve_candidates
+from scraper.semantic_search import HNSW_EF_SEARCH, create_query_embedding
+
+
+def exact_neighbours(session, embedding_list, embedding_model, k):
+    session.execute(text("SET LOCAL enable_indexscan = off"))
+    rows = session.execute(
+        text("""
+            SELECT youtube_id FROM videos
+            WHERE embedding IS NOT NULL AND embedding_model = :model
+            ORDER BY embedding <=> :qe
+            LIMIT :k
+        """),
+        {"qe": str(embedding_list), "model": embedding_model, "k": k},
+    )
+    neighbours = [row[0] for row in rows]
+    session.rollback()
+    return neighbours
+
+
+def measure(session, cases, truth, iterations, k, storage, rerank_factor):
+    samples, recalls = [], []
+    for _ in range(iterations):
+        for query, embedding_list, embedding_model in cases:
+            started = time.perf_counter()
+            result = retrieve_candidates(
+                session, query, embedding_list, embedding_model, "",
+                k=k, text_limit=k, ef_search=HNSW_EF_SEARCH,
+                storage=storage, rerank_factor=rerank_factor,
+            )
+            samples.append(1000.0 * (time.perf_counter() - started))
+            session.rollback()
+            expected = truth[query]
+            found = {row[0] for row in result.vector_rows[:k]}
+            hit = found & set(expected)
+            recalls.append(len(hit) / len(expected) if expected else 1.0)
+    return samples, sum(recalls) / len(recalls)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Benchmark recall@k and latency per vector storage.")
+    parser.add_argument("queries", nargs="*", default=DEFAULT_QUERIES)
+    parser.add_argument("--iterations", type=int, default=20)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--rerank-factors", type=int, nargs="+", default=[2, 4, 8])
+    parser.add_argument("--hashing", action="store_true",
+                        help="Embed queries with the hashing backend (no API calls)")
+    args = parser.parse_args(argv)
+
+    if args.hashing:
+        set_backend(HashingBackend())
+    embedding_model = get_backend().model_id
+    cases = []
+    for query in args.queries:
+        vector = create_query_embedding(query)
+        if vector is None:
+            raise SystemExit(f"Could not embed {query!r}; try --hashing")
+        cases.append((query, vector.tolist(), embedding_model))
+
+    modes = [("vector", "vector", 1), ("halfvec", "halfvec", 1)]
+    modes += [(f"binary x{factor}", "binary", factor) for factor in args.rerank_factors]
+
+    session = SessionLocal()
+    try:
+        truth = {
+            query: exact_neighbours(session, embedding_list, model, args.k)
+            for query, embedding_list, model in cases
+        }
+        # Warm the connection and plan caches before measuring
+        measure(session, cases, truth, 1, args.k, "vector", 1)
+
+        print(f"{len(cases)} queries x {args.iterations} iterations, recall@{args.k}")
+        for name, storage, factor in modes:
+            samples, recall = measure(session, cases, truth, args.iterations, args.k,
+                                      storage, factor)
+            print(f"{name:<12} recall {recall:6.3f}   "
+                  f"p50 {percentile(samples, 0.50):7.2f} ms   "
+                  f"p95 {percentile(samples, 0.95):7.2f} ms")
+    finally:
+        session.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,388 @@
+"""
+Background backfill of video embeddings.
+
+Streams `videos` rows that have no embedding from the active model in
+keyset-paginated chunks (ORDER BY id), embeds title + description in large
+batches through the embedding layer, and writes the vectors back with one
+bulk UPDATE per chunk. Progress is checkpointed to a JSON file so an
+interrupted run resumes where it stopped; a run that reaches the end of the
+table resets the checkpoint, so the next run also revisits rows below it
+that lost their embedding since (a model switch, a failed ingestion embed).
+
+Usage:
+    python -m scraper.backfill [--batch-size 256] [--concurrency 2]
+                               [--max-rows-per-sec 0] [--limit N] [--reset]
+
+The same job can run inside the API process (BACKFILL_ENABLED=true); see
+`backfill_loop`.
+
+    python -m scraper.backfill --compact [--batch-size 256]
+
+fills the compact companion columns (embedding_half, embedding_bit) of
+rows that already have an embedding, entirely inside Postgres.
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from sqlalchemy import text
+
+from backend.database import get_session
+from backend.models import EMBEDDING_DIM
+from scraper.corpus_state import corpus_state
+from scraper.embeddings import embed_texts, get_backend, video_embedding_text
+
+BACKFILL_ENABLED = os.getenv("BACKFILL_ENABLED", "false").lower() == "true"
+BACKFILL_BATCH_SIZE = int(os.getenv("BACKFILL_BATCH_SIZE", "256"))
+BACKFILL_CONCURRENCY = int(os.getenv("BACKFILL_CONCURRENCY", "2"))
+# 0 = unlimited
+BACKFILL_MAX_ROWS_PER_SEC = float(os.getenv("BACKFILL_MAX_ROWS_PER_SEC", "0"))
+BACKFILL_CHECKPOINT = os.getenv("BACKFILL_CHECKPOINT", ".backfill_checkpoint.json")
+# Seconds between in-app runs
+BACKFILL_INTERVAL = float(os.getenv("BACKFILL_INTERVAL", "300"))
+
+
+class Checkpoint:
+    """Last fully written video id, persisted as JSON and scoped to one model."""
+
+    def __init__(self, path, model_id):
+        self.path = path
+        self.model_id = model_id
+        self.last_id = 0
+
+    def load(self):
+        try:
+            with open(self.path) as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return self
+        # A checkpoint written for another model does not apply
+        if data.get("model") == self.model_id:
+            self.last_id = int(data.get("last_id", 0))
+        return self
+
+    def save(self, last_id):
+        self.last_id = last_id
+        tmp_path = f"{self.path}.tmp"
+        state = {"model": self.model_id, "last_id": last_id, "updated_at": time.time()}
+        with open(tmp_path, "w") as f:
+            json.dump(state, f)
+        os.replace(tmp_path, self.path)
+
+    def reset(self):
+        self.save(0)
+
+
+class RateLimiter:
+    """Paces callers to at most `rate` units per second (0 disables pacing)."""
+
+    def __init__(self, rate, clock=time.monotonic, sleep=time.sleep):
+        self.rate = rate
+        self._clock = clock
+        self._sleep = sleep
+        self._next_at = None
+
+    def acquire(self, units):
+        if not self.rate:
+            return
+        now = self._clock()
+        if self._next_at is not None and self._next_at > now:
+            self._sleep(self._next_at - now)
+            now = self._next_at
+        self._next_at = now + units / self.rate
+
+
+def _fetch_chunk(session, after_id, limit, model_id):
+    """Next chunk of rows lacking an embedding from `model_id`, in id order."""
+    rows = session.execute(
+        text("""
+            SELECT id, title, description FROM videos
+            WHERE id > :after_id
+            AND (embedding IS NULL OR embedding_model IS DISTINCT FROM :model)
+            ORDER BY id
+            LIMIT :limit
+        """),
+        {"after_id": after_id, "limit": limit, "model": model_id},
+    )
+    return [tuple(row) for row in rows]
+
+
+def write_video_embeddings(session, ids, vectors, model_id):
+    """
+    Write vectors for `ids` with a single bulk UPDATE, commit, and invalidate
+    corpus state.
+    """
+    session.execute(
+        text("""
+            UPDATE videos AS v
+            SET embedding = CAST(d.embedding AS vector),
+                embedding_half = CAST(d.embedding AS halfvec),
+                embedding_bit = binary_quantize(CAST(d.embedding AS vector)),
+                embedding_model = :model
+            FROM (
+                SELECT unnest(CAST(:ids AS integer[])) AS id,
+                       unnest(CAST(:embeddings AS text[])) AS embedding
+            ) AS d
+            WHERE v.id = d.id
+        """),
+        {
+            "ids": list(ids),
+            "embeddings": [str(v.tolist()) for v in vectors],
+            "model": model_id,
+        },
+    )
+    session.commit()
+    corpus_state.invalidate()
+
+
+def run_backfill(batch_size=BACKFILL_BATCH_SIZE, concurrency=BACKFILL_CONCURRENCY,
+                 max_rows_per_sec=BACKFILL_MAX_ROWS_PER_SEC,
+                 checkpoint_path=BACKFILL_CHECKPOINT, limit=None, reset=False):
+    """
+    Embed every video missing a vector from the active model.
+
+    Up to `concurrency` chunks are embedded in parallel while the next chunk
+    is read; chunks are written (and the checkpoint advanced) strictly in id
+    order. A completed pass resets the checkpoint to 0. Returns {"rows",
+    "seconds", "rows_per_sec", "last_id"}, last_id being the last id written.
+    """
+    backend = get_backend()
+    checkpoint = Checkpoint(checkpoint_path, backend.model_id).load()
+    if reset:
+        checkpoint.reset()
+    limiter = RateLimiter(max_rows_per_sec)
+
+    gen = get_session()
+    session = next(gen)
+    started = time.time()
+    written = 0
+    queued = 0
+    after_id = last_id = checkpoint.last_id
+    in_flight = deque()
+    completed = False
+
+    def flush_oldest():
+        nonlocal written, last_id
+        rows, future = in_flight.popleft()
+        vectors = future.result()
+        write_video_embeddings(session, [r[0] for r in rows], vectors, backend.model_id)
+        last_id = rows[-1][0]
+        checkpoint.save(last_id)
+        written += len(rows)
+        elapsed = time.time() - started
+        logging.info(
+            f"Backfill: {written} rows embedded up to id {rows[-1][0]} "
+            f"({written / elapsed if elapsed else 0:.1f} rows/sec)"
+        )
+
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, concurrency)) as pool:
+            while limit is None or queued < limit:
+                chunk_size = (
+                    batch_size if limit is None else min(batch_size, limit - queued)
+                )
+                rows = _fetch_chunk(session, after_id, chunk_size, backend.model_id)
+                if not rows:
+                    completed = True
+                    break
+                after_id = rows[-1][0]
+                queued += len(rows)
+                limiter.acquire(len(rows))
+                texts = [
+                    video_embedding_text(title, description)
+                    for _, title, description in rows
+                ]
+                future = pool.submit(embed_texts, texts, backend, batch_size)
+                in_flight.append((rows, future))
+                if len(in_flight) >= max(1, concurrency):
+                    flush_oldest()
+            while in_flight:
+                flush_oldest()
+        if completed:
+            # Start the next run from the beginning of the table
+            checkpoint.reset()
+    finally:
+        for _, future in in_flight:
+            future.cancel()
+        gen.close()
+
+    elapsed = time.time() - started
+    return {
+        "rows": written,
+        "seconds": elapsed,
+        "rows_per_sec": written / elapsed if elapsed else 0.0,
+        "last_id": last_id,
+    }
+
+
+def _compact_chunk(session, after_id, limit):
+    """
+    Derive halfvec + binary-quantized columns for the next chunk of embedded
+    rows lacking them. Returns (rows updated, last id) and commits.
+    """
+    row = session.execute(
+        text(f"""
+            WITH chunk AS (
+                SELECT id FROM videos
+                WHERE id > :after_id
+                AND embedding IS NOT NULL
+                AND (embedding_half IS NULL OR embedding_bit IS NULL)
+                ORDER BY id
+                LIMIT :limit
+            ), updated AS (
+                UPDATE videos AS v
+                SET embedding_half = CAST(v.embedding AS halfvec({EMBEDDING_DIM})),
+                    embedding_bit = CAST(
+                        binary_quantize(v.embedding) AS bit({EMBEDDING_DIM})
+                    )
+                FROM chunk
+                WHERE v.id = chunk.id
+                RETURNING v.id
+            )
+            SELECT COUNT(*), MAX(id) FROM updated
+        """),
+        {"after_id": after_id, "limit": limit},
+    ).one()
+    session.commit()
+    return int(row[0] or 0), row[1]
+
+
+def run_compact_backfill(batch_size=BACKFILL_BATCH_SIZE,
+                         max_rows_per_sec=BACKFILL_MAX_ROWS_PER_SEC, limit=None):
+    """
+    Fill embedding_half / embedding_bit from the existing float32 vectors.
+    Resumable without a checkpoint: finished rows no longer match the chunk
+    query. Returns {"rows", "seconds", "rows_per_sec", "last_id"}.
+    """
+    limiter = RateLimiter(max_rows_per_sec)
+    gen = get_session()
+    session = next(gen)
+    started = time.time()
+    written = 0
+    after_id = 0
+    try:
+        while limit is None or written < limit:
+            chunk_size = (
+                batch_size if limit is None else min(batch_size, limit - written)
+            )
+            limiter.acquire(chunk_size)
+            count, last_id = _compact_chunk(session, after_id, chunk_size)
+            if not count:
+                break
+            written += count
+            after_id = last_id
+            elapsed = time.time() - started
+            logging.info(
+                f"Compact backfill: {written} rows up to id {last_id} "
+                f"({written / elapsed if elapsed else 0:.1f} rows/sec)"
+            )
+    finally:
+        gen.close()
+
+    elapsed = time.time() - started
+    return {
+        "rows": written,
+        "seconds": elapsed,
+        "rows_per_sec": written / elapsed if elapsed else 0.0,
+        "last_id": after_id,
+    }
+
+
+# --- In-app background task ---
+
+_wakeup = None
+_loop = None
+_run_lock = threading.Lock()
+
+
+def request_backfill():
+    """Ask the in-app backfill task to run now (safe to call from any thread)."""
+    if _loop is not None and _wakeup is not None:
+        _loop.call_soon_threadsafe(_wakeup.set)
+
+
+def _run_backfill_exclusive():
+    # One backfill at a time per process, however it was triggered
+    if not _run_lock.acquire(blocking=False):
+        return None
+    try:
+        return run_backfill()
+    finally:
+        _run_lock.release()
+
+
+async def backfill_loop(interval=BACKFILL_INTERVAL):
+    """Run the backfill every `interval` seconds, or sooner when requested."""
+    global _wakeup, _loop
+    _loop = asyncio.get_running_loop()
+    _wakeup = asyncio.Event()
+    while True:
+        try:
+            stats = await asyncio.to_thread(_run_backfill_exclusive)
+            if stats and stats["rows"]:
+                logging.info(
+                    f"Backfill embedded {stats['rows']} videos "
+                    f"({stats['rows_per_sec']:.1f} rows/sec)"
+                )
+        except Exception as e:
+            logging.error(f"Backfill run failed: {e}")
+        try:
+            await asyncio.wait_for(_wakeup.wait(), timeout=interval)
+        except asyncio.TimeoutError:
+            pass
+        _wakeup.clear()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Backfill missing video embeddings.")
+    parser.add_argument("--batch-size", type=int, default=BACKFILL_BATCH_SIZE)
+    parser.add_argument("--concurrency", type=int, default=BACKFILL_CONCURRENCY)
+    parser.add_argument(
+        "--max-rows-per-sec", type=float, default=BACKFILL_MAX_ROWS_PER_SEC
+    )
+    parser.add_argument("--checkpoint", default=BACKFILL_CHECKPOINT)
+    parser.add_argument("--limit", type=int, default=None, help="Stop after N rows")
+    parser.add_argument(
+        "--reset", action="store_true", help="Ignore the saved checkpoint"
+    )
+    parser.add_argument(
+        "--compact", action="store_true",
+        help="Fill halfvec/bit columns from existing embeddings instead",
+    )
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    if args.compact:
+        stats = run_compact_backfill(
+            batch_size=args.batch_size,
+            max_rows_per_sec=args.max_rows_per_sec,
+            limit=args.limit,
+        )
+        print(
+            f"Compacted {stats['rows']} embeddings in {stats['seconds']:.1f}s "
+            f"({stats['rows_per_sec']:.1f} rows/sec), last id {stats['last_id']}"
+        )
+        return
+    stats = run_backfill(
+        batch_size=args.batch_size,
+        concurrency=args.concurrency,
+        max_rows_per_sec=args.max_rows_per_sec,
+        checkpoint_path=args.checkpoint,
+        limit=args.limit,
+        reset=args.reset,
+    )
+    print(
+        f"Embedded {stats['rows']} videos in {stats['seconds']:.1f}s "
+        f"({stats['rows_per_sec']:.1f} rows/sec), last id {stats['last_id']}"
+    )
+
+
+if __name__ == "__main__":
+    main()
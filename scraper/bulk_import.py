@@ -0,0 +1,344 @@
+"""
+Streaming import of offline YouTube metadata dumps.
+
+Input files hold one `videos.list` item per line (NDJSON), optionally
+gzip-compressed. Lines are streamed in batches, so memory stays constant
+whatever the file size. Each batch is filtered like live fetches (no Shorts,
+Education category only), optionally embedded in large batches through the
+embedding layer, and written with one bulk upsert (COPY into a staging table
+by default; see scraper.video_store). New videos are inserted and known ones
+get their statistics refreshed.
+
+Uncompressed files are split into byte ranges so several workers import one
+file in parallel; a gzip file cannot be split and is read by one worker.
+Workers are threads: parsing is cheap next to the database writes and
+embedding calls they wait on.
+
+Progress is checkpointed per range as the byte offset (of the uncompressed
+stream) up to which every line is committed, so an interrupted import resumes
+where it stopped. A resumed import keeps the ranges it started with.
+
+Usage:
+    python -m scraper.bulk_import dump.ndjson [more.ndjson.gz ...]
+                                  [--workers 4] [--batch-size 1000] [--embed]
+                                  [--method copy|upsert] [--reset]
+
+Without --embed the rows are stored without vectors; run
+`python -m scraper.backfill` afterwards.
+"""
+
+import argparse
+import gzip
+import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from backend.database import get_session
+from backend.models import Video
+from scraper.embeddings import embed_texts, get_backend, video_embedding_text
+from scraper.video_store import copy_videos, upsert_videos, video_rows
+from scraper.youtube_scraper import is_educational_video, is_youtube_short
+
+IMPORT_BATCH_SIZE = int(os.getenv("IMPORT_BATCH_SIZE", "1000"))
+IMPORT_WORKERS = int(os.getenv("IMPORT_WORKERS", "4"))
+IMPORT_CHECKPOINT = os.getenv("IMPORT_CHECKPOINT", ".import_checkpoint.json")
+
+GZIP_MAGIC = b"\x1f\x8b"
+
+WRITE_METHODS = {"copy": copy_videos, "upsert": upsert_videos}
+
+
+def is_gzip(path):
+    with open(path, "rb") as f:
+        return f.read(2) == GZIP_MAGIC
+
+
+def _open(path):
+    return gzip.open(path, "rb") if is_gzip(path) else open(path, "rb")
+
+
+def split_ranges(size, parts):
+    """Up to `parts` contiguous byte ranges [start, end) covering `size` bytes."""
+    if not size:
+        return [(0, 0)]
+    step = -(-size // max(1, min(parts, size)))
+    return [(start, min(size, start + step)) for start in range(0, size, step)]
+
+
+def read_lines(path, start, end, offset=None):
+    """
+    Yield (line, offset after it) for every line that starts in [start, end)
+    (end None = end of stream), resuming after `offset` if given. A line
+    crossing `start` belongs to the previous range.
+    """
+    with _open(path) as f:
+        if offset is not None and offset > start:
+            f.seek(offset)  # checkpoints always sit on a line boundary
+        elif start > 0:
+            f.seek(start - 1)
+            f.readline()
+        pos = f.tell()
+        while end is None or pos < end:
+            line = f.readline()
+            if not line:
+                break
+            pos += len(line)
+            yield line, pos
+
+
+class ImportCheckpoint:
+    """Byte ranges of each input file and the offset each range is committed up to."""
+
+    def __init__(self, path):
+        self.path = path
+        # file path -> {"size", "ranges": [{"start", "end", "offset", "done"}]}
+        self.files = {}
+        self._lock = threading.Lock()
+
+    def load(self):
+        try:
+            with open(self.path) as f:
+                self.files = json.load(f).get("files", {})
+        except (OSError, ValueError):
+            pass
+        return self
+
+    def plan(self, path, workers):
+        """
+        The ranges of `path`: those of an earlier run over the same file, or a
+        fresh split.
+        """
+        key = os.path.realpath(path)
+        size = os.path.getsize(path)
+        with self._lock:
+            entry = self.files.get(key)
+            if entry is None or entry["size"] != size:
+                compressed = is_gzip(path)
+                bounds = [(0, None)] if compressed else split_ranges(size, workers)
+                entry = self.files[key] = {
+                    "size": size,
+                    "ranges": [
+                        {"start": start, "end": end, "offset": start, "done": False}
+                        for start, end in bounds
+                    ],
+                }
+            return key, entry["ranges"]
+
+    def advance(self, key, index, offset, done=False):
+        with self._lock:
+            span = self.files[key]["ranges"][index]
+            span["offset"] = offset
+            span["done"] = span["done"] or done
+            self._save()
+
+    def _save(self):
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"files": self.files, "updated_at": time.time()}, f)
+        os.replace(tmp_path, self.path)
+
+    def reset(self):
+        with self._lock:
+            self.files = {}
+            self._save()
+
+
+class ImportProgress:
+    """Thread-safe import counters with a rows/sec progress line."""
+
+    def __init__(self, clock=time.time):
+        self._clock = clock
+        self.started = clock()
+        self._lock = threading.Lock()
+        self.counters = {"lines": 0, "invalid": 0, "skipped": 0, "inserted": 0,
+                         "updated": 0}
+
+    def add(self, **counts):
+        with self._lock:
+            for name, n in counts.items():
+                self.counters[name] += n
+            return dict(self.counters)
+
+    def rate(self, lines):
+        elapsed = self._clock() - self.started
+        return lines / elapsed if elapsed else 0.0
+
+    def report(self, counters):
+        logging.info(
+            f"Import: {counters['lines']} lines, {counters['inserted']} new, "
+            f"{counters['updated']} refreshed, {counters['skipped']} filtered, "
+            f"{counters['invalid']} invalid "
+            f"({self.rate(counters['lines']):.0f} rows/sec)"
+        )
+
+    def stats(self):
+        with self._lock:
+            counters = dict(self.counters)
+        seconds = self._clock() - self.started
+        return {**counters, "seconds": seconds,
+                "rows_per_sec": self.rate(counters["lines"])}
+
+
+def _parse(lines):
+    """Decode NDJSON lines; returns (items, invalid count). Blank lines are ignored."""
+    items, invalid = [], 0
+    for line in lines:
+        if not line.strip():
+            continue
+        try:
+            item = json.loads(line)
+        except ValueError:
+            invalid += 1
+            continue
+        if isinstance(item, dict) and "id" in item and "snippet" in item:
+            items.append(item)
+        else:
+            invalid += 1
+    return items, invalid
+
+
+def _accept(items):
+    return [v for v in items if not is_youtube_short(v) and is_educational_video(v)]
+
+
+def _embed_new(session, videos, backend):
+    """Embeddings for videos not stored yet (None for known ones)."""
+    ids = [v['id'] for v in videos]
+    known = session.query(Video.youtube_id).filter(Video.youtube_id.in_(ids))
+    existing = {row[0] for row in known}
+    new = [v for v in videos if v['id'] not in existing]
+    if not new:
+        return [None] * len(videos)
+    texts = [
+        video_embedding_text(v['snippet']['title'], v['snippet'].get('description'))
+        for v in new
+    ]
+    vectors = dict(zip((v['id'] for v in new), embed_texts(texts, backend=backend),
+                       strict=True))
+    return [vectors.get(v['id']) for v in videos]
+
+
+def write_batch(videos, method, backend=None):
+    """
+    Embed (if `backend`) and write one batch on its own session. Returns
+    (inserted, updated).
+    """
+    gen = get_session()
+    session = next(gen)
+    try:
+        embeddings = model_id = None
+        if backend is not None:
+            embeddings = _embed_new(session, videos, backend)
+            model_id = backend.model_id
+        rows = video_rows(videos, embeddings, model_id)
+        counts = WRITE_METHODS[method](session, rows)
+        session.commit()
+        return counts
+    except Exception:
+        session.rollback()
+        raise
+    finally:
+        gen.close()
+
+
+def import_range(path, key, index, span, checkpoint, progress, batch_size, method,
+                 backend):
+    """
+    Import the lines of one range in batches, advancing its checkpoint after
+    each commit.
+    """
+    if span["done"]:
+        return
+
+    def flush(lines, offset, done=False):
+        items, invalid = _parse(lines)
+        accepted = _accept(items)
+        inserted = updated = 0
+        if accepted:
+            inserted, updated = write_batch(accepted, method, backend)
+        checkpoint.advance(key, index, offset, done=done)
+        progress.report(progress.add(
+            lines=len(lines), invalid=invalid, skipped=len(items) - len(accepted),
+            inserted=inserted, updated=updated,
+        ))
+
+    lines, offset = [], span["offset"]
+    for line, offset in read_lines(path, span["start"], span["end"], span["offset"]):
+        lines.append(line)
+        if len(lines) >= batch_size:
+            flush(lines, offset)
+            lines = []
+    flush(lines, offset, done=True)
+
+
+def run_import(paths, workers=IMPORT_WORKERS, batch_size=IMPORT_BATCH_SIZE,
+               method="copy", embed=False, checkpoint_path=IMPORT_CHECKPOINT,
+               reset=False):
+    """
+    Import every NDJSON (or gzip NDJSON) file in `paths`.
+    Returns {"lines", "invalid", "skipped", "inserted", "updated", "seconds",
+    "rows_per_sec"}.
+    """
+    checkpoint = ImportCheckpoint(checkpoint_path).load()
+    if reset:
+        checkpoint.reset()
+    backend = get_backend() if embed else None
+    progress = ImportProgress()
+
+    tasks = []
+    for path in paths:
+        key, spans = checkpoint.plan(path, workers)
+        tasks.extend((path, key, index, span) for index, span in enumerate(spans))
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        futures = [
+            pool.submit(import_range, path, key, index, span, checkpoint, progress,
+                        batch_size, method, backend)
+            for path, key, index, span in tasks
+        ]
+        for future in futures:
+            future.result()
+    return progress.stats()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Import NDJSON dumps of YouTube videos.list items.")
+    parser.add_argument("paths", nargs="+",
+                        help="NDJSON files, optionally gzip-compressed")
+    parser.add_argument("--workers", type=int, default=IMPORT_WORKERS)
+    parser.add_argument("--batch-size", type=int, default=IMPORT_BATCH_SIZE)
+    parser.add_argument("--method", choices=sorted(WRITE_METHODS), default="copy")
+    parser.add_argument("--embed", action="store_true",
+                        help="Embed new videos while importing "
+                             "(otherwise run the backfill later)")
+    parser.add_argument("--checkpoint", default=IMPORT_CHECKPOINT)
+    parser.add_argument("--reset", action="store_true",
+                        help="Ignore the saved checkpoint")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    stats = run_import(
+        args.paths,
+        workers=args.workers,
+        batch_size=args.batch_size,
+        method=args.method,
+        embed=args.embed,
+        checkpoint_path=args.checkpoint,
+        reset=args.reset,
+    )
+    print(
+        f"Imported {stats['lines']} lines in {stats['seconds']:.1f}s "
+        f"({stats['rows_per_sec']:.0f} rows/sec): {stats['inserted']} new, "
+        f"{stats['updated']} refreshed, {stats['skipped']} filtered, "
+        f"{stats['invalid']} invalid"
+    )
+    if stats["inserted"] and not args.embed:
+        print("New videos have no embeddings yet; run `python -m scraper.backfill`.")
+
+
+if __name__ == "__main__":
+    main()
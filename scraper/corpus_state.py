@@ -0,0 +1,134 @@
+"""
+Cached corpus-state flags and stats.
+
+Facts about the `videos` table that change rarely but are needed on every
+request (does the corpus have any videos? does the active model have any
+embeddings?) are read with cheap EXISTS probes and cached for
+CORPUS_STATE_REFRESH seconds. Ingestion and backfill writes invalidate the
+snapshot so the next reader sees their effect immediately.
+"""
+
+import logging
+import os
+import threading
+import time
+
+from sqlalchemy import text
+
+from backend.database import get_session
+
+CORPUS_STATE_REFRESH = float(os.getenv("CORPUS_STATE_REFRESH", "30"))  # seconds
+
+
+class CorpusState:
+    """
+    Thread-safe, periodically refreshed snapshot of the video corpus for one
+    embedding model: whether any videos exist and whether any are embedded by
+    that model. The lock only guards the cached snapshot; the probes run
+    outside it so concurrent readers never queue behind a database round-trip.
+    """
+
+    def __init__(self, refresh_interval=CORPUS_STATE_REFRESH, clock=time.monotonic):
+        self.refresh_interval = refresh_interval
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._snapshot = None
+        self._refreshed_at = None
+        self._stale = True
+        # Bumped by invalidate() so a refresh that started before a write
+        # does not mark its (possibly older) result as fresh
+        self._generation = 0
+        self._counters = {"refreshes": 0, "refresh_errors": 0, "invalidations": 0}
+
+    def _load(self, session, model_id):
+        row = session.execute(
+            text("""
+                SELECT
+                    EXISTS (SELECT 1 FROM videos LIMIT 1) AS has_videos,
+                    EXISTS (
+                        SELECT 1 FROM videos
+                        WHERE embedding IS NOT NULL AND embedding_model = :model
+                        LIMIT 1
+                    ) AS has_embeddings
+            """),
+            {"model": model_id},
+        ).one()
+        return {
+            "model": model_id,
+            "has_videos": bool(row[0]),
+            "has_embeddings": bool(row[1]),
+        }
+
+    def _is_fresh(self, model_id):
+        return (
+            self._snapshot is not None
+            and not self._stale
+            and self._snapshot["model"] == model_id
+            and self._clock() - self._refreshed_at < self.refresh_interval
+        )
+
+    def snapshot(self, model_id, session=None):
+        """
+        Return the cached snapshot for `model_id`, refreshing it when stale.
+        If a refresh fails, the previous snapshot for the same model is
+        served; with none to fall back on, the error propagates.
+        """
+        with self._lock:
+            if self._is_fresh(model_id):
+                return dict(self._snapshot)
+            generation = self._generation
+
+        session_gen = None
+        if session is None:
+            session_gen = get_session()
+            session = next(session_gen)
+        try:
+            snapshot = self._load(session, model_id)
+        except Exception as e:
+            with self._lock:
+                self._counters["refresh_errors"] += 1
+                if self._snapshot is None or self._snapshot["model"] != model_id:
+                    raise
+                logging.warning(
+                    f"Corpus state refresh failed, serving cached snapshot: {e}"
+                )
+                return dict(self._snapshot)
+        finally:
+            if session_gen:
+                session_gen.close()
+
+        with self._lock:
+            self._snapshot = snapshot
+            self._refreshed_at = self._clock()
+            # An invalidation that raced the probes keeps the snapshot stale
+            self._stale = generation != self._generation
+            self._counters["refreshes"] += 1
+            return dict(snapshot)
+
+    def has_embeddings(self, model_id, session=None):
+        """True if any video has an embedding from `model_id`."""
+        return self.snapshot(model_id, session=session)["has_embeddings"]
+
+    def invalidate(self):
+        """Force the next reader to refresh (call after writes to `videos`)."""
+        with self._lock:
+            self._stale = True
+            self._generation += 1
+            self._counters["invalidations"] += 1
+
+    def stats(self):
+        with self._lock:
+            snapshot = dict(self._snapshot) if self._snapshot else {}
+            age = None
+            if self._refreshed_at is not None:
+                age = self._clock() - self._refreshed_at
+            return {
+                **snapshot,
+                "age_seconds": age,
+                "stale": self._stale,
+                **self._counters,
+            }
+
+
+# Process-wide corpus state shared by recommend, ingestion and backfill
+corpus_state = CorpusState()
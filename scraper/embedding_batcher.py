@@ -0,0 +1,298 @@
+"""
+Micro-batching coalescer for embedding requests.
+
+Concurrent callers of `create_query_embedding(s)` hand their texts to a shared
+coalescer. A flusher thread waits a short window (EMBEDDING_COALESCE_WINDOW_MS)
+or until EMBEDDING_COALESCE_MAX_BATCH texts are pending, sends them to the
+backend as one batch, and hands each caller its own vector. Identical texts
+pending in the same window are embedded once. Only collecting a window is
+serial: up to EMBEDDING_COALESCE_MAX_IN_FLIGHT batches are sent concurrently,
+so a slow batch does not hold back the windows after it.
+
+`AsyncEmbeddingCoalescer` does the same on the event loop for the async
+request path: callers await their vectors and the batch awaits
+`backend.aembed`, so no thread blocks on the upstream.
+"""
+
+import asyncio
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import Future, ThreadPoolExecutor
+
+EMBEDDING_COALESCE_ENABLED = (
+    os.getenv("EMBEDDING_COALESCE_ENABLED", "true").lower() == "true"
+)
+EMBEDDING_COALESCE_WINDOW_MS = float(os.getenv("EMBEDDING_COALESCE_WINDOW_MS", "3"))
+EMBEDDING_COALESCE_MAX_BATCH = int(os.getenv("EMBEDDING_COALESCE_MAX_BATCH", "64"))
+# Batches sent upstream at the same time
+EMBEDDING_COALESCE_MAX_IN_FLIGHT = int(
+    os.getenv("EMBEDDING_COALESCE_MAX_IN_FLIGHT", "4")
+)
+
+
+class _Coalescer:
+    """Pending texts, batching and metrics shared by both coalescers."""
+
+    def __init__(self, embed_fn, window_ms=EMBEDDING_COALESCE_WINDOW_MS,
+                 max_batch=EMBEDDING_COALESCE_MAX_BATCH, clock=time.monotonic,
+                 max_in_flight=EMBEDDING_COALESCE_MAX_IN_FLIGHT):
+        self.embed_fn = embed_fn
+        self.window = window_ms / 1000.0
+        self.max_batch = max_batch
+        self.max_in_flight = max(1, max_in_flight)
+        self._clock = clock
+        self._cond = threading.Condition()
+        self._pending = OrderedDict()  # text -> (future, enqueued_at)
+        self._recent_waits = deque(maxlen=1000)
+        self._counters = {
+            "requests": 0,
+            "texts": 0,
+            "deduplicated": 0,
+            "batches": 0,
+            "batched_texts": 0,
+            "max_batch_size": 0,
+            "upstream_seconds": 0.0,
+        }
+
+    def _admit(self, texts, new_future):
+        """Register `texts` as pending (call holding `_cond`); returns their futures."""
+        now = self._clock()
+        self._counters["requests"] += 1
+        self._counters["texts"] += len(texts)
+        futures = []
+        for text in texts:
+            entry = self._pending.get(text)
+            if entry is None:
+                entry = (new_future(), now)
+                self._pending[text] = entry
+            else:
+                self._counters["deduplicated"] += 1
+            futures.append(entry[0])
+        return futures
+
+    def _pop_batch(self):
+        """Pop up to max_batch pending (text, (future, enqueued_at)) items."""
+        batch = []
+        while self._pending and len(batch) < self.max_batch:
+            batch.append(self._pending.popitem(last=False))
+        return batch
+
+    def _vectors(self, texts, vectors):
+        if len(vectors) != len(texts):
+            raise ValueError(f"Expected {len(texts)} embeddings, got {len(vectors)}")
+        return vectors
+
+    def _record(self, batch, flushed_at, upstream_seconds):
+        with self._cond:
+            self._counters["batches"] += 1
+            self._counters["batched_texts"] += len(batch)
+            self._counters["max_batch_size"] = max(
+                self._counters["max_batch_size"], len(batch)
+            )
+            self._counters["upstream_seconds"] += upstream_seconds
+            self._recent_waits.extend(
+                flushed_at - enqueued for _, (_, enqueued) in batch
+            )
+
+    def stats(self):
+        """Batch-size and window-wait metrics."""
+        with self._cond:
+            counters = dict(self._counters)
+            waits = sorted(self._recent_waits)
+        batches = counters["batches"]
+        return {
+            **counters,
+            "window_ms": self.window * 1000.0,
+            "avg_batch_size": counters["batched_texts"] / batches if batches else 0.0,
+            "upstream_calls_saved": counters["texts"] - batches if batches else 0,
+            "wait_ms_avg": 1000.0 * sum(waits) / len(waits) if waits else 0.0,
+            "wait_ms_p95": (
+                1000.0 * waits[int(0.95 * (len(waits) - 1))] if waits else 0.0
+            ),
+        }
+
+
+class EmbeddingCoalescer(_Coalescer):
+    """Gathers texts from concurrent callers into batched `embed_fn` calls."""
+
+    def __init__(self, embed_fn, window_ms=EMBEDDING_COALESCE_WINDOW_MS,
+                 max_batch=EMBEDDING_COALESCE_MAX_BATCH, clock=time.monotonic,
+                 max_in_flight=EMBEDDING_COALESCE_MAX_IN_FLIGHT):
+        super().__init__(embed_fn, window_ms, max_batch, clock, max_in_flight)
+        self._worker = None
+        self._slots = threading.BoundedSemaphore(self.max_in_flight)
+        self._executor = ThreadPoolExecutor(
+            max_workers=self.max_in_flight, thread_name_prefix="embedding-batch"
+        )
+
+    def _ensure_worker(self):
+        if self._worker is None or not self._worker.is_alive():
+            self._worker = threading.Thread(
+                target=self._run, name="embedding-coalescer", daemon=True
+            )
+            self._worker.start()
+
+    def embed(self, texts):
+        """
+        Embed `texts`, blocking until their batch has been flushed.
+        Returns vectors aligned with `texts`; raises if the batch call failed.
+        """
+        with self._cond:
+            futures = self._admit(texts, Future)
+            self._ensure_worker()
+            self._cond.notify()
+        return [f.result() for f in futures]
+
+    def _take_batch(self):
+        """Block until a batch is due, then remove and return it."""
+        with self._cond:
+            while not self._pending:
+                self._cond.wait()
+            oldest = next(iter(self._pending.values()))[1]
+            deadline = oldest + self.window
+            while len(self._pending) < self.max_batch:
+                remaining = deadline - self._clock()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            return self._pop_batch()
+
+    def _run(self):
+        while True:
+            # With every slot busy, texts keep gathering into the next batch
+            self._slots.acquire()
+            batch = self._take_batch()
+            self._executor.submit(self._flush, batch)
+
+    def _flush(self, batch):
+        flushed_at = self._clock()
+        texts = [text for text, _ in batch]
+        started = time.time()
+        try:
+            vectors = self._vectors(texts, self.embed_fn(texts))
+        except Exception as e:
+            for _, (future, _) in batch:
+                future.set_exception(e)
+        else:
+            for (_, (future, _)), vector in zip(batch, vectors, strict=True):
+                future.set_result(vector)
+        finally:
+            self._record(batch, flushed_at, time.time() - started)
+            self._slots.release()
+
+
+class AsyncEmbeddingCoalescer(_Coalescer):
+    """
+    Event-loop twin of EmbeddingCoalescer over an async `embed_fn`
+    (backend.aembed). Bound to the loop it is first used on.
+    """
+
+    def __init__(self, embed_fn, window_ms=EMBEDDING_COALESCE_WINDOW_MS,
+                 max_batch=EMBEDDING_COALESCE_MAX_BATCH, clock=time.monotonic,
+                 max_in_flight=EMBEDDING_COALESCE_MAX_IN_FLIGHT):
+        super().__init__(embed_fn, window_ms, max_batch, clock, max_in_flight)
+        self._drainer = None
+        self._full = asyncio.Event()
+        self._slots = asyncio.Semaphore(self.max_in_flight)
+        self._flushes = set()
+
+    async def embed(self, texts):
+        """Embed `texts` with the next batch; raises if the batch call failed."""
+        loop = asyncio.get_running_loop()
+        with self._cond:
+            futures = self._admit(texts, loop.create_future)
+        if len(self._pending) >= self.max_batch:
+            self._full.set()
+        if self._drainer is None or self._drainer.done():
+            self._drainer = loop.create_task(self._drain())
+        # A cancelled caller must not cancel a vector other callers share
+        return list(await asyncio.gather(*(asyncio.shield(f) for f in futures)))
+
+    async def _drain(self):
+        """Collect pending texts into batches and dispatch each as its own task."""
+        while self._pending:
+            oldest = next(iter(self._pending.values()))[1]
+            remaining = oldest + self.window - self._clock()
+            if remaining > 0 and len(self._pending) < self.max_batch:
+                self._full.clear()
+                try:
+                    await asyncio.wait_for(self._full.wait(), remaining)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            # With every slot busy, texts keep gathering into the next batch
+            await self._slots.acquire()
+            with self._cond:
+                batch = self._pop_batch()
+            task = asyncio.get_running_loop().create_task(self._flush(batch))
+            self._flushes.add(task)
+            task.add_done_callback(self._flushes.discard)
+
+    async def _flush(self, batch):
+        flushed_at = self._clock()
+        texts = [text for text, _ in batch]
+        started = time.time()
+        try:
+            vectors = self._vectors(texts, await self.embed_fn(texts))
+        except Exception as e:
+            for _, (future, _) in batch:
+                if not future.done():
+                    future.set_exception(e)
+        else:
+            for (_, (future, _)), vector in zip(batch, vectors, strict=True):
+                if not future.done():
+                    future.set_result(vector)
+        finally:
+            self._record(batch, flushed_at, time.time() - started)
+            self._slots.release()
+
+
+_coalescer = None
+_coalescer_backend = None
+_async_coalescer = None
+_async_coalescer_key = None
+_coalescer_lock = threading.Lock()
+
+
+def get_coalescer(backend):
+    """
+    Return the process-wide coalescer for `backend`, rebuilding it if the
+    backend changed.
+    """
+    global _coalescer, _coalescer_backend
+    with _coalescer_lock:
+        if _coalescer is None or _coalescer_backend is not backend:
+            _coalescer = EmbeddingCoalescer(
+                backend.embed,
+                max_batch=min(EMBEDDING_COALESCE_MAX_BATCH, backend.max_batch_size),
+            )
+            _coalescer_backend = backend
+        return _coalescer
+
+
+def get_async_coalescer(backend):
+    """
+    Return the async coalescer for `backend` on the running event loop,
+    rebuilding it if the backend or the loop changed.
+    """
+    global _async_coalescer, _async_coalescer_key
+    key = (backend, asyncio.get_running_loop())
+    with _coalescer_lock:
+        if _async_coalescer is None or _async_coalescer_key != key:
+            _async_coalescer = AsyncEmbeddingCoalescer(
+                backend.aembed,
+                max_batch=min(EMBEDDING_COALESCE_MAX_BATCH, backend.max_batch_size),
+            )
+            _async_coalescer_key = key
+        return _async_coalescer
+
+
+def coalescer_stats():
+    with _coalescer_lock:
+        coalescer, async_coalescer = _coalescer, _async_coalescer
+    stats = coalescer.stats() if coalescer else {}
+    if async_coalescer:
+        stats["async"] = async_coalescer.stats()
+    return stats
@@ -0,0 +1,208 @@
+"""
+Two-tier cache for query embeddings.
+- L1: in-process LRU with size and TTL eviction
+- L2: Postgres `query_embeddings` table, shared across workers and restarts
+
+Entries are keyed by (normalized query, model id) so vectors from different
+embedding models never collide.
+"""
+
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+from sqlalchemy.dialects.postgresql import insert
+
+from backend.database import get_session
+from backend.models import QueryEmbedding
+
+EMBEDDING_CACHE_SIZE = int(os.getenv("EMBEDDING_CACHE_SIZE", "2048"))
+EMBEDDING_CACHE_TTL = float(os.getenv("EMBEDDING_CACHE_TTL", "86400"))  # 1 day
+# Persistent (query_embeddings table) tier; entries expire after 30 days
+EMBEDDING_CACHE_DB_TTL = float(os.getenv("EMBEDDING_CACHE_DB_TTL", str(30 * 86400)))
+EMBEDDING_CACHE_DB_ENABLED = (
+    os.getenv("EMBEDDING_CACHE_DB_ENABLED", "true").lower() == "true"
+)
+
+
+def normalize_query(query):
+    """Normalize a query for cache keying: lowercase, collapsed whitespace."""
+    return " ".join(str(query).lower().split())
+
+
+class EmbeddingCache:
+    """
+    Thread-safe LRU + TTL cache in front of the embedding API, optionally
+    backed by Postgres. Misses are returned to the caller so that they can be
+    batched into a single upstream request.
+    """
+
+    def __init__(self, max_size=EMBEDDING_CACHE_SIZE, ttl=EMBEDDING_CACHE_TTL,
+                 db_ttl=EMBEDDING_CACHE_DB_TTL, persistent=EMBEDDING_CACHE_DB_ENABLED,
+                 clock=time.monotonic):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.db_ttl = db_ttl
+        self.persistent = persistent
+        self._clock = clock
+        self._entries = OrderedDict()  # (query, model) -> (expires_at, vector)
+        self._lock = threading.Lock()
+        self._counters = {
+            "l1_hits": 0,
+            "l2_hits": 0,
+            "misses": 0,
+            "evictions": 0,
+            "upstream_texts": 0,
+            "upstream_seconds": 0.0,
+        }
+
+    # --- L1 (in-process) ---
+
+    def _l1_get(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, vector = entry
+        if expires_at <= self._clock():
+            del self._entries[key]
+            self._counters["evictions"] += 1
+            return None
+        self._entries.move_to_end(key)
+        return vector
+
+    def _l1_put(self, key, vector):
+        self._entries[key] = (self._clock() + self.ttl, vector)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self._counters["evictions"] += 1
+
+    # --- L2 (Postgres) ---
+
+    def _l2_get_many(self, queries, model_id):
+        """Look up normalized queries in Postgres. Returns {query: vector}."""
+        if not self.persistent or not queries:
+            return {}
+        gen = get_session()
+        session = next(gen)
+        try:
+            cutoff = datetime.now(timezone.utc) - timedelta(seconds=self.db_ttl)
+            rows = session.query(QueryEmbedding.query, QueryEmbedding.embedding).filter(
+                QueryEmbedding.model == model_id,
+                QueryEmbedding.query.in_(list(queries)),
+                QueryEmbedding.created_at >= cutoff,
+            ).all()
+            return {q: np.array(emb, dtype=np.float32) for q, emb in rows}
+        except Exception as e:
+            logging.warning(f"Embedding cache DB lookup failed: {e}")
+            return {}
+        finally:
+            gen.close()
+
+    def _l2_put_many(self, items, model_id):
+        """Upsert {query: vector} into Postgres."""
+        if not self.persistent or not items:
+            return
+        gen = get_session()
+        session = next(gen)
+        try:
+            now = datetime.now(timezone.utc)
+            stmt = insert(QueryEmbedding).values([
+                {
+                    "query": q, "model": model_id,
+                    "embedding": vec.tolist(), "created_at": now,
+                }
+                for q, vec in items.items()
+            ])
+            stmt = stmt.on_conflict_do_update(
+                index_elements=["query", "model"],
+                set_={
+                    "embedding": stmt.excluded.embedding,
+                    "created_at": stmt.excluded.created_at,
+                },
+            )
+            session.execute(stmt)
+            session.commit()
+        except Exception as e:
+            session.rollback()
+            logging.warning(f"Embedding cache DB write failed: {e}")
+        finally:
+            gen.close()
+
+    # --- Public API ---
+
+    def get_many(self, queries, model_id):
+        """
+        Look up queries in L1 then L2.
+        Returns (hits, misses): hits maps normalized query -> vector,
+        misses is the ordered list of normalized queries not found.
+        """
+        hits = {}
+        pending = []
+        with self._lock:
+            for q in dict.fromkeys(normalize_query(q) for q in queries):
+                vector = self._l1_get((q, model_id))
+                if vector is not None:
+                    hits[q] = vector
+                    self._counters["l1_hits"] += 1
+                else:
+                    pending.append(q)
+
+        if pending:
+            found = self._l2_get_many(pending, model_id)
+            with self._lock:
+                for q, vector in found.items():
+                    self._l1_put((q, model_id), vector)
+                    self._counters["l2_hits"] += 1
+            hits.update(found)
+            pending = [q for q in pending if q not in found]
+
+        with self._lock:
+            self._counters["misses"] += len(pending)
+        return hits, pending
+
+    def put_many(self, items, model_id):
+        """Store {normalized query: vector} in both tiers."""
+        if not items:
+            return
+        with self._lock:
+            for q, vector in items.items():
+                self._l1_put((q, model_id), vector)
+        self._l2_put_many(items, model_id)
+
+    def record_upstream(self, text_count, seconds):
+        """Record an upstream embedding call so savings can be estimated."""
+        with self._lock:
+            self._counters["upstream_texts"] += text_count
+            self._counters["upstream_seconds"] += seconds
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        """Return hit/miss counters and the estimated upstream latency saved."""
+        with self._lock:
+            counters = dict(self._counters)
+            size = len(self._entries)
+        hits = counters["l1_hits"] + counters["l2_hits"]
+        lookups = hits + counters["misses"]
+        avg_upstream = (
+            counters["upstream_seconds"] / counters["upstream_texts"]
+            if counters["upstream_texts"] else 0.0
+        )
+        return {
+            **counters,
+            "size": size,
+            "hit_rate": hits / lookups if lookups else 0.0,
+            "upstream_calls_saved": hits,
+            "estimated_seconds_saved": hits * avg_upstream,
+        }
+
+
+# Process-wide cache instance used by scraper.semantic_search
+embedding_cache = EmbeddingCache()
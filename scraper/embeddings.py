@@ -0,0 +1,346 @@
+"""
+Pluggable embedding backends.
+
+`create_query_embedding(s)` in scraper.semantic_search dispatches to the
+backend selected by the EMBEDDING_BACKEND environment variable:
+- cloudflare: Workers AI @cf/baai/bge-small-en-v1.5 over HTTP (default)
+- local: bge-small-en-v1.5 exported to ONNX, run on CPU in a process pool
+- hashing: deterministic feature-hashing encoder for tests and benchmarks
+
+Every backend also has an async `aembed` for the request path: Cloudflare
+awaits the async HTTP client, CPU backends run `embed` in a worker thread.
+
+Every backend reports a model id and dimension. The model id is stored next
+to each video embedding (videos.embedding_model) and is part of the query
+cache key, so vectors produced by different models are never compared.
+"""
+
+import asyncio
+import hashlib
+import logging
+import os
+import re
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from backend.models import EMBEDDING_DIM
+from scraper.http_client import get_async_client, get_client
+
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "cloudflare").lower()
+
+# Cloudflare Workers AI configuration
+CLOUDFLARE_ACCOUNT_ID = os.getenv("CLOUDFLARE_ACCOUNT_ID")
+CLOUDFLARE_API_TOKEN = os.getenv("CLOUDFLARE_API_TOKEN")
+CLOUDFLARE_MODEL = "@cf/baai/bge-small-en-v1.5"
+CLOUDFLARE_BGE_URL = f"https://api.cloudflare.com/client/v4/accounts/{CLOUDFLARE_ACCOUNT_ID}/ai/run/{CLOUDFLARE_MODEL}"
+
+# Local ONNX encoder configuration
+LOCAL_EMBEDDING_MODEL_DIR = os.getenv(
+    "LOCAL_EMBEDDING_MODEL_DIR", "models/bge-small-en-v1.5"
+)
+LOCAL_EMBEDDING_WORKERS = int(os.getenv("LOCAL_EMBEDDING_WORKERS", "2"))
+LOCAL_EMBEDDING_BATCH_SIZE = int(os.getenv("LOCAL_EMBEDDING_BATCH_SIZE", "32"))
+LOCAL_EMBEDDING_MAX_TOKENS = 512
+
+
+class EmbeddingError(Exception):
+    """Raised when a backend cannot produce embeddings for a batch."""
+
+
+class EmbeddingBackend:
+    """
+    Interface for embedding backends.
+    `embed` returns one float32 vector per input text, in input order,
+    or raises EmbeddingError.
+    """
+
+    name = "base"
+    model_id = None
+    dimension = EMBEDDING_DIM
+    max_batch_size = 100
+
+    def available(self):
+        """Return True if the backend is configured and can be called."""
+        return True
+
+    def embed(self, texts):
+        raise NotImplementedError
+
+    async def aembed(self, texts):
+        """Async `embed`; by default runs it in a worker thread."""
+        return await asyncio.to_thread(self.embed, texts)
+
+
+class CloudflareBackend(EmbeddingBackend):
+    """Cloudflare Workers AI bge-small-en-v1.5 over the shared HTTP client."""
+
+    name = "cloudflare"
+    model_id = CLOUDFLARE_MODEL
+    dimension = 384
+
+    def __init__(self, account_id=CLOUDFLARE_ACCOUNT_ID, api_token=CLOUDFLARE_API_TOKEN,
+                 url=CLOUDFLARE_BGE_URL):
+        self.account_id = account_id
+        self.api_token = api_token
+        self.url = url
+
+    def available(self):
+        return bool(self.account_id and self.api_token)
+
+    def _request_kwargs(self, texts):
+        # Embedding is a pure function of the input, so the POST is safe to retry
+        return {
+            "headers": {"Authorization": f"Bearer {self.api_token}"},
+            "json": {"text": texts if len(texts) > 1 else texts[0]},
+            "timeout": None if len(texts) == 1 else (3, 30),
+            "idempotent": True,
+        }
+
+    def embed(self, texts):
+        if not texts:
+            return []
+        client = get_client("cloudflare")
+        response = client.post(self.url, **self._request_kwargs(texts))
+        return self._parse(response, texts)
+
+    async def aembed(self, texts):
+        if not texts:
+            return []
+        client = get_async_client("cloudflare")
+        response = await client.post(self.url, **self._request_kwargs(texts))
+        return self._parse(response, texts)
+
+    def _parse(self, response, texts):
+        if response.status_code != 200:
+            raise EmbeddingError(
+                f"Cloudflare API error: {response.status_code} - {response.text}"
+            )
+
+        result = response.json()
+        data = result.get("result", {}).get("data") if result.get("success") else None
+        if not data or len(data) != len(texts):
+            raise EmbeddingError(f"Unexpected Cloudflare response: {result}")
+        return [np.array(emb, dtype=np.float32) for emb in data]
+
+
+# --- Local ONNX encoder (runs inside worker processes) ---
+
+_worker_session = None
+_worker_tokenizer = None
+
+
+def _init_local_worker(model_dir):
+    """Process-pool initializer: load the ONNX model and tokenizer once per worker."""
+    global _worker_session, _worker_tokenizer
+    import onnxruntime
+    from tokenizers import Tokenizer
+
+    options = onnxruntime.SessionOptions()
+    options.intra_op_num_threads = 1  # parallelism comes from the pool
+    _worker_session = onnxruntime.InferenceSession(
+        os.path.join(model_dir, "model.onnx"), options,
+        providers=["CPUExecutionProvider"],
+    )
+    _worker_tokenizer = Tokenizer.from_file(os.path.join(model_dir, "tokenizer.json"))
+    _worker_tokenizer.enable_truncation(LOCAL_EMBEDDING_MAX_TOKENS)
+    _worker_tokenizer.enable_padding()
+
+
+def _encode_local_batch(texts):
+    """Encode one batch with CLS pooling + L2 normalization (bge convention)."""
+    encodings = _worker_tokenizer.encode_batch(texts)
+    input_ids = np.array([e.ids for e in encodings], dtype=np.int64)
+    attention_mask = np.array([e.attention_mask for e in encodings], dtype=np.int64)
+    feeds = {"input_ids": input_ids, "attention_mask": attention_mask}
+    input_names = {i.name for i in _worker_session.get_inputs()}
+    if "token_type_ids" in input_names:
+        feeds["token_type_ids"] = np.zeros_like(input_ids)
+
+    hidden = _worker_session.run(None, feeds)[0]
+    cls = hidden[:, 0, :]
+    cls = cls / np.linalg.norm(cls, axis=1, keepdims=True)
+    return cls.astype(np.float32)
+
+
+class LocalOnnxBackend(EmbeddingBackend):
+    """
+    bge-small-en-v1.5 exported to ONNX and run on CPU.
+    Requires the optional `onnxruntime` and `tokenizers` packages and a model
+    directory containing model.onnx and tokenizer.json.
+    """
+
+    name = "local"
+    model_id = "local:BAAI/bge-small-en-v1.5"
+    dimension = 384
+
+    def __init__(self, model_dir=LOCAL_EMBEDDING_MODEL_DIR,
+                 workers=LOCAL_EMBEDDING_WORKERS,
+                 batch_size=LOCAL_EMBEDDING_BATCH_SIZE):
+        self.model_dir = model_dir
+        self.workers = workers
+        self.batch_size = batch_size
+        self.max_batch_size = batch_size * workers
+        self._pool = None
+        self._lock = threading.Lock()
+
+    def available(self):
+        try:
+            import onnxruntime  # noqa: F401
+            import tokenizers  # noqa: F401
+        except ImportError:
+            return False
+        return os.path.isfile(os.path.join(self.model_dir, "model.onnx"))
+
+    def _get_pool(self):
+        with self._lock:
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    initializer=_init_local_worker,
+                    initargs=(self.model_dir,),
+                )
+            return self._pool
+
+    def embed(self, texts):
+        if not texts:
+            return []
+        size = self.batch_size
+        batches = [texts[i:i + size] for i in range(0, len(texts), size)]
+        try:
+            results = list(self._get_pool().map(_encode_local_batch, batches))
+        except Exception as e:
+            raise EmbeddingError(f"Local embedding failed: {e}") from e
+        return [row for batch in results for row in batch]
+
+    def shutdown(self):
+        with self._lock:
+            if self._pool is not None:
+                self._pool.shutdown(wait=False, cancel_futures=True)
+                self._pool = None
+
+
+_TOKEN_RE = re.compile(r"\w+")
+
+
+class HashingBackend(EmbeddingBackend):
+    """
+    Deterministic feature-hashing encoder (word unigrams + character trigrams).
+    Has no semantic quality; useful for tests, benchmarks and offline runs.
+    """
+
+    name = "hashing"
+    max_batch_size = 10000
+
+    def __init__(self, dimension=EMBEDDING_DIM):
+        self.dimension = dimension
+        self.model_id = f"hashing-v1-{dimension}"
+
+    def _features(self, text):
+        tokens = _TOKEN_RE.findall(text.lower())
+        features = list(tokens)
+        for token in tokens:
+            padded = f"#{token}#"
+            features.extend(padded[i:i + 3] for i in range(len(padded) - 2))
+        return features
+
+    def embed(self, texts):
+        vectors = []
+        for text in texts:
+            vector = np.zeros(self.dimension, dtype=np.float32)
+            for feature in self._features(text):
+                digest = hashlib.blake2b(feature.encode(), digest_size=8).digest()
+                bucket = int.from_bytes(digest[:4], "little") % self.dimension
+                sign = 1.0 if digest[4] & 1 else -1.0
+                vector[bucket] += sign
+            norm = np.linalg.norm(vector)
+            vectors.append(vector / norm if norm else vector)
+        return vectors
+
+
+BACKENDS = {
+    "cloudflare": CloudflareBackend,
+    "local": LocalOnnxBackend,
+    "hashing": HashingBackend,
+}
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def create_backend(name):
+    """Instantiate a backend by name and check it matches the stored vector size."""
+    try:
+        backend = BACKENDS[name]()
+    except KeyError:
+        raise ValueError(
+            f"Unknown EMBEDDING_BACKEND '{name}'. Choose one of: {', '.join(BACKENDS)}"
+        ) from None
+    if backend.dimension != EMBEDDING_DIM:
+        raise ValueError(
+            f"Embedding backend '{name}' produces {backend.dimension}-dim vectors "
+            f"but videos.embedding is {EMBEDDING_DIM}-dim"
+        )
+    return backend
+
+
+def get_backend():
+    """Return the process-wide backend selected by EMBEDDING_BACKEND."""
+    global _backend
+    with _backend_lock:
+        if _backend is None:
+            _backend = create_backend(EMBEDDING_BACKEND)
+            logging.info(
+                f"Embedding backend: {_backend.name} "
+                f"({_backend.model_id}, {_backend.dimension}d)"
+            )
+        return _backend
+
+
+def set_backend(backend):
+    """Swap the process-wide backend (scripts, tests, benchmarks)."""
+    global _backend
+    with _backend_lock:
+        _backend = backend
+
+
+VIDEO_TEXT_MAX_CHARS = 2000
+
+
+def video_embedding_text(title, description):
+    """Text embedded for a video: title followed by (truncated) description."""
+    text = f"{title or ''}\n{description or ''}".strip()
+    return text[:VIDEO_TEXT_MAX_CHARS]
+
+
+def binary_quantize(vector):
+    """Sign-bit quantization as a bit string, matching pgvector's binary_quantize()."""
+    return "".join(np.where(np.asarray(vector) > 0, "1", "0"))
+
+
+def embed_texts(texts, backend=None, batch_size=None):
+    """
+    Embed documents (video text) in large batches, bypassing the query cache.
+    Returns vectors aligned with `texts`; raises EmbeddingError on failure.
+    """
+    backend = backend or get_backend()
+    if not backend.available():
+        raise EmbeddingError(f"Embedding backend '{backend.name}' is not configured")
+    size = min(batch_size or backend.max_batch_size, backend.max_batch_size)
+    vectors = []
+    for i in range(0, len(texts), size):
+        vectors.extend(backend.embed(texts[i:i + size]))
+    return vectors
+
+
+async def aembed_texts(texts, backend=None, batch_size=None):
+    """Async `embed_texts` over `backend.aembed`."""
+    backend = backend or get_backend()
+    if not backend.available():
+        raise EmbeddingError(f"Embedding backend '{backend.name}' is not configured")
+    size = min(batch_size or backend.max_batch_size, backend.max_batch_size)
+    vectors = []
+    for i in range(0, len(texts), size):
+        vectors.extend(await backend.aembed(texts[i:i + size]))
+    return vectors
@@ -0,0 +1,199 @@
+"""
+Guard around YouTube fetches for a (normalized query, duration).
+
+- Single-flight: concurrent fetches of the same key share one run; the
+  others wait and get its result (or its error).
+- Recently fetched: after a fetch that accepted videos, the key is not
+  fetched again for FETCH_RECENT_WINDOW seconds.
+- Negative cache: a fetch that accepted no videos (everything filtered as
+  Shorts or non-educational) suppresses the key for FETCH_NEGATIVE_TTL
+  seconds, doubling on each further empty fetch up to FETCH_NEGATIVE_MAX_TTL.
+
+Outcomes are remembered only once the fetched videos are committed (see
+`defer` on `run` / `arun`); failed fetches and rolled-back writes are not
+remembered, and the HTTP client's circuit breaker covers an unavailable API.
+Suppressed fetches return 0 new videos. State is per process.
+"""
+
+import asyncio
+import functools
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+
+from scraper.embedding_cache import normalize_query
+
+FETCH_RECENT_WINDOW = float(os.getenv("FETCH_RECENT_WINDOW", "600"))  # 10 minutes
+FETCH_NEGATIVE_TTL = float(os.getenv("FETCH_NEGATIVE_TTL", "900"))  # 15 minutes
+FETCH_NEGATIVE_MAX_TTL = float(os.getenv("FETCH_NEGATIVE_MAX_TTL", "86400"))  # 1 day
+FETCH_GUARD_SIZE = 4096
+
+
+class FetchGuard:
+    """
+    Single-flight plus positive/negative memo of fetches, keyed by query and
+    duration.
+    """
+
+    def __init__(self, recent_window=FETCH_RECENT_WINDOW,
+                 negative_ttl=FETCH_NEGATIVE_TTL,
+                 negative_max_ttl=FETCH_NEGATIVE_MAX_TTL, max_size=FETCH_GUARD_SIZE,
+                 clock=time.monotonic):
+        self.recent_window = recent_window
+        self.negative_ttl = negative_ttl
+        self.negative_max_ttl = negative_max_ttl
+        self.max_size = max_size
+        self._clock = clock
+        self._memo = OrderedDict()  # key -> (kind, expires_at, empty_streak)
+        self._flights = {}  # key -> concurrent.futures.Future
+        self._aflights = {}  # key -> asyncio.Future
+        self._lock = threading.Lock()
+        self._counters = {
+            "fetches": 0,
+            "coalesced": 0,
+            "suppressed_recent": 0,
+            "suppressed_negative": 0,
+            "empty_fetches": 0,
+        }
+
+    @staticmethod
+    def key(query, video_duration):
+        return (normalize_query(query), video_duration or "any")
+
+    def _suppressing(self, key):
+        """
+        Kind of the unexpired memo entry of `key` ('recent' | 'negative'), or
+        None.
+        """
+        # Expired negative entries are kept (until evicted) so that the next
+        # empty fetch continues their backoff
+        entry = self._memo.get(key)
+        if entry is None or entry[1] <= self._clock():
+            return None
+        return entry[0]
+
+    def suppressed(self, query, video_duration):
+        """
+        'recent' or 'negative' if a fetch of this query would be skipped, else
+        None.
+        """
+        with self._lock:
+            return self._suppressing(self.key(query, video_duration))
+
+    def _check(self, key):
+        with self._lock:
+            kind = self._suppressing(key)
+            if kind is not None:
+                self._counters[f"suppressed_{kind}"] += 1
+            return kind is not None
+
+    def _record(self, key, accepted):
+        """Remember the outcome of a completed fetch that accepted `accepted` videos."""
+        with self._lock:
+            now = self._clock()
+            if accepted:
+                self._memo[key] = ("recent", now + self.recent_window, 0)
+            else:
+                previous = self._memo.get(key)
+                negative = previous is not None and previous[0] == "negative"
+                streak = previous[2] + 1 if negative else 1
+                ttl = min(self.negative_ttl * 2 ** (streak - 1), self.negative_max_ttl)
+                self._memo[key] = ("negative", now + ttl, streak)
+                self._counters["empty_fetches"] += 1
+            self._memo.move_to_end(key)
+            while len(self._memo) > self.max_size:
+                self._memo.popitem(last=False)
+
+    def _remember(self, key, accepted, defer):
+        if defer is None:
+            self._record(key, accepted)
+        else:
+            defer(functools.partial(self._record, key, accepted))
+
+    def run(self, query, video_duration, fetch, defer=None):
+        """
+        Run `fetch()` -> (inserted, accepted) unless suppressed or already in
+        flight in another thread. Returns the number of inserted videos.
+
+        When `fetch` writes on a session the caller commits, pass
+        `defer(callback)` to run the memo update after that commit; without
+        it the outcome is remembered as soon as `fetch` returns.
+        """
+        key = self.key(query, video_duration)
+        if self._check(key):
+            return 0
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = Future()
+                self._counters["fetches"] += 1
+            else:
+                self._counters["coalesced"] += 1
+        if not leader:
+            return flight.result()
+        try:
+            inserted, accepted = fetch()
+            self._remember(key, accepted, defer)
+            flight.set_result(inserted)
+            return inserted
+        except BaseException as e:
+            flight.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                del self._flights[key]
+
+    async def arun(self, query, video_duration, fetch, defer=None):
+        """
+        Async `run`: `fetch()` is a coroutine function; coalescing is per
+        event loop. `defer` is as for `run`.
+        """
+        key = self.key(query, video_duration)
+        if self._check(key):
+            return 0
+        flight = self._aflights.get(key)
+        if flight is not None:
+            with self._lock:
+                self._counters["coalesced"] += 1
+            inserted, error = await asyncio.shield(flight)
+            if error is not None:
+                raise error
+            return inserted
+        flight = asyncio.get_running_loop().create_future()
+        self._aflights[key] = flight
+        with self._lock:
+            self._counters["fetches"] += 1
+        outcome = (0, RuntimeError("YouTube fetch was cancelled"))
+        try:
+            inserted, accepted = await fetch()
+            self._remember(key, accepted, defer)
+            outcome = (inserted, None)
+            return inserted
+        except Exception as e:
+            outcome = (0, e)
+            raise
+        finally:
+            del self._aflights[key]
+            flight.set_result(outcome)
+
+    def clear(self):
+        with self._lock:
+            self._memo.clear()
+
+    def stats(self):
+        with self._lock:
+            counters = dict(self._counters)
+            now = self._clock()
+            live = [entry for entry in self._memo.values() if entry[1] > now]
+        return {
+            **counters,
+            "recent_entries": sum(1 for entry in live if entry[0] == "recent"),
+            "negative_entries": sum(1 for entry in live if entry[0] == "negative"),
+        }
+
+
+# Process-wide guard used by scraper.youtube_scraper
+youtube_fetch_guard = FetchGuard()
@@ -0,0 +1,192 @@
+"""
+Multi-page YouTube harvesting, for offline corpus building and deep refreshes
+of popular topics.
+
+`aharvest_videos` follows search.list's nextPageToken for up to
+HARVEST_MAX_PAGES pages of 50 results. The videos.list lookup of each page
+starts as soon as the page arrives and runs while the next search page is in
+flight; at most HARVEST_DETAIL_CONCURRENCY lookups run at once, and never
+more than the YouTube client's connection pool leaves next to the search.
+Accepted videos are embedded in one batch and written with one bulk upsert
+(scraper.video_store).
+
+Each page is requested only while the quota budget covers it and one detail
+lookup; otherwise harvesting stops and keeps what it has. A failed search
+page also ends the harvest after the first page, and a failed detail lookup
+drops that page only.
+
+Usage:
+    python -m scraper.harvest "organic chemistry" ["cell biology" ...]
+                              [--pages 5] [--duration any]
+    python -m scraper.harvest --top-queries 20 [--pages 5]
+
+`--top-queries N` harvests the N most searched queries of the last
+SEARCH_FREQUENCY_DAYS days.
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import time
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import func, select
+
+from backend.database import AsyncSessionLocal, dispose_async_engine
+from backend.models import UserSearch
+from scraper.http_client import close_async_clients, get_async_client
+from scraper.semantic_search import SEARCH_FREQUENCY_DAYS
+from scraper.youtube_quota import QUOTA_COSTS, QuotaExhausted, youtube_quota
+from scraper.youtube_scraper import aget_video_details, asearch_page, astore_videos
+
+HARVEST_MAX_PAGES = int(os.getenv("HARVEST_MAX_PAGES", "5"))
+HARVEST_DETAIL_CONCURRENCY = int(os.getenv("HARVEST_DETAIL_CONCURRENCY", "4"))
+
+# search.list returns at most 50 results per page
+HARVEST_PAGE_SIZE = 50
+
+
+def _detail_concurrency(limit):
+    # One pooled connection stays free for the search page in flight
+    return max(1, min(limit, get_async_client("youtube").pool_size - 1))
+
+
+async def aharvest_videos(query, db_session, pages=HARVEST_MAX_PAGES,
+                          video_duration="any",
+                          detail_concurrency=HARVEST_DETAIL_CONCURRENCY):
+    """
+    Harvest up to `pages` search pages of `query` and write the accepted
+    videos on `db_session` (the caller commits).
+
+    Returns {"pages", "results", "accepted", "inserted", "updated",
+    "detail_failures", "seconds", "stopped"}; "stopped" is "depth" (page
+    limit reached), "exhausted" (no further page), "quota" or "error".
+    """
+    started = time.perf_counter()
+    semaphore = asyncio.Semaphore(_detail_concurrency(detail_concurrency))
+    stats = {"pages": 0, "results": 0, "detail_failures": 0, "stopped": "depth"}
+
+    async def details(video_ids):
+        async with semaphore:
+            return await aget_video_details(video_ids)
+
+    lookups = []
+    page_token = None
+    try:
+        for _ in range(pages):
+            if not await asyncio.to_thread(
+                youtube_quota.available, QUOTA_COSTS["search"] + QUOTA_COSTS["videos"]
+            ):
+                stats["stopped"] = "quota"
+                break
+            try:
+                items, page_token = await asearch_page(
+                    query, max_results=HARVEST_PAGE_SIZE, video_duration=video_duration,
+                    page_token=page_token,
+                )
+            except QuotaExhausted:
+                stats["stopped"] = "quota"
+                break
+            except Exception as e:
+                if not stats["pages"]:
+                    raise
+                logging.warning(f"Harvest of {query!r} stopped at page "
+                                f"{stats['pages'] + 1}: {e}")
+                stats["stopped"] = "error"
+                break
+            stats["pages"] += 1
+            video_ids = [item["id"]["videoId"] for item in items
+                         if "videoId" in item.get("id", {})]
+            stats["results"] += len(video_ids)
+            if video_ids:
+                lookups.append(asyncio.create_task(details(video_ids)))
+            if not page_token:
+                stats["stopped"] = "exhausted"
+                break
+        pages_of_details = await asyncio.gather(*lookups, return_exceptions=True)
+    except BaseException:
+        for task in lookups:
+            task.cancel()
+        raise
+
+    fetched = {}
+    for result in pages_of_details:
+        if isinstance(result, BaseException):
+            stats["detail_failures"] += 1
+            logging.warning(f"Harvest of {query!r}: a detail lookup failed: {result}")
+            continue
+        # Pages can overlap; the first occurrence of a video is kept
+        for video in result:
+            fetched.setdefault(video['id'], video)
+
+    inserted, updated, accepted = await astore_videos(list(fetched.values()), query,
+                                                      db_session)
+    stats.update(
+        accepted=accepted, inserted=inserted, updated=updated,
+        seconds=time.perf_counter() - started,
+    )
+    return stats
+
+
+async def atop_queries(db_session, limit, days=SEARCH_FREQUENCY_DAYS):
+    """The `limit` most searched normalized queries of the last `days` days."""
+    since = datetime.now(timezone.utc) - timedelta(days=days)
+    normalized = func.lower(func.trim(UserSearch.query))
+    result = await db_session.execute(
+        select(normalized)
+        .where(UserSearch.search_time >= since)
+        .group_by(normalized)
+        .order_by(func.count().desc())
+        .limit(limit)
+    )
+    return list(result.scalars())
+
+
+async def _harvest_all(queries, top_queries, pages, video_duration):
+    if top_queries:
+        async with AsyncSessionLocal() as session:
+            queries = list(queries) + await atop_queries(session, top_queries)
+    for query in queries:
+        async with AsyncSessionLocal() as session:
+            stats = await aharvest_videos(query, session, pages=pages,
+                                          video_duration=video_duration)
+            await session.commit()
+        print(
+            f"{query!r}: {stats['pages']} pages, {stats['results']} results, "
+            f"{stats['accepted']} accepted, {stats['inserted']} new, "
+            f"{stats['updated']} refreshed "
+            f"in {stats['seconds']:.1f}s (stopped: {stats['stopped']})"
+        )
+        if stats["stopped"] == "quota":
+            print("Quota budget spent; stopping.")
+            break
+
+
+async def _amain(args):
+    try:
+        await _harvest_all(args.queries, args.top_queries, args.pages, args.duration)
+    finally:
+        await close_async_clients()
+        await dispose_async_engine()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Harvest several YouTube search pages per query.")
+    parser.add_argument("queries", nargs="*")
+    parser.add_argument("--pages", type=int, default=HARVEST_MAX_PAGES)
+    parser.add_argument("--duration", choices=("any", "short", "medium", "long"),
+                        default="any")
+    parser.add_argument("--top-queries", type=int, default=0,
+                        help="Also harvest the N most searched recent queries")
+    args = parser.parse_args(argv)
+    if not args.queries and not args.top_queries:
+        parser.error("give queries or --top-queries")
+
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(_amain(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,367 @@
+"""
+Shared HTTP client layer for upstream APIs (Cloudflare Workers AI, YouTube).
+
+Each upstream gets one pooled `requests.Session` (keep-alive connections are
+reused across calls), its own timeouts, a retry policy with jittered
+exponential backoff for idempotent calls, and a circuit breaker that fails
+fast while the upstream is unhealthy.
+
+Per-upstream settings are read from the environment, e.g. for "youtube":
+    HTTP_YOUTUBE_CONNECT_TIMEOUT, HTTP_YOUTUBE_READ_TIMEOUT, HTTP_YOUTUBE_RETRIES,
+    HTTP_YOUTUBE_POOL_SIZE, HTTP_YOUTUBE_BREAKER_THRESHOLD, HTTP_YOUTUBE_BREAKER_RESET
+
+`get_async_client` returns an httpx-based twin with the same settings and
+policies for the async request path; sync and async clients of one upstream
+keep separate breakers and counters.
+"""
+
+import asyncio
+import logging
+import os
+import random
+import threading
+import time
+
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+
+IDEMPOTENT_METHODS = {"GET", "HEAD", "OPTIONS", "PUT", "DELETE"}
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+
+# Defaults per upstream; every value can be overridden via environment.
+UPSTREAM_DEFAULTS = {
+    "cloudflare": {"read_timeout": 10.0, "breaker_threshold": 5},
+    "youtube": {"read_timeout": 15.0, "breaker_threshold": 3, "breaker_reset": 60.0},
+}
+GENERIC_DEFAULTS = {
+    "connect_timeout": 3.0,
+    "read_timeout": 10.0,
+    "retries": 2,
+    "pool_size": 10,
+    "backoff_base": 0.2,
+    "backoff_max": 2.0,
+    "breaker_threshold": 5,
+    "breaker_reset": 30.0,
+}
+
+
+class UpstreamUnavailableError(Exception):
+    """Raised when an upstream's circuit breaker is open."""
+
+
+class CircuitBreaker:
+    """
+    Consecutive-failure circuit breaker.
+    closed -> open after `threshold` failures; open -> half_open after
+    `reset_timeout` seconds, where one trial call decides the next state.
+    """
+
+    def __init__(self, threshold=5, reset_timeout=30.0, clock=time.monotonic):
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at = None
+        self._trial_in_flight = False
+
+    @property
+    def state(self):
+        with self._lock:
+            return self._state()
+
+    def _state(self):
+        if self._opened_at is None:
+            return "closed"
+        if self._clock() - self._opened_at >= self.reset_timeout:
+            return "half_open"
+        return "open"
+
+    def allow_request(self):
+        """Return True if a call may proceed right now."""
+        with self._lock:
+            state = self._state()
+            if state == "closed":
+                return True
+            if state == "half_open" and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._trial_in_flight or self._failures >= self.threshold:
+                self._opened_at = self._clock()
+            self._trial_in_flight = False
+
+    def release_trial(self):
+        """End a call that neither succeeded nor failed (e.g. it was cancelled)."""
+        with self._lock:
+            self._trial_in_flight = False
+
+
+class UpstreamClient:
+    """Pooled, retrying, circuit-broken HTTP client for a single upstream."""
+
+    # Transport errors the call catches, and those of them worth retrying
+    TRANSPORT_ERRORS = requests.RequestException
+    RETRYABLE_ERRORS = (requests.ConnectionError, requests.Timeout)
+
+    def __init__(self, name, connect_timeout=3.0, read_timeout=10.0, retries=2,
+                 pool_size=10, backoff_base=0.2, backoff_max=2.0,
+                 breaker_threshold=5, breaker_reset=30.0, sleep=time.sleep):
+        self.name = name
+        self.timeout = (connect_timeout, read_timeout)
+        self.pool_size = pool_size
+        self.retries = retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.breaker = CircuitBreaker(breaker_threshold, breaker_reset)
+        self._sleep = sleep
+        self.session = self._make_session(pool_size)
+
+        self._lock = threading.Lock()
+        self._counters = {
+            "requests": 0, "retries": 0, "failures": 0, "short_circuited": 0,
+        }
+
+    def _make_session(self, pool_size):
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=0)
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        return session
+
+    def _count(self, key):
+        with self._lock:
+            self._counters[key] += 1
+
+    def _backoff(self, attempt):
+        """Full-jitter exponential backoff."""
+        ceiling = min(self.backoff_max, self.backoff_base * (2 ** attempt))
+        return random.uniform(0, ceiling)
+
+    # Retry and breaker policy shared by the sync and async clients; each
+    # `request` only adds the transport call (and how it waits).
+
+    def _start(self, method, idempotent):
+        """(method, attempts) of a call; raises while the circuit is open."""
+        method = method.upper()
+        if idempotent is None:
+            idempotent = method in IDEMPOTENT_METHODS
+        if not self.breaker.allow_request():
+            self._count("short_circuited")
+            raise UpstreamUnavailableError(f"{self.name} circuit is open")
+        return method, self.retries + 1 if idempotent else 1
+
+    def _delay(self, attempt):
+        """Count an attempt; returns the backoff before it (None for the first)."""
+        self._count("requests")
+        if not attempt:
+            return None
+        self._count("retries")
+        return self._backoff(attempt - 1)
+
+    def _retry_error(self, method, attempt, error):
+        """Log a transport error; True if the next attempt should follow."""
+        logging.warning(f"{self.name} {method} attempt {attempt + 1} failed: {error}")
+        return isinstance(error, self.RETRYABLE_ERRORS)
+
+    def _final_response(self, method, attempt, response):
+        """True (recording a success) unless the status is worth retrying."""
+        if response.status_code not in RETRYABLE_STATUS:
+            self.breaker.record_success()
+            return True
+        logging.warning(
+            f"{self.name} {method} attempt {attempt + 1} "
+            f"returned {response.status_code}"
+        )
+        return False
+
+    def _failed(self):
+        self._count("failures")
+        self.breaker.record_failure()
+
+    def _exhausted(self, last_error, response):
+        """
+        Record the failed call; re-raise its transport error or return the
+        last response.
+        """
+        self._failed()
+        if last_error is not None:
+            raise last_error
+        return response
+
+    def request(self, method, url, idempotent=None, timeout=None, **kwargs):
+        """
+        Send a request through the pooled session.
+        Idempotent calls are retried on connection errors, timeouts and
+        retryable statuses. Returns the final response (which may carry an
+        error status); raises on transport errors or an open circuit.
+        """
+        method, attempts = self._start(method, idempotent)
+        last_error = response = None
+        try:
+            for attempt in range(attempts):
+                delay = self._delay(attempt)
+                if delay is not None:
+                    self._sleep(delay)
+                try:
+                    response = self.session.request(
+                        method, url, timeout=timeout or self.timeout, **kwargs
+                    )
+                except self.TRANSPORT_ERRORS as e:
+                    last_error, response = e, None
+                    if self._retry_error(method, attempt, e):
+                        continue
+                    break
+                last_error = None
+                if self._final_response(method, attempt, response):
+                    return response
+        except BaseException:
+            # Any other exit (a hook raising, an interrupt) still ends the call;
+            # count it so a half-open trial is released
+            self._failed()
+            raise
+        return self._exhausted(last_error, response)
+
+    def get(self, url, **kwargs):
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request("POST", url, **kwargs)
+
+    def stats(self):
+        with self._lock:
+            counters = dict(self._counters)
+        return {**counters, "circuit": self.breaker.state}
+
+
+class AsyncUpstreamClient(UpstreamClient):
+    """
+    Async twin of UpstreamClient over a pooled `httpx.AsyncClient`.
+    Waiting on the upstream (and on backoff) yields to the event loop.
+    """
+
+    TRANSPORT_ERRORS = httpx.HTTPError
+    RETRYABLE_ERRORS = httpx.TransportError
+
+    def __init__(self, name, sleep=asyncio.sleep, transport=None, **kwargs):
+        self._transport = transport
+        super().__init__(name, sleep=sleep, **kwargs)
+
+    def _make_session(self, pool_size):
+        return httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=pool_size, max_keepalive_connections=pool_size
+            ),
+            transport=self._transport,
+        )
+
+    @staticmethod
+    def _httpx_timeout(timeout):
+        connect, read = timeout
+        return httpx.Timeout(read, connect=connect)
+
+    async def request(self, method, url, idempotent=None, timeout=None, **kwargs):
+        """Async `UpstreamClient.request`; same retry and breaker semantics."""
+        method, attempts = self._start(method, idempotent)
+        last_error = response = None
+        try:
+            for attempt in range(attempts):
+                delay = self._delay(attempt)
+                if delay is not None:
+                    await self._sleep(delay)
+                try:
+                    response = await self.session.request(
+                        method, url,
+                        timeout=self._httpx_timeout(timeout or self.timeout),
+                        **kwargs,
+                    )
+                except self.TRANSPORT_ERRORS as e:
+                    last_error, response = e, None
+                    if self._retry_error(method, attempt, e):
+                        continue
+                    break
+                last_error = None
+                if self._final_response(method, attempt, response):
+                    return response
+        except asyncio.CancelledError:
+            # The caller no longer needs the result; that says nothing about
+            # the upstream, so only a half-open trial is released
+            self.breaker.release_trial()
+            raise
+        except BaseException:
+            self._failed()
+            raise
+        return self._exhausted(last_error, response)
+
+    async def get(self, url, **kwargs):
+        return await self.request("GET", url, **kwargs)
+
+    async def post(self, url, **kwargs):
+        return await self.request("POST", url, **kwargs)
+
+    async def aclose(self):
+        await self.session.aclose()
+
+
+_clients = {}
+_async_clients = {}
+_clients_lock = threading.Lock()
+
+
+def _config_for(name):
+    config = {**GENERIC_DEFAULTS, **UPSTREAM_DEFAULTS.get(name, {})}
+    for key, default in config.items():
+        value = os.getenv(f"HTTP_{name.upper()}_{key.upper()}")
+        if value is not None:
+            config[key] = type(default)(value)
+    return config
+
+
+def get_client(name):
+    """Return the shared client for an upstream, creating it on first use."""
+    with _clients_lock:
+        client = _clients.get(name)
+        if client is None:
+            client = UpstreamClient(name, **_config_for(name))
+            _clients[name] = client
+        return client
+
+
+def get_async_client(name):
+    """Return the shared async client for an upstream, creating it on first use."""
+    with _clients_lock:
+        client = _async_clients.get(name)
+        if client is None:
+            client = AsyncUpstreamClient(name, **_config_for(name))
+            _async_clients[name] = client
+        return client
+
+
+async def close_async_clients():
+    """Close pooled async connections (call on application shutdown)."""
+    with _clients_lock:
+        clients = list(_async_clients.values())
+        _async_clients.clear()
+    for client in clients:
+        await client.aclose()
+
+
+def client_stats():
+    """Counters and circuit state for every upstream client created so far."""
+    with _clients_lock:
+        clients = dict(_clients)
+        clients.update(
+            {f"{name}_async": client for name, client in _async_clients.items()}
+        )
+    return {name: client.stats() for name, client in clients.items()}
@@ -0,0 +1,522 @@
+"""
+Background queue of YouTube supply-refresh jobs.
+
+When the stored candidates for a query run short, `arecommend` answers from
+the database right away and enqueues a job here instead of blocking on the
+YouTube API. Worker tasks started with the API (`ingestion_loop`) claim jobs,
+run `afetch_and_store_videos` on their own session and commit; the new
+videos invalidate the cached recommendations they affect, so the next
+request for the query sees them. Clients poll a job through
+GET /api/recommend/refresh/{job_id}.
+
+Backends (INGESTION_QUEUE_BACKEND):
+- memory: per-process queue; jobs are lost on restart and only the worker
+  that accepted a job can report on it
+- postgres: the `ingestion_jobs` table, claimed with FOR UPDATE SKIP LOCKED
+  so several API workers share one queue; a job whose worker died is
+  reclaimed after INGESTION_JOB_LEASE seconds
+
+At most one job per (normalized query, duration) is queued or running;
+enqueueing a duplicate returns the active job (raising its priority if the
+new request is worth more). Queued jobs are claimed by priority, the
+expected value of the fetch (`fetch_priority`), so when YouTube quota is
+scarce the most searched, worst supplied queries go first. Workers stop
+claiming while the quota budget cannot cover a search. Failed jobs are
+retried up to INGESTION_MAX_ATTEMPTS times.
+"""
+
+import asyncio
+import itertools
+import logging
+import os
+import threading
+import time
+from collections import deque
+from datetime import datetime, timezone
+
+from sqlalchemy import case, func, select, text, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+from backend.database import AsyncSessionLocal
+from backend.models import IngestionJob
+from scraper.embedding_cache import normalize_query
+from scraper.youtube_quota import QUOTA_COSTS, youtube_quota
+
+INGESTION_QUEUE_ENABLED = os.getenv("INGESTION_QUEUE_ENABLED", "true").lower() == "true"
+# memory | postgres
+INGESTION_QUEUE_BACKEND = os.getenv("INGESTION_QUEUE_BACKEND", "memory")
+INGESTION_WORKERS = int(os.getenv("INGESTION_WORKERS", "1"))
+INGESTION_MAX_ATTEMPTS = int(os.getenv("INGESTION_MAX_ATTEMPTS", "3"))
+INGESTION_JOB_LEASE = float(os.getenv("INGESTION_JOB_LEASE", "300"))
+INGESTION_POLL_INTERVAL = float(os.getenv("INGESTION_POLL_INTERVAL", "1"))
+
+ACTIVE_STATUSES = ("queued", "running")
+FINISHED_STATUSES = ("done", "failed")
+
+# Interval at which `wait_finished` re-reads a job
+_FINISH_POLL = 0.25
+
+JOB_COLUMNS = (
+    IngestionJob.id,
+    IngestionJob.query,
+    IngestionJob.video_duration,
+    IngestionJob.max_results,
+    IngestionJob.status,
+    IngestionJob.priority,
+    IngestionJob.attempts,
+    IngestionJob.inserted,
+    IngestionJob.error,
+    IngestionJob.created_at,
+    IngestionJob.started_at,
+    IngestionJob.finished_at,
+)
+
+# Running jobs whose lease expired on their last attempt (the worker died
+# before `fail` could run); they are not reclaimed again
+EXPIRE_SQL = """
+UPDATE ingestion_jobs
+SET status = 'failed', error = 'Lease expired on the last attempt',
+    finished_at = now()
+WHERE status = 'running' AND attempts >= :max_attempts
+  AND started_at < now() - make_interval(secs => :lease)
+"""
+
+# Most valuable queued job, or a running one whose lease expired with
+# attempts left; locked rows are being claimed by another worker and skipped
+CLAIM_SQL = """
+UPDATE ingestion_jobs
+SET status = 'running', started_at = now(), attempts = attempts + 1
+WHERE id = (
+    SELECT id FROM ingestion_jobs
+    WHERE status = 'queued'
+       OR (status = 'running' AND attempts < :max_attempts
+           AND started_at < now() - make_interval(secs => :lease))
+    ORDER BY priority DESC, id
+    FOR UPDATE SKIP LOCKED
+    LIMIT 1
+)
+RETURNING id, query, video_duration, max_results, status, priority, attempts, inserted,
+          error, created_at, started_at, finished_at
+"""
+
+
+def fetch_priority(search_count, supply_gap):
+    """
+    Expected value of fetching a query: how often it is searched times the
+    share of its results the DB cannot fill.
+    """
+    return max(search_count, 1) * supply_gap
+
+
+class _QueueBase:
+    """Wake-up and polling helpers shared by the queue backends."""
+
+    def __init__(self):
+        self._event = None
+        self._event_loop = None
+
+    def _wakeup_event(self):
+        loop = asyncio.get_running_loop()
+        if self._event_loop is not loop:
+            self._event_loop, self._event = loop, asyncio.Event()
+        return self._event
+
+    def _notify(self):
+        if self._event is not None and self._event_loop is asyncio.get_running_loop():
+            self._event.set()
+
+    async def wait(self, timeout):
+        """Sleep until a job is enqueued in this process, or `timeout` passes."""
+        event = self._wakeup_event()
+        try:
+            await asyncio.wait_for(event.wait(), timeout=timeout)
+        except asyncio.TimeoutError:
+            pass
+        event.clear()
+
+    async def wait_finished(self, job_id, timeout):
+        """Return the job once it is done or failed, or as it is after `timeout`."""
+        deadline = time.monotonic() + timeout
+        while True:
+            job = await self.get(job_id)
+            if job is None or job["status"] in FINISHED_STATUSES:
+                return job
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return job
+            await asyncio.sleep(min(_FINISH_POLL, remaining))
+
+
+class MemoryQueue(_QueueBase):
+    """In-process queue; finished jobs are kept for polling up to `retain`."""
+
+    name = "memory"
+
+    def __init__(self, max_attempts=INGESTION_MAX_ATTEMPTS, retain=1000):
+        super().__init__()
+        self.max_attempts = max_attempts
+        self._ids = itertools.count(1)
+        self._jobs = {}  # id -> job
+        self._queued = []  # ids of queued jobs
+        self._active = {}  # (query, duration) -> id
+        self._finished = deque(maxlen=retain)
+        self._lock = threading.Lock()
+
+    async def enqueue(self, query, video_duration, max_results, priority=0.0):
+        """
+        Queue a refresh job. Returns (job, created); duplicates return the
+        active job.
+        """
+        key = (normalize_query(query), video_duration)
+        with self._lock:
+            active = self._active.get(key)
+            if active is not None:
+                job = self._jobs[active]
+                job["priority"] = max(job["priority"], priority)
+                return dict(job), False
+            job = {
+                "id": next(self._ids),
+                "query": key[0],
+                "video_duration": video_duration,
+                "max_results": max_results,
+                "status": "queued",
+                "priority": priority,
+                "attempts": 0,
+                "inserted": None,
+                "error": None,
+                "created_at": datetime.now(timezone.utc),
+                "started_at": None,
+                "finished_at": None,
+            }
+            self._jobs[job["id"]] = job
+            self._active[key] = job["id"]
+            self._queued.append(job["id"])
+        self._notify()
+        return dict(job), True
+
+    async def claim(self):
+        with self._lock:
+            if not self._queued:
+                return None
+            job_id = max(self._queued, key=lambda i: (self._jobs[i]["priority"], -i))
+            self._queued.remove(job_id)
+            job = self._jobs[job_id]
+            job.update(status="running", started_at=datetime.now(timezone.utc),
+                       attempts=job["attempts"] + 1)
+            return dict(job)
+
+    def _finish(self, job):
+        self._active.pop((job["query"], job["video_duration"]), None)
+        if len(self._finished) == self._finished.maxlen:
+            self._jobs.pop(self._finished[0], None)
+        self._finished.append(job["id"])
+
+    async def complete(self, job_id, inserted):
+        with self._lock:
+            job = self._jobs[job_id]
+            job.update(status="done", inserted=inserted, error=None,
+                       finished_at=datetime.now(timezone.utc))
+            self._finish(job)
+
+    async def fail(self, job_id, error):
+        """
+        Record a failed attempt; requeue unless attempts are used up. Returns
+        the new status.
+        """
+        with self._lock:
+            job = self._jobs[job_id]
+            job["error"] = error
+            if job["attempts"] < self.max_attempts:
+                job["status"] = "queued"
+                self._queued.append(job_id)
+            else:
+                job.update(status="failed", finished_at=datetime.now(timezone.utc))
+                self._finish(job)
+            return job["status"]
+
+    async def get(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job) if job is not None else None
+
+    async def active_job(self, query, video_duration):
+        with self._lock:
+            job_id = self._active.get((normalize_query(query), video_duration))
+            return dict(self._jobs[job_id]) if job_id is not None else None
+
+    async def depth(self):
+        with self._lock:
+            return len(self._queued)
+
+
+class PostgresQueue(_QueueBase):
+    """Durable queue in the `ingestion_jobs` table, shared by every API worker."""
+
+    name = "postgres"
+
+    def __init__(self, session_factory=None, max_attempts=INGESTION_MAX_ATTEMPTS,
+                 lease=INGESTION_JOB_LEASE):
+        super().__init__()
+        self.session_factory = session_factory or AsyncSessionLocal
+        self.max_attempts = max_attempts
+        self.lease = lease
+
+    @staticmethod
+    def _job(row):
+        return dict(row._mapping) if row is not None else None
+
+    async def enqueue(self, query, video_duration, max_results, priority=0.0):
+        """
+        Queue a refresh job. Returns (job, created); duplicates return the
+        active job.
+        """
+        stmt = pg_insert(IngestionJob).values(
+            query=normalize_query(query), video_duration=video_duration,
+            max_results=max_results, status="queued", priority=priority, attempts=0,
+            created_at=func.now(),
+        )
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["query", "video_duration"],
+            # Literal predicate so Postgres can match the partial unique index
+            index_where=text("status IN ('queued', 'running')"),
+            set_={"priority": func.greatest(IngestionJob.priority,
+                                            stmt.excluded.priority)},
+        ).returning(
+            *JOB_COLUMNS,
+            # xmax is 0 only on a freshly inserted row version
+            text("(xmax = 0) AS created"),
+        )
+        async with self.session_factory() as session:
+            row = (await session.execute(stmt)).first()
+            await session.commit()
+        job = self._job(row)
+        created = job.pop("created")
+        if created:
+            self._notify()
+        return job, created
+
+    async def claim(self):
+        params = {"lease": self.lease, "max_attempts": self.max_attempts}
+        async with self.session_factory() as session:
+            await session.execute(text(EXPIRE_SQL), params)
+            result = await session.execute(text(CLAIM_SQL), params)
+            row = result.first()
+            await session.commit()
+            return self._job(row)
+
+    async def complete(self, job_id, inserted):
+        async with self.session_factory() as session:
+            await session.execute(
+                update(IngestionJob).where(IngestionJob.id == job_id)
+                .values(status="done", inserted=inserted, error=None,
+                        finished_at=func.now())
+            )
+            await session.commit()
+
+    async def fail(self, job_id, error):
+        """
+        Record a failed attempt; requeue unless attempts are used up. Returns
+        the new status.
+        """
+        exhausted = IngestionJob.attempts >= self.max_attempts
+        async with self.session_factory() as session:
+            result = await session.execute(
+                update(IngestionJob).where(IngestionJob.id == job_id)
+                .values(
+                    status=case((exhausted, "failed"), else_="queued"),
+                    error=error,
+                    finished_at=case((exhausted, func.now()), else_=None),
+                )
+                .returning(IngestionJob.status)
+            )
+            status = result.scalar()
+            await session.commit()
+        self._notify()
+        return status
+
+    async def _active_job(self, session, query, video_duration):
+        result = await session.execute(
+            select(*JOB_COLUMNS).where(
+                IngestionJob.query == query,
+                IngestionJob.video_duration == video_duration,
+                IngestionJob.status.in_(ACTIVE_STATUSES),
+            )
+        )
+        return self._job(result.first())
+
+    async def get(self, job_id):
+        async with self.session_factory() as session:
+            result = await session.execute(
+                select(*JOB_COLUMNS).where(IngestionJob.id == job_id)
+            )
+            return self._job(result.first())
+
+    async def active_job(self, query, video_duration):
+        async with self.session_factory() as session:
+            return await self._active_job(session, normalize_query(query),
+                                          video_duration)
+
+    async def depth(self):
+        async with self.session_factory() as session:
+            result = await session.execute(
+                select(func.count()).select_from(IngestionJob)
+                .where(IngestionJob.status == "queued")
+            )
+            return result.scalar()
+
+
+class IngestionMetrics:
+    """Thread-safe counters and latency samples of ingestion jobs."""
+
+    def __init__(self, window=1024):
+        self._lock = threading.Lock()
+        self._counters = {
+            "enqueued": 0,
+            "deduplicated": 0,
+            "succeeded": 0,
+            "failed": 0,
+            "retried": 0,
+            "videos_inserted": 0,
+        }
+        self._queue_wait = deque(maxlen=window)
+        self._run = deque(maxlen=window)
+
+    def record_enqueue(self, created):
+        with self._lock:
+            self._counters["enqueued" if created else "deduplicated"] += 1
+
+    def record_run(self, job, status, run_seconds, inserted=0):
+        """Record one attempt of `job`; `status` is its status afterwards."""
+        with self._lock:
+            if status == "done":
+                self._counters["succeeded"] += 1
+                self._counters["videos_inserted"] += inserted or 0
+            elif status == "failed":
+                self._counters["failed"] += 1
+            else:
+                self._counters["retried"] += 1
+            if job.get("started_at") and job.get("created_at"):
+                waited = job["started_at"] - job["created_at"]
+                self._queue_wait.append(waited.total_seconds())
+            self._run.append(run_seconds)
+
+    def clear(self):
+        with self._lock:
+            for name in self._counters:
+                self._counters[name] = 0
+            self._queue_wait.clear()
+            self._run.clear()
+
+    def stats(self):
+        def summary(values):
+            values = sorted(values)
+            if not values:
+                return {"ms_avg": 0.0, "ms_p95": 0.0}
+            return {
+                "ms_avg": 1000.0 * sum(values) / len(values),
+                "ms_p95": 1000.0 * values[int(0.95 * (len(values) - 1))],
+            }
+
+        with self._lock:
+            counters = dict(self._counters)
+            queue_wait, run = list(self._queue_wait), list(self._run)
+        finished = counters["succeeded"] + counters["failed"]
+        return {
+            **counters,
+            "success_rate": counters["succeeded"] / finished if finished else 0.0,
+            "queue_wait": summary(queue_wait),
+            "run": summary(run),
+        }
+
+
+def _default_queue():
+    if INGESTION_QUEUE_BACKEND == "postgres":
+        return PostgresQueue()
+    return MemoryQueue()
+
+
+# Process-wide queue and metrics used by arecommend and the API
+ingestion_queue = _default_queue()
+ingestion_metrics = IngestionMetrics()
+
+
+async def enqueue_refresh(query, video_duration, max_results=20, priority=0.0,
+                          queue=None):
+    """Queue a supply refresh for `query`. Returns the (possibly existing) job."""
+    queue = queue or ingestion_queue
+    job, created = await queue.enqueue(query, video_duration, max_results, priority)
+    ingestion_metrics.record_enqueue(created)
+    return job
+
+
+async def run_job(job, queue=None, session_factory=None):
+    """Fetch and store videos for one claimed job, then record its outcome."""
+    from scraper.youtube_scraper import afetch_and_store_videos
+
+    queue = queue or ingestion_queue
+    session_factory = session_factory or AsyncSessionLocal
+    started = time.perf_counter()
+    try:
+        async with session_factory() as session:
+            try:
+                inserted = await afetch_and_store_videos(
+                    job["query"], max_results=job["max_results"],
+                    video_duration=job["video_duration"], db_session=session,
+                )
+                await session.commit()
+            except BaseException:
+                await session.rollback()
+                raise
+    except Exception as e:
+        logging.warning(f"Ingestion job {job['id']} ({job['query']!r}) failed: {e}")
+        status = await queue.fail(job["id"], str(e))
+        ingestion_metrics.record_run(job, status, time.perf_counter() - started)
+        return status
+    await queue.complete(job["id"], inserted)
+    ingestion_metrics.record_run(job, "done", time.perf_counter() - started, inserted)
+    logging.info(f"Ingestion job {job['id']} added {inserted} videos "
+                 f"for {job['query']!r}")
+    return "done"
+
+
+async def _worker(queue, poll_interval):
+    while True:
+        try:
+            # Leave jobs queued (in priority order) until the quota budget
+            # covers a search; the check may refresh the ledger from the DB
+            quota_left = await asyncio.to_thread(
+                youtube_quota.available, QUOTA_COSTS["search"]
+            )
+            if not quota_left:
+                await asyncio.sleep(poll_interval)
+                continue
+            job = await queue.claim()
+        except Exception as e:
+            logging.error(f"Checking quota or claiming an ingestion job failed: {e}")
+            job = None
+        if job is None:
+            await queue.wait(poll_interval)
+            continue
+        try:
+            await run_job(job, queue)
+        except Exception as e:
+            # Recording the outcome failed; a durable job is reclaimed after its lease
+            logging.error(f"Ingestion job {job['id']} bookkeeping failed: {e}")
+
+
+async def ingestion_loop(queue=None, workers=INGESTION_WORKERS,
+                         poll_interval=INGESTION_POLL_INTERVAL):
+    """Run `workers` concurrent workers draining the ingestion queue."""
+    queue = queue or ingestion_queue
+    await asyncio.gather(*(_worker(queue, poll_interval) for _ in range(workers)))
+
+
+async def ingestion_stats(queue=None):
+    """Queue depth plus job counters and latencies, for /api/metrics."""
+    queue = queue or ingestion_queue
+    try:
+        depth = await queue.depth()
+    except Exception as e:
+        logging.warning(f"Reading ingestion queue depth failed: {e}")
+        depth = None
+    return {"backend": queue.name, "depth": depth, **ingestion_metrics.stats()}
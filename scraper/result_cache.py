@@ -0,0 +1,337 @@
+"""
+Cache of ranked `/api/recommend` results.
+
+Entries are keyed by (normalized query, duration, top_n, ranking version)
+and expire after RESULT_CACHE_TTL seconds. The store is an in-process LRU by
+default, or Redis when RESULT_CACHE_REDIS_URL is set (shared across workers;
+needs the optional `redis` package).
+
+Concurrent misses for the same key are coalesced: the first request computes
+the result and the others await it. Coalescing is per process.
+
+Newly ingested videos invalidate only the entries they could change: each
+entry is tagged with "<duration>:<token>" for the tokens of its query, and a
+new video drops the entries tagged with its duration bucket (or "any") and a
+token of its title, description or the query that fetched it. Purely
+semantic matches without a shared token are left to the TTL.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+
+from backend.models import DURATION_BUCKETS, duration_bucket
+from scraper.embedding_cache import normalize_query
+from scraper.retrieval import FUSION_METHOD, VECTOR_STORAGE
+
+RESULT_CACHE_ENABLED = os.getenv("RESULT_CACHE_ENABLED", "true").lower() == "true"
+RESULT_CACHE_TTL = float(os.getenv("RESULT_CACHE_TTL", "300"))  # 5 minutes
+RESULT_CACHE_SIZE = int(os.getenv("RESULT_CACHE_SIZE", "1024"))
+RESULT_CACHE_REDIS_URL = os.getenv("RESULT_CACHE_REDIS_URL", "")
+
+# Bump when the ranking logic changes so shared (Redis) entries written by an
+# older deploy are not served
+RANKING_VERSION = "1"
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+_STOPWORDS = frozenset(
+    "a an and are as at be by for from how in is it of on or the to what why with"
+    .split()
+)
+
+# Set on a coalesced flight whose leader failed or was cancelled
+_NO_RESULT = object()
+
+
+def query_tokens(text):
+    """Distinct lowercase word tokens of `text`, without stopwords."""
+    tokens = _TOKEN_RE.findall(str(text or "").lower())
+    return {t for t in tokens if t not in _STOPWORDS}
+
+
+def _duration_tag(video_duration):
+    # Durations retrieval does not filter on behave like "any"
+    return video_duration if video_duration in DURATION_BUCKETS else "any"
+
+
+class InProcessBackend:
+    """Thread-safe LRU + TTL store with a tag index for invalidation."""
+
+    remote = False
+
+    def __init__(self, max_size=RESULT_CACHE_SIZE, clock=time.monotonic):
+        self.max_size = max_size
+        self._clock = clock
+        self._entries = OrderedDict()  # key -> (expires_at, value, tags)
+        self._tags = {}  # tag -> {key}
+        self._lock = threading.Lock()
+
+    def _drop(self, key):
+        _, _, tags = self._entries.pop(key)
+        for tag in tags:
+            keys = self._tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tags[tag]
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] <= self._clock():
+                self._drop(key)
+                return None
+            self._entries.move_to_end(key)
+            return [dict(v) for v in entry[1]]
+
+    def set(self, key, value, ttl, tags):
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = (self._clock() + ttl, [dict(v) for v in value],
+                                  frozenset(tags))
+            for tag in tags:
+                self._tags.setdefault(tag, set()).add(key)
+            while len(self._entries) > self.max_size:
+                self._drop(next(iter(self._entries)))
+
+    def invalidate_tags(self, tags):
+        with self._lock:
+            keys = set()
+            for tag in tags:
+                keys |= self._tags.get(tag, set())
+            for key in keys:
+                self._drop(key)
+            return len(keys)
+
+    def size(self):
+        with self._lock:
+            return len(self._entries)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._tags.clear()
+
+
+class RedisBackend:
+    """
+    Redis store: one JSON string per entry (SET EX) and one set per tag
+    holding the keys tagged with it. Tag sets expire with their newest entry.
+    """
+
+    remote = True
+
+    def __init__(self, client, prefix="recommend:"):
+        self.client = client
+        self.prefix = prefix
+
+    @classmethod
+    def from_url(cls, url):
+        import redis
+
+        return cls(redis.Redis.from_url(url))
+
+    def _tag_key(self, tag):
+        return f"{self.prefix}tag:{tag}"
+
+    def get(self, key):
+        raw = self.client.get(self.prefix + key)
+        return json.loads(raw) if raw is not None else None
+
+    def set(self, key, value, ttl, tags):
+        pipe = self.client.pipeline(transaction=False)
+        pipe.set(self.prefix + key, json.dumps(value, default=float),
+                 ex=int(max(ttl, 1)))
+        for tag in tags:
+            pipe.sadd(self._tag_key(tag), self.prefix + key)
+            pipe.expire(self._tag_key(tag), int(max(ttl, 1)))
+        pipe.execute()
+
+    def invalidate_tags(self, tags):
+        tag_keys = [self._tag_key(tag) for tag in tags]
+        if not tag_keys:
+            return 0
+        keys = self.client.sunion(tag_keys)
+        if keys:
+            self.client.delete(*keys)
+        self.client.delete(*tag_keys)
+        return len(keys)
+
+    def size(self):
+        return sum(
+            1 for key in self.client.scan_iter(match=f"{self.prefix}*")
+            if not key.decode().startswith(f"{self.prefix}tag:")
+        )
+
+    def clear(self):
+        keys = list(self.client.scan_iter(match=f"{self.prefix}*"))
+        if keys:
+            self.client.delete(*keys)
+
+
+def _default_backend():
+    if RESULT_CACHE_REDIS_URL:
+        try:
+            return RedisBackend.from_url(RESULT_CACHE_REDIS_URL)
+        except ImportError:
+            logging.warning("RESULT_CACHE_REDIS_URL is set but redis is not installed; "
+                            "using the in-process result cache")
+    return InProcessBackend()
+
+
+class ResultCache:
+    """TTL cache of ranked results with request coalescing and tag invalidation."""
+
+    def __init__(self, backend=None, ttl=RESULT_CACHE_TTL,
+                 enabled=RESULT_CACHE_ENABLED):
+        self.backend = backend if backend is not None else _default_backend()
+        self.ttl = ttl
+        self.enabled = enabled
+        self._inflight = {}  # key -> asyncio.Future, owned by the request computing it
+        self._lock = threading.Lock()
+        self._counters = {
+            "hits": 0,
+            "misses": 0,
+            "coalesced": 0,
+            "stores": 0,
+            "invalidated": 0,
+            "errors": 0,
+        }
+
+    def _count(self, name, n=1):
+        with self._lock:
+            self._counters[name] += n
+
+    @staticmethod
+    def key(query, video_duration, top_n, model_id, ef_search=None, candidate_k=None):
+        """
+        Cache key of one recommend call. Retrieval knobs that change the
+        ranking are part of the version segment.
+        """
+        version = f"{RANKING_VERSION}/{FUSION_METHOD}/{VECTOR_STORAGE}/{model_id}"
+        if ef_search is not None or candidate_k is not None:
+            version += f"/ef={ef_search}/k={candidate_k}"
+        return f"{version}|{video_duration}|{top_n}|{normalize_query(query)}"
+
+    @staticmethod
+    def tags(query, video_duration):
+        duration = _duration_tag(video_duration)
+        return {f"{duration}:{token}" for token in query_tokens(query)}
+
+    async def _call(self, method, *args):
+        """Run a backend call, off the event loop when it is a network round trip."""
+        try:
+            if self.backend.remote:
+                return await asyncio.to_thread(method, *args)
+            return method(*args)
+        except Exception as e:
+            # A broken cache must never fail a recommendation
+            self._count("errors")
+            logging.warning(f"Result cache {method.__name__} failed: {e}")
+            return None
+
+    async def aget_or_compute(self, key, compute, tags=()):
+        """
+        Return the cached value of `key`, or await `compute()` and cache a
+        non-empty result. Concurrent callers with the same key share one
+        computation; if that computation fails they each compute their own.
+        """
+        if not self.enabled:
+            return await compute()
+
+        value = await self._call(self.backend.get, key)
+        if value is not None:
+            self._count("hits")
+            return value
+
+        flight = self._inflight.get(key)
+        if flight is not None:
+            self._count("coalesced")
+            value = await asyncio.shield(flight)
+            if value is not _NO_RESULT:
+                return [dict(v) for v in value]
+            return await compute()
+
+        self._count("misses")
+        flight = asyncio.get_running_loop().create_future()
+        self._inflight[key] = flight
+        value = _NO_RESULT
+        try:
+            value = await compute()
+            if value:
+                await self._call(self.backend.set, key, value, self.ttl, tags)
+                self._count("stores")
+            return value
+        finally:
+            del self._inflight[key]
+            flight.set_result(value)
+
+    @staticmethod
+    def video_tags(videos, query=None):
+        """Tags of the entries that (text, duration_seconds) `videos` could change."""
+        extra = query_tokens(query)
+        tags = set()
+        for text, seconds in videos:
+            tokens = query_tokens(text) | extra
+            for duration in ("any", duration_bucket(seconds or 0)):
+                tags.update(f"{duration}:{token}" for token in tokens)
+        return tags
+
+    def invalidate_videos(self, videos, query=None):
+        """
+        Drop entries that newly ingested `videos` could change.
+        `videos` is an iterable of (text, duration_seconds); `query` is the
+        search that fetched them. Returns the number of entries removed.
+        """
+        tags = self.video_tags(videos, query) if self.enabled else None
+        if not tags:
+            return 0
+        try:
+            removed = self.backend.invalidate_tags(tags)
+        except Exception as e:
+            self._count("errors")
+            logging.warning(f"Result cache invalidation failed: {e}")
+            return 0
+        self._count("invalidated", removed)
+        return removed
+
+    async def ainvalidate_videos(self, videos, query=None):
+        """Async `invalidate_videos`; Redis round trips run off the event loop."""
+        tags = self.video_tags(videos, query) if self.enabled else None
+        if not tags:
+            return 0
+        removed = await self._call(self.backend.invalidate_tags, tags) or 0
+        self._count("invalidated", removed)
+        return removed
+
+    def clear(self):
+        self.backend.clear()
+
+    def stats(self):
+        with self._lock:
+            counters = dict(self._counters)
+        lookups = counters["hits"] + counters["misses"] + counters["coalesced"]
+        try:
+            size = self.backend.size()
+        except Exception:
+            size = None
+        return {
+            **counters,
+            "backend": "redis" if self.backend.remote else "memory",
+            "size": size,
+            "hit_rate": (
+                (counters["hits"] + counters["coalesced"]) / lookups if lookups else 0.0
+            ),
+        }
+
+
+# Process-wide cache used by the /api/recommend endpoint
+result_cache = ResultCache()
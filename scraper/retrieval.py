@@ -0,0 +1,569 @@
+"""
+Single-round-trip retrieval plan for `recommend`.
+
+One statement returns both candidate sets:
+- vector_hits: the k nearest videos from the active embedding model, with
+  their cosine similarity (ORDER BY distance LIMIT k, served by HNSW)
+- text_hits: full-text matches on videos.search_vector, ranked by
+  ts_rank_cd relevance (GIN index; optional pg_trgm title fallback)
+
+The supply decision (is the DB good enough, or should we fetch from
+YouTube?) is made in Python from the returned similarities instead of a
+separate COUNT(*) query, and the text candidates used to top up the result
+list arrive in the same round trip.
+
+The vector side can read one of three storages (VECTOR_STORAGE):
+- vector: float32 `embedding` with its HNSW index (default)
+- halfvec: half-precision `embedding_half` with its HNSW index
+- binary: Hamming-distance shortlist over the sign bits in `embedding_bit`,
+  then an exact cosine re-rank of the shortlist on `embedding_half`
+
+`aretrieve_candidates` runs the same plan on an AsyncSession (asyncpg); it
+sends the ef_search setting as its own statement, since asyncpg cannot
+execute a multi-statement string with bind parameters.
+
+`rank_candidates` / `arank_candidates` run the ranking statement: the same
+candidate pools, merged in SQL with reciprocal rank fusion (default) or a
+weighted sum of component scores, so a strong keyword match and a strong
+semantic match compete on equal terms, then blended with the stored
+videos.popularity_prior. The database returns the final order, so
+`LIMIT :top_n` is exact and the supply counts come back alongside.
+"""
+
+import os
+
+from sqlalchemy import text
+
+from backend.models import DURATION_BUCKETS, EMBEDDING_DIM, TEXT_SEARCH_CONFIG, Video
+
+# Also match titles by trigram similarity (typo tolerance; needs pg_trgm)
+TEXT_SEARCH_FUZZY = os.getenv("TEXT_SEARCH_FUZZY", "false").lower() == "true"
+# Candidates pulled from each of the lexical and vector sides before fusion
+RETRIEVAL_CANDIDATE_K = int(os.getenv("RETRIEVAL_CANDIDATE_K", "50"))
+# rrf (reciprocal rank fusion) | weighted (weighted sum of similarity and text
+# relevance)
+FUSION_METHOD = os.getenv("FUSION_METHOD", "rrf").lower()
+RRF_K = int(os.getenv("RRF_K", "60"))
+# Share of the fused score given to the vector side (both methods)
+FUSION_VECTOR_WEIGHT = float(os.getenv("FUSION_VECTOR_WEIGHT", "0.5"))
+# Share of the final score given to videos.popularity_prior (the rest is fused
+# relevance)
+POPULARITY_WEIGHT = float(os.getenv("POPULARITY_WEIGHT", "0.3"))
+FUSION_METHODS = ("rrf", "weighted")
+# Which stored representation the vector side searches: vector | halfvec | binary
+VECTOR_STORAGE = os.getenv("VECTOR_STORAGE", "vector").lower()
+# binary storage: Hamming shortlist size as a multiple of k before the exact re-rank
+BINARY_RERANK_FACTOR = int(os.getenv("BINARY_RERANK_FACTOR", "4"))
+VECTOR_STORAGES = ("vector", "halfvec", "binary")
+
+# Result column order shared by every branch of the plan
+RETRIEVAL_COLUMNS = """
+        youtube_id,
+        title,
+        description,
+        thumbnail,
+        duration,
+        view_count,
+        like_count"""
+
+# Transaction-local HNSW search breadth for the vector side
+EF_SEARCH_SQL = "SELECT set_config('hnsw.ef_search', :ef_search, true)"
+
+# A nearest neighbour is "relevant supply" above this cosine similarity
+SUPPLY_MIN_SIMILARITY = 0.6
+# Vector hits at or below this cosine similarity are not ranked
+VECTOR_MIN_SIMILARITY = 0.5
+
+
+def duration_filter_sql(video_duration):
+    """
+    SQL fragment restricting a query to one duration bucket ("" for "any").
+
+    The bucket is inlined as a literal (it comes from DURATION_BUCKETS, never
+    from the request) so the planner can match it against the predicate of
+    the bucket's partial HNSW index.
+    """
+    if video_duration not in DURATION_BUCKETS:
+        return ""
+    return f"AND duration_bucket = '{video_duration}'"
+
+
+def duration_filter(video_duration):
+    """ORM twin of `duration_filter_sql`; None for "any" or unrecognized values."""
+    if video_duration not in DURATION_BUCKETS:
+        return None
+    return Video.duration_bucket == video_duration
+
+
+def _vector_cte(duration_filter_sql, storage="vector"):
+    if storage == "halfvec":
+        query = f"CAST(:query_embedding AS halfvec({EMBEDDING_DIM}))"
+        return f"""
+    vector_hits AS (
+        SELECT {RETRIEVAL_COLUMNS},
+            1 - (embedding_half <=> {query}) AS similarity_score,
+            'vector' AS source
+        FROM videos
+        WHERE embedding_half IS NOT NULL
+        AND embedding_model = :embedding_model
+        {duration_filter_sql}
+        ORDER BY embedding_half <=> {query} ASC
+        LIMIT :k
+    )"""
+    if storage == "binary":
+        query = f"CAST(:query_embedding AS halfvec({EMBEDDING_DIM}))"
+        query_bits = (
+            f"binary_quantize(CAST(:query_embedding AS vector({EMBEDDING_DIM})))"
+        )
+        return f"""
+    vector_hits AS (
+        SELECT {RETRIEVAL_COLUMNS},
+            1 - (embedding_half <=> {query}) AS similarity_score,
+            'vector' AS source
+        FROM (
+            SELECT {RETRIEVAL_COLUMNS}, embedding_half
+            FROM videos
+            WHERE embedding_bit IS NOT NULL
+            AND embedding_model = :embedding_model
+            {duration_filter_sql}
+            ORDER BY embedding_bit <~> {query_bits}
+            LIMIT :rerank_k
+        ) AS shortlist
+        ORDER BY embedding_half <=> {query} ASC
+        LIMIT :k
+    )"""
+    return f"""
+    vector_hits AS (
+        SELECT {RETRIEVAL_COLUMNS},
+            1 - (embedding <=> :query_embedding) AS similarity_score,
+            'vector' AS source
+        FROM videos
+        WHERE embedding IS NOT NULL
+        AND embedding_model = :embedding_model
+        {duration_filter_sql}
+        ORDER BY embedding <=> :query_embedding ASC
+        LIMIT :k
+    )"""
+
+
+def _index_hits_cte():
+    # Neighbours already found by the in-process vector index (duration
+    # filter applied there); only their display columns are read here
+    return f"""
+    vector_hits AS (
+        SELECT {RETRIEVAL_COLUMNS},
+            hits.similarity AS similarity_score,
+            'vector' AS source
+        FROM unnest(CAST(:hit_ids AS integer[]), CAST(:hit_scores AS float8[]))
+            AS hits(id, similarity)
+        JOIN videos USING (id)
+    )"""
+
+
+def _text_hits_cte():
+    # Keyword matches already found by a separate (concurrent) statement;
+    # only their display columns are read here
+    return f"""
+    text_hits AS (
+        SELECT {RETRIEVAL_COLUMNS},
+            hits.relevance AS similarity_score,
+            'text' AS source
+        FROM unnest(CAST(:text_ids AS text[]), CAST(:text_scores AS float8[]))
+            AS hits(youtube_id, relevance)
+        JOIN videos USING (youtube_id)
+    )"""
+
+
+def _text_cte(duration_filter_sql, fuzzy=False):
+    # ts_rank_cd normalization 32 maps rank to rank / (rank + 1), i.e. [0, 1)
+    tsquery = f"websearch_to_tsquery('{TEXT_SEARCH_CONFIG}', :query_text)"
+    rank = f"ts_rank_cd(search_vector, {tsquery}, 32)"
+    match = f"search_vector @@ {tsquery}"
+    if fuzzy:
+        rank = f"GREATEST({rank}, similarity(title, :query_text))"
+        match = f"({match} OR title % :query_text)"
+    return f"""
+    text_hits AS (
+        SELECT {RETRIEVAL_COLUMNS},
+            {rank} AS similarity_score,
+            'text' AS source
+        FROM videos
+        WHERE {match}
+        {duration_filter_sql}
+        ORDER BY similarity_score DESC, view_count DESC NULLS LAST
+        LIMIT :text_limit
+    )"""
+
+
+def _vector_side(duration_filter_sql, from_index, storage, inline_ef_search):
+    """(CTE, statement prefix) of the vector side."""
+    if storage not in VECTOR_STORAGES:
+        raise ValueError(
+            f"Unknown VECTOR_STORAGE '{storage}'. "
+            f"Choose one of: {', '.join(VECTOR_STORAGES)}"
+        )
+    if from_index:
+        return _index_hits_cte(), ""
+    prefix = f"{EF_SEARCH_SQL};\n" if inline_ef_search else ""
+    return _vector_cte(duration_filter_sql, storage=storage), prefix
+
+
+def build_retrieval_sql(duration_filter_sql="", with_vector=True,
+                        fuzzy=TEXT_SEARCH_FUZZY, from_index=False,
+                        storage=VECTOR_STORAGE, inline_ef_search=True,
+                        with_text=True):
+    """
+    Build the combined retrieval statement.
+
+    With a query vector, a `SELECT set_config('hnsw.ef_search', ...)` is
+    sent in the same query string so the HNSW breadth applies to this
+    transaction without an extra round trip (unless `inline_ef_search` is
+    False). With `from_index`, the vector side is a lookup of neighbours
+    found by the in-process vector index. `with_text=False` leaves out the
+    lexical side (when it runs as a separate, concurrent statement).
+    """
+    ctes, selects = [], []
+    prefix = ""
+    if with_vector:
+        cte, prefix = _vector_side(duration_filter_sql, from_index, storage,
+                                   inline_ef_search)
+        ctes.append(cte)
+        selects.append("SELECT * FROM vector_hits")
+    if with_text:
+        ctes.append(_text_cte(duration_filter_sql, fuzzy=fuzzy))
+        selects.append("SELECT * FROM text_hits")
+    return f"{prefix}WITH{','.join(ctes)}\n" + "\nUNION ALL\n".join(selects)
+
+
+def _fused_score_sql(method):
+    if method == "rrf":
+        return """COALESCE(CAST(:vector_weight AS float8) / (:rrf_k + vector_rank), 0)
+            + COALESCE((1 - CAST(:vector_weight AS float8))
+                / (:rrf_k + lexical_rank), 0)"""
+    return """CAST(:vector_weight AS float8) * COALESCE(similarity, 0)
+            + (1 - CAST(:vector_weight AS float8)) * COALESCE(relevance, 0)"""
+
+
+def _ranking_sql(method, with_vector):
+    """CTEs fusing vector_hits and text_hits, and the final blended SELECT."""
+    if with_vector:
+        vector_ranked = """
+    vector_ranked AS (
+        SELECT youtube_id, similarity_score AS similarity,
+            row_number() OVER (ORDER BY similarity_score DESC) AS vector_rank
+        FROM vector_hits
+        WHERE similarity_score > :min_similarity
+    )"""
+        vector_supply = (
+            "(SELECT count(*) FROM vector_hits"
+            " WHERE similarity_score > :supply_min_similarity)"
+        )
+    else:
+        vector_ranked = """
+    vector_ranked AS (
+        SELECT NULL::text AS youtube_id, NULL::float8 AS similarity,
+            NULL::bigint AS vector_rank
+        WHERE false
+    )"""
+        vector_supply = "0"
+    # The fused score is min-max scaled to [0, 1] so it keeps its spread next
+    # to the prior (raw RRF scores differ only in the third decimal)
+    ctes = f"""{vector_ranked},
+    lexical_ranked AS (
+        SELECT youtube_id, similarity_score AS relevance,
+            row_number() OVER (
+                ORDER BY similarity_score DESC, view_count DESC NULLS LAST
+            ) AS lexical_rank
+        FROM text_hits
+    ),
+    fused AS (
+        SELECT youtube_id, vector_rank, lexical_rank,
+            {_fused_score_sql(method)} AS fused_score
+        FROM vector_ranked FULL JOIN lexical_ranked USING (youtube_id)
+    ),
+    scaled AS (
+        SELECT youtube_id, vector_rank, lexical_rank,
+            CASE WHEN max(fused_score) OVER () > min(fused_score) OVER ()
+                THEN (fused_score - min(fused_score) OVER ())
+                    / (max(fused_score) OVER () - min(fused_score) OVER ())
+                ELSE 1.0
+            END AS fused_score
+        FROM fused
+    )"""
+    select = f"""
+SELECT {RETRIEVAL_COLUMNS},
+    vector_rank,
+    lexical_rank,
+    (1 - CAST(:popularity_weight AS float8)) * fused_score
+        + CAST(:popularity_weight AS float8) * COALESCE(popularity_prior, 0) AS score,
+    {vector_supply} AS vector_supply,
+    (SELECT count(*) FROM text_hits) AS text_supply
+FROM scaled
+JOIN videos USING (youtube_id)
+ORDER BY score DESC, youtube_id
+LIMIT :top_n"""
+    return ctes, select
+
+
+def build_ranked_sql(duration_filter_sql="", with_vector=True,
+                     fuzzy=TEXT_SEARCH_FUZZY, from_index=False,
+                     storage=VECTOR_STORAGE, inline_ef_search=True,
+                     text_from_hits=False, method=FUSION_METHOD):
+    """
+    Build the ranking statement: the candidate pools of `build_retrieval_sql`,
+    fused by `method` and blended with videos.popularity_prior, best first
+    and cut at :top_n. With `text_from_hits`, the lexical side is read from
+    :text_ids / :text_scores (matches of an earlier statement) instead of
+    being searched again.
+    """
+    if method not in FUSION_METHODS:
+        raise ValueError(
+            f"Unknown FUSION_METHOD '{method}'. "
+            f"Choose one of: {', '.join(FUSION_METHODS)}"
+        )
+    ctes = []
+    prefix = ""
+    if with_vector:
+        cte, prefix = _vector_side(duration_filter_sql, from_index, storage,
+                                   inline_ef_search)
+        ctes.append(cte)
+    if text_from_hits:
+        ctes.append(_text_hits_cte())
+    else:
+        ctes.append(_text_cte(duration_filter_sql, fuzzy=fuzzy))
+    ranking_ctes, select = _ranking_sql(method, with_vector)
+    return f"{prefix}WITH{','.join(ctes)},{ranking_ctes}{select}"
+
+
+class SupplyCheck:
+    """
+    Supply decision shared by candidate and ranked results; subclasses
+    provide `semantic_supply(top_n)` and `text_supply`.
+    """
+
+    def needs_youtube(self, top_n, with_vector):
+        """True when the DB cannot fill top_n relevant results on its own."""
+        return self.supply_gap(top_n, with_vector) > 0
+
+    def supply_gap(self, top_n, with_vector):
+        """Share of the top_n results the DB cannot fill (0.0 - 1.0)."""
+        supply = self.semantic_supply(top_n) if with_vector else self.text_supply
+        return max(top_n - supply, 0) / top_n if top_n else 0.0
+
+
+class RetrievalResult(SupplyCheck):
+    """Candidate rows from one retrieval round trip, split by source."""
+
+    def __init__(self, vector_rows, text_rows):
+        # Rows are (youtube_id, title, description, thumbnail, duration,
+        # view_count, like_count, similarity_score), best first. similarity_score
+        # is cosine similarity for vector rows and text relevance for text rows.
+        self.vector_rows = vector_rows
+        self.text_rows = text_rows
+
+    @classmethod
+    def from_rows(cls, rows):
+        vector_rows, text_rows = [], []
+        for row in rows:
+            *values, source = tuple(row)
+            (vector_rows if source == "vector" else text_rows).append(tuple(values))
+        # UNION ALL does not promise to keep each branch's ORDER BY
+        vector_rows.sort(key=lambda r: r[7] if r[7] is not None else float("-inf"),
+                         reverse=True)
+        return cls(vector_rows, text_rows)
+
+    @property
+    def text_supply(self):
+        return len(self.text_rows)
+
+    def semantic_supply(self, top_n, min_similarity=SUPPLY_MIN_SIMILARITY):
+        """How many of the top_n nearest videos clear the relevance bar."""
+        return sum(
+            1 for row in self.vector_rows[:top_n]
+            if row[7] is not None and row[7] > min_similarity
+        )
+
+
+class RankedResult(SupplyCheck):
+    """
+    Final-ranked rows of one ranking statement, with the supply counts of
+    its pools.
+    """
+
+    def __init__(self, rows, vector_supply=0, text_supply=0):
+        # Rows are (youtube_id, title, description, thumbnail, duration,
+        # view_count, like_count, vector_rank, lexical_rank, score), best first.
+        # vector_supply counts neighbours above SUPPLY_MIN_SIMILARITY,
+        # text_supply keyword matches.
+        self.rows = rows
+        self.vector_supply = vector_supply
+        self.text_supply = text_supply
+
+    @classmethod
+    def from_rows(cls, rows):
+        rows = [tuple(row) for row in rows]
+        if not rows:
+            # Every supply candidate is also ranked, so both pools were empty
+            return cls([])
+        return cls([row[:10] for row in rows], vector_supply=rows[0][10],
+                   text_supply=rows[0][11])
+
+    def semantic_supply(self, top_n, min_similarity=SUPPLY_MIN_SIMILARITY):
+        """How many of the top_n nearest videos clear SUPPLY_MIN_SIMILARITY."""
+        return min(self.vector_supply, top_n)
+
+
+def _candidate_params(query, embedding_list, embedding_model, k, text_limit,
+                      ef_search, index_hits, storage, rerank_factor, with_text):
+    """Bind parameters of the candidate pools for these inputs."""
+    with_vector = embedding_list is not None or index_hits is not None
+    params = {}
+    if with_text:
+        params.update({
+            "query_text": query,
+            "text_limit": text_limit,
+        })
+    if index_hits is not None:
+        params.update({
+            "hit_ids": [video_id for video_id, _ in index_hits],
+            "hit_scores": [score for _, score in index_hits],
+        })
+    elif with_vector:
+        # The HNSW scan feeds LIMIT k directly, or LIMIT rerank_k for the
+        # binary shortlist
+        scan_limit = k * max(1, rerank_factor) if storage == "binary" else k
+        params.update({
+            "query_embedding": str(embedding_list),
+            "embedding_model": embedding_model,
+            "k": k,
+            "rerank_k": scan_limit,
+            # ef_search must be at least the scan limit for it to return that many rows
+            "ef_search": str(max(int(ef_search), scan_limit)),
+        })
+    return params
+
+
+def _retrieval_statement(query, embedding_list, embedding_model, duration_filter_sql,
+                         k, text_limit, ef_search, index_hits, storage,
+                         rerank_factor, inline_ef_search=True, with_text=True):
+    """Return (sql, params) of the retrieval plan for these inputs."""
+    with_vector = embedding_list is not None or index_hits is not None
+    if not (with_vector or with_text):
+        raise ValueError("A retrieval plan needs a vector or a text side")
+    params = _candidate_params(query, embedding_list, embedding_model, k, text_limit,
+                               ef_search, index_hits, storage, rerank_factor,
+                               with_text)
+    sql = build_retrieval_sql(duration_filter_sql, with_vector=with_vector,
+                              from_index=index_hits is not None, storage=storage,
+                              inline_ef_search=inline_ef_search, with_text=with_text)
+    return sql, params
+
+
+def _ranked_statement(query, embedding_list, embedding_model, duration_filter_sql,
+                      top_n, k, text_limit, ef_search, index_hits, text_hits,
+                      storage, rerank_factor, method, rrf_k, vector_weight,
+                      popularity_weight, inline_ef_search=True):
+    """Return (sql, params) of the ranking statement for these inputs."""
+    with_vector = embedding_list is not None or index_hits is not None
+    params = _candidate_params(query, embedding_list, embedding_model, k, text_limit,
+                               ef_search, index_hits, storage, rerank_factor,
+                               with_text=text_hits is None)
+    if text_hits is not None:
+        params.update({
+            "text_ids": [youtube_id for youtube_id, _ in text_hits],
+            "text_scores": [score for _, score in text_hits],
+        })
+    params.update({
+        "top_n": top_n,
+        "min_similarity": VECTOR_MIN_SIMILARITY,
+        "supply_min_similarity": SUPPLY_MIN_SIMILARITY,
+        "vector_weight": vector_weight,
+        "popularity_weight": popularity_weight,
+    })
+    if method == "rrf":
+        params["rrf_k"] = rrf_k
+    sql = build_ranked_sql(duration_filter_sql, with_vector=with_vector,
+                           from_index=index_hits is not None, storage=storage,
+                           inline_ef_search=inline_ef_search,
+                           text_from_hits=text_hits is not None, method=method)
+    return sql, params
+
+
+def retrieve_candidates(session, query, embedding_list, embedding_model,
+                        duration_filter_sql, k, text_limit, ef_search, index_hits=None,
+                        storage=VECTOR_STORAGE, rerank_factor=BINARY_RERANK_FACTOR):
+    """
+    Run the retrieval plan in one round trip and return a RetrievalResult.
+    Pass embedding_list=None for a keyword-only plan, or `index_hits`
+    ((videos.id, similarity) pairs from the vector index) to skip pgvector.
+    """
+    sql, params = _retrieval_statement(
+        query, embedding_list, embedding_model, duration_filter_sql, k, text_limit,
+        ef_search, index_hits, storage, rerank_factor,
+    )
+    return RetrievalResult.from_rows(session.execute(text(sql), params))
+
+
+async def aretrieve_candidates(session, query, embedding_list, embedding_model,
+                               duration_filter_sql, k, text_limit, ef_search,
+                               index_hits=None, storage=VECTOR_STORAGE,
+                               rerank_factor=BINARY_RERANK_FACTOR, with_text=True):
+    """
+    `retrieve_candidates` on an AsyncSession. `with_text=False` returns the
+    vector side only (text_rows is empty).
+    """
+    sql, params = _retrieval_statement(
+        query, embedding_list, embedding_model, duration_filter_sql, k, text_limit,
+        ef_search, index_hits, storage, rerank_factor, inline_ef_search=False,
+        with_text=with_text,
+    )
+    ef = params.pop("ef_search", None)
+    if ef is not None:
+        await session.execute(text(EF_SEARCH_SQL), {"ef_search": ef})
+    result = await session.execute(text(sql), params)
+    return RetrievalResult.from_rows(result.all())
+
+
+def rank_candidates(session, query, embedding_list, embedding_model,
+                    duration_filter_sql, top_n, k, text_limit, ef_search,
+                    index_hits=None, text_hits=None, storage=VECTOR_STORAGE,
+                    rerank_factor=BINARY_RERANK_FACTOR, method=FUSION_METHOD,
+                    rrf_k=RRF_K, vector_weight=FUSION_VECTOR_WEIGHT,
+                    popularity_weight=POPULARITY_WEIGHT):
+    """
+    Retrieve, fuse and rank in one round trip; returns a RankedResult with
+    the top_n videos in final order. Pass embedding_list=None for a
+    keyword-only ranking, `index_hits` ((videos.id, similarity) pairs from
+    the vector index) to skip pgvector, or `text_hits` ((youtube_id,
+    relevance) pairs) to reuse keyword matches found earlier.
+
+    - rrf: w / (rrf_k + rank) summed over the sides a video appears on
+    - weighted: w * similarity + (1 - w) * relevance
+    The fused score (scaled to [0, 1]) then makes up 1 - popularity_weight
+    of the final score, and videos.popularity_prior the rest.
+    """
+    sql, params = _ranked_statement(
+        query, embedding_list, embedding_model, duration_filter_sql, top_n, k,
+        text_limit, ef_search, index_hits, text_hits, storage, rerank_factor, method,
+        rrf_k, vector_weight, popularity_weight,
+    )
+    return RankedResult.from_rows(session.execute(text(sql), params))
+
+
+async def arank_candidates(session, query, embedding_list, embedding_model,
+                           duration_filter_sql, top_n, k, text_limit, ef_search,
+                           index_hits=None, text_hits=None, storage=VECTOR_STORAGE,
+                           rerank_factor=BINARY_RERANK_FACTOR, method=FUSION_METHOD,
+                           rrf_k=RRF_K, vector_weight=FUSION_VECTOR_WEIGHT,
+                           popularity_weight=POPULARITY_WEIGHT):
+    """`rank_candidates` on an AsyncSession."""
+    sql, params = _ranked_statement(
+        query, embedding_list, embedding_model, duration_filter_sql, top_n, k,
+        text_limit, ef_search, index_hits, text_hits, storage, rerank_factor, method,
+        rrf_k, vector_weight, popularity_weight, inline_ef_search=False,
+    )
+    ef = params.pop("ef_search", None)
+    if ef is not None:
+        await session.execute(text(EF_SEARCH_SQL), {"ef_search": ef})
+    result = await session.execute(text(sql), params)
+    return RankedResult.from_rows(result.all())
@@ -1,90 +1,174 @@
+import asyncio
 import time
 import os
 import logging
+from datetime import datetime, timedelta, timezone
 
-import requests
 import numpy as np
-from sqlalchemy import text
-
-from backend.database import get_session
-from backend.models import UserSearch, Video
-
-# Cloudflare Workers AI configuration
-CLOUDFLARE_ACCOUNT_ID = os.getenv("CLOUDFLARE_ACCOUNT_ID")
-CLOUDFLARE_API_TOKEN = os.getenv("CLOUDFLARE_API_TOKEN")
-CLOUDFLARE_BGE_URL = f"https://api.cloudflare.com/client/v4/accounts/{CLOUDFLARE_ACCOUNT_ID}/ai/run/@cf/baai/bge-small-en-v1.5"
+from sqlalchemy import cast, func, select
+from sqlalchemy.dialects.postgresql import REGCONFIG
+
+from backend.database import AsyncSessionLocal, get_session
+from backend.models import (
+    DURATION_BUCKETS,
+    TEXT_SEARCH_CONFIG,
+    UserSearch,
+    Video,
+    duration_bucket,
+)
+from scraper.corpus_state import corpus_state
+from scraper.embedding_batcher import (
+    EMBEDDING_COALESCE_ENABLED,
+    get_async_coalescer,
+    get_coalescer,
+)
+from scraper.embedding_cache import embedding_cache, normalize_query
+from scraper.embeddings import get_backend
+from scraper.fetch_guard import youtube_fetch_guard
+from scraper.ingestion_queue import (
+    INGESTION_QUEUE_ENABLED,
+    enqueue_refresh,
+    fetch_priority,
+)
+from scraper.retrieval import (
+    RETRIEVAL_CANDIDATE_K,
+    arank_candidates,
+    aretrieve_candidates,
+    duration_filter,
+    duration_filter_sql,
+    rank_candidates,
+)
+from scraper.stages import StageGraph, stage_timings
+from scraper.vector_index import VECTOR_INDEX_ENABLED, vector_index
+from scraper.youtube_quota import QUOTA_COSTS, youtube_quota
+
+# HNSW search breadth (pgvector default 40); higher = better recall, slower
+HNSW_EF_SEARCH = int(os.getenv("HNSW_EF_SEARCH", "40"))
+# Window of user_searches counted towards a query's refresh priority
+SEARCH_FREQUENCY_DAYS = 7
+
+def _embed_misses(backend, texts):
+    """
+    Embed cache misses with the active backend in one (coalesced) call.
+    Returns a list of numpy arrays aligned with `texts`, or None on failure.
+    """
+    started = time.time()
+    try:
+        if EMBEDDING_COALESCE_ENABLED:
+            # Share one upstream call with concurrent requests in the same window
+            return get_coalescer(backend).embed(texts)
+        return backend.embed(texts)
+    except Exception as e:
+        logging.error(f"{backend.name} embedding failed: {e}")
+        return None
+    finally:
+        embedding_cache.record_upstream(len(texts), time.time() - started)
 
 
 def create_query_embedding(query):
     """
-    Create query embedding using Cloudflare Workers AI bge-small-en-v1.5.
+    Create a query embedding with the configured embedding backend
+    (Cloudflare Workers AI bge-small-en-v1.5 by default).
     Returns 384-dimensional embedding for vector search.
+    Served from the embedding cache when the query was embedded recently.
     """
-    if not CLOUDFLARE_ACCOUNT_ID or not CLOUDFLARE_API_TOKEN:
-        logging.warning("Cloudflare credentials not set. Vector search disabled.")
+    backend = get_backend()
+    if not backend.available():
+        logging.warning(
+            f"Embedding backend '{backend.name}' not configured. "
+            "Vector search disabled."
+        )
         return None
-    
+
+    hits, misses = embedding_cache.get_many([query], backend.model_id)
+    if not misses:
+        return next(iter(hits.values()))
+
+    embeddings = _embed_misses(backend, misses)
+    if embeddings is None:
+        return None
+    embedding_cache.put_many({misses[0]: embeddings[0]}, backend.model_id)
+    return embeddings[0]
+
+
+async def _aembed_misses(backend, texts):
+    """Async `_embed_misses`: awaits the backend instead of blocking on it."""
+    started = time.time()
     try:
-        response = requests.post(
-            CLOUDFLARE_BGE_URL,
-            headers={"Authorization": f"Bearer {CLOUDFLARE_API_TOKEN}"},
-            json={"text": query},
-            timeout=10
-        )
-        
-        if response.status_code != 200:
-            logging.error(f"Cloudflare API error: {response.status_code} - {response.text}")
-            return None
-        
-        result = response.json()
-        
-        # Extract embedding from response
-        if result.get("success") and result.get("result", {}).get("data"):
-            embedding = result["result"]["data"][0]
-            return np.array(embedding, dtype=np.float32)
-        else:
-            logging.error(f"Unexpected Cloudflare response: {result}")
-            return None
-        
+        if EMBEDDING_COALESCE_ENABLED:
+            # Share one awaited upstream call with concurrent requests on this loop
+            return await get_async_coalescer(backend).embed(texts)
+        return await backend.aembed(texts)
     except Exception as e:
-        logging.error(f"Failed to create query embedding: {e}")
+        logging.error(f"{backend.name} embedding failed: {e}")
         return None
+    finally:
+        embedding_cache.record_upstream(len(texts), time.time() - started)
+
+
+async def acreate_query_embedding(query):
+    """
+    Async `create_query_embedding`. The cache's Postgres tier is sync, so
+    cache reads and writes run in a worker thread.
+    """
+    backend = get_backend()
+    if not backend.available():
+        logging.warning(
+            f"Embedding backend '{backend.name}' not configured. "
+            "Vector search disabled."
+        )
+        return None
+
+    hits, misses = await asyncio.to_thread(
+        embedding_cache.get_many, [query], backend.model_id
+    )
+    if not misses:
+        return next(iter(hits.values()))
+
+    embeddings = await _aembed_misses(backend, misses)
+    if embeddings is None:
+        return None
+    await asyncio.to_thread(
+        embedding_cache.put_many, {misses[0]: embeddings[0]}, backend.model_id
+    )
+    return embeddings[0]
 
 
 def create_query_embeddings(queries):
     """
-    Batch-embed multiple queries in a single Cloudflare API call.
+    Batch-embed multiple queries in a single backend call.
+    Cached queries are served locally; only the misses are sent upstream.
     Falls back to per-query calls on batch failure.
     Returns a list of numpy arrays (None entries filtered out).
     """
     if not queries:
         return []
-    if not CLOUDFLARE_ACCOUNT_ID or not CLOUDFLARE_API_TOKEN:
-        logging.warning("Cloudflare credentials not set. Vector search disabled.")
+    backend = get_backend()
+    if not backend.available():
+        logging.warning(
+            f"Embedding backend '{backend.name}' not configured. "
+            "Vector search disabled."
+        )
         return []
 
-    try:
-        response = requests.post(
-            CLOUDFLARE_BGE_URL,
-            headers={"Authorization": f"Bearer {CLOUDFLARE_API_TOKEN}"},
-            json={"text": queries},
-            timeout=30
-        )
-        if response.status_code == 200:
-            result = response.json()
-            if result.get("success") and result.get("result", {}).get("data"):
-                data = result["result"]["data"]
-                return [np.array(emb, dtype=np.float32) for emb in data if emb]
-    except Exception as e:
-        logging.warning(f"Batch embedding failed, falling back to per-query: {e}")
+    hits, misses = embedding_cache.get_many(queries, backend.model_id)
 
-    # Fallback: per-query calls
-    embeddings = []
-    for q in queries:
-        emb = create_query_embedding(q)
-        if emb is not None:
-            embeddings.append(emb)
-    return embeddings
+    if misses:
+        embeddings = _embed_misses(backend, misses)
+        if embeddings is not None:
+            fetched = dict(zip(misses, embeddings, strict=True))
+            embedding_cache.put_many(fetched, backend.model_id)
+            hits.update(fetched)
+        elif len(misses) > 1:
+            logging.warning("Batch embedding failed, falling back to per-query")
+            # Fallback: per-query calls (each one caches its own result)
+            for q in misses:
+                emb = create_query_embedding(q)
+                if emb is not None:
+                    hits[q] = emb
+
+    normalized = (normalize_query(q) for q in queries)
+    return [hits[q] for q in normalized if q in hits]
 
 
 def cosine_similarity(a, b):
@@ -94,25 +178,9 @@ def duration_in_range(duration_seconds, video_duration):
     """
     Check if duration falls within the specified range.
     """
-    if video_duration == "short":
-        return duration_seconds < 240  # < 4 minutes
-    elif video_duration == "medium":
-        return 240 <= duration_seconds < 1200  # 4-20 minutes
-    elif video_duration == "long":
-        return duration_seconds >= 1200  # >= 20 minutes
-    return True  # Default to True if no filter specified
-
-
-def _build_duration_orm_filter(video_duration):
-    """Build SQLAlchemy ORM filter conditions for duration."""
-    from sqlalchemy import and_
-    if video_duration == "short":
-        return Video.duration < 240
-    elif video_duration == "medium":
-        return and_(Video.duration >= 240, Video.duration < 1200)
-    elif video_duration == "long":
-        return Video.duration >= 1200
-    return None  # "any" or unrecognized — no filter
+    if video_duration not in DURATION_BUCKETS:
+        return True  # Default to True if no filter specified
+    return duration_bucket(duration_seconds) == video_duration
 
 
 def _get_local_session():
@@ -122,64 +190,27 @@ def _get_local_session():
     return session, gen
 
 
-def _escape_like(query):
-    """Escape SQL LIKE/ILIKE wildcard characters in user input."""
-    return query.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
-
-
-def _execute_text_search(session, query, duration_filter_sql, limit):
-    """Run a text-based ILIKE search and return the raw result rows."""
-    sql = f"""
-    SELECT
-        youtube_id,
-        title,
-        description,
-        thumbnail,
-        duration,
-        view_count,
-        like_count,
-        0.0 as similarity_score
-    FROM videos
-    WHERE (title ILIKE :query ESCAPE '\\' OR description ILIKE :query ESCAPE '\\')
-    {duration_filter_sql}
-    ORDER BY view_count DESC NULLS LAST, like_count DESC NULLS LAST
-    LIMIT :limit
-    """
-    return session.execute(
-        text(sql),
-        {"query": f"%{_escape_like(query)}%", "limit": limit}
-    )
-
-
-def _process_text_rows(rows, seen_ids, videos, base_score=None):
-    """Map raw text-search result rows to video dicts. Mutates seen_ids and videos in-place."""
-    for row in rows:
-        youtube_id, title, description, thumbnail, duration, view_count, like_count, _similarity = row
-        if youtube_id in seen_ids:
-            continue
-        view_count = view_count or 0
-        like_count = like_count or 0
-        
-        # If no base_score provided, use the old popularity-only logic
-        if base_score is not None:
-            score = base_score
-        else:
-            score = float(view_count + 2 * like_count) / 100000
-            
-        videos.append({
-            "video_id": youtube_id,
-            "title": title,
-            "description": description,
-            "thumbnail": thumbnail,
-            "channel": "YouTube",
-            "link": f"https://www.youtube.com/watch?v={youtube_id}",
-            "score": score,
-            "views": view_count,
-            "likes": like_count
-        })
-        seen_ids.add(youtube_id)
-
-def recommend(query, top_n=5, user_id="guest", video_duration="any", db_session=None):
+def _ranked_to_video(row):
+    """Map a ranked row to a video dict, keeping its component ranks."""
+    (youtube_id, title, description, thumbnail, duration, view_count, like_count,
+     vector_rank, lexical_rank, score) = row
+    return {
+        "video_id": youtube_id,
+        "title": title,
+        "description": description,
+        "thumbnail": thumbnail,
+        "channel": "YouTube",
+        "link": f"https://www.youtube.com/watch?v={youtube_id}",
+        "score": score,
+        "views": view_count or 0,
+        "likes": like_count or 0,
+        "vector_rank": vector_rank,
+        "lexical_rank": lexical_rank,
+    }
+
+
+def recommend(query, top_n=5, user_id="guest", video_duration="any", db_session=None,
+              ef_search=None, candidate_k=None):
     session = None
     session_gen = None
     
@@ -196,19 +227,15 @@ def recommend(query, top_n=5, user_id="guest", video_duration="any", db_session=
         # === STEP 1: Build duration filter + generate query embedding ===
         from scraper.youtube_scraper import fetch_and_store_videos
 
-        # Build duration filter
-        duration_filter_sql = ""
-        if video_duration == "short":
-            duration_filter_sql = "AND duration < 240"  # < 4 minutes
-        elif video_duration == "medium":
-            duration_filter_sql = "AND duration >= 240 AND duration < 1200"  # 4-20 minutes
-        elif video_duration == "long":
-            duration_filter_sql = "AND duration >= 1200"  # >= 20 minutes
+        # Build duration filter (routes vector search to the bucket's partial index)
+        bucket_filter_sql = duration_filter_sql(video_duration)
 
-        # Check globally if ANY video in the DB has an embedding
-        has_any_embeddings = session.query(Video).filter(
-            Video.embedding.isnot(None)
-        ).limit(1).first() is not None
+        # Check globally if ANY video in the DB has an embedding from the active model
+        # (cached corpus state; refreshed periodically and on ingestion/backfill writes)
+        embedding_model = get_backend().model_id
+        has_any_embeddings = corpus_state.has_embeddings(
+            embedding_model, session=session
+        )
 
         query_vector = None
         embedding_list = None
@@ -219,26 +246,41 @@ def recommend(query, top_n=5, user_id="guest", video_duration="any", db_session=
         else:
             print("⏭️ Skipping embedding — no embedded videos exist in DB")
 
-        # === STEP 2: Smart supply check — decide if YouTube fetch is needed ===
+        # === STEP 2: Retrieve, rank + supply check in one round trip ===
+        # The top-K nearest neighbours and top-K keyword matches are fused and
+        # blended with the popularity prior in a single statement, which
+        # returns the final top_n rows and the supply counts the YouTube
+        # decision is made from. K (recall vs latency) is independent of top_n.
+        k = max(candidate_k or RETRIEVAL_CANDIDATE_K, top_n)
+
+        def retrieve(use_index=True):
+            # The in-process vector index (if enabled and built for this model)
+            # answers the vector side locally; pgvector is the fallback
+            index_hits = None
+            if use_index and VECTOR_INDEX_ENABLED and query_vector is not None:
+                index_hits = vector_index.search(
+                    query_vector, k,
+                    video_duration=video_duration, model_id=embedding_model,
+                )
+            return rank_candidates(
+                session, query, embedding_list, embedding_model, bucket_filter_sql,
+                top_n=top_n, k=k, text_limit=k, ef_search=ef_search or HNSW_EF_SEARCH,
+                index_hits=index_hits,
+            )
+
+        candidates = retrieve()
         if query_vector is not None:
-            # Use vector similarity count: how many DB videos are semantically close?
-            count_sql = f"""
-                SELECT COUNT(*) FROM videos
-                WHERE embedding IS NOT NULL
-                AND 1 - (embedding <=> :qe) > 0.6
-                {duration_filter_sql}
-            """
-            semantic_count = session.execute(
-                text(count_sql), {"qe": str(embedding_list)}
-            ).scalar() or 0
-            print(f"📊 Found {semantic_count} semantically relevant videos in DB (similarity > 0.6)")
-            needs_youtube = semantic_count < top_n
+            print(
+                f"📊 Found {candidates.semantic_supply(top_n)} semantically relevant "
+                "videos in DB (similarity > 0.6)"
+            )
         else:
-            # Fallback: ILIKE text match count
-            db_videos, _ = check_query_in_db(query, video_duration=video_duration, db_session=session)
-            db_count = len(db_videos) if db_videos else 0
-            print(f"📊 Found {db_count} keyword-matching videos in DB (duration: {video_duration})")
-            needs_youtube = db_count < top_n
+            print(
+                f"📊 Found {candidates.text_supply} keyword-matching videos in DB "
+                f"(duration: {video_duration})"
+            )
+        with_vector = query_vector is not None
+        needs_youtube = candidates.needs_youtube(top_n, with_vector=with_vector)
 
         # === STEP 3: Fetch from YouTube if not enough ===
         if needs_youtube:
@@ -250,94 +292,24 @@ def recommend(query, top_n=5, user_id="guest", video_duration="any", db_session=
                     video_duration=video_duration,
                     db_session=session
                 )
+                # Also keeps the statistics refreshed on already-stored videos
+                session.commit()
                 if inserted > 0:
-                    session.commit()
                     print(f"✅ Added {inserted} new videos from YouTube")
+                    # Fresh videos are embedded at ingestion, so an empty corpus
+                    # may now be vector-searchable
+                    if query_vector is None and not has_any_embeddings:
+                        query_vector = create_query_embedding(query)
+                        if query_vector is not None:
+                            embedding_list = query_vector.tolist()
+                    # Re-run the plan so the new videos are candidates; they are
+                    # not in the vector index until its next refresh
+                    candidates = retrieve(use_index=False)
             except Exception as yt_error:
                 print(f"⚠️ YouTube fetch failed: {yt_error}")
 
-        # === STEP 4: Search and recommend from database ===
-        
-        # === STEP 4: Search and recommend from database ===
-        videos = []
-        seen_ids = set()
-
-        # If a fresh fetch was triggered, we PRIORITIZE text results (ILIKE)
-        # because the newly inserted videos don't have embeddings yet.
-        if needs_youtube:
-            print("🚀 Fresh Fetch Priority: Retrieving keyword-matched videos first...")
-            text_result = _execute_text_search(session, query, duration_filter_sql, top_n)
-            _process_text_rows(text_result, seen_ids, videos, base_score=0.7)
-
-        # Then, if we still need more videos, perform Vector Search (pgvector)
-        if query_vector is not None and len(videos) < top_n:
-            print(f"Using Vector Search (pgvector) for remaining {top_n - len(videos)} slots")
-            sql = f"""
-            SELECT
-                youtube_id,
-                title,
-                description,
-                thumbnail,
-                duration,
-                view_count,
-                like_count,
-                1 - (embedding <=> :query_embedding) as similarity_score
-            FROM videos
-            WHERE embedding IS NOT NULL
-            AND 1 - (embedding <=> :query_embedding) > 0.5
-            {duration_filter_sql}
-            ORDER BY embedding <=> :query_embedding ASC
-            LIMIT :limit
-            """
-            
-            result = session.execute(
-                text(sql),
-                {
-                    "query_embedding": str(embedding_list),
-                    "limit": top_n - len(videos)
-                }
-            )
-
-            for row in result:
-                youtube_id, title, description, thumbnail, duration, view_count, like_count, similarity = row
-                if youtube_id in seen_ids:
-                    continue
-                final_score = float(similarity) if similarity is not None else 0.0
-                videos.append({
-                    "video_id": youtube_id,
-                    "title": title,
-                    "description": description,
-                    "thumbnail": thumbnail,
-                    "channel": "YouTube",
-                    "link": f"https://www.youtube.com/watch?v={youtube_id}",
-                    "score": final_score,
-                    "views": view_count,
-                    "likes": like_count
-                })
-                seen_ids.add(youtube_id)
-
-        # Fallback: if we still don't have enough, or if query_vector was skipped
-        if len(videos) < top_n:
-            if query_vector is None:
-                print("Using Text Search (Initial Fallback - no embeddings DB-wide)")
-            else:
-                print(f"⚠️ Search still under-quota ({len(videos)}/{top_n}). Filling with text hunt...")
-            
-            fallback_result = _execute_text_search(session, query, duration_filter_sql, top_n)
-            # Use 0.7 base score if we have a vector goal, else use popularity ranking
-            text_base = 0.7 if query_vector is not None else None
-            _process_text_rows(fallback_result, seen_ids, videos, base_score=text_base)
-
-        # Blend quality signals into vector search scores:
-        # 70% semantic relevance + 30% normalized popularity (views + likes)
-        if videos and query_vector is not None:
-            max_views = max((v["views"] or 1) for v in videos)
-            max_likes = max((v["likes"] or 1) for v in videos)
-            for v in videos:
-                views_norm = (v["views"] or 0) / max_views
-                likes_norm = (v["likes"] or 0) / max_likes
-                popularity = 0.5 * views_norm + 0.5 * likes_norm
-                v["score"] = 0.7 * v["score"] + 0.3 * popularity
+        # === STEP 4: The rows are already in final order ===
+        results = [_ranked_to_video(row) for row in candidates.rows]
 
         # Only close if we created it
         if session_gen:
@@ -346,7 +318,7 @@ def recommend(query, top_n=5, user_id="guest", video_duration="any", db_session=
         elapsed_time = time.time() - start_time
         print(f"Search completed in {elapsed_time:.2f} seconds")
         
-        return sorted(videos, key=lambda v: v["score"], reverse=True)[:top_n]
+        return results
         
     except Exception as e:
         print(f"[ERROR] Recommend failed: {e}")
@@ -355,6 +327,197 @@ def recommend(query, top_n=5, user_id="guest", video_duration="any", db_session=
             session_gen.close()
         return []
 
+
+async def arecommend(query, db_session, top_n=5, user_id="guest", video_duration="any",
+                     ef_search=None, candidate_k=None, session_factory=None,
+                     refresh_in_background=None):
+    """
+    Async `recommend` on an AsyncSession (the API request path), run as a
+    graph of concurrent stages:
+
+        corpus ──┐
+        embed ───┼─> rank ─> [enqueue | youtube -> rerank]
+        text ────┘
+
+    The corpus-state lookup, query embedding and lexical search start
+    together; the lexical search runs on its own session from
+    `session_factory` (default AsyncSessionLocal). The embedding is
+    cancelled if the corpus has nothing to compare it against. The rank
+    stage runs the vector side in the ranking statement and passes the
+    keyword matches in, so the database returns the final top_n rows.
+
+    When supply runs short and `refresh_in_background` is set (default
+    INGESTION_QUEUE_ENABLED), a refresh job is queued on the ingestion queue
+    and the stored candidates are ranked right away; otherwise the request
+    fetches from YouTube itself before ranking. Stage timings
+    are recorded in `stage_timings`.
+    """
+    session = db_session
+    session_factory = session_factory or AsyncSessionLocal
+    if refresh_in_background is None:
+        refresh_in_background = INGESTION_QUEUE_ENABLED
+    graph = StageGraph()
+    results = None
+    try:
+        print(f"Searching for: '{query}' (duration: {video_duration})")
+
+        from scraper.youtube_scraper import afetch_and_store_videos
+
+        bucket_filter_sql = duration_filter_sql(video_duration)
+        embedding_model = get_backend().model_id
+        k = max(candidate_k or RETRIEVAL_CANDIDATE_K, top_n)
+        ef = ef_search or HNSW_EF_SEARCH
+
+        async def corpus_stage():
+            # Cached corpus state; a refresh uses its own sync session
+            return await asyncio.to_thread(corpus_state.has_embeddings, embedding_model)
+
+        async def embed_stage():
+            return await acreate_query_embedding(query)
+
+        async def text_stage():
+            async with session_factory() as text_session:
+                return await aretrieve_candidates(
+                    text_session, query, None, embedding_model, bucket_filter_sql,
+                    k=k, text_limit=k, ef_search=ef,
+                )
+
+        async def rank_stage(query_vector, text_hits):
+            # The in-process vector index (if enabled and built for this model)
+            # answers locally; pgvector is the fallback
+            index_hits = None
+            if query_vector is not None and VECTOR_INDEX_ENABLED:
+                index_hits = vector_index.search(
+                    query_vector, k,
+                    video_duration=video_duration, model_id=embedding_model,
+                )
+            embedding_list = (
+                query_vector.tolist() if query_vector is not None else None
+            )
+            return await arank_candidates(
+                session, query, embedding_list, embedding_model, bucket_filter_sql,
+                top_n=top_n, k=k, text_limit=k, ef_search=ef, index_hits=index_hits,
+                text_hits=[(row[0], row[7]) for row in text_hits.text_rows],
+            )
+
+        graph.start("corpus", corpus_stage)
+        graph.start("embed", embed_stage)
+        graph.start("text", text_stage)
+
+        has_any_embeddings = await graph.result("corpus")
+        query_vector = None
+        if has_any_embeddings:
+            query_vector = await graph.result("embed")
+        else:
+            print("⏭️ Skipping embedding — no embedded videos exist in DB")
+            graph.cancel("embed")
+
+        # Supply decision: vector neighbours when we have a query vector,
+        # otherwise keyword matches
+        text_hits = await graph.result("text")
+        candidates = await graph.start(
+            "rank", lambda: rank_stage(query_vector, text_hits)
+        )
+        with_vector = query_vector is not None
+        needs_youtube = candidates.needs_youtube(top_n, with_vector=with_vector)
+
+        suppressed = (
+            needs_youtube and youtube_fetch_guard.suppressed(query, video_duration)
+        )
+        if suppressed:
+            # Fetched recently, or YouTube had nothing usable for it
+            print(
+                "⏭️ Not enough relevant videos in DB; "
+                f"YouTube fetch skipped ({suppressed})"
+            )
+        elif needs_youtube and not await asyncio.to_thread(
+                youtube_quota.available, QUOTA_COSTS["search"]):
+            print(
+                "⚠️ Not enough relevant videos in DB; YouTube quota budget spent, "
+                "serving DB-only results"
+            )
+        elif needs_youtube and refresh_in_background:
+
+            async def enqueue_stage():
+                # Rank the job by how often the query is searched and how much
+                # of the page the DB cannot fill
+                searches = await asearch_count(query, session)
+                gap = candidates.supply_gap(top_n, with_vector=query_vector is not None)
+                return await enqueue_refresh(
+                    query, video_duration, max_results=20,
+                    priority=fetch_priority(searches, gap),
+                )
+
+            try:
+                job = await graph.start("enqueue", enqueue_stage)
+                print(
+                    "⚠️ Not enough relevant videos in DB, "
+                    f"queued refresh job {job['id']}"
+                )
+            except Exception as e:
+                print(f"⚠️ Queueing a YouTube refresh failed: {e}")
+        elif needs_youtube:
+            print("⚠️ Not enough relevant videos in DB, fetching from YouTube...")
+
+            async def youtube_stage():
+                return await afetch_and_store_videos(
+                    query, max_results=20, video_duration=video_duration,
+                    db_session=session,
+                )
+
+            try:
+                inserted = await graph.start("youtube", youtube_stage)
+                # Also keeps the statistics refreshed on already-stored videos
+                await session.commit()
+                if inserted > 0:
+                    print(f"✅ Added {inserted} new videos from YouTube")
+                    # Fresh videos are embedded at ingestion, so an empty corpus
+                    # may now be vector-searchable
+                    if query_vector is None and not has_any_embeddings:
+                        query_vector = await acreate_query_embedding(query)
+                # Rank both sides again in one statement so new videos are
+                # candidates (they are not in the vector index yet)
+                embedding_list = (
+                    query_vector.tolist() if query_vector is not None else None
+                )
+                candidates = await graph.start("rerank", lambda: arank_candidates(
+                    session, query, embedding_list, embedding_model, bucket_filter_sql,
+                    top_n=top_n, k=k, text_limit=k, ef_search=ef,
+                ))
+            except Exception as yt_error:
+                print(f"⚠️ YouTube fetch failed: {yt_error}")
+                await session.rollback()
+
+        results = [_ranked_to_video(row) for row in candidates.rows]
+        return results
+
+    except Exception as e:
+        print(f"[ERROR] Recommend failed: {e}")
+        return []
+    finally:
+        await graph.aclose()
+        stage_timings.record(graph)
+        if results is not None:
+            stages = ", ".join(
+                f"{name} {1000 * sec:.0f}ms"
+                for name, sec in graph.durations.items() if name != "total"
+            )
+            print(
+                f"Search completed in {graph.durations['total']:.2f} seconds "
+                f"({stages})"
+            )
+
+
+def _search_user_uuid(user_id):
+    """UUID of a logged-in user, or None for guests and malformed ids."""
+    from uuid import UUID
+    if isinstance(user_id, str) and user_id != "guest":
+        try:
+            return UUID(user_id)
+        except ValueError:
+            return None  # Invalid UUID, skip logging
+    return None  # Guest user or invalid
+
 def log_search(query, user_id="guest", db_session=None):
     """Log user search query using SQLAlchemy ORM."""
     session = None
@@ -366,16 +529,7 @@ def log_search(query, user_id="guest", db_session=None):
         session, session_gen = _get_local_session()
 
     try:
-        # Convert string user_id to UUID if it's not already
-        from uuid import UUID
-        if isinstance(user_id, str) and user_id != "guest":
-            try:
-                user_uuid = UUID(user_id)
-            except ValueError:
-                user_uuid = None  # Invalid UUID, skip logging
-        else:
-            user_uuid = None  # Guest user or invalid
-
+        user_uuid = _search_user_uuid(user_id)
         if user_uuid:
             search_entry = UserSearch(user_id=user_uuid, query=query)
             session.add(search_entry)
@@ -389,6 +543,31 @@ def log_search(query, user_id="guest", db_session=None):
         if session_gen:
             session_gen.close()
 
+
+async def alog_search(query, db_session, user_id="guest"):
+    """Async `log_search` on an AsyncSession; commits its own entry."""
+    user_uuid = _search_user_uuid(user_id)
+    if not user_uuid:
+        return
+    try:
+        db_session.add(UserSearch(user_id=user_uuid, query=query))
+        await db_session.commit()
+    except Exception as e:
+        print(f"Failed to log search: {e}")
+        await db_session.rollback()
+
+
+async def asearch_count(query, db_session, days=SEARCH_FREQUENCY_DAYS):
+    """How often `query` was searched (case-insensitively) in the last `days` days."""
+    since = datetime.now(timezone.utc) - timedelta(days=days)
+    result = await db_session.execute(
+        select(func.count()).select_from(UserSearch).where(
+            func.lower(UserSearch.query) == normalize_query(query),
+            UserSearch.search_time >= since,
+        )
+    )
+    return result.scalar() or 0
+
 def get_user_profile(user_id, db_session=None):
     """Get user's search history and compute average embedding for personalization."""
     session = None
@@ -444,18 +623,17 @@ def check_query_in_db(query, video_duration="any", db_session=None):
         session, session_gen = _get_local_session()
 
     try:
-        # Base text filter (escape SQL wildcards in user input)
-        escaped = _escape_like(query)
-        pattern = f"%{escaped}%"
-        text_filter = Video.title.ilike(pattern, escape='\\') | Video.description.ilike(pattern, escape='\\')
-        q = session.query(Video).filter(text_filter)
+        # Full-text match on the generated search_vector (GIN index)
+        tsquery = func.websearch_to_tsquery(cast(TEXT_SEARCH_CONFIG, REGCONFIG), query)
+        q = session.query(Video).filter(Video.search_vector.op("@@")(tsquery))
 
         # Apply duration filter if specified
-        duration_filter = _build_duration_orm_filter(video_duration)
-        if duration_filter is not None:
-            q = q.filter(duration_filter)
+        bucket_filter = duration_filter(video_duration)
+        if bucket_filter is not None:
+            q = q.filter(bucket_filter)
 
-        videos = q.limit(20).all()
+        rank = func.ts_rank_cd(Video.search_vector, tsquery, 32)
+        videos = q.order_by(rank.desc()).limit(20).all()
 
         # Check if any of the matched videos have embeddings
         has_embeddings = any(v.embedding is not None for v in videos)
@@ -0,0 +1,108 @@
+"""
+Small asyncio stage graph for the `arecommend` pipeline.
+
+Each stage is a coroutine started as its own task, so independent stages
+(corpus-state lookup, query embedding, lexical retrieval) overlap and a
+request costs roughly its slowest stage instead of the sum of every stage.
+Stages that need another stage's result are started once the caller has
+awaited it. A stage whose result is no
+longer needed can be cancelled; closing the graph cancels whatever is still
+running.
+
+Per-stage wall times are aggregated process-wide in `stage_timings`
+(exposed under /api/metrics).
+"""
+
+import asyncio
+import threading
+import time
+from collections import deque
+
+
+class StageGraph:
+    """Named asyncio stages for one request."""
+
+    def __init__(self):
+        self._tasks = {}
+        self.durations = {}  # stage -> seconds from start to finish
+        self.cancelled = set()
+        self._started_at = time.perf_counter()
+
+    def start(self, name, stage):
+        """Run `stage()` as its own task and time it under `name`."""
+
+        async def run():
+            started = time.perf_counter()
+            try:
+                return await stage()
+            finally:
+                self.durations[name] = time.perf_counter() - started
+
+        self._tasks[name] = asyncio.create_task(run(), name=f"stage:{name}")
+        return self._tasks[name]
+
+    async def result(self, name):
+        return await self._tasks[name]
+
+    def cancel(self, name):
+        """Cancel a stage whose result is no longer needed."""
+        task = self._tasks.get(name)
+        if task is not None and not task.done():
+            task.cancel()
+            self.cancelled.add(name)
+
+    async def aclose(self):
+        """Cancel unfinished stages and wait for them to unwind."""
+        pending = [task for task in self._tasks.values() if not task.done()]
+        for task in pending:
+            task.cancel()
+        self.cancelled.update(
+            name for name, task in self._tasks.items() if task in pending
+        )
+        await asyncio.gather(*pending, return_exceptions=True)
+        self.durations["total"] = time.perf_counter() - self._started_at
+
+
+class StageTimings:
+    """Thread-safe per-stage latency aggregates across requests."""
+
+    def __init__(self, window=1024):
+        self._lock = threading.Lock()
+        self._samples = {}
+        self._cancelled = {}
+        self._window = window
+
+    def record(self, graph):
+        with self._lock:
+            for name, seconds in graph.durations.items():
+                if name in graph.cancelled:
+                    continue
+                samples = self._samples.setdefault(name, deque(maxlen=self._window))
+                samples.append(seconds)
+            for name in graph.cancelled:
+                self._cancelled[name] = self._cancelled.get(name, 0) + 1
+
+    def stats(self):
+        with self._lock:
+            samples = {name: sorted(values) for name, values in self._samples.items()}
+            cancelled = dict(self._cancelled)
+        stats = {}
+        for name in samples.keys() | cancelled.keys():
+            values = samples.get(name, [])
+            p95 = values[int(0.95 * (len(values) - 1))] if values else 0.0
+            stats[name] = {
+                "count": len(values),
+                "cancelled": cancelled.get(name, 0),
+                "ms_avg": 1000.0 * sum(values) / len(values) if values else 0.0,
+                "ms_p95": 1000.0 * p95,
+            }
+        return stats
+
+    def clear(self):
+        with self._lock:
+            self._samples.clear()
+            self._cancelled.clear()
+
+
+# Process-wide stage timings of `arecommend`
+stage_timings = StageTimings()
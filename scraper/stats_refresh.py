@@ -0,0 +1,265 @@
+"""
+Periodic refresh of video statistics (view_count, like_count).
+
+Popularity is part of the ranking score, but the counts are otherwise only
+written when a video is fetched. This job walks `videos` in keyset order
+(ORDER BY id), asks videos.list for up to 50 ids per call (1 quota unit
+each, whatever the number of ids) and writes the counts back with one bulk
+UPDATE per call.
+
+Videos with a user interaction in the last STATS_HOT_WINDOW_DAYS are hot and
+due every STATS_HOT_INTERVAL_HOURS; the others are due every
+STATS_COLD_INTERVAL_DAYS. A run refreshes the due hot videos first, then the
+due cold ones.
+
+Popularity is part of the ranking score, so once a batch is committed the
+cached recommendations its changed counts could reorder are invalidated.
+
+Progress lives in `videos.stats_refreshed_at`, so an interrupted run resumes
+where it stopped: refreshed rows are no longer due. Videos YouTube no longer
+returns (deleted or private) keep their last counts and are stamped too.
+
+Calls do not spend the quota headroom, and the job stops while fewer than
+STATS_REFRESH_QUOTA_RESERVE units would be left for searches.
+
+Usage:
+    python -m scraper.stats_refresh [--max-rows-per-sec 0] [--limit N]
+
+The same job can run inside the API process (STATS_REFRESH_ENABLED=true); see
+`stats_refresh_loop`.
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import text
+
+from backend.database import get_session
+from scraper.backfill import RateLimiter
+from scraper.result_cache import result_cache
+from scraper.video_store import statistics_counts
+from scraper.youtube_quota import QUOTA_COSTS, QuotaExhausted, youtube_quota
+from scraper.youtube_scraper import get_video_details
+
+STATS_REFRESH_ENABLED = os.getenv("STATS_REFRESH_ENABLED", "false").lower() == "true"
+# Seconds between in-app runs
+STATS_REFRESH_INTERVAL = float(os.getenv("STATS_REFRESH_INTERVAL", "3600"))
+# 0 = unlimited
+STATS_REFRESH_MAX_ROWS_PER_SEC = float(
+    os.getenv("STATS_REFRESH_MAX_ROWS_PER_SEC", "0")
+)
+STATS_REFRESH_QUOTA_RESERVE = int(os.getenv("STATS_REFRESH_QUOTA_RESERVE", "2000"))
+STATS_HOT_WINDOW_DAYS = float(os.getenv("STATS_HOT_WINDOW_DAYS", "7"))
+STATS_HOT_INTERVAL_HOURS = float(os.getenv("STATS_HOT_INTERVAL_HOURS", "24"))
+STATS_COLD_INTERVAL_DAYS = float(os.getenv("STATS_COLD_INTERVAL_DAYS", "14"))
+
+# videos.list accepts at most 50 ids per call
+STATS_BATCH_SIZE = 50
+
+STATISTICS_PART = "statistics"
+
+
+def _due_chunk(session, after_id, cutoff, limit, hot_since=None):
+    """
+    Next videos (id, youtube_id, title, description, duration, view_count,
+    like_count) after `after_id`, in id order, not refreshed since `cutoff`;
+    only videos interacted with since `hot_since` if given.
+    """
+    hot_filter = (
+        "AND v.id IN (SELECT video_id FROM user_interactions "
+        "WHERE interaction_time >= :hot_since)"
+        if hot_since is not None else ""
+    )
+    rows = session.execute(
+        text(f"""
+            SELECT v.id, v.youtube_id, v.title, v.description, v.duration,
+                   v.view_count, v.like_count
+            FROM videos AS v
+            WHERE v.id > :after_id
+            AND (v.stats_refreshed_at IS NULL OR v.stats_refreshed_at < :cutoff)
+            {hot_filter}
+            ORDER BY v.id
+            LIMIT :limit
+        """),
+        {"after_id": after_id, "cutoff": cutoff, "limit": limit,
+         "hot_since": hot_since},
+    )
+    return [tuple(row) for row in rows]
+
+
+def write_statistics(session, ids, counts, refreshed_at):
+    """
+    Bulk UPDATE the counts of `ids` (one (views, likes) pair or None per id;
+    None keeps the stored counts), stamp them and commit.
+    """
+    session.execute(
+        text("""
+            UPDATE videos AS v
+            SET view_count = COALESCE(d.view_count, v.view_count),
+                like_count = COALESCE(d.like_count, v.like_count),
+                stats_refreshed_at = :refreshed_at
+            FROM (
+                SELECT unnest(CAST(:ids AS integer[])) AS id,
+                       unnest(CAST(:views AS integer[])) AS view_count,
+                       unnest(CAST(:likes AS integer[])) AS like_count
+            ) AS d
+            WHERE v.id = d.id
+        """),
+        {
+            "ids": list(ids),
+            "views": [c[0] if c is not None else None for c in counts],
+            "likes": [c[1] if c is not None else None for c in counts],
+            "refreshed_at": refreshed_at,
+        },
+    )
+    session.commit()
+
+
+def refresh_chunk(session, rows, refreshed_at):
+    """
+    Fetch and write statistics for one chunk of `_due_chunk` rows, then drop
+    the cached results whose videos' counts changed. Returns the missing count.
+    """
+    items = get_video_details(
+        [row[1] for row in rows], part=STATISTICS_PART, use_headroom=False
+    )
+    by_youtube_id = {item["id"]: statistics_counts(item) for item in items}
+    counts = [by_youtube_id.get(row[1]) for row in rows]
+    write_statistics(session, [row[0] for row in rows], counts, refreshed_at)
+    # Committed: the new popularity priors can reorder cached recommendations
+    result_cache.invalidate_videos(
+        (f"{title} {description or ''}", duration)
+        for (_, _, title, description, duration, views, likes), count in zip(
+            rows, counts, strict=True
+        )
+        if count is not None and count != (views, likes)
+    )
+    return sum(1 for c in counts if c is None)
+
+
+def run_stats_refresh(max_rows_per_sec=STATS_REFRESH_MAX_ROWS_PER_SEC,
+                      quota_reserve=STATS_REFRESH_QUOTA_RESERVE, limit=None, now=None):
+    """
+    Refresh the statistics of every due video, hot ones first.
+    Returns {"rows", "hot", "calls", "missing", "seconds", "rows_per_sec",
+    "stopped"}; "stopped" is "done", "quota" or "limit".
+    """
+    now = now or datetime.now(timezone.utc)
+    passes = (
+        ("hot", now - timedelta(hours=STATS_HOT_INTERVAL_HOURS),
+         now - timedelta(days=STATS_HOT_WINDOW_DAYS)),
+        ("cold", now - timedelta(days=STATS_COLD_INTERVAL_DAYS), None),
+    )
+    limiter = RateLimiter(max_rows_per_sec)
+    gen = get_session()
+    session = next(gen)
+    started = time.time()
+    stats = {"rows": 0, "hot": 0, "calls": 0, "missing": 0, "stopped": "done"}
+
+    try:
+        for name, cutoff, hot_since in passes:
+            after_id = 0
+            while stats["stopped"] == "done":
+                if limit is not None and stats["rows"] >= limit:
+                    stats["stopped"] = "limit"
+                    break
+                chunk_size = STATS_BATCH_SIZE
+                if limit is not None:
+                    chunk_size = min(chunk_size, limit - stats["rows"])
+                rows = _due_chunk(session, after_id, cutoff, chunk_size, hot_since)
+                if not rows:
+                    break
+                # Leave the rest of the day's budget to searches
+                if not youtube_quota.available(QUOTA_COSTS["videos"] + quota_reserve):
+                    stats["stopped"] = "quota"
+                    break
+                limiter.acquire(len(rows))
+                try:
+                    stats["missing"] += refresh_chunk(session, rows, now)
+                except QuotaExhausted:
+                    stats["stopped"] = "quota"
+                    break
+                after_id = rows[-1][0]
+                stats["calls"] += 1
+                stats["rows"] += len(rows)
+                if name == "hot":
+                    stats["hot"] += len(rows)
+                elapsed = time.time() - started
+                logging.info(
+                    f"Stats refresh ({name}): {stats['rows']} videos "
+                    f"up to id {after_id} "
+                    f"({stats['rows'] / elapsed if elapsed else 0:.1f} rows/sec)"
+                )
+    finally:
+        gen.close()
+
+    elapsed = time.time() - started
+    stats["seconds"] = elapsed
+    stats["rows_per_sec"] = stats["rows"] / elapsed if elapsed else 0.0
+    return stats
+
+
+# --- In-app background task ---
+
+_run_lock = threading.Lock()
+
+
+def _run_exclusive():
+    # One refresh at a time per process
+    if not _run_lock.acquire(blocking=False):
+        return None
+    try:
+        return run_stats_refresh()
+    finally:
+        _run_lock.release()
+
+
+async def stats_refresh_loop(interval=STATS_REFRESH_INTERVAL):
+    """Run the statistics refresh every `interval` seconds."""
+    while True:
+        try:
+            stats = await asyncio.to_thread(_run_exclusive)
+            if stats and stats["rows"]:
+                logging.info(
+                    f"Stats refresh updated {stats['rows']} videos "
+                    f"({stats['hot']} hot) in {stats['calls']} calls "
+                    f"({stats['rows_per_sec']:.1f} rows/sec), "
+                    f"stopped: {stats['stopped']}"
+                )
+        except Exception as e:
+            logging.error(f"Stats refresh run failed: {e}")
+        await asyncio.sleep(interval)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Refresh view/like counts of stored videos.")
+    parser.add_argument("--max-rows-per-sec", type=float,
+                        default=STATS_REFRESH_MAX_ROWS_PER_SEC)
+    parser.add_argument("--quota-reserve", type=int,
+                        default=STATS_REFRESH_QUOTA_RESERVE,
+                        help="Quota units to leave for searches")
+    parser.add_argument("--limit", type=int, default=None, help="Stop after N videos")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    stats = run_stats_refresh(
+        max_rows_per_sec=args.max_rows_per_sec,
+        quota_reserve=args.quota_reserve,
+        limit=args.limit,
+    )
+    print(
+        f"Refreshed {stats['rows']} videos "
+        f"({stats['hot']} hot, {stats['missing']} gone) "
+        f"in {stats['calls']} calls, {stats['seconds']:.1f}s "
+        f"({stats['rows_per_sec']:.1f} rows/sec), stopped: {stats['stopped']}"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,536 @@
+"""
+In-process, memory-mapped vector index for nearest-neighbour search.
+
+The embeddings of the active model are exported from `videos` into a
+generation directory made of immutable segments:
+- meta.json       model, dtype, count, segment list and the id / created_at
+                  watermark
+- seg-*/          one directory per segment:
+    vectors.npy     (n, dim) L2-normalized float32 or float16 matrix
+    ids.npy         videos.id, parallel to the matrix rows
+    youtube_ids.npy videos.youtube_id
+    durations.npy   videos.duration (seconds)
+    hnsw.bin        optional hnswlib graph (VECTOR_INDEX_HNSW=true)
+
+Readers open the arrays with np.load(mmap_mode="r"), so every uvicorn
+worker shares one copy through the page cache. `CURRENT` names the live
+generation and is swapped atomically by the (single) writer; readers check
+it at most every VECTOR_INDEX_RELOAD_INTERVAL seconds and pick up a new
+generation or segment on their next search after that.
+
+Refreshes are incremental: rows above the id watermark are written as a
+new segment and meta.json is republished, leaving existing segments
+untouched. If the number of embedded rows in the DB no longer matches
+(backfilled or re-embedded old rows, deletions), or a generation has
+accumulated VECTOR_INDEX_MAX_SEGMENTS segments, the index is rebuilt from
+scratch into a single segment.
+
+Usage:
+    python -m scraper.vector_index [--rebuild]
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+
+import numpy as np
+from sqlalchemy import func, select
+
+from backend.database import get_session
+from backend.models import DURATION_BUCKETS, Video
+from scraper.embeddings import get_backend
+
+VECTOR_INDEX_ENABLED = os.getenv("VECTOR_INDEX_ENABLED", "false").lower() == "true"
+VECTOR_INDEX_DIR = os.getenv("VECTOR_INDEX_DIR", ".vector_index")
+VECTOR_INDEX_DTYPE = os.getenv("VECTOR_INDEX_DTYPE", "float32")  # float32 | float16
+VECTOR_INDEX_REFRESH_INTERVAL = float(
+    os.getenv("VECTOR_INDEX_REFRESH_INTERVAL", "60")
+)
+VECTOR_INDEX_RELOAD_INTERVAL = float(os.getenv("VECTOR_INDEX_RELOAD_INTERVAL", "1"))
+VECTOR_INDEX_MAX_SEGMENTS = int(os.getenv("VECTOR_INDEX_MAX_SEGMENTS", "16"))
+VECTOR_INDEX_HNSW = os.getenv("VECTOR_INDEX_HNSW", "false").lower() == "true"
+VECTOR_INDEX_HNSW_MIN_ROWS = int(os.getenv("VECTOR_INDEX_HNSW_MIN_ROWS", "50000"))
+VECTOR_INDEX_HNSW_EF = int(os.getenv("VECTOR_INDEX_HNSW_EF", "64"))
+
+# Rows read from Postgres per keyset chunk while exporting
+EXPORT_CHUNK_SIZE = 2000
+# Matrix rows scored per matmul block (bounds float16 -> float32 temporaries)
+SEARCH_BLOCK_ROWS = 65536
+
+
+def _normalize(matrix):
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def _duration_mask(durations, video_duration):
+    """Vectorized duration filter; None means every row is allowed."""
+    bounds = DURATION_BUCKETS.get(video_duration)
+    if bounds is None:
+        return None
+    low, high = bounds
+    mask = np.ones(len(durations), dtype=bool)
+    if low is not None:
+        mask &= durations >= low
+    if high is not None:
+        mask &= durations < high
+    return mask
+
+
+def _write_json(path, payload):
+    tmp = f"{path}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(payload, f)
+    os.replace(tmp, path)
+
+
+class _Segment:
+    """One immutable, memory-mapped slice of a generation's rows."""
+
+    def __init__(self, path):
+        self.path = path
+        self.vectors = np.load(os.path.join(path, "vectors.npy"), mmap_mode="r")
+        self.ids = np.load(os.path.join(path, "ids.npy"), mmap_mode="r")
+        self.youtube_ids = np.load(
+            os.path.join(path, "youtube_ids.npy"), mmap_mode="r"
+        )
+        self.durations = np.load(os.path.join(path, "durations.npy"), mmap_mode="r")
+        self.hnsw = None
+        hnsw_path = os.path.join(path, "hnsw.bin")
+        if os.path.exists(hnsw_path):
+            try:
+                import hnswlib
+            except ImportError:
+                logging.warning(
+                    "hnsw.bin present but hnswlib is not installed; using exact search"
+                )
+            else:
+                self.hnsw = hnswlib.Index(space="ip", dim=self.vectors.shape[1])
+                self.hnsw.load_index(hnsw_path, max_elements=len(self.ids))
+
+    def exact_search(self, queries, k, mask):
+        """Top-k by inner product for each query row, blockwise over the matrix."""
+        n = len(self.ids)
+        scores = np.empty((len(queries), n), dtype=np.float32)
+        for start in range(0, n, SEARCH_BLOCK_ROWS):
+            block = np.asarray(
+                self.vectors[start:start + SEARCH_BLOCK_ROWS], dtype=np.float32
+            )
+            scores[:, start:start + len(block)] = queries @ block.T
+        if mask is not None:
+            scores[:, ~mask] = -np.inf
+        k = min(k, n)
+        top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        results = []
+        for row, candidates in zip(scores, top, strict=True):
+            ordered = candidates[np.argsort(-row[candidates])]
+            results.append(
+                [(int(i), float(row[i])) for i in ordered if np.isfinite(row[i])]
+            )
+        return results
+
+    def hnsw_search(self, queries, k, mask):
+        self.hnsw.set_ef(max(VECTOR_INDEX_HNSW_EF, k))
+        allowed = None if mask is None else (lambda label: bool(mask[label]))
+        labels, distances = self.hnsw.knn_query(
+            queries, k=min(k, len(self.ids)), filter=allowed
+        )
+        return [
+            [
+                (int(i), 1.0 - float(d))
+                for i, d in zip(row_labels, row_distances, strict=True)
+            ]
+            for row_labels, row_distances in zip(labels, distances, strict=True)
+        ]
+
+    def search(self, queries, k, video_duration):
+        """Per-query (videos.id, score) hits within this segment."""
+        mask = _duration_mask(self.durations, video_duration)
+        if self.hnsw is not None:
+            hits = self.hnsw_search(queries, k, mask)
+        else:
+            hits = self.exact_search(queries, k, mask)
+        return [[(int(self.ids[i]), score) for i, score in row] for row in hits]
+
+
+class _Generation:
+    """One published generation: its meta.json and the segments it lists."""
+
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, "meta.json")) as f:
+            self.meta = json.load(f)
+        self.segments = [
+            _Segment(os.path.join(path, name)) for name in self.meta["segments"]
+        ]
+        self.hnsw = any(segment.hnsw is not None for segment in self.segments)
+        self.rows = sum(len(segment.ids) for segment in self.segments)
+
+    def search(self, queries, k, video_duration):
+        """Merge each segment's top-k into the generation-wide top-k."""
+        merged = [[] for _ in queries]
+        for segment in self.segments:
+            if not len(segment.ids):
+                continue
+            hits = segment.search(queries, k, video_duration)
+            for row, segment_row in zip(merged, hits, strict=True):
+                row.extend(segment_row)
+        return [sorted(row, key=lambda hit: -hit[1])[:k] for row in merged]
+
+
+class VectorIndex:
+    """
+    Memory-mapped nearest-neighbour index over video embeddings.
+    `search` / `search_many` return (videos.id, cosine similarity) pairs,
+    best first, or None when no usable (non-empty) generation is available.
+    """
+
+    def __init__(self, path=VECTOR_INDEX_DIR, dtype=VECTOR_INDEX_DTYPE,
+                 use_hnsw=VECTOR_INDEX_HNSW, hnsw_min_rows=VECTOR_INDEX_HNSW_MIN_ROWS,
+                 reload_interval=VECTOR_INDEX_RELOAD_INTERVAL,
+                 max_segments=VECTOR_INDEX_MAX_SEGMENTS, clock=time.monotonic):
+        self.path = path
+        self.dtype = np.dtype(dtype)
+        self.use_hnsw = use_hnsw
+        self.hnsw_min_rows = hnsw_min_rows
+        self.reload_interval = reload_interval
+        self.max_segments = max_segments
+        self._clock = clock
+        self._generation = None
+        self._current_stamp = None
+        self._checked_at = None
+        self._lock = threading.Lock()
+        self._counters = {"searches": 0, "reloads": 0, "refreshes": 0, "rebuilds": 0}
+
+    # --- Readers ---
+
+    def _current_file(self):
+        return os.path.join(self.path, "CURRENT")
+
+    def load(self):
+        """
+        (Re)open the live generation if CURRENT changed. CURRENT is checked
+        at most once per reload_interval. Returns True if one is loaded.
+        """
+        now = self._clock()
+        with self._lock:
+            if (self._checked_at is not None
+                    and now - self._checked_at < self.reload_interval):
+                return self._generation is not None
+            self._checked_at = now
+        try:
+            stat = os.stat(self._current_file())
+        except OSError:
+            return self._generation is not None
+        stamp = (stat.st_ino, stat.st_mtime_ns)
+        with self._lock:
+            if stamp != self._current_stamp:
+                with open(self._current_file()) as f:
+                    name = f.read().strip()
+                self._generation = _Generation(os.path.join(self.path, name))
+                self._current_stamp = stamp
+                self._counters["reloads"] += 1
+            return self._generation is not None
+
+    def search_many(self, queries, k, video_duration="any", model_id=None):
+        if not self.load():
+            return None
+        generation = self._generation
+        if model_id is not None and generation.meta["model"] != model_id:
+            return None
+        if not generation.rows:
+            # Nothing indexed yet: let the caller search pgvector instead of
+            # reading "no neighbours" as an answer
+            return None
+
+        queries = _normalize(np.atleast_2d(np.asarray(queries, dtype=np.float32)))
+        hits = generation.search(queries, k, video_duration)
+        with self._lock:
+            self._counters["searches"] += len(queries)
+        return hits
+
+    def search(self, query, k, video_duration="any", model_id=None):
+        hits = self.search_many(
+            [query], k, video_duration=video_duration, model_id=model_id
+        )
+        return None if hits is None else hits[0]
+
+    # --- Writer ---
+
+    def _read_current_meta(self):
+        try:
+            with open(self._current_file()) as f:
+                name = f.read().strip()
+            with open(os.path.join(self.path, name, "meta.json")) as f:
+                return name, json.load(f)
+        except (OSError, ValueError):
+            return None, None
+
+    def _embedded_count(self, session, model_id):
+        return session.execute(
+            select(func.count())
+            .select_from(Video)
+            .where(Video.embedding.isnot(None))
+            .where(Video.embedding_model == model_id)
+        ).scalar() or 0
+
+    def _export(self, session, model_id, after_id):
+        """
+        Yield (ids, youtube_ids, durations, vectors, created_at) chunks above
+        after_id.
+        """
+        while True:
+            rows = session.execute(
+                select(
+                    Video.id, Video.youtube_id, Video.duration,
+                    Video.embedding, Video.created_at,
+                )
+                .where(Video.id > after_id)
+                .where(Video.embedding.isnot(None))
+                .where(Video.embedding_model == model_id)
+                .order_by(Video.id)
+                .limit(EXPORT_CHUNK_SIZE)
+            ).all()
+            if not rows:
+                return
+            after_id = rows[-1][0]
+            created = [r[4] for r in rows if r[4] is not None]
+            yield (
+                np.array([r[0] for r in rows], dtype=np.int64),
+                np.array([r[1] for r in rows], dtype="U50"),
+                np.array([r[2] or 0 for r in rows], dtype=np.int32),
+                _normalize(np.array([r[3] for r in rows], dtype=np.float32)),
+                max(created) if created else None,
+            )
+
+    def _concat(self, chunks):
+        """Stack exported chunks into (ids, youtube_ids, durations, vectors)."""
+        if not chunks:
+            dimension = get_backend().dimension
+            return (
+                np.empty(0, dtype=np.int64),
+                np.empty(0, dtype="U50"),
+                np.empty(0, dtype=np.int32),
+                np.empty((0, dimension), dtype=np.float32),
+            )
+        return tuple(np.concatenate([c[i] for c in chunks]) for i in range(4))
+
+    def _write_segment(self, directory, arrays):
+        """Write one immutable segment under `directory`; returns its name."""
+        ids, youtube_ids, durations, vectors = arrays
+        name = f"seg-{time.time_ns()}"
+        tmp = os.path.join(directory, f".{name}.tmp")
+        os.makedirs(tmp)
+        np.save(os.path.join(tmp, "vectors.npy"), vectors.astype(self.dtype))
+        np.save(os.path.join(tmp, "ids.npy"), ids)
+        np.save(os.path.join(tmp, "youtube_ids.npy"), youtube_ids)
+        np.save(os.path.join(tmp, "durations.npy"), durations)
+        if self.use_hnsw and len(ids) >= self.hnsw_min_rows:
+            self._build_hnsw(tmp, vectors)
+        os.replace(tmp, os.path.join(directory, name))
+        return name
+
+    def _publish(self, name):
+        """Point CURRENT at generation `name` (a fresh inode, so readers reload)."""
+        current_tmp = f"{self._current_file()}.tmp"
+        with open(current_tmp, "w") as f:
+            f.write(name)
+        os.replace(current_tmp, self._current_file())
+
+    def _build_hnsw(self, directory, vectors):
+        try:
+            import hnswlib
+        except ImportError:
+            logging.warning(
+                "VECTOR_INDEX_HNSW is set but hnswlib is not installed; "
+                "exact search only"
+            )
+            return
+        index = hnswlib.Index(space="ip", dim=vectors.shape[1])
+        index.init_index(max_elements=len(vectors), ef_construction=200, M=16)
+        index.add_items(vectors.astype(np.float32), np.arange(len(vectors)))
+        index.save_index(os.path.join(directory, "hnsw.bin"))
+
+    def _prune(self, keep):
+        # Keep the previous generation too: readers may still be mid-reload
+        generations = sorted(
+            d for d in os.listdir(self.path)
+            if d.startswith("gen-") and os.path.isdir(os.path.join(self.path, d))
+        )
+        for name in generations[:-2]:
+            if name != keep:
+                shutil.rmtree(os.path.join(self.path, name), ignore_errors=True)
+
+    def _can_append(self, meta, model_id):
+        return (
+            meta is not None
+            and "segments" in meta
+            and meta["model"] == model_id
+            and meta["dtype"] == self.dtype.name
+            and len(meta["segments"]) < self.max_segments
+        )
+
+    def _append(self, session, model_id, current, meta):
+        """
+        Write the rows above the watermark as a new segment of the live
+        generation. Returns None when rows below the watermark changed and
+        the generation has to be rebuilt instead.
+        """
+        expected = self._embedded_count(session, model_id)
+        chunks = list(self._export(session, model_id, meta["max_id"]))
+        added = sum(len(c[0]) for c in chunks)
+        if meta["count"] + added != expected:
+            # Rows below the watermark changed (backfill, re-embedding, deletes)
+            logging.info(
+                f"Vector index out of sync ({meta['count']} + {added} != "
+                f"{expected}); rebuilding"
+            )
+            return None
+        if not added:
+            return {"mode": "unchanged", "added": 0, "count": meta["count"]}
+
+        directory = os.path.join(self.path, current)
+        arrays = self._concat(chunks)
+        segment = self._write_segment(directory, arrays)
+        created = [c[4] for c in chunks if c[4] is not None]
+        meta = {
+            **meta,
+            "segments": [*meta["segments"], segment],
+            "count": meta["count"] + added,
+            "max_id": int(arrays[0].max()),
+            "max_created_at": (
+                max(created).isoformat() if created else meta["max_created_at"]
+            ),
+            "built_at": time.time(),
+        }
+        _write_json(os.path.join(directory, "meta.json"), meta)
+        self._publish(current)
+        with self._lock:
+            self._counters["refreshes"] += 1
+        return {"mode": "incremental", "added": added, "count": meta["count"]}
+
+    def _rebuild(self, session, model_id):
+        """Export every embedded row into a new single-segment generation."""
+        chunks = list(self._export(session, model_id, 0))
+        arrays = self._concat(chunks)
+        ids, vectors = arrays[0], arrays[3]
+        name = f"gen-{time.time_ns()}"
+        tmp = os.path.join(self.path, f".{name}.tmp")
+        os.makedirs(tmp)
+        segment = self._write_segment(tmp, arrays)
+        created = [c[4] for c in chunks if c[4] is not None]
+        meta = {
+            "model": model_id,
+            "dtype": self.dtype.name,
+            "dimension": int(vectors.shape[1]) if vectors.ndim == 2 else 0,
+            "segments": [segment],
+            "count": int(len(ids)),
+            "max_id": int(ids.max()) if len(ids) else 0,
+            "max_created_at": max(created).isoformat() if created else None,
+            "built_at": time.time(),
+        }
+        _write_json(os.path.join(tmp, "meta.json"), meta)
+        os.replace(tmp, os.path.join(self.path, name))
+        self._publish(name)
+        self._prune(keep=name)
+        with self._lock:
+            self._counters["rebuilds"] += 1
+        return {"mode": "rebuild", "added": len(ids), "count": meta["count"]}
+
+    def refresh(self, session=None, full=False, model_id=None):
+        """
+        Bring the index up to date with `videos` and publish a new generation
+        or segment if anything changed. Returns {"mode", "added", "count"}.
+        """
+        model_id = model_id or get_backend().model_id
+        os.makedirs(self.path, exist_ok=True)
+        session_gen = None
+        if session is None:
+            session_gen = get_session()
+            session = next(session_gen)
+        try:
+            current, meta = self._read_current_meta()
+            if not full and self._can_append(meta, model_id):
+                result = self._append(session, model_id, current, meta)
+                if result is not None:
+                    return result
+            # No appendable generation, a forced rebuild, or an append that
+            # found older rows changed: one full rebuild, never a second append
+            return self._rebuild(session, model_id)
+        finally:
+            if session_gen:
+                session_gen.close()
+
+    def stats(self):
+        generation = self._generation
+        meta = generation.meta if generation is not None else {}
+        with self._lock:
+            counters = dict(self._counters)
+        return {
+            "enabled": VECTOR_INDEX_ENABLED,
+            "loaded": generation is not None,
+            "hnsw": generation is not None and generation.hnsw,
+            "segments": len(meta.get("segments", [])),
+            **{
+                key: meta.get(key)
+                for key in ("model", "dtype", "count", "max_id", "built_at")
+            },
+            **counters,
+        }
+
+
+# Process-wide index shared by recommend and the refresh task
+vector_index = VectorIndex()
+
+
+def _refresh_if_writer():
+    """Refresh under an exclusive file lock so only one worker writes."""
+    import fcntl
+
+    os.makedirs(vector_index.path, exist_ok=True)
+    with open(os.path.join(vector_index.path, ".lock"), "w") as lock_file:
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            return None  # another worker is refreshing
+        return vector_index.refresh()
+
+
+async def vector_index_loop(interval=VECTOR_INDEX_REFRESH_INTERVAL):
+    """Refresh the index every `interval` seconds (in-app background task)."""
+    while True:
+        try:
+            stats = await asyncio.to_thread(_refresh_if_writer)
+            if stats and stats["mode"] != "unchanged":
+                logging.info(
+                    f"Vector index {stats['mode']}: +{stats['added']} "
+                    f"({stats['count']} rows)"
+                )
+        except Exception as e:
+            logging.error(f"Vector index refresh failed: {e}")
+        await asyncio.sleep(interval)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Build or refresh the in-process vector index."
+    )
+    parser.add_argument("--rebuild", action="store_true", help="Rebuild from scratch")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    stats = vector_index.refresh(full=args.rebuild)
+    print(
+        f"Vector index {stats['mode']}: +{stats['added']} rows, "
+        f"{stats['count']} total"
+    )
+
+
+if __name__ == "__main__":
+    main()
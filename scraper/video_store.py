@@ -0,0 +1,281 @@
+"""
+Bulk writes of YouTube `videos.list` items to the `videos` table.
+
+Items are normalized into column values by `video_rows`, then written with
+one INSERT ... ON CONFLICT (youtube_id) DO UPDATE per batch:
+
+- new videos are inserted with their embedding (the half-precision and
+  bit companions are derived in SQL from the same vector);
+- known videos only get their statistics (view_count, like_count) and
+  stats_refreshed_at refreshed, and rows whose statistics did not change
+  are not rewritten (that would churn the row and every index on it); the
+  statistics refresh job stamps those when it next reaches them.
+
+`upsert_videos` / `aupsert_videos` send the rows as a multi-row INSERT.
+`copy_videos` is the path for large imports: it streams the rows into a
+temporary staging table with COPY and merges them with the same upsert
+(psycopg2 engine only).
+
+All three return (inserted, updated) counts; the caller commits.
+`benchmarks/bulk_ingest.py` compares their throughput with the
+row-at-a-time `insert_video` loop.
+"""
+
+import io
+import logging
+import os
+
+import isodate
+from pgvector.sqlalchemy import Vector
+from sqlalchemy import cast, func, literal_column, or_
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+from backend.models import EMBEDDING_DIM, Video
+
+# Rows per multi-row INSERT (asyncpg caps a statement at 32767 parameters)
+UPSERT_BATCH_SIZE = int(os.getenv("UPSERT_BATCH_SIZE", "500"))
+# Rows per COPY into the staging table
+COPY_BATCH_SIZE = int(os.getenv("COPY_BATCH_SIZE", "10000"))
+
+# Columns refreshed when a known video is ingested again
+STATS_COLUMNS = ("view_count", "like_count")
+
+# `videos.view_count` / `like_count` are 32-bit; the most viewed videos exceed that
+MAX_COUNT = 2**31 - 1
+
+# Column values written by COPY, in staging-table order
+COPY_COLUMNS = (
+    "youtube_id", "title", "description", "thumbnail", "duration", "category",
+    "upload_date", "view_count", "like_count", "embedding", "embedding_model",
+)
+
+STAGING_TABLE = "videos_staging"
+
+CREATE_STAGING_SQL = f"""
+    CREATE TEMP TABLE IF NOT EXISTS {STAGING_TABLE} (
+        youtube_id text, title text, description text, thumbnail text,
+        duration integer, category text, upload_date text,
+        view_count integer, like_count integer,
+        embedding text, embedding_model text
+    ) ON COMMIT DELETE ROWS
+"""
+
+MERGE_STAGING_SQL = f"""
+    WITH upserted AS (
+        INSERT INTO videos (
+            youtube_id, title, description, thumbnail, duration, category,
+            upload_date, view_count, like_count,
+            embedding, embedding_half, embedding_bit, embedding_model,
+            created_at, stats_refreshed_at
+        )
+        SELECT
+            youtube_id, title, description, thumbnail, duration, category,
+            upload_date, view_count, like_count,
+            CAST(embedding AS vector),
+            CAST(CAST(embedding AS vector) AS halfvec),
+            binary_quantize(CAST(embedding AS vector)),
+            embedding_model, now(), now()
+        FROM {STAGING_TABLE}
+        ON CONFLICT (youtube_id) DO UPDATE
+        SET view_count = EXCLUDED.view_count, like_count = EXCLUDED.like_count,
+            stats_refreshed_at = EXCLUDED.stats_refreshed_at
+        WHERE (videos.view_count, videos.like_count)
+            IS DISTINCT FROM (EXCLUDED.view_count, EXCLUDED.like_count)
+        -- xmax is 0 only on a freshly inserted row version
+        RETURNING (xmax = 0) AS inserted
+    )
+    SELECT count(*) FILTER (WHERE inserted), count(*) FILTER (WHERE NOT inserted)
+    FROM upserted
+"""
+
+
+def parse_duration(video):
+    """Duration of a `videos.list` item in seconds (0 if missing or malformed)."""
+    try:
+        duration = isodate.parse_duration(video['contentDetails']['duration'])
+        return int(duration.total_seconds())
+    except Exception:
+        return 0
+
+
+def _count(statistics, name):
+    try:
+        return min(int(statistics.get(name, 0)), MAX_COUNT)
+    except (TypeError, ValueError):
+        return 0
+
+
+def statistics_counts(video):
+    """(view_count, like_count) of a `videos.list` item, clamped to the column range."""
+    statistics = video.get('statistics', {})
+    return _count(statistics, 'viewCount'), _count(statistics, 'likeCount')
+
+
+def video_row(video, subject="Auto", embedding=None, embedding_model=None):
+    """
+    Column values of a `videos` row for one item, except the binary-quantized
+    embedding.
+    """
+    view_count, like_count = statistics_counts(video)
+    return {
+        "youtube_id": video['id'],
+        "title": video['snippet']['title'],
+        "description": video['snippet'].get('description'),
+        "thumbnail": video['snippet']['thumbnails'].get('high', {}).get('url', ''),
+        "duration": parse_duration(video),
+        "category": subject,
+        "upload_date": video['snippet'].get('publishedAt', ''),
+        "view_count": view_count,
+        "like_count": like_count,
+        "embedding": embedding.tolist() if embedding is not None else None,
+        "embedding_half": embedding.tolist() if embedding is not None else None,
+        "embedding_model": embedding_model if embedding is not None else None,
+    }
+
+
+def video_rows(videos, embeddings=None, embedding_model=None, subject="Auto"):
+    """
+    Normalize a batch of items. `embeddings` (aligned with `videos`, entries
+    may be None) is optional. Malformed items are skipped; a video listed
+    twice keeps its last occurrence.
+    """
+    if embeddings is None:
+        embeddings = [None] * len(videos)
+    rows = {}
+    for video, embedding in zip(videos, embeddings, strict=True):
+        try:
+            row = video_row(video, subject, embedding, embedding_model)
+        except (KeyError, TypeError, AttributeError) as e:
+            logging.warning(f"Skipping malformed video item {video.get('id')!r}: "
+                            f"missing {e}")
+            continue
+        rows[row["youtube_id"]] = row
+    return list(rows.values())
+
+
+def _dedupe(rows):
+    # ON CONFLICT DO UPDATE cannot touch the same row twice in one statement
+    return list({row["youtube_id"]: row for row in rows}.values())
+
+
+def _batches(rows, size):
+    for start in range(0, len(rows), size):
+        yield rows[start:start + size]
+
+
+def upsert_statement(rows):
+    """
+    INSERT ... ON CONFLICT (youtube_id) DO UPDATE of changed statistics,
+    RETURNING whether each row is new.
+    """
+    values = []
+    for row in rows:
+        row = dict(row)
+        row.setdefault("embedding_half", row.get("embedding"))
+        # Sign bits are derived in SQL from the same vector; asyncpg has no
+        # text fallback for the built-in bit type
+        row["embedding_bit"] = (
+            func.binary_quantize(cast(row["embedding"], Vector(EMBEDDING_DIM)))
+            if row.get("embedding") is not None else None
+        )
+        values.append(row)
+    stmt = pg_insert(Video).values(values)
+    return stmt.on_conflict_do_update(
+        index_elements=["youtube_id"],
+        set_={
+            **{column: stmt.excluded[column] for column in STATS_COLUMNS},
+            "stats_refreshed_at": stmt.excluded.stats_refreshed_at,
+        },
+        where=or_(*(
+            getattr(Video, column).is_distinct_from(stmt.excluded[column])
+            for column in STATS_COLUMNS
+        )),
+    ).returning(literal_column("xmax = 0").label("inserted"))
+
+
+def _tally(flags):
+    flags = list(flags)
+    inserted = sum(1 for flag in flags if flag)
+    return inserted, len(flags) - inserted
+
+
+def upsert_videos(session, rows, batch_size=UPSERT_BATCH_SIZE):
+    """Write normalized `rows` on a sync Session. Returns (inserted, updated)."""
+    inserted = updated = 0
+    for batch in _batches(_dedupe(rows), batch_size):
+        new, refreshed = _tally(session.execute(upsert_statement(batch)).scalars())
+        inserted += new
+        updated += refreshed
+    return inserted, updated
+
+
+async def aupsert_videos(session, rows, batch_size=UPSERT_BATCH_SIZE):
+    """Async `upsert_videos` on an AsyncSession."""
+    inserted = updated = 0
+    for batch in _batches(_dedupe(rows), batch_size):
+        result = await session.execute(upsert_statement(batch))
+        new, refreshed = _tally(result.scalars())
+        inserted += new
+        updated += refreshed
+    return inserted, updated
+
+
+def _copy_field(value):
+    """One field of COPY's text format."""
+    if value is None:
+        return "\\N"
+    if isinstance(value, list):
+        value = "[" + ",".join(repr(float(x)) for x in value) + "]"
+    return (
+        str(value)
+        .replace("\\", "\\\\")
+        .replace("\t", "\\t")
+        .replace("\n", "\\n")
+        .replace("\r", "\\r")
+    )
+
+
+def copy_buffer(rows):
+    """Rows as a COPY text-format buffer over COPY_COLUMNS."""
+    buffer = io.StringIO()
+    for row in rows:
+        buffer.write("\t".join(_copy_field(row.get(column)) for column in COPY_COLUMNS))
+        buffer.write("\n")
+    buffer.seek(0)
+    return buffer
+
+
+def copy_videos(session, rows, batch_size=COPY_BATCH_SIZE):
+    """
+    Write normalized `rows` (any iterable) through COPY into a temporary
+    staging table, merged into `videos` every `batch_size` rows. Needs a
+    psycopg2-backed Session. Returns (inserted, updated).
+    """
+    cursor = session.connection().connection.cursor()
+    cursor.execute(CREATE_STAGING_SQL)
+    inserted = updated = 0
+    batch = []
+
+    def flush():
+        nonlocal inserted, updated
+        cursor.execute(f"TRUNCATE {STAGING_TABLE}")
+        cursor.copy_expert(
+            f"COPY {STAGING_TABLE} ({', '.join(COPY_COLUMNS)}) FROM STDIN",
+            copy_buffer(_dedupe(batch)),
+        )
+        cursor.execute(MERGE_STAGING_SQL)
+        new, refreshed = cursor.fetchone()
+        inserted += new
+        updated += refreshed
+        batch.clear()
+
+    try:
+        for row in rows:
+            batch.append(row)
+            if len(batch) >= batch_size:
+                flush()
+        if batch:
+            flush()
+    finally:
+        cursor.close()
+    return inserted, updated
@@ -0,0 +1,206 @@
+"""
+YouTube Data API quota accounting.
+
+Every API call is charged to a ledger before it is sent: search.list costs
+100 units and videos.list 1. Units are recorded per quota day (the API resets
+at midnight Pacific time) in the `youtube_quota_usage` table, so every worker
+and restart sees the same total.
+
+A call is refused with QuotaExhausted once it would leave less than
+YOUTUBE_QUOTA_HEADROOM of YOUTUBE_DAILY_QUOTA. The headroom is kept for
+calls that complete work already paid for (the details lookup after a
+search), which may spend it. Callers then serve DB-only results.
+
+Workers check the ledger before charging, so concurrent workers can overshoot
+by a few calls; the headroom absorbs that.
+"""
+
+import logging
+import os
+import threading
+import time
+from datetime import datetime
+from zoneinfo import ZoneInfo
+
+from sqlalchemy.dialects.postgresql import insert
+
+from backend.database import get_session
+from backend.models import YouTubeQuotaUsage
+
+YOUTUBE_DAILY_QUOTA = int(os.getenv("YOUTUBE_DAILY_QUOTA", "10000"))
+YOUTUBE_QUOTA_HEADROOM = int(os.getenv("YOUTUBE_QUOTA_HEADROOM", "1000"))
+YOUTUBE_QUOTA_DB_ENABLED = (
+    os.getenv("YOUTUBE_QUOTA_DB_ENABLED", "true").lower() == "true"
+)
+# Seconds the in-process view of the ledger is trusted before re-reading it
+YOUTUBE_QUOTA_REFRESH = float(os.getenv("YOUTUBE_QUOTA_REFRESH", "30"))
+
+# Units per call of each endpoint
+QUOTA_COSTS = {"search": 100, "videos": 1}
+
+QUOTA_TIMEZONE = ZoneInfo("America/Los_Angeles")
+
+
+class QuotaExhausted(RuntimeError):
+    """The daily YouTube quota budget does not cover this call."""
+
+
+def quota_day():
+    """Current YouTube quota day."""
+    return datetime.now(QUOTA_TIMEZONE).date()
+
+
+class QuotaLedger:
+    """Thread-safe daily quota ledger, optionally persisted in Postgres."""
+
+    def __init__(self, budget=YOUTUBE_DAILY_QUOTA, headroom=YOUTUBE_QUOTA_HEADROOM,
+                 persistent=YOUTUBE_QUOTA_DB_ENABLED, refresh=YOUTUBE_QUOTA_REFRESH,
+                 today=quota_day, clock=time.monotonic):
+        self.budget = budget
+        self.headroom = headroom
+        self.persistent = persistent
+        self.refresh = refresh
+        self._today = today
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._day = None
+        self._usage = {}  # endpoint -> [units, calls] for self._day
+        self._synced_at = None
+        self._rejected = 0
+
+    # --- Postgres ---
+
+    def _load(self, session, day):
+        rows = session.query(
+            YouTubeQuotaUsage.endpoint, YouTubeQuotaUsage.units, YouTubeQuotaUsage.calls
+        ).filter(YouTubeQuotaUsage.day == day).all()
+        return {endpoint: [units, calls] for endpoint, units, calls in rows}
+
+    def _db_sync(self, day, endpoint=None, units=0, calls=0):
+        """
+        Add usage (if any) to the ledger row and return the day's totals, or
+        None on failure.
+        """
+        if not self.persistent:
+            return None
+        gen = get_session()
+        session = next(gen)
+        try:
+            if endpoint is not None:
+                stmt = insert(YouTubeQuotaUsage).values(
+                    day=day, endpoint=endpoint, units=units, calls=calls
+                )
+                stmt = stmt.on_conflict_do_update(
+                    index_elements=["day", "endpoint"],
+                    set_={
+                        "units": YouTubeQuotaUsage.units + stmt.excluded.units,
+                        "calls": YouTubeQuotaUsage.calls + stmt.excluded.calls,
+                    },
+                )
+                session.execute(stmt)
+                session.commit()
+            return self._load(session, day)
+        except Exception as e:
+            session.rollback()
+            logging.warning(f"YouTube quota ledger sync failed: {e}")
+            return None
+        finally:
+            gen.close()
+
+    # --- In-process view ---
+
+    def _roll(self):
+        """Start a fresh view when the quota day changes. Caller holds the lock."""
+        day = self._today()
+        if day != self._day:
+            self._day, self._usage, self._synced_at = day, {}, None
+        return day
+
+    def _refresh_if_stale(self):
+        with self._lock:
+            day = self._roll()
+            fresh = (self._synced_at is not None
+                     and self._clock() - self._synced_at < self.refresh)
+        if fresh or not self.persistent:
+            return
+        totals = self._db_sync(day)
+        with self._lock:
+            if totals is not None and day == self._day:
+                self._usage = totals
+            self._synced_at = self._clock()
+
+    def _spent(self):
+        return sum(units for units, _ in self._usage.values())
+
+    def remaining(self):
+        self._refresh_if_stale()
+        with self._lock:
+            return self.budget - self._spent()
+
+    def available(self, units, use_headroom=False):
+        """True if `units` can be spent now without dipping into the headroom."""
+        floor = 0 if use_headroom else self.headroom
+        return self.remaining() - units >= floor
+
+    def _add(self, day, endpoint, units, calls):
+        totals = self._db_sync(day, endpoint, units, calls)
+        with self._lock:
+            if day != self._day:
+                return
+            if totals is not None:
+                self._usage = totals
+                self._synced_at = self._clock()
+            else:
+                usage = self._usage.setdefault(endpoint, [0, 0])
+                usage[0] += units
+                usage[1] += calls
+
+    def charge(self, endpoint, use_headroom=False):
+        """
+        Record one call of `endpoint` before it is sent.
+        Raises QuotaExhausted (and records nothing) if the budget does not cover it.
+        """
+        units = QUOTA_COSTS[endpoint]
+        if not self.available(units, use_headroom=use_headroom):
+            with self._lock:
+                self._rejected += 1
+            raise QuotaExhausted(
+                f"YouTube quota budget exhausted ({self.remaining()} of "
+                f"{self.budget} units left, {self.headroom} reserved); "
+                f"{endpoint} needs {units}"
+            )
+        with self._lock:
+            day = self._roll()
+        self._add(day, endpoint, units, 1)
+
+    def mark_exhausted(self):
+        """
+        The API reported quotaExceeded: record the units this ledger did not
+        see (e.g. another consumer of the key) so the rest of the day is DB-only.
+        """
+        remaining = self.remaining()
+        if remaining > 0:
+            with self._lock:
+                day = self._roll()
+            self._add(day, "external", remaining, 0)
+
+    def stats(self):
+        remaining = self.remaining()
+        with self._lock:
+            return {
+                "day": self._day.isoformat() if self._day else None,
+                "budget": self.budget,
+                "headroom": self.headroom,
+                "spent": self._spent(),
+                "remaining": remaining,
+                "exhausted": remaining - QUOTA_COSTS["search"] < self.headroom,
+                "rejected": self._rejected,
+                "by_endpoint": {
+                    endpoint: {"units": units, "calls": calls}
+                    for endpoint, (units, calls) in self._usage.items()
+                },
+            }
+
+
+# Process-wide ledger used by scraper.youtube_scraper
+youtube_quota = QuotaLedger()
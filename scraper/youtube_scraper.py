@@ -1,17 +1,46 @@
+import asyncio
+import functools
 import os
 
 import isodate
-import requests
 from dotenv import load_dotenv
+from sqlalchemy import select
 
-from backend.database import get_session
+from backend.database import after_commit, get_session
 from backend.models import Video
+from scraper.backfill import request_backfill
+from scraper.corpus_state import corpus_state
+from scraper.embeddings import (
+    aembed_texts,
+    binary_quantize,
+    embed_texts,
+    get_backend,
+    video_embedding_text,
+)
+from scraper.fetch_guard import youtube_fetch_guard
+from scraper.http_client import get_async_client, get_client
+from scraper.result_cache import result_cache
+from scraper.video_store import (
+    aupsert_videos,
+    parse_duration,
+    upsert_videos,
+    video_row,
+    video_rows,
+)
+from scraper.youtube_quota import youtube_quota
 
 load_dotenv()
 API_KEY = os.getenv("YOUTUBE_API_KEY")
 
-def fetch_videos(query, max_results=10, video_duration="any", video_category_id="27"):
-    url = "https://www.googleapis.com/youtube/v3/search"
+SEARCH_URL = "https://www.googleapis.com/youtube/v3/search"
+VIDEOS_URL = "https://www.googleapis.com/youtube/v3/videos"
+
+# `error.errors[].reason` values of a YouTube response meaning the quota is spent
+QUOTA_ERROR_REASONS = {"quotaExceeded", "dailyLimitExceeded"}
+
+
+def _search_params(query, max_results, video_duration, video_category_id,
+                   page_token=None):
     params = {
         'part': 'snippet',
         'q': query,
@@ -21,32 +50,91 @@ def fetch_videos(query, max_results=10, video_duration="any", video_category_id=
         'videoDuration': video_duration,
         'videoCategoryId': video_category_id
     }
-    response = requests.get(url, params=params)
-    return response.json().get('items', [])
+    if page_token:
+        params['pageToken'] = page_token
+    return params
 
-def get_video_details(video_ids):
-    url = "https://www.googleapis.com/youtube/v3/videos"
-    params = {
-        'part': 'snippet,statistics,contentDetails',
+DETAILS_PART = 'snippet,statistics,contentDetails'
+
+def _details_params(video_ids, part=DETAILS_PART):
+    return {
+        'part': part,
         'id': ','.join(video_ids),
         'key': API_KEY
     }
-    response = requests.get(url, params=params)
-    return response.json().get('items', [])
 
-def insert_video(video, subject="Science", difficulty="Easy", db_session=None):
-    """Insert a video into the database. Uses provided session or creates new one."""
-    session = db_session if db_session else get_session()
+class YouTubeAPIError(RuntimeError):
+    """The YouTube API answered with an error payload (e.g. quota exceeded)."""
+
+
+def _payload(response):
+    # An error must not look like "no results" to the fetch guard's negative cache
+    data = response.json()
+    if "error" in data:
+        reasons = {e.get("reason") for e in data["error"].get("errors", [])}
+        if reasons & QUOTA_ERROR_REASONS:
+            # Usage the ledger did not see; stop fetching for the rest of the day
+            youtube_quota.mark_exhausted()
+        raise YouTubeAPIError(data["error"].get("message", "YouTube API error"))
+    return data
+
+def _items(response):
+    return _payload(response).get('items', [])
+
+# Each call is charged to the quota ledger before it is sent (QuotaExhausted
+# if the daily budget does not cover it). A details lookup completes a search
+# that was already paid for, so it may spend the reserved headroom.
+
+def fetch_videos(query, max_results=10, video_duration="any", video_category_id="27"):
+    youtube_quota.charge("search")
+    params = _search_params(query, max_results, video_duration, video_category_id)
+    response = get_client("youtube").get(SEARCH_URL, params=params)
+    return _items(response)
+
+def get_video_details(video_ids, part=DETAILS_PART, use_headroom=True):
+    """videos.list for up to 50 ids (1 unit whatever the `part`)."""
+    youtube_quota.charge("videos", use_headroom=use_headroom)
+    params = _details_params(video_ids, part)
+    response = get_client("youtube").get(VIDEOS_URL, params=params)
+    return _items(response)
+
+async def afetch_videos(query, max_results=10, video_duration="any",
+                        video_category_id="27"):
+    """Async `fetch_videos` over the async YouTube client."""
+    await asyncio.to_thread(youtube_quota.charge, "search")
+    params = _search_params(query, max_results, video_duration, video_category_id)
+    response = await get_async_client("youtube").get(SEARCH_URL, params=params)
+    return await asyncio.to_thread(_items, response)
+
+async def asearch_page(query, max_results=50, video_duration="any",
+                       video_category_id="27", page_token=None):
+    """One search.list page: (items, nextPageToken or None)."""
+    await asyncio.to_thread(youtube_quota.charge, "search")
+    params = _search_params(
+        query, max_results, video_duration, video_category_id, page_token
+    )
+    response = await get_async_client("youtube").get(SEARCH_URL, params=params)
+    data = await asyncio.to_thread(_payload, response)
+    return data.get('items', []), data.get('nextPageToken')
+
+async def aget_video_details(video_ids):
+    """Async `get_video_details` over the async YouTube client."""
+    await asyncio.to_thread(youtube_quota.charge, "videos", use_headroom=True)
+    params = _details_params(video_ids)
+    response = await get_async_client("youtube").get(VIDEOS_URL, params=params)
+    return await asyncio.to_thread(_items, response)
+
+def insert_video(video, subject="Science", difficulty="Easy", db_session=None,
+                 embedding=None, embedding_model=None):
+    """
+    Insert a video into the database. Uses provided session or creates new one.
+    Row-at-a-time; batches go through scraper.video_store.upsert_videos.
+    """
     owns_session = db_session is None
+    session_gen = get_session() if owns_session else None
+    session = next(session_gen) if owns_session else db_session
     
     try:
-        title = video['snippet']['title']
-        description = video['snippet']['description']
-        try:
-            duration_seconds = int(isodate.parse_duration(video['contentDetails']['duration']).total_seconds())
-        except:
-            duration_seconds = 0
-
         existing = session.query(Video).filter(Video.youtube_id == video['id']).first()
         if existing:
             if owns_session:
@@ -54,16 +142,8 @@ def insert_video(video, subject="Science", difficulty="Easy", db_session=None):
             return False
 
         video_record = Video(
-            youtube_id=video['id'],
-            title=title,
-            description=description,
-            thumbnail=video['snippet']['thumbnails'].get('high', {}).get('url', ''),
-            duration=duration_seconds,
-            category=subject,
-            upload_date=video['snippet'].get('publishedAt', ''),
-            view_count=int(video['statistics'].get('viewCount', 0)),
-            like_count=int(video['statistics'].get('likeCount', 0)),
-            embedding=None  # Disabled for Phase 1
+            **video_row(video, subject, embedding, embedding_model),
+            embedding_bit=binary_quantize(embedding) if embedding is not None else None,
         )
         session.add(video_record)
         if owns_session:
@@ -75,7 +155,7 @@ def insert_video(video, subject="Science", difficulty="Easy", db_session=None):
         return False
     finally:
         if owns_session:
-            session.close()
+            session_gen.close()
 
 
 def is_youtube_short(video):
@@ -97,13 +177,171 @@ def is_educational_video(video):
     return category_id == '27'
 
 
+def _exclude_existing(videos, db_session=None):
+    """Drop videos whose youtube_id is already stored (one query for the batch)."""
+    if not videos:
+        return videos
+    session_gen = get_session() if db_session is None else None
+    session = next(session_gen) if session_gen else db_session
+    try:
+        ids = [v['id'] for v in videos]
+        rows = session.query(Video.youtube_id).filter(Video.youtube_id.in_(ids))
+        existing = {row[0] for row in rows}
+    finally:
+        if session_gen:
+            session_gen.close()
+    return [v for v in videos if v['id'] not in existing]
+
+
+async def _aexclude_existing(videos, db_session):
+    """Async `_exclude_existing` on an AsyncSession."""
+    if not videos:
+        return videos
+    ids = [v['id'] for v in videos]
+    stmt = select(Video.youtube_id).where(Video.youtube_id.in_(ids))
+    result = await db_session.execute(stmt)
+    existing = set(result.scalars())
+    return [v for v in videos if v['id'] not in existing]
+
+
+def _embed_videos(videos):
+    """
+    Embed title + description of all videos in one batched call.
+    Returns (embeddings, model_id); on failure every embedding is None and
+    model_id is None so the rows are left for the backfill worker.
+    """
+    if not videos:
+        return [], None
+    backend = get_backend()
+    texts = [
+        video_embedding_text(v['snippet']['title'], v['snippet'].get('description'))
+        for v in videos
+    ]
+    try:
+        return embed_texts(texts, backend=backend), backend.model_id
+    except Exception as e:
+        print(f"⚠️ Embedding {len(videos)} new videos failed, queued for backfill: {e}")
+        return [None] * len(videos), None
+
+
+async def _aembed_videos(videos):
+    """Async `_embed_videos`."""
+    if not videos:
+        return [], None
+    backend = get_backend()
+    texts = [
+        video_embedding_text(v['snippet']['title'], v['snippet'].get('description'))
+        for v in videos
+    ]
+    try:
+        return await aembed_texts(texts, backend=backend), backend.model_id
+    except Exception as e:
+        print(f"⚠️ Embedding {len(videos)} new videos failed, queued for backfill: {e}")
+        return [None] * len(videos), None
+
+
+def _accept_videos(video_details):
+    """Drop YouTube Shorts and non-educational videos."""
+    accepted = []
+    for video in video_details:
+        # Skip YouTube Shorts
+        if is_youtube_short(video):
+            print(f"⏭️ Skipped Short: {video['snippet']['title'][:50]}")
+            continue
+
+        # Skip non-educational videos
+        if not is_educational_video(video):
+            print(f"⏭️ Skipped non-educational: {video['snippet']['title'][:50]}")
+            continue
+
+        accepted.append(video)
+    return accepted
+
+
+def _after_commit(embedding_model, query, videos, asynchronous=False):
+    """
+    Post-commit step of a batch that inserted `videos`. With `asynchronous`,
+    the result-cache invalidation is returned as a coroutine for the event
+    loop instead of running its Redis round trips inline.
+    """
+    corpus_state.invalidate()
+    if embedding_model is None:
+        # Rows were stored without vectors; let the backfill pick them up
+        request_backfill()
+    # Drop cached recommendations the new videos could change
+    texts = [
+        (
+            f"{v['snippet']['title']} {v['snippet'].get('description') or ''}",
+            parse_duration(v),
+        )
+        for v in videos
+    ]
+    if asynchronous:
+        return result_cache.ainvalidate_videos(texts, query=query)
+    result_cache.invalidate_videos(texts, query=query)
+
+
+def _commit_hook(db_session):
+    """Defer a fetch-guard memo to the commit of the caller's session, if any."""
+    if db_session is None:
+        return None
+    return functools.partial(after_commit, db_session)
+
+
+def _known_videos(accepted, new):
+    new_ids = {v['id'] for v in new}
+    return [v for v in accepted if v['id'] not in new_ids]
+
+
+def _upsert(rows, db_session, on_commit):
+    """
+    `upsert_videos` on `db_session` (the caller commits) or on an own, committed
+    session. `on_commit()` runs once rows inserted by the batch are committed.
+    """
+    if db_session is not None:
+        counts = upsert_videos(db_session, rows)
+        if counts[0]:
+            after_commit(db_session, on_commit)
+        return counts
+    session_gen = get_session()
+    session = next(session_gen)
+    try:
+        counts = upsert_videos(session, rows)
+        if counts[0]:
+            after_commit(session, on_commit)
+        session.commit()
+        return counts
+    except Exception:
+        session.rollback()
+        raise
+    finally:
+        session_gen.close()
+
+
 def fetch_and_store_videos(query, max_results=20, video_duration="any", db_session=None):
     """
     Fetch videos from YouTube API, filter out Shorts and non-educational,
-    then store valid videos in the database.
-    
+    embed the new ones in a single batch, then write the batch with one
+    upsert: new videos are inserted and known ones get their statistics
+    refreshed. If embedding fails the videos are still stored and left for
+    the backfill.
+
+    Concurrent calls for the same query share one fetch, and queries fetched
+    recently (or that yielded nothing usable) are skipped; see
+    scraper.fetch_guard. With `db_session`, a fetch only counts as recent
+    once the caller commits it.
+
     Returns the count of newly inserted videos.
     """
+    return youtube_fetch_guard.run(
+        query, video_duration,
+        lambda: _fetch_and_store(query, max_results, video_duration, db_session),
+        defer=_commit_hook(db_session),
+    )
+
+
+def _fetch_and_store(query, max_results, video_duration, db_session):
+    """Unguarded `fetch_and_store_videos`. Returns (inserted, accepted) counts."""
     print(f"🔍 Fetching videos from YouTube for: '{query}'")
     
     # Fetch from YouTube (already filters by category 27 and duration)
@@ -112,27 +350,88 @@ def fetch_and_store_videos(query, max_results=20, video_duration="any", db_sessi
     
     if not video_ids:
         print("⚠️ No video IDs returned from YouTube API.")
-        return 0
+        return 0, 0
     
     # Get full video details
-    video_details = get_video_details(video_ids)
-    inserted_count = 0
-    
-    for video in video_details:
-        # Skip YouTube Shorts
-        if is_youtube_short(video):
-            print(f"⏭️ Skipped Short: {video['snippet']['title'][:50]}")
-            continue
-        
-        # Skip non-educational videos
-        if not is_educational_video(video):
-            print(f"⏭️ Skipped non-educational: {video['snippet']['title'][:50]}")
-            continue
-        
-        # Insert valid video
-        if insert_video(video, subject="Auto", difficulty="Medium", db_session=db_session):
-            inserted_count += 1
-    
-    print(f"✅ Inserted {inserted_count} educational videos into database.")
-    return inserted_count
+    accepted = _accept_videos(get_video_details(video_ids))
+    # Only videos not stored yet are embedded
+    new = _exclude_existing(accepted, db_session)
+    embeddings, embedding_model = _embed_videos(new)
+
+    rows = (
+        video_rows(new, embeddings, embedding_model)
+        + video_rows(_known_videos(accepted, new))
+    )
+    inserted_count, updated_count = _upsert(
+        rows, db_session, functools.partial(_after_commit, embedding_model, query, new)
+    )
+
+    print(f"✅ Inserted {inserted_count} educational videos into database "
+          f"(statistics refreshed for {updated_count}).")
+    return inserted_count, len(accepted)
+
+
+async def afetch_and_store_videos(query, max_results=20, video_duration="any",
+                                  db_session=None):
+    """
+    Async `fetch_and_store_videos` on an AsyncSession: YouTube and embedding
+    calls are awaited, and the batch is written with the same upsert. The
+    caller commits. Guarded like `fetch_and_store_videos`.
+
+    Returns the count of newly inserted videos.
+    """
+    return await youtube_fetch_guard.arun(
+        query, video_duration,
+        lambda: _afetch_and_store(query, max_results, video_duration, db_session),
+        defer=_commit_hook(db_session),
+    )
+
+
+async def _afetch_and_store(query, max_results, video_duration, db_session):
+    """Unguarded `afetch_and_store_videos`. Returns (inserted, accepted) counts."""
+    print(f"🔍 Fetching videos from YouTube for: '{query}'")
+
+    yt_results = await afetch_videos(
+        query, max_results=max_results, video_duration=video_duration
+    )
+    video_ids = [
+        item["id"]["videoId"] for item in yt_results if "videoId" in item.get("id", {})
+    ]
+
+    if not video_ids:
+        print("⚠️ No video IDs returned from YouTube API.")
+        return 0, 0
+
+    inserted_count, updated_count, accepted_count = await astore_videos(
+        await aget_video_details(video_ids), query, db_session
+    )
+    print(f"✅ Inserted {inserted_count} educational videos into database "
+          f"(statistics refreshed for {updated_count}).")
+    return inserted_count, accepted_count
+
+
+async def astore_videos(videos, query, db_session):
+    """
+    Filter `videos.list` items (Shorts, non-educational), embed the new ones
+    in one batch and write them all with one upsert on `db_session`; the
+    caller commits, and the corpus state and cached results are invalidated
+    once it does. `query` is the search that found them.
+
+    Returns (inserted, updated, accepted) counts.
+    """
+    accepted = _accept_videos(videos)
+    new = await _aexclude_existing(accepted, db_session)
+    embeddings, embedding_model = await _aembed_videos(new)
+
+    rows = (
+        video_rows(new, embeddings, embedding_model)
+        + video_rows(_known_videos(accepted, new))
+    )
+    inserted_count, updated_count = await aupsert_videos(db_session, rows)
+
+    if inserted_count:
+        after_commit(db_session, functools.partial(
+            _after_commit, embedding_model, query, new, asynchronous=True
+        ))
+    return inserted_count, updated_count, len(accepted)
 
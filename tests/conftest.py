@@ -7,9 +7,23 @@ from unittest.mock import MagicMock, patch
 
 # Set test environment before importing app
 os.environ["ENV"] = "development"
+# Keep the YouTube quota ledger in-process
+os.environ.setdefault("YOUTUBE_QUOTA_DB_ENABLED", "false")
 
 from fastapi.testclient import TestClient
 from backend.app import app
+from scraper.fetch_guard import youtube_fetch_guard
+from scraper.result_cache import result_cache
+
+
+@pytest.fixture(autouse=True)
+def clear_result_cache():
+    """Start every test without cached recommendations or YouTube fetch memos."""
+    result_cache.clear()
+    youtube_fetch_guard.clear()
+    yield
+    result_cache.clear()
+    youtube_fetch_guard.clear()
 
 
 @pytest.fixture
@@ -33,7 +33,7 @@ class TestHealthEndpoint:
         assert data["status"] == "ok"
         assert "connected" in data["database"]
 
-    @patch("backend.app.test_connection")
+    @patch("backend.app.async_test_connection")
     def test_health_database_disconnected(self, mock_test_conn, client):
         """Health should report error when database is down."""
         mock_test_conn.return_value = (False, "Connection refused")
@@ -25,8 +25,8 @@ class TestRecommendEndpoint:
         # Override auth dependency
         app.dependency_overrides[get_current_user_id] = mock_get_user_id
 
-        with patch("backend.app.recommend") as mock_recommend, \
-             patch("backend.app.log_search") as mock_log:
+        with patch("backend.app.arecommend") as mock_recommend, \
+             patch("backend.app.alog_search") as mock_log:
             mock_recommend.return_value = sample_videos
 
             response = client.get(
@@ -47,8 +47,8 @@ class TestRecommendEndpoint:
         """GET /api/recommend with empty query should return 400."""
         app.dependency_overrides[get_current_user_id] = mock_get_user_id
 
-        with patch("backend.app.recommend") as mock_recommend, \
-             patch("backend.app.log_search") as mock_log:
+        with patch("backend.app.arecommend") as mock_recommend, \
+             patch("backend.app.alog_search") as mock_log:
             response = client.get(
                 "/api/recommend",
                 params={"query": ""},
@@ -63,8 +63,8 @@ class TestRecommendEndpoint:
         """Recommend endpoint should log user searches."""
         app.dependency_overrides[get_current_user_id] = mock_get_user_id
 
-        with patch("backend.app.recommend") as mock_recommend, \
-             patch("backend.app.log_search") as mock_log:
+        with patch("backend.app.arecommend") as mock_recommend, \
+             patch("backend.app.alog_search") as mock_log:
             mock_recommend.return_value = []
 
             client.get(
@@ -85,8 +85,8 @@ class TestRecommendEndpoint:
         """Recommend should pass duration filter to search."""
         app.dependency_overrides[get_current_user_id] = mock_get_user_id
 
-        with patch("backend.app.recommend") as mock_recommend, \
-             patch("backend.app.log_search") as mock_log:
+        with patch("backend.app.arecommend") as mock_recommend, \
+             patch("backend.app.alog_search") as mock_log:
             mock_recommend.return_value = []
 
             client.get(
@@ -105,8 +105,8 @@ class TestRecommendEndpoint:
         """Invalid duration should default to 'medium'."""
         app.dependency_overrides[get_current_user_id] = mock_get_user_id
 
-        with patch("backend.app.recommend") as mock_recommend, \
-             patch("backend.app.log_search") as mock_log:
+        with patch("backend.app.arecommend") as mock_recommend, \
+             patch("backend.app.alog_search") as mock_log:
             mock_recommend.return_value = []
 
             client.get(
@@ -121,6 +121,60 @@ class TestRecommendEndpoint:
         app.dependency_overrides.clear()
 
 
+    def test_recommend_passes_ef_search(self, client):
+        """ef_search query param should reach the vector search."""
+        app.dependency_overrides[get_current_user_id] = mock_get_user_id
+
+        with patch("backend.app.arecommend") as mock_recommend, \
+             patch("backend.app.alog_search") as mock_log:
+            mock_recommend.return_value = []
+
+            client.get(
+                "/api/recommend",
+                params={"query": "python", "ef_search": 100},
+                headers={"Authorization": "Bearer fake-token"}
+            )
+
+            assert mock_recommend.call_args[1]["ef_search"] == 100
+
+        app.dependency_overrides.clear()
+
+    def test_recommend_rejects_invalid_ef_search(self, client):
+        """Out-of-range ef_search should be rejected."""
+        app.dependency_overrides[get_current_user_id] = mock_get_user_id
+
+        with patch("backend.app.arecommend") as mock_recommend, \
+             patch("backend.app.alog_search") as mock_log:
+            response = client.get(
+                "/api/recommend",
+                params={"query": "python", "ef_search": 0},
+                headers={"Authorization": "Bearer fake-token"}
+            )
+
+            assert response.status_code == 422
+            mock_recommend.assert_not_called()
+
+        app.dependency_overrides.clear()
+
+    def test_recommend_passes_candidate_k(self, client):
+        """candidate_k query param should reach the fusion stage."""
+        app.dependency_overrides[get_current_user_id] = mock_get_user_id
+
+        with patch("backend.app.arecommend") as mock_recommend, \
+             patch("backend.app.alog_search") as mock_log:
+            mock_recommend.return_value = []
+
+            client.get(
+                "/api/recommend",
+                params={"query": "python", "candidate_k": 100},
+                headers={"Authorization": "Bearer fake-token"}
+            )
+
+            assert mock_recommend.call_args[1]["candidate_k"] == 100
+
+        app.dependency_overrides.clear()
+
+
 class TestRecommendErrorHandling:
     """Tests for error handling in recommend endpoint."""
 
@@ -128,8 +182,8 @@ class TestRecommendErrorHandling:
         """Internal errors should return 500."""
         app.dependency_overrides[get_current_user_id] = mock_get_user_id
 
-        with patch("backend.app.recommend") as mock_recommend, \
-             patch("backend.app.log_search") as mock_log:
+        with patch("backend.app.arecommend") as mock_recommend, \
+             patch("backend.app.alog_search") as mock_log:
             mock_recommend.side_effect = Exception("Database connection failed")
 
             response = client.get(
@@ -0,0 +1,308 @@
+"""
+Tests for the async request path: async retrieval, `arecommend`, and the
+API staying responsive while one request waits on a stalled upstream.
+"""
+import asyncio
+import time
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import httpx
+import numpy as np
+import pytest
+
+from backend.app import app, get_current_user_id
+from backend.database import get_async_db
+from scraper import semantic_search
+from scraper.ingestion_queue import MemoryQueue
+from scraper.retrieval import arank_candidates, aretrieve_candidates
+
+
+def _row(youtube_id, similarity, source):
+    return (youtube_id, f"title {youtube_id}", "desc", "thumb", 300, 1000, 10,
+            similarity, source)
+
+
+def _ranked(youtube_id, score, vector_rank=None, lexical_rank=None, vector_supply=0,
+            text_supply=0):
+    return (youtube_id, f"title {youtube_id}", "desc", "thumb", 300, 1000, 10,
+            vector_rank, lexical_rank, score, vector_supply, text_supply)
+
+
+def _async_session(rows):
+    session = MagicMock()
+    result = MagicMock()
+    result.all.return_value = rows
+    session.execute = AsyncMock(return_value=result)
+    session.commit = AsyncMock()
+    session.rollback = AsyncMock()
+    return session
+
+
+def _routing_session(text_rows, ranked_rows, scalar=None):
+    """
+    Session answering ranking statements with `ranked_rows`, anything else
+    with `text_rows`.
+    """
+    session = _async_session(text_rows)
+    text_result = session.execute.return_value
+    text_result.scalar.return_value = scalar
+    ranked = MagicMock()
+    ranked.all.return_value = ranked_rows
+
+    async def execute(statement, params=None):
+        return ranked if "LIMIT :top_n" in str(statement) else text_result
+
+    session.execute = AsyncMock(side_effect=execute)
+    return session
+
+
+def _session_factory(session):
+    """`async with factory() as s` yielding `session` (the lexical-stage session)."""
+    context = MagicMock()
+    context.__aenter__ = AsyncMock(return_value=session)
+    context.__aexit__ = AsyncMock(return_value=False)
+    return MagicMock(return_value=context)
+
+
+class StalledBackend:
+    """Embedding backend whose upstream call hangs until released."""
+
+    name = "stalled"
+    model_id = "stalled-384"
+
+    def __init__(self):
+        self.started = asyncio.Event()
+        self.release = asyncio.Event()
+
+    def available(self):
+        return True
+
+    async def aembed(self, texts):
+        self.started.set()
+        await self.release.wait()
+        return [np.ones(384, dtype=np.float32) for _ in texts]
+
+
+@pytest.fixture
+def no_query_cache():
+    with patch.object(semantic_search.embedding_cache, "get_many",
+                      side_effect=lambda queries, model: ({}, list(queries))), \
+         patch.object(semantic_search.embedding_cache, "put_many"), \
+         patch.object(semantic_search, "EMBEDDING_COALESCE_ENABLED", False), \
+         patch.object(semantic_search.corpus_state, "has_embeddings",
+                      return_value=True):
+        yield
+
+
+class TestAsyncRetrieval:
+    def test_ef_search_sent_as_its_own_statement(self):
+        session = _async_session([_row("v1", 0.9, "vector")])
+
+        result = asyncio.run(aretrieve_candidates(
+            session, "math", [0.1, 0.2], "model-a", "", k=50, text_limit=5,
+            ef_search=40,
+        ))
+
+        assert session.execute.await_count == 2
+        ef_sql, ef_params = session.execute.await_args_list[0][0]
+        assert "set_config('hnsw.ef_search'" in str(ef_sql)
+        assert ef_params == {"ef_search": "50"}
+        plan_sql, plan_params = session.execute.await_args_list[1][0]
+        assert "set_config" not in str(plan_sql)
+        assert "ef_search" not in plan_params
+        assert result.vector_rows[0][0] == "v1"
+
+    def test_keyword_plan_is_one_statement(self):
+        session = _async_session([_row("t1", 0.4, "text")])
+
+        asyncio.run(aretrieve_candidates(
+            session, "math", None, "model-a", "", k=5, text_limit=5, ef_search=40,
+        ))
+
+        session.execute.assert_awaited_once()
+
+    def test_ranking_sends_ef_search_first(self):
+        session = _async_session([_ranked("v1", 0.9, 1, vector_supply=1)])
+
+        result = asyncio.run(arank_candidates(
+            session, "math", [0.1, 0.2], "model-a", "", top_n=1, k=50, text_limit=5,
+            ef_search=40, text_hits=[("t1", 0.4)],
+        ))
+
+        ef_sql, ef_params = session.execute.await_args_list[0][0]
+        assert ef_params == {"ef_search": "50"}
+        plan_sql, plan_params = session.execute.await_args_list[1][0]
+        assert "set_config" not in str(plan_sql)
+        assert plan_params["text_ids"] == ["t1"]
+        assert result.rows[0][0] == "v1"
+
+
+class TestArecommend:
+    def test_ranks_like_sync_recommend(self, no_query_cache):
+        session = _routing_session(
+            [_row("v1", 0.4, "text")],
+            [_ranked("v1", 0.95, 1, 1, vector_supply=2),
+             _ranked("v2", 0.6, 2, None, vector_supply=2)],
+        )
+
+        with patch.object(semantic_search, "acreate_query_embedding",
+                          AsyncMock(return_value=np.ones(4))), \
+             patch("scraper.youtube_scraper.afetch_and_store_videos") as mock_fetch:
+            results = asyncio.run(semantic_search.arecommend(
+                "math", session, top_n=2, session_factory=_session_factory(session),
+            ))
+
+        mock_fetch.assert_not_called()
+        assert [v["video_id"] for v in results] == ["v1", "v2"]
+        # The keyword matches are passed to the ranking statement, not searched twice
+        ranking_params = session.execute.await_args_list[-1][0][1]
+        assert ranking_params["text_ids"] == ["v1"]
+        assert "query_text" not in ranking_params
+
+    def test_short_supply_fetches_through_async_ingestion(self, no_query_cache):
+        session = _routing_session([], [_ranked("v1", 1.0, 1)])
+
+        with patch.object(semantic_search, "acreate_query_embedding",
+                          AsyncMock(return_value=np.ones(4))), \
+             patch("scraper.youtube_scraper.afetch_and_store_videos",
+                   AsyncMock(return_value=2)) as mock_fetch:
+            asyncio.run(semantic_search.arecommend(
+                "math", session, top_n=2, session_factory=_session_factory(session),
+                refresh_in_background=False,
+            ))
+
+        mock_fetch.assert_awaited_once()
+        session.commit.assert_awaited_once()
+        # Ranked again after ingestion, searching both sides in the statement
+        assert "query_text" in session.execute.await_args_list[-1][0][1]
+
+    def test_short_supply_queues_refresh_and_answers_from_db(self, no_query_cache):
+        session = _routing_session(
+            [_row("t1", 0.3, "text")],
+            [_ranked("v1", 0.8, 1), _ranked("t1", 0.5, None, 1, text_supply=1)],
+            scalar=3,  # searches of the query
+        )
+        queue = MemoryQueue()
+
+        with patch.object(semantic_search, "acreate_query_embedding",
+                          AsyncMock(return_value=np.ones(4))), \
+             patch("scraper.ingestion_queue.ingestion_queue", queue), \
+             patch("scraper.youtube_scraper.afetch_and_store_videos") as mock_fetch:
+            results = asyncio.run(semantic_search.arecommend(
+                "Math", session, top_n=2, session_factory=_session_factory(session),
+                refresh_in_background=True,
+            ))
+            job = asyncio.run(queue.active_job("math", "any"))
+
+        mock_fetch.assert_not_called()
+        session.commit.assert_not_awaited()
+        assert [v["video_id"] for v in results] == ["v1", "t1"]
+        assert job["status"] == "queued"
+        assert job["priority"] == 3 * 1.0  # searched 3 times, no semantic supply
+
+    def test_embedding_and_lexical_search_overlap(self, no_query_cache):
+        vector_session = _async_session([
+            _ranked("v1", 0.9, 1, vector_supply=2),
+            _ranked("v2", 0.8, 2, vector_supply=2),
+        ])
+        text_session = _async_session([_row("t1", 0.5, "text")])
+        text_result = text_session.execute.return_value
+
+        async def slow_embedding(query):
+            await asyncio.sleep(0.15)
+            return np.ones(4)
+
+        async def slow_text(*args, **kwargs):
+            await asyncio.sleep(0.15)
+            return text_result
+
+        text_session.execute = AsyncMock(side_effect=slow_text)
+
+        with patch.object(semantic_search, "acreate_query_embedding", slow_embedding), \
+             patch("scraper.youtube_scraper.afetch_and_store_videos") as mock_fetch:
+            started = time.perf_counter()
+            results = asyncio.run(semantic_search.arecommend(
+                "math", vector_session, top_n=2,
+                session_factory=_session_factory(text_session),
+            ))
+            elapsed = time.perf_counter() - started
+
+        mock_fetch.assert_not_called()
+        assert elapsed < 0.28  # the two 150ms stages ran side by side
+        assert {v["video_id"] for v in results} <= {"v1", "v2", "t1"}
+
+    def test_empty_corpus_cancels_speculative_embedding(self, no_query_cache):
+        session = _routing_session(
+            [_row("t1", 0.5, "text"), _row("t2", 0.4, "text")],
+            [_ranked("t1", 0.9, None, 1, text_supply=2),
+             _ranked("t2", 0.3, None, 2, text_supply=2)],
+        )
+        embedding_started = asyncio.Event()
+        embedded = []
+
+        async def slow_embedding(query):
+            embedding_started.set()
+            await asyncio.sleep(5)
+            embedded.append(query)
+
+        semantic_search.stage_timings.clear()
+        with patch.object(semantic_search.corpus_state, "has_embeddings",
+                          return_value=False), \
+             patch.object(semantic_search, "acreate_query_embedding", slow_embedding), \
+             patch("scraper.youtube_scraper.afetch_and_store_videos") as mock_fetch:
+            results = asyncio.run(semantic_search.arecommend(
+                "math", session, top_n=2, session_factory=_session_factory(session),
+            ))
+
+        mock_fetch.assert_not_called()
+        assert embedded == []
+        assert [v["video_id"] for v in results] == ["t1", "t2"]
+        assert semantic_search.stage_timings.stats()["embed"]["cancelled"] == 1
+
+
+class TestEventLoopIsolation:
+    def test_stalled_upstream_does_not_block_other_requests(self, no_query_cache):
+        session = _routing_session([], [_ranked("v1", 0.9, 1, vector_supply=5)])
+
+        async def override_db():
+            yield session
+
+        async def override_user():
+            return "test-user-123"
+
+        async def scenario(backend):
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(transport=transport,
+                                         base_url="http://test") as client:
+                stalled = asyncio.create_task(
+                    client.get("/api/recommend", params={"query": "atom class 11"})
+                )
+                await asyncio.wait_for(backend.started.wait(), timeout=2)
+
+                # The recommend request is parked on the upstream; others still run
+                other = await asyncio.wait_for(client.get("/api/metrics"), timeout=2)
+                assert other.status_code == 200
+                assert not stalled.done()
+
+                backend.release.set()
+                return await asyncio.wait_for(stalled, timeout=2)
+
+        app.dependency_overrides[get_async_db] = override_db
+        app.dependency_overrides[get_current_user_id] = override_user
+        try:
+            async def run():
+                backend = StalledBackend()
+                factory = _session_factory(session)
+                with patch.object(semantic_search, "get_backend",
+                                  return_value=backend), \
+                     patch.object(semantic_search, "AsyncSessionLocal", factory), \
+                     patch("scraper.youtube_scraper.afetch_and_store_videos",
+                           AsyncMock(return_value=0)):
+                    return await scenario(backend)
+
+            response = asyncio.run(run())
+        finally:
+            app.dependency_overrides.clear()
+
+        assert response.status_code == 200
+        assert response.json()["results"][0]["video_id"] == "v1"
@@ -0,0 +1,138 @@
+"""
+Tests for the video-embedding backfill worker.
+"""
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from scraper import backfill
+from scraper.backfill import Checkpoint, RateLimiter, run_backfill, run_compact_backfill
+from scraper.embeddings import HashingBackend
+
+
+class FakeVideos:
+    """In-memory stand-in for the keyset query and bulk UPDATE."""
+
+    def __init__(self, count):
+        self.rows = [(i, f"title {i}", f"description {i}") for i in range(1, count + 1)]
+        self.written = {}
+        self.updates = 0
+
+    def fetch_chunk(self, session, after_id, limit, model_id):
+        pending = [r for r in self.rows if r[0] > after_id and r[0] not in self.written]
+        return pending[:limit]
+
+    def write(self, session, ids, vectors, model_id):
+        self.updates += 1
+        for video_id, vector in zip(ids, vectors, strict=True):
+            self.written[video_id] = (model_id, vector)
+
+
+@pytest.fixture
+def videos():
+    fake = FakeVideos(25)
+
+    def fake_session():
+        yield MagicMock()
+
+    with patch.object(backfill, "_fetch_chunk", side_effect=fake.fetch_chunk), \
+         patch.object(backfill, "write_video_embeddings", side_effect=fake.write), \
+         patch.object(backfill, "get_session", side_effect=fake_session), \
+         patch.object(backfill, "get_backend", return_value=HashingBackend()):
+        yield fake
+
+
+class TestRunBackfill:
+    def test_embeds_all_rows_in_chunks(self, videos, tmp_path):
+        stats = run_backfill(batch_size=10, concurrency=2,
+                             checkpoint_path=str(tmp_path / "ckpt.json"))
+
+        assert stats["rows"] == 25
+        assert stats["last_id"] == 25
+        assert videos.updates == 3
+        assert set(videos.written) == set(range(1, 26))
+        assert all(model == "hashing-v1-384" for model, _ in videos.written.values())
+
+    def test_resumes_from_checkpoint(self, videos, tmp_path):
+        path = str(tmp_path / "ckpt.json")
+        Checkpoint(path, "hashing-v1-384").save(20)
+
+        stats = run_backfill(batch_size=10, checkpoint_path=path)
+
+        assert stats["rows"] == 5
+        assert set(videos.written) == {21, 22, 23, 24, 25}
+
+    def test_completed_pass_revisits_rows_below_the_checkpoint(self, videos, tmp_path):
+        path = str(tmp_path / "ckpt.json")
+        run_backfill(batch_size=10, checkpoint_path=path)
+        assert Checkpoint(path, "hashing-v1-384").load().last_id == 0
+
+        # Rows that lost their embedding after the scan passed them
+        del videos.written[3], videos.written[7]
+        stats = run_backfill(batch_size=10, checkpoint_path=path)
+
+        assert stats["rows"] == 2
+        assert {3, 7} <= set(videos.written)
+
+    def test_limit_stops_early(self, videos, tmp_path):
+        checkpoint = str(tmp_path / "c.json")
+        stats = run_backfill(batch_size=10, limit=12, checkpoint_path=checkpoint)
+
+        assert stats["rows"] == 12
+        assert stats["last_id"] == 12
+
+    def test_embedding_failure_keeps_checkpoint(self, videos, tmp_path):
+        path = str(tmp_path / "ckpt.json")
+        with patch.object(backfill, "embed_texts", side_effect=RuntimeError("down")):
+            with pytest.raises(RuntimeError):
+                run_backfill(batch_size=10, checkpoint_path=path)
+
+        assert Checkpoint(path, "hashing-v1-384").load().last_id == 0
+        assert videos.written == {}
+
+
+class TestRunCompactBackfill:
+    def test_walks_chunks_until_none_left(self):
+        chunks = iter([(3, 7), (2, 12), (0, None)])
+        calls = []
+
+        def compact_chunk(session, after_id, limit):
+            calls.append((after_id, limit))
+            return next(chunks)
+
+        def fake_session():
+            yield MagicMock()
+
+        with patch.object(backfill, "_compact_chunk", side_effect=compact_chunk), \
+             patch.object(backfill, "get_session", side_effect=fake_session):
+            stats = run_compact_backfill(batch_size=3, max_rows_per_sec=0)
+
+        assert calls == [(0, 3), (7, 3), (12, 3)]
+        assert stats["rows"] == 5
+        assert stats["last_id"] == 12
+
+
+class TestCheckpoint:
+    def test_checkpoint_for_other_model_ignored(self, tmp_path):
+        path = str(tmp_path / "ckpt.json")
+        Checkpoint(path, "model-a").save(99)
+
+        assert Checkpoint(path, "model-b").load().last_id == 0
+        assert Checkpoint(path, "model-a").load().last_id == 99
+
+
+class TestRateLimiter:
+    def test_paces_to_configured_rate(self):
+        now = [0.0]
+        sleeps = []
+
+        def sleep(seconds):
+            sleeps.append(seconds)
+            now[0] += seconds
+
+        limiter = RateLimiter(100, clock=lambda: now[0], sleep=sleep)
+        limiter.acquire(50)
+        limiter.acquire(50)
+        limiter.acquire(50)
+
+        assert sleeps == [0.5, 0.5]
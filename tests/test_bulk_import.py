@@ -0,0 +1,122 @@
+"""
+Tests for the streaming NDJSON importer.
+"""
+import gzip
+import json
+from unittest.mock import patch
+
+import pytest
+
+from scraper import bulk_import
+from scraper.bulk_import import ImportCheckpoint, read_lines, run_import, split_ranges
+from tests.test_ingestion import make_item
+
+
+def write_dump(path, items, compress=False):
+    data = "".join(json.dumps(item) + "\n" for item in items).encode()
+    with (gzip.open(path, "wb") if compress else open(path, "wb")) as f:
+        f.write(data)
+    return path
+
+
+def dump_items(count):
+    items = [make_item(f"vid{i}", title="x" * (i % 17 + 1)) for i in range(count)]
+    items[3] = make_item("short3", duration="PT30S")
+    items[5] = make_item("music5", category="10")
+    return items
+
+
+@pytest.fixture
+def written():
+    """Capture batches passed to the database writer (every video reported as new)."""
+    batches = []
+
+    def fake_write(videos, method, backend=None):
+        batches.append([v["id"] for v in videos])
+        return len(videos), 0
+
+    with patch.object(bulk_import, "write_batch", side_effect=fake_write):
+        yield batches
+
+
+class TestReadLines:
+    @pytest.mark.parametrize("parts", [1, 2, 3, 7])
+    def test_ranges_cover_every_line_once(self, tmp_path, parts):
+        path = write_dump(tmp_path / "dump.ndjson", dump_items(40))
+        size = path.stat().st_size
+
+        lines = [
+            line
+            for start, end in split_ranges(size, parts)
+            for line, _ in read_lines(path, start, end)
+        ]
+
+        assert lines == path.read_bytes().splitlines(keepends=True)
+
+    def test_resumes_after_offset(self, tmp_path):
+        path = write_dump(tmp_path / "dump.ndjson", dump_items(10))
+        first = list(read_lines(path, 0, None))
+
+        resumed = [line for line, _ in read_lines(path, 0, None, offset=first[3][1])]
+
+        assert resumed == [line for line, _ in first[4:]]
+
+    def test_gzip_stream(self, tmp_path):
+        path = write_dump(tmp_path / "dump.ndjson.gz", dump_items(10), compress=True)
+
+        lines = list(read_lines(path, 0, None))
+
+        assert len(lines) == 10
+        assert json.loads(lines[0][0])["id"] == "vid0"
+
+
+class TestRunImport:
+    def test_filters_batches_and_reports(self, tmp_path, written):
+        path = write_dump(tmp_path / "dump.ndjson", dump_items(20))
+        with open(path, "a") as f:
+            f.write("not json\n\n")
+
+        stats = run_import([str(path)], workers=1, batch_size=8,
+                           checkpoint_path=str(tmp_path / "ckpt.json"))
+
+        assert stats["lines"] == 22
+        assert (stats["inserted"], stats["skipped"], stats["invalid"]) == (18, 2, 1)
+        assert [len(batch) for batch in written] == [6, 8, 4]
+        assert "short3" not in sum(written, [])
+
+    def test_parallel_workers_split_a_file(self, tmp_path, written):
+        path = write_dump(tmp_path / "dump.ndjson", dump_items(50))
+
+        stats = run_import([str(path)], workers=4, batch_size=5,
+                           checkpoint_path=str(tmp_path / "ckpt.json"))
+
+        assert stats["inserted"] == 48
+        assert sorted(sum(written, [])) == sorted(
+            v["id"] for v in dump_items(50) if v["id"] not in ("short3", "music5")
+        )
+        spans = ImportCheckpoint(str(tmp_path / "ckpt.json")).load().files
+        assert len(next(iter(spans.values()))["ranges"]) == 4
+
+    def test_restart_resumes_from_checkpoint(self, tmp_path, written):
+        path = write_dump(tmp_path / "dump.ndjson.gz", dump_items(30), compress=True)
+        checkpoint = str(tmp_path / "ckpt.json")
+        calls = []
+
+        def failing_write(videos, method, backend=None):
+            calls.append(len(videos))
+            if len(calls) == 2:
+                raise RuntimeError("db down")
+            return len(videos), 0
+
+        with patch.object(bulk_import, "write_batch", side_effect=failing_write), \
+             pytest.raises(RuntimeError):
+            run_import([str(path)], workers=3, batch_size=10,
+                       checkpoint_path=checkpoint)
+
+        stats = run_import([str(path)], workers=3, batch_size=10,
+                           checkpoint_path=checkpoint)
+
+        # The first batch (10 lines) was committed; the other 20 lines are imported now
+        assert stats["lines"] == 20
+        assert sum(written, [])[0] == "vid10"
+        assert run_import([str(path)], checkpoint_path=checkpoint)["lines"] == 0
@@ -0,0 +1,111 @@
+"""
+Tests for the cached corpus-state service.
+"""
+from unittest.mock import MagicMock
+
+import pytest
+
+from scraper.corpus_state import CorpusState
+
+
+def _session(has_videos=True, has_embeddings=True):
+    session = MagicMock()
+    session.execute.return_value.one.return_value = (has_videos, has_embeddings)
+    return session
+
+
+@pytest.fixture
+def clock():
+    now = [0.0]
+    fake = lambda: now[0]  # noqa: E731
+    fake.advance = lambda seconds: now.__setitem__(0, now[0] + seconds)
+    return fake
+
+
+class TestCorpusState:
+    def test_snapshot_cached_within_interval(self, clock):
+        state = CorpusState(refresh_interval=30, clock=clock)
+        session = _session()
+
+        assert state.has_embeddings("model-a", session=session)
+        clock.advance(10)
+        snapshot = state.snapshot("model-a", session=session)
+
+        assert session.execute.call_count == 1
+        assert snapshot["has_videos"] is True
+        assert snapshot["has_embeddings"] is True
+
+    def test_refreshes_after_interval(self, clock):
+        state = CorpusState(refresh_interval=30, clock=clock)
+        session = _session()
+
+        state.snapshot("model-a", session=session)
+        clock.advance(31)
+        state.snapshot("model-a", session=session)
+
+        assert session.execute.call_count == 2
+
+    def test_invalidate_forces_refresh(self, clock):
+        state = CorpusState(refresh_interval=30, clock=clock)
+        empty = _session(has_embeddings=False)
+        state.snapshot("model-a", session=empty)
+        assert not state.has_embeddings("model-a", session=empty)
+
+        state.invalidate()
+
+        assert state.has_embeddings("model-a", session=_session(has_embeddings=True))
+        assert state.stats()["invalidations"] == 1
+
+    def test_model_change_refreshes(self, clock):
+        state = CorpusState(refresh_interval=30, clock=clock)
+        session = _session()
+
+        state.snapshot("model-a", session=session)
+        snapshot = state.snapshot("model-b", session=session)
+
+        assert session.execute.call_count == 2
+        assert snapshot["model"] == "model-b"
+
+    def test_failed_refresh_serves_previous_snapshot(self, clock):
+        state = CorpusState(refresh_interval=30, clock=clock)
+        state.snapshot("model-a", session=_session(has_videos=True))
+        clock.advance(60)
+        broken = MagicMock()
+        broken.execute.side_effect = RuntimeError("db down")
+
+        assert state.snapshot("model-a", session=broken)["has_videos"] is True
+        assert state.stats()["refresh_errors"] == 1
+
+    def test_failed_first_refresh_raises(self, clock):
+        state = CorpusState(clock=clock)
+        broken = MagicMock()
+        broken.execute.side_effect = RuntimeError("db down")
+
+        with pytest.raises(RuntimeError):
+            state.snapshot("model-a", session=broken)
+
+    def test_probes_run_outside_the_lock(self, clock):
+        state = CorpusState(clock=clock)
+        session = _session()
+
+        def probe(*args, **kwargs):
+            assert not state._lock.locked()
+            return MagicMock(one=lambda: (True, True))
+
+        session.execute.side_effect = probe
+
+        assert state.has_embeddings("model-a", session=session)
+
+    def test_invalidation_during_refresh_keeps_snapshot_stale(self, clock):
+        state = CorpusState(refresh_interval=30, clock=clock)
+        session = _session()
+
+        def probe(*args, **kwargs):
+            state.invalidate()
+            return MagicMock(one=lambda: (True, False))
+
+        session.execute.side_effect = probe
+        state.snapshot("model-a", session=session)
+
+        assert state.stats()["stale"] is True
+        assert state.has_embeddings("model-a", session=_session(has_embeddings=True))
@@ -0,0 +1,187 @@
+"""
+Tests for the micro-batching embedding coalescer.
+"""
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pytest
+
+from scraper.embedding_batcher import AsyncEmbeddingCoalescer, EmbeddingCoalescer
+
+
+class RecordingEmbedder:
+    def __init__(self, fail=False):
+        self.batches = []
+        self.fail = fail
+        self._lock = threading.Lock()
+
+    def __call__(self, texts):
+        with self._lock:
+            self.batches.append(list(texts))
+        if self.fail:
+            raise RuntimeError("upstream down")
+        return [np.full(4, len(t), dtype=np.float32) for t in texts]
+
+
+def _embed_concurrently(coalescer, texts):
+    barrier = threading.Barrier(len(texts))
+
+    def call(text):
+        barrier.wait()
+        return coalescer.embed([text])[0]
+
+    with ThreadPoolExecutor(max_workers=len(texts)) as pool:
+        return list(pool.map(call, texts))
+
+
+class TestEmbeddingCoalescer:
+    def test_concurrent_callers_share_one_batch(self):
+        embedder = RecordingEmbedder()
+        coalescer = EmbeddingCoalescer(embedder, window_ms=50, max_batch=64)
+        texts = ["a", "bb", "ccc", "dddd"]
+
+        results = _embed_concurrently(coalescer, texts)
+
+        assert len(embedder.batches) == 1
+        assert sorted(embedder.batches[0]) == sorted(texts)
+        for text, vector in zip(texts, results, strict=True):
+            assert vector[0] == len(text)
+
+    def test_duplicate_texts_embedded_once(self):
+        embedder = RecordingEmbedder()
+        coalescer = EmbeddingCoalescer(embedder, window_ms=50, max_batch=64)
+
+        results = _embed_concurrently(coalescer, ["same", "same", "same"])
+
+        assert embedder.batches == [["same"]]
+        assert all(np.allclose(r, results[0]) for r in results)
+        assert coalescer.stats()["deduplicated"] == 2
+
+    def test_max_batch_splits_large_requests(self):
+        embedder = RecordingEmbedder()
+        coalescer = EmbeddingCoalescer(embedder, window_ms=1, max_batch=2)
+
+        results = coalescer.embed(["a", "b", "c", "d", "e"])
+
+        assert len(results) == 5
+        assert sorted(len(b) for b in embedder.batches) == [1, 2, 2]
+
+    def test_failure_propagates_to_every_caller(self):
+        coalescer = EmbeddingCoalescer(RecordingEmbedder(fail=True), window_ms=1)
+
+        with pytest.raises(RuntimeError):
+            coalescer.embed(["a", "b"])
+
+    def test_stalled_batch_does_not_delay_the_next_one(self):
+        started, release = threading.Event(), threading.Event()
+        embedder = RecordingEmbedder()
+
+        def embed(texts):
+            if "slow" in texts:
+                started.set()
+                release.wait(5)
+            return embedder(texts)
+
+        coalescer = EmbeddingCoalescer(embed, window_ms=1)
+        with ThreadPoolExecutor(max_workers=1) as pool:
+            slow = pool.submit(coalescer.embed, ["slow"])
+            assert started.wait(1)
+            fast = coalescer.embed(["fast"])
+            assert not slow.done()
+            release.set()
+            assert slow.result(timeout=1)[0][0] == 4
+
+        assert fast[0][0] == 4
+        assert embedder.batches == [["fast"], ["slow"]]
+
+    def test_stats_report_batch_size_and_wait(self):
+        coalescer = EmbeddingCoalescer(RecordingEmbedder(), window_ms=5, max_batch=64)
+        coalescer.embed(["a", "b", "c"])
+
+        stats = coalescer.stats()
+
+        assert stats["batches"] == 1
+        assert stats["avg_batch_size"] == 3
+        assert stats["max_batch_size"] == 3
+        assert stats["wait_ms_avg"] > 0
+
+
+class AsyncRecordingEmbedder(RecordingEmbedder):
+    async def __call__(self, texts):
+        await asyncio.sleep(0)
+        return super().__call__(texts)
+
+
+class TestAsyncEmbeddingCoalescer:
+    def test_concurrent_callers_share_one_awaited_batch(self):
+        embedder = AsyncRecordingEmbedder()
+        texts = ["a", "bb", "same", "same"]
+
+        async def scenario():
+            coalescer = AsyncEmbeddingCoalescer(embedder, window_ms=20, max_batch=64)
+            results = await asyncio.gather(*(coalescer.embed([t]) for t in texts))
+            return results, coalescer
+
+        results, coalescer = asyncio.run(scenario())
+
+        assert embedder.batches == [["a", "bb", "same"]]
+        assert [r[0][0] for r in results] == [1, 2, 4, 4]
+        assert coalescer.stats()["deduplicated"] == 1
+
+    def test_full_batch_flushes_before_the_window(self):
+        embedder = AsyncRecordingEmbedder()
+
+        async def scenario():
+            coalescer = AsyncEmbeddingCoalescer(embedder, window_ms=10_000, max_batch=2)
+            embedding = coalescer.embed(["a", "b", "c", "d"])
+            return await asyncio.wait_for(embedding, timeout=1)
+
+        assert len(asyncio.run(scenario())) == 4
+        assert [len(b) for b in embedder.batches] == [2, 2]
+
+    def test_stalled_batch_does_not_delay_the_next_one(self):
+        embedder = AsyncRecordingEmbedder()
+
+        async def scenario():
+            release = asyncio.Event()
+
+            async def embed(texts):
+                if "slow" in texts:
+                    await release.wait()
+                return await embedder(texts)
+
+            coalescer = AsyncEmbeddingCoalescer(embed, window_ms=1)
+            slow = asyncio.create_task(coalescer.embed(["slow"]))
+            await asyncio.sleep(0.01)
+            fast = await asyncio.wait_for(coalescer.embed(["fast"]), timeout=1)
+            assert not slow.done()
+            release.set()
+            return fast, await slow
+
+        fast, slow = asyncio.run(scenario())
+
+        assert (fast[0][0], slow[0][0]) == (4, 4)
+        assert embedder.batches == [["fast"], ["slow"]]
+
+    def test_failure_propagates_to_every_caller(self):
+        async def scenario():
+            coalescer = AsyncEmbeddingCoalescer(
+                AsyncRecordingEmbedder(fail=True), window_ms=1
+            )
+            return await asyncio.gather(coalescer.embed(["a"]), coalescer.embed(["b"]),
+                                        return_exceptions=True)
+
+        assert all(isinstance(r, RuntimeError) for r in asyncio.run(scenario()))
+
+    def test_cancelled_caller_does_not_cancel_a_shared_text(self):
+        async def scenario():
+            coalescer = AsyncEmbeddingCoalescer(AsyncRecordingEmbedder(), window_ms=20)
+            first = asyncio.create_task(coalescer.embed(["same"]))
+            second = asyncio.create_task(coalescer.embed(["same"]))
+            await asyncio.sleep(0)
+            first.cancel()
+            return await second
+
+        assert asyncio.run(scenario())[0][0] == 4
@@ -0,0 +1,131 @@
+"""
+Tests for the two-tier query embedding cache.
+"""
+from unittest.mock import patch
+
+import numpy as np
+import pytest
+
+from scraper import semantic_search
+from scraper.embedding_cache import EmbeddingCache, normalize_query
+from scraper.embeddings import HashingBackend
+
+MODEL = "@cf/baai/bge-small-en-v1.5"
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def _vec(value):
+    return np.full(384, value, dtype=np.float32)
+
+
+class TestEmbeddingCache:
+    """Tests for L1 LRU/TTL behaviour (persistent tier disabled)."""
+
+    def test_normalize_query(self):
+        assert normalize_query("  Atom   Class 11 ") == "atom class 11"
+
+    def test_hit_after_put(self):
+        cache = EmbeddingCache(persistent=False)
+        cache.put_many({"atom class 11": _vec(0.1)}, MODEL)
+
+        hits, misses = cache.get_many(["Atom  class 11"], MODEL)
+
+        assert misses == []
+        assert np.allclose(hits["atom class 11"], _vec(0.1))
+        assert cache.stats()["l1_hits"] == 1
+
+    def test_keyed_by_model(self):
+        cache = EmbeddingCache(persistent=False)
+        cache.put_many({"python": _vec(0.1)}, MODEL)
+
+        hits, misses = cache.get_many(["python"], "other-model")
+
+        assert hits == {}
+        assert misses == ["python"]
+
+    def test_lru_eviction(self):
+        cache = EmbeddingCache(max_size=2, persistent=False)
+        cache.put_many({"a": _vec(1), "b": _vec(2)}, MODEL)
+        cache.get_many(["a"], MODEL)  # touch "a" so "b" is least recent
+        cache.put_many({"c": _vec(3)}, MODEL)
+
+        hits, misses = cache.get_many(["a", "b", "c"], MODEL)
+
+        assert set(hits) == {"a", "c"}
+        assert misses == ["b"]
+
+    def test_ttl_expiry(self):
+        clock = FakeClock()
+        cache = EmbeddingCache(ttl=60, persistent=False, clock=clock)
+        cache.put_many({"a": _vec(1)}, MODEL)
+
+        clock.now += 61
+        hits, misses = cache.get_many(["a"], MODEL)
+
+        assert hits == {}
+        assert misses == ["a"]
+
+    def test_l2_hit_promotes_to_l1(self):
+        cache = EmbeddingCache(persistent=True)
+        with patch.object(cache, "_l2_get_many", return_value={"a": _vec(1)}) as l2:
+            cache.get_many(["a"], MODEL)
+            cache.get_many(["a"], MODEL)
+
+        l2.assert_called_once()
+        stats = cache.stats()
+        assert stats["l2_hits"] == 1
+        assert stats["l1_hits"] == 1
+
+
+class CountingBackend(HashingBackend):
+    """Hashing backend that records every batch it is asked to embed."""
+
+    def __init__(self):
+        super().__init__()
+        self.calls = []
+
+    def embed(self, texts):
+        self.calls.append(list(texts))
+        return super().embed(texts)
+
+
+class TestCachedEmbeddingCalls:
+    """create_query_embedding(s) should only send cache misses upstream."""
+
+    @pytest.fixture(autouse=True)
+    def _setup(self):
+        self.cache = EmbeddingCache(persistent=False)
+        self.backend = CountingBackend()
+        with patch.object(semantic_search, "embedding_cache", self.cache), \
+             patch.object(semantic_search, "get_backend", return_value=self.backend):
+            yield
+
+    def test_single_query_cached(self):
+        first = semantic_search.create_query_embedding("python basics")
+        second = semantic_search.create_query_embedding("Python  basics")
+
+        assert first is not None and second is not None
+        assert len(self.backend.calls) == 1
+
+    def test_batch_sends_only_misses(self):
+        self.cache.put_many({"python": _vec(0.5)}, self.backend.model_id)
+
+        result = semantic_search.create_query_embeddings(["python", "atoms", "cells"])
+
+        assert len(result) == 3
+        assert self.backend.calls == [["atoms", "cells"]]
+
+    def test_batch_all_cached_skips_upstream(self):
+        self.cache.put_many({"a": _vec(1), "b": _vec(2)}, self.backend.model_id)
+
+        result = semantic_search.create_query_embeddings(["a", "b"])
+
+        assert len(result) == 2
+        assert self.backend.calls == []
@@ -0,0 +1,114 @@
+"""
+Tests for the pluggable embedding backends.
+"""
+import asyncio
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import numpy as np
+import pytest
+
+from scraper.embeddings import (
+    CloudflareBackend,
+    EmbeddingError,
+    HashingBackend,
+    LocalOnnxBackend,
+    binary_quantize,
+    create_backend,
+)
+
+
+class TestHashingBackend:
+    def test_deterministic_and_normalized(self):
+        backend = HashingBackend()
+
+        first, second = backend.embed(["atom class 11", "atom class 11"])
+
+        assert first.shape == (384,)
+        assert first.dtype == np.float32
+        assert np.allclose(first, second)
+        assert np.isclose(np.linalg.norm(first), 1.0)
+
+    def test_similar_texts_score_higher(self):
+        backend = HashingBackend()
+        query, near, far = backend.embed(
+            ["atomic structure", "structure of the atom", "french revolution"]
+        )
+
+        assert float(query @ near) > float(query @ far)
+
+    def test_model_id_includes_dimension(self):
+        assert HashingBackend().model_id == "hashing-v1-384"
+
+
+class TestCloudflareBackend:
+    def test_unavailable_without_credentials(self):
+        assert not CloudflareBackend(account_id=None, api_token=None).available()
+
+    def test_embed_posts_batch_through_shared_client(self):
+        backend = CloudflareBackend(account_id="acct", api_token="token", url="http://cf")
+        response = MagicMock(status_code=200)
+        response.json.return_value = {
+            "success": True,
+            "result": {"data": [[0.1] * 384, [0.2] * 384]},
+        }
+
+        with patch("scraper.embeddings.get_client") as mock_get_client:
+            mock_get_client.return_value.post.return_value = response
+            vectors = backend.embed(["a", "b"])
+
+        mock_get_client.assert_called_once_with("cloudflare")
+        kwargs = mock_get_client.return_value.post.call_args[1]
+        assert kwargs["json"] == {"text": ["a", "b"]}
+        assert kwargs["idempotent"] is True
+        assert len(vectors) == 2
+
+    def test_aembed_posts_through_async_client(self):
+        backend = CloudflareBackend(account_id="acct", api_token="token", url="http://cf")
+        response = MagicMock(status_code=200)
+        response.json.return_value = {
+            "success": True, "result": {"data": [[0.1] * 384]},
+        }
+
+        with patch("scraper.embeddings.get_async_client") as mock_get_client:
+            mock_get_client.return_value.post = AsyncMock(return_value=response)
+            vectors = asyncio.run(backend.aembed(["a"]))
+
+        mock_get_client.assert_called_once_with("cloudflare")
+        assert mock_get_client.return_value.post.call_args[1]["json"] == {"text": "a"}
+        assert len(vectors) == 1
+
+    def test_embed_raises_on_misaligned_response(self):
+        backend = CloudflareBackend(account_id="acct", api_token="token", url="http://cf")
+        response = MagicMock(status_code=200)
+        response.json.return_value = {
+            "success": True, "result": {"data": [[0.1] * 384]},
+        }
+
+        with patch("scraper.embeddings.get_client") as mock_get_client:
+            mock_get_client.return_value.post.return_value = response
+            with pytest.raises(EmbeddingError):
+                backend.embed(["a", "b"])
+
+
+class TestBackendSelection:
+    def test_create_known_backend(self):
+        backend = create_backend("hashing")
+        assert backend.dimension == 384
+
+    def test_unknown_backend_rejected(self):
+        with pytest.raises(ValueError):
+            create_backend("word2vec")
+
+    def test_dimension_mismatch_rejected(self):
+        tiny = {"tiny": lambda: HashingBackend(64)}
+        with patch.dict("scraper.embeddings.BACKENDS", tiny):
+            with pytest.raises(ValueError):
+                create_backend("tiny")
+
+    def test_local_backend_unavailable_without_model(self, tmp_path):
+        assert not LocalOnnxBackend(model_dir=str(tmp_path)).available()
+
+
+class TestBinaryQuantize:
+    def test_positive_components_set_bits(self):
+        assert binary_quantize(np.array([0.3, -0.1, 0.0, 2.0])) == "1001"
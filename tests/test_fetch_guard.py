@@ -0,0 +1,187 @@
+"""
+Tests for the YouTube fetch guard: single-flight, the recently-fetched memo
+and the negative cache with backoff.
+"""
+import asyncio
+import threading
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+from sqlalchemy.orm import Session
+
+from scraper import youtube_scraper
+from scraper.fetch_guard import FetchGuard
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def _guard(clock=None, **kwargs):
+    kwargs.setdefault("recent_window", 600)
+    kwargs.setdefault("negative_ttl", 100)
+    kwargs.setdefault("negative_max_ttl", 350)
+    return FetchGuard(clock=clock or FakeClock(), **kwargs)
+
+
+class TestMemo:
+    def test_recent_fetch_suppresses_until_window_passes(self):
+        clock = FakeClock()
+        guard = _guard(clock)
+        fetch = MagicMock(return_value=(3, 5))
+
+        assert guard.run("Atom class 11", "any", fetch) == 3
+        assert guard.run("atom  class 11", "any", fetch) == 0
+        assert guard.suppressed("atom class 11", "any") == "recent"
+        assert guard.run("atom class 11", "long", fetch) == 3  # other duration
+
+        clock.now = 601
+        guard.run("atom class 11", "any", fetch)
+        assert fetch.call_count == 3
+        assert guard.stats()["suppressed_recent"] == 1
+
+    def test_negative_ttl_backs_off_exponentially(self):
+        clock = FakeClock()
+        guard = _guard(clock)
+        fetch = MagicMock(return_value=(0, 0))
+
+        guard.run("lofi beats", "any", fetch)
+        expiries = []
+        for _ in range(3):
+            while guard.suppressed("lofi beats", "any") == "negative":
+                clock.now += 1
+            expiries.append(clock.now)
+            guard.run("lofi beats", "any", fetch)
+
+        # 100s, then 200s, then capped at 350s
+        gaps = [b - a for a, b in zip([0] + expiries, expiries, strict=False)]
+        assert gaps == [100, 200, 350]
+        assert guard.stats()["empty_fetches"] == 4
+
+    def test_accepted_videos_clear_negative_entry(self):
+        clock = FakeClock()
+        guard = _guard(clock)
+        guard.run("q", "any", MagicMock(return_value=(0, 0)))
+        clock.now = 101
+        guard.run("q", "any", MagicMock(return_value=(2, 2)))
+        assert guard.suppressed("q", "any") == "recent"
+
+    def test_failures_are_not_remembered(self):
+        guard = _guard()
+        with pytest.raises(RuntimeError):
+            guard.run("q", "any", MagicMock(side_effect=RuntimeError("quota")))
+        assert guard.suppressed("q", "any") is None
+
+    def test_deferred_outcome_is_remembered_on_commit_only(self):
+        guard = _guard()
+        pending = []
+
+        guard.run("q", "any", MagicMock(return_value=(2, 2)), defer=pending.append)
+        assert guard.suppressed("q", "any") is None  # not committed yet
+
+        pending.pop()()
+        assert guard.suppressed("q", "any") == "recent"
+
+    def test_failed_fetch_defers_nothing(self):
+        guard = _guard()
+        pending = []
+
+        async def fetch():
+            raise RuntimeError("youtube down")
+
+        with pytest.raises(RuntimeError):
+            asyncio.run(guard.arun("q", "any", fetch, defer=pending.append))
+        assert pending == []
+
+
+class TestSingleFlight:
+    def test_threads_share_one_fetch(self):
+        guard = _guard()
+        release = threading.Event()
+        calls = []
+
+        def fetch():
+            calls.append(1)
+            release.wait(2)
+            return 4, 4
+
+        results = []
+        def worker():
+            results.append(guard.run("q", "any", fetch))
+
+        threads = [threading.Thread(target=worker) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        while guard.stats()["coalesced"] < 3:
+            pass
+        release.set()
+        for thread in threads:
+            thread.join()
+
+        assert len(calls) == 1
+        assert results == [4, 4, 4, 4]
+
+    def test_coroutines_share_one_fetch_and_its_error(self):
+        guard = _guard()
+        calls = []
+
+        async def fetch():
+            calls.append(1)
+            await asyncio.sleep(0.02)
+            raise RuntimeError("youtube down")
+
+        async def run():
+            return await asyncio.gather(
+                *(guard.arun("q", "any", fetch) for _ in range(3)),
+                return_exceptions=True,
+            )
+
+        results = asyncio.run(run())
+
+        assert len(calls) == 1
+        assert all(isinstance(r, RuntimeError) for r in results)
+
+
+class TestYoutubeScraperGuard:
+    def test_repeated_fetch_calls_youtube_once(self):
+        session = Session()
+        with patch.object(youtube_scraper, "fetch_videos",
+                          return_value=[]) as mock_search:
+            youtube_scraper.fetch_and_store_videos("lofi beats", db_session=session)
+            session.commit()
+            youtube_scraper.fetch_and_store_videos("Lofi Beats", db_session=session)
+
+        mock_search.assert_called_once()
+        guard = youtube_scraper.youtube_fetch_guard
+        assert guard.suppressed("lofi beats", "any") == "negative"
+
+    def test_rolled_back_fetch_is_not_remembered(self):
+        session = Session()
+        session.begin()
+        with patch.object(youtube_scraper, "fetch_videos",
+                          return_value=[]) as mock_search:
+            youtube_scraper.fetch_and_store_videos("lofi beats", db_session=session)
+            session.rollback()
+            youtube_scraper.fetch_and_store_videos("lofi beats", db_session=Session())
+
+        assert mock_search.call_count == 2
+
+    def test_error_payload_raises_instead_of_empty(self):
+        response = MagicMock()
+        response.json.return_value = {
+            "error": {"code": 403, "message": "quotaExceeded"},
+        }
+        client = MagicMock()
+        client.get = AsyncMock(return_value=response)
+
+        with patch.object(youtube_scraper, "get_async_client", return_value=client), \
+             pytest.raises(youtube_scraper.YouTubeAPIError, match="quotaExceeded"):
+            asyncio.run(youtube_scraper.afetch_and_store_videos(
+                "atom", db_session=MagicMock(),
+            ))
+
+        assert youtube_scraper.youtube_fetch_guard.suppressed("atom", "any") is None
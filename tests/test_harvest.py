@@ -0,0 +1,146 @@
+"""
+Tests for multi-page YouTube harvesting.
+"""
+import asyncio
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+
+from scraper import harvest, youtube_scraper
+from scraper.youtube_quota import QuotaLedger
+from tests.test_ingestion import make_item
+
+
+class FakeYouTube:
+    """search.list pages of `per_page` ids each, followed by videos.list lookups."""
+
+    def __init__(self, total_pages, per_page=3):
+        self.total_pages = total_pages
+        self.per_page = per_page
+        self.searches = []
+        self.lookups = []
+        self.second_page_requested = asyncio.Event()
+
+    async def search(self, query, max_results, video_duration, page_token):
+        page = int(page_token or 0)
+        self.searches.append(page_token)
+        if page == 1:
+            self.second_page_requested.set()
+        ids = [f"p{page}v{i}" for i in range(self.per_page)]
+        next_token = str(page + 1) if page + 1 < self.total_pages else None
+        return [{"id": {"videoId": vid}} for vid in ids], next_token
+
+    async def details(self, video_ids):
+        self.lookups.append(list(video_ids))
+        if video_ids[0].startswith("p0"):
+            # Completes only if the next search page is requested meanwhile
+            await asyncio.wait_for(self.second_page_requested.wait(), timeout=1)
+        return [make_item(vid) for vid in video_ids]
+
+
+@pytest.fixture
+def ledger():
+    return QuotaLedger(budget=10_000, headroom=0, persistent=False)
+
+
+def run_harvest(youtube, ledger, **kwargs):
+    def store(videos, query, session):
+        return len(videos), 0, len(videos)
+
+    stored = AsyncMock(side_effect=store)
+    client = MagicMock(pool_size=10)
+    with patch.object(harvest, "asearch_page", side_effect=youtube.search), \
+         patch.object(harvest, "aget_video_details", side_effect=youtube.details), \
+         patch.object(harvest, "astore_videos", stored), \
+         patch.object(harvest, "get_async_client", return_value=client), \
+         patch.object(harvest, "youtube_quota", ledger):
+        stats = asyncio.run(harvest.aharvest_videos("biology", MagicMock(), **kwargs))
+    return stats, stored
+
+
+class TestHarvest:
+    def test_follows_page_tokens_up_to_depth(self, ledger):
+        youtube = FakeYouTube(total_pages=10)
+
+        stats, stored = run_harvest(youtube, ledger, pages=3)
+
+        assert youtube.searches == [None, "1", "2"]
+        assert (stats["pages"], stats["results"], stats["stopped"]) == (3, 9, "depth")
+        stored.assert_awaited_once()
+        assert len(stored.call_args[0][0]) == 9
+
+    def test_stops_when_results_are_exhausted(self, ledger):
+        stats, _ = run_harvest(FakeYouTube(total_pages=2), ledger, pages=5)
+
+        assert (stats["pages"], stats["stopped"]) == (2, "exhausted")
+
+    def test_detail_lookup_overlaps_next_search_page(self, ledger):
+        youtube = FakeYouTube(total_pages=2)
+
+        stats, _ = run_harvest(youtube, ledger, pages=2)
+
+        assert stats["detail_failures"] == 0
+        assert len(youtube.lookups) == 2
+
+    def test_overlapping_pages_are_deduplicated(self, ledger):
+        youtube = FakeYouTube(total_pages=3)
+        youtube.search = AsyncMock(side_effect=[
+            ([{"id": {"videoId": "a"}}, {"id": {"videoId": "b"}}], "1"),
+            ([{"id": {"videoId": "b"}}, {"id": {"videoId": "c"}}], None),
+        ])
+        youtube.details = AsyncMock(side_effect=lambda ids: [make_item(i) for i in ids])
+
+        _, stored = run_harvest(youtube, ledger, pages=5)
+
+        assert [v["id"] for v in stored.call_args[0][0]] == ["a", "b", "c"]
+
+    def test_stops_when_quota_does_not_cover_a_page(self, ledger):
+        for _ in range(99):
+            ledger.charge("search")  # 100 units left, a page and its lookup need 101
+
+        stats, stored = run_harvest(FakeYouTube(total_pages=5), ledger)
+
+        assert (stats["pages"], stats["stopped"]) == (0, "quota")
+        assert stored.call_args[0][0] == []
+
+    def test_failed_detail_lookup_drops_only_its_page(self, ledger):
+        youtube = FakeYouTube(total_pages=2)
+
+        async def details(video_ids):
+            if video_ids[0].startswith("p1"):
+                raise RuntimeError("timeout")
+            return [make_item(vid) for vid in video_ids]
+
+        youtube.details = details
+        stats, stored = run_harvest(youtube, ledger, pages=2)
+
+        assert stats["detail_failures"] == 1
+        assert [v["id"] for v in stored.call_args[0][0]] == ["p0v0", "p0v1", "p0v2"]
+
+    def test_first_search_failure_raises(self, ledger):
+        youtube = FakeYouTube(total_pages=2)
+        youtube.search = AsyncMock(side_effect=RuntimeError("youtube down"))
+
+        with pytest.raises(RuntimeError, match="youtube down"):
+            run_harvest(youtube, ledger)
+
+
+class TestSearchPage:
+    def test_sends_page_token_and_returns_next_one(self, ledger):
+        response = MagicMock()
+        response.json.return_value = {
+            "items": [{"id": {"videoId": "x"}}], "nextPageToken": "CAUQAA",
+        }
+        client = MagicMock()
+        client.get = AsyncMock(return_value=response)
+
+        with patch.object(youtube_scraper, "get_async_client", return_value=client), \
+             patch.object(youtube_scraper, "youtube_quota", ledger):
+            items, token = asyncio.run(
+                youtube_scraper.asearch_page("atom", page_token="CAoQAA")
+            )
+
+        assert token == "CAUQAA"
+        assert items == [{"id": {"videoId": "x"}}]
+        assert client.get.call_args[1]["params"]["pageToken"] == "CAoQAA"
+        assert ledger.stats()["by_endpoint"]["search"]["units"] == 100
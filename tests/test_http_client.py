@@ -0,0 +1,338 @@
+"""
+Tests for the shared upstream HTTP client, run against a local fake server
+that injects latency and error responses.
+"""
+import asyncio
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import httpx
+import pytest
+import requests
+
+from scraper.http_client import (
+    AsyncUpstreamClient,
+    CircuitBreaker,
+    UpstreamClient,
+    UpstreamUnavailableError,
+)
+from scraper.stages import StageGraph
+
+
+class FakeUpstream:
+    """
+    Local HTTP server whose responses are scripted per test.
+    Each script entry is (status, delay_seconds); the last entry repeats.
+    """
+
+    def __init__(self):
+        self.script = [(200, 0)]
+        self.calls = 0
+        self.client_ports = []
+        upstream = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"  # keep-alive
+
+            def _respond(self):
+                index = min(upstream.calls, len(upstream.script) - 1)
+                status, delay = upstream.script[index]
+                upstream.calls += 1
+                upstream.client_ports.append(self.client_address[1])
+                length = int(self.headers.get("Content-Length") or 0)
+                if length:
+                    self.rfile.read(length)
+                if delay:
+                    time.sleep(delay)
+                body = json.dumps({"status": status}).encode()
+                try:
+                    self.send_response(status)
+                    self.send_header("Content-Type", "application/json")
+                    self.send_header("Content-Length", str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body)
+                except (BrokenPipeError, ConnectionResetError):
+                    pass
+
+            do_GET = _respond
+            do_POST = _respond
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.server.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}/"
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+@pytest.fixture
+def upstream():
+    server = FakeUpstream()
+    yield server
+    server.close()
+
+
+def make_client(**kwargs):
+    options = {
+        "connect_timeout": 1.0,
+        "read_timeout": 1.0,
+        "retries": 2,
+        "breaker_threshold": 3,
+        "breaker_reset": 30.0,
+        "sleep": lambda _: None,
+    }
+    options.update(kwargs)
+    return UpstreamClient("fake", **options)
+
+
+class TestPooling:
+    def test_connections_are_reused(self, upstream):
+        client = make_client()
+
+        for _ in range(5):
+            assert client.get(upstream.url).status_code == 200
+
+        assert upstream.calls == 5
+        assert len(set(upstream.client_ports)) == 1
+
+
+class TestRetries:
+    def test_retries_idempotent_get_on_503(self, upstream):
+        upstream.script = [(503, 0), (503, 0), (200, 0)]
+        client = make_client()
+
+        response = client.get(upstream.url)
+
+        assert response.status_code == 200
+        assert upstream.calls == 3
+        assert client.stats()["retries"] == 2
+
+    def test_post_not_retried_by_default(self, upstream):
+        upstream.script = [(503, 0), (200, 0)]
+        client = make_client()
+
+        response = client.post(upstream.url, json={"text": "x"})
+
+        assert response.status_code == 503
+        assert upstream.calls == 1
+
+    def test_post_retried_when_marked_idempotent(self, upstream):
+        upstream.script = [(502, 0), (200, 0)]
+        client = make_client()
+
+        response = client.post(upstream.url, json={"text": "x"}, idempotent=True)
+
+        assert response.status_code == 200
+        assert upstream.calls == 2
+
+    def test_client_errors_not_retried(self, upstream):
+        upstream.script = [(403, 0)]
+        client = make_client()
+
+        assert client.get(upstream.url).status_code == 403
+        assert upstream.calls == 1
+
+    def test_slow_upstream_times_out_then_recovers(self, upstream):
+        upstream.script = [(200, 0.5), (200, 0)]
+        client = make_client(read_timeout=0.1)
+
+        response = client.get(upstream.url)
+
+        assert response.status_code == 200
+        assert upstream.calls == 2
+
+    def test_timeout_raises_after_retries_exhausted(self, upstream):
+        upstream.script = [(200, 0.5)]
+        client = make_client(read_timeout=0.1, retries=1)
+
+        with pytest.raises(requests.Timeout):
+            client.get(upstream.url)
+        assert upstream.calls == 2
+
+
+class TestCircuitBreaker:
+    def test_opens_after_threshold_and_fails_fast(self, upstream):
+        upstream.script = [(500, 0)]
+        client = make_client(retries=0, breaker_threshold=3)
+
+        for _ in range(3):
+            client.get(upstream.url)
+        assert client.breaker.state == "open"
+
+        started = time.monotonic()
+        with pytest.raises(UpstreamUnavailableError):
+            client.get(upstream.url)
+        assert time.monotonic() - started < 0.05
+        assert upstream.calls == 3
+        assert client.stats()["short_circuited"] == 1
+
+    def test_half_open_trial_closes_on_success(self):
+        now = [0.0]
+        breaker = CircuitBreaker(threshold=1, reset_timeout=10, clock=lambda: now[0])
+        breaker.record_failure()
+        assert not breaker.allow_request()
+
+        now[0] = 11
+        assert breaker.allow_request()  # trial call
+        assert not breaker.allow_request()  # only one trial at a time
+        breaker.record_success()
+
+        assert breaker.state == "closed"
+
+    def test_half_open_trial_reopens_on_failure(self):
+        now = [0.0]
+        breaker = CircuitBreaker(threshold=5, reset_timeout=10, clock=lambda: now[0])
+        for _ in range(5):
+            breaker.record_failure()
+
+        now[0] = 11
+        assert breaker.allow_request()
+        breaker.record_failure()
+
+        assert breaker.state == "open"
+
+
+    def test_unexpected_error_during_trial_releases_it(self, monkeypatch):
+        client = make_client(retries=0, breaker_threshold=1, breaker_reset=0)
+        client.breaker.record_failure()
+        calls = []
+
+        def broken(*args, **kwargs):
+            calls.append(1)
+            raise ValueError("bad hook")
+
+        monkeypatch.setattr(client.session, "request", broken)
+        for _ in range(2):
+            # The failed trial reopens the circuit; the next trial is allowed again
+            with pytest.raises(ValueError):
+                client.get("http://upstream.invalid/")
+
+        assert len(calls) == 2
+        assert client.stats()["failures"] == 2
+
+
+def make_async_client(**kwargs):
+    options = {
+        "connect_timeout": 1.0,
+        "read_timeout": 1.0,
+        "retries": 2,
+        "breaker_threshold": 3,
+        "breaker_reset": 30.0,
+    }
+    options.update(kwargs)
+
+    async def no_sleep(_):
+        pass
+    return AsyncUpstreamClient("fake", sleep=no_sleep, **options)
+
+
+class TestAsyncUpstreamClient:
+    def test_retries_idempotent_get_on_503(self, upstream):
+        upstream.script = [(503, 0), (200, 0)]
+
+        async def scenario():
+            client = make_async_client()
+            try:
+                return await client.get(upstream.url), client.stats()
+            finally:
+                await client.aclose()
+
+        response, stats = asyncio.run(scenario())
+
+        assert response.status_code == 200
+        assert upstream.calls == 2
+        assert stats["retries"] == 1
+
+    def test_timeout_raises_after_retries_exhausted(self, upstream):
+        upstream.script = [(200, 0.5)]
+
+        async def scenario():
+            client = make_async_client(read_timeout=0.1, retries=1)
+            try:
+                await client.get(upstream.url)
+            finally:
+                await client.aclose()
+
+        with pytest.raises(httpx.TimeoutException):
+            asyncio.run(scenario())
+        assert upstream.calls == 2
+
+    def test_open_circuit_fails_fast(self, upstream):
+        upstream.script = [(500, 0)]
+
+        async def scenario():
+            client = make_async_client(retries=0, breaker_threshold=1)
+            try:
+                await client.get(upstream.url)
+                with pytest.raises(UpstreamUnavailableError):
+                    await client.get(upstream.url)
+            finally:
+                await client.aclose()
+
+        asyncio.run(scenario())
+        assert upstream.calls == 1
+
+    def test_cancelled_trial_releases_the_circuit(self, upstream):
+        upstream.script = [(200, 0.5)]
+
+        async def scenario():
+            client = make_async_client(retries=0, breaker_threshold=1, breaker_reset=0)
+            client.breaker.record_failure()
+            try:
+                trial = asyncio.create_task(client.get(upstream.url))
+                await asyncio.sleep(0.05)
+                trial.cancel()
+                with pytest.raises(asyncio.CancelledError):
+                    await trial
+                return client.breaker.allow_request()
+            finally:
+                await client.aclose()
+
+        assert asyncio.run(scenario())
+
+    def test_cancelled_stages_do_not_open_the_circuit(self, upstream):
+        upstream.script = [(200, 0.5)]
+
+        async def scenario():
+            client = make_async_client(retries=0, breaker_threshold=3)
+            try:
+                for _ in range(client.breaker.threshold):
+                    graph = StageGraph()
+                    graph.start("embed", lambda: client.get(upstream.url))
+                    await asyncio.sleep(0.05)
+                    graph.cancel("embed")
+                    await graph.aclose()
+                return client.breaker.state, client.stats()["failures"]
+            finally:
+                await client.aclose()
+
+        assert asyncio.run(scenario()) == ("closed", 0)
+
+    def test_slow_upstream_does_not_block_the_event_loop(self, upstream):
+        upstream.script = [(200, 0.5)]
+
+        async def scenario():
+            client = make_async_client(read_timeout=2.0)
+            try:
+                slow = asyncio.create_task(client.get(upstream.url))
+                started = time.monotonic()
+                await asyncio.sleep(0.05)
+                # Other coroutines keep running while the request is in flight
+                ticked_after = time.monotonic() - started
+                assert not slow.done()
+                return ticked_after, (await slow).status_code
+            finally:
+                await client.aclose()
+
+        ticked_after, status = asyncio.run(scenario())
+
+        assert ticked_after < 0.3
+        assert status == 200
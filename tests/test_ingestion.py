@@ -0,0 +1,160 @@
+"""
+Tests for YouTube ingestion in fetch_and_store_videos.
+"""
+from unittest.mock import MagicMock, patch
+
+import numpy as np
+import pytest
+from sqlalchemy.orm import Session
+
+from scraper import youtube_scraper
+from scraper.embeddings import HashingBackend
+
+
+def make_item(video_id, title="Photosynthesis explained", duration="PT10M",
+              category="27"):
+    return {
+        "id": video_id,
+        "snippet": {
+            "title": title,
+            "description": "Biology lesson",
+            "categoryId": category,
+            "thumbnails": {"high": {"url": f"https://img/{video_id}.jpg"}},
+            "publishedAt": "2024-01-01T00:00:00Z",
+        },
+        "statistics": {"viewCount": "100", "likeCount": "10"},
+        "contentDetails": {"duration": duration},
+    }
+
+
+@pytest.fixture
+def youtube():
+    items = [
+        make_item("vid1"),
+        make_item("vid2", title="Cell division"),
+        make_item("short1", duration="PT30S"),
+        make_item("music1", category="10"),
+    ]
+    with patch.object(youtube_scraper, "fetch_videos",
+                      return_value=[{"id": {"videoId": i["id"]}} for i in items]), \
+         patch.object(youtube_scraper, "get_video_details", return_value=items), \
+         patch.object(youtube_scraper, "_exclude_existing",
+                      side_effect=lambda videos, s=None: videos), \
+         patch.object(youtube_scraper, "get_backend", return_value=HashingBackend()), \
+         patch.object(youtube_scraper, "request_backfill") as mock_backfill:
+        yield mock_backfill
+
+
+def empty_session():
+    """Session mock on which every existence check finds nothing."""
+    session = MagicMock()
+    session.query.return_value.filter.return_value.first.return_value = None
+    return session
+
+
+def fetch_biology(session):
+    return youtube_scraper.fetch_and_store_videos("biology", db_session=session)
+
+
+@pytest.fixture
+def upsert():
+    """Capture the rows written by the batch upsert (each reported as inserted)."""
+    written = []
+
+    def fake_upsert(session, rows):
+        written.extend(rows)
+        return len(rows), 0
+
+    with patch.object(youtube_scraper, "upsert_videos", side_effect=fake_upsert):
+        yield written
+
+
+class TestFetchAndStoreVideos:
+    def test_accepted_videos_embedded_in_one_batch(self, youtube, upsert):
+        session = empty_session()
+        with patch.object(youtube_scraper, "embed_texts",
+                          wraps=youtube_scraper.embed_texts) as mock_embed:
+            inserted = fetch_biology(session)
+
+        assert inserted == 2
+        mock_embed.assert_called_once()
+        assert len(mock_embed.call_args[0][0]) == 2
+
+        assert [row["youtube_id"] for row in upsert] == ["vid1", "vid2"]
+        assert all(len(row["embedding"]) == 384 for row in upsert)
+        assert all(row["embedding_model"] == "hashing-v1-384" for row in upsert)
+        youtube.assert_not_called()
+
+    def test_embedding_failure_stores_rows_for_backfill(self, youtube, upsert):
+        session = Session()
+        down = RuntimeError("down")
+        with patch.object(youtube_scraper, "embed_texts", side_effect=down):
+            inserted = fetch_biology(session)
+
+        assert inserted == 2
+        assert all(row["embedding"] is None for row in upsert)
+        assert all(row["embedding_model"] is None for row in upsert)
+        youtube.assert_not_called()  # not before the caller commits
+        session.commit()
+        youtube.assert_called_once()
+
+    def test_invalidation_waits_for_the_callers_commit(self, youtube, upsert):
+        session = Session()
+        with patch.object(youtube_scraper.corpus_state, "invalidate") as mock_corpus, \
+             patch.object(youtube_scraper.result_cache,
+                          "invalidate_videos") as mock_cache:
+            fetch_biology(session)
+            mock_corpus.assert_not_called()
+            mock_cache.assert_not_called()
+
+            session.commit()
+
+        mock_corpus.assert_called_once()
+        assert mock_cache.call_args.kwargs["query"] == "biology"
+
+    def test_rolled_back_batch_invalidates_nothing(self, youtube, upsert):
+        session = Session()
+        session.begin()
+        with patch.object(youtube_scraper.corpus_state, "invalidate") as mock_corpus, \
+             patch.object(youtube_scraper.result_cache,
+                          "invalidate_videos") as mock_cache:
+            fetch_biology(session)
+            session.rollback()
+            session.commit()
+
+        mock_corpus.assert_not_called()
+        mock_cache.assert_not_called()
+
+    def test_known_videos_refresh_statistics_without_embedding(self, youtube, upsert):
+        known = {"vid1"}
+
+        def exclude_existing(videos, s=None):
+            return [v for v in videos if v["id"] not in known]
+
+        with patch.object(youtube_scraper, "_exclude_existing",
+                          side_effect=exclude_existing), \
+             patch.object(youtube_scraper, "embed_texts",
+                          wraps=youtube_scraper.embed_texts) as mock_embed:
+            fetch_biology(empty_session())
+
+        assert len(mock_embed.call_args[0][0]) == 1
+        rows = {row["youtube_id"]: row for row in upsert}
+        assert rows["vid1"]["embedding"] is None
+        assert rows["vid1"]["view_count"] == 100
+        assert rows["vid2"]["embedding"] is not None
+
+
+class TestInsertVideo:
+    def test_insert_with_embedding(self):
+        session = empty_session()
+
+        ok = youtube_scraper.insert_video(
+            make_item("vid9"), db_session=session,
+            embedding=np.zeros(384, dtype=np.float32), embedding_model="m",
+        )
+
+        assert ok
+        video = session.add.call_args[0][0]
+        assert video.embedding_model == "m"
+        assert video.duration == 600
+        session.commit.assert_not_called()  # caller owns the session
@@ -0,0 +1,320 @@
+"""
+Tests for the background YouTube ingestion queue: job lifecycle, worker
+runs, metrics and the refresh endpoints.
+"""
+import asyncio
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from sqlalchemy.dialects import postgresql
+
+from backend.app import app, get_current_user_id
+from backend.database import get_async_db
+from scraper import ingestion_queue as iq
+from scraper.ingestion_queue import MemoryQueue, PostgresQueue, ingestion_loop, run_job
+
+
+def _session_factory(session):
+    context = MagicMock()
+    context.__aenter__ = AsyncMock(return_value=session)
+    context.__aexit__ = AsyncMock(return_value=False)
+    return MagicMock(return_value=context)
+
+
+def _session():
+    session = MagicMock()
+    session.commit = AsyncMock()
+    session.rollback = AsyncMock()
+    return session
+
+
+class TestMemoryQueue:
+    def test_duplicate_enqueue_returns_active_job(self):
+        queue = MemoryQueue()
+
+        async def run():
+            first, created = await queue.enqueue("Atom  Class 11", "any", 20)
+            second, created_again = await queue.enqueue("atom class 11", "any", 20)
+            other, _ = await queue.enqueue("atom class 11", "long", 20)
+            return first, created, second, created_again, other
+
+        first, created, second, created_again, other = asyncio.run(run())
+
+        assert created and not created_again
+        assert first["id"] == second["id"]
+        assert other["id"] != first["id"]
+        assert first["query"] == "atom class 11"
+
+    def test_claim_highest_priority_first(self):
+        queue = MemoryQueue()
+
+        async def run():
+            await queue.enqueue("rare", "any", 20, priority=0.5)
+            await queue.enqueue("popular", "any", 20, priority=4.0)
+            # raises the active job
+            await queue.enqueue("rare", "any", 20, priority=6.0)
+            return [(await queue.claim())["query"] for _ in range(2)]
+
+        assert asyncio.run(run()) == ["rare", "popular"]
+
+    def test_claim_in_order_and_complete(self):
+        queue = MemoryQueue()
+
+        async def run():
+            await queue.enqueue("a", "any", 20)
+            await queue.enqueue("b", "any", 20)
+            job = await queue.claim()
+            await queue.complete(job["id"], 3)
+            finished = await queue.get(job["id"])
+            active = await queue.active_job("a", "any")
+            return job, finished, await queue.depth(), active
+
+        job, finished, depth, active = asyncio.run(run())
+
+        assert job["query"] == "a" and job["status"] == "running"
+        assert job["attempts"] == 1
+        assert finished["status"] == "done" and finished["inserted"] == 3
+        assert depth == 1
+        assert active is None
+
+    def test_failed_job_is_retried_until_attempts_run_out(self):
+        queue = MemoryQueue(max_attempts=2)
+
+        async def run():
+            await queue.enqueue("a", "any", 20)
+            statuses = []
+            for _ in range(2):
+                job = await queue.claim()
+                statuses.append(await queue.fail(job["id"], "quota"))
+            return statuses, await queue.claim(), await queue.get(job["id"])
+
+        statuses, next_job, job = asyncio.run(run())
+
+        assert statuses == ["queued", "failed"]
+        assert next_job is None
+        assert job["error"] == "quota" and job["finished_at"] is not None
+
+    def test_wait_finished_returns_once_done(self):
+        queue = MemoryQueue()
+
+        async def run():
+            job, _ = await queue.enqueue("a", "any", 20)
+
+            async def finish():
+                await asyncio.sleep(0.05)
+                await queue.claim()
+                await queue.complete(job["id"], 1)
+
+            asyncio.get_running_loop().create_task(finish())
+            return await queue.wait_finished(job["id"], timeout=2)
+
+        assert asyncio.run(run())["status"] == "done"
+
+
+class TestRunJob:
+    def test_success_commits_and_records_metrics(self):
+        queue = MemoryQueue()
+        session = _session()
+        iq.ingestion_metrics.clear()
+
+        async def run():
+            await queue.enqueue("atom", "short", 20)
+            job = await queue.claim()
+            with patch("scraper.youtube_scraper.afetch_and_store_videos",
+                       AsyncMock(return_value=4)) as mock_fetch:
+                status = await run_job(job, queue, _session_factory(session))
+            return status, mock_fetch, await queue.get(job["id"])
+
+        status, mock_fetch, job = asyncio.run(run())
+
+        assert status == "done"
+        mock_fetch.assert_awaited_once_with("atom", max_results=20,
+                                            video_duration="short", db_session=session)
+        session.commit.assert_awaited_once()
+        assert job["inserted"] == 4
+        stats = iq.ingestion_metrics.stats()
+        assert stats["succeeded"] == 1 and stats["videos_inserted"] == 4
+        assert stats["success_rate"] == 1.0
+
+    def test_failure_rolls_back_and_requeues(self):
+        queue = MemoryQueue()
+        session = _session()
+        iq.ingestion_metrics.clear()
+
+        async def run():
+            await queue.enqueue("atom", "any", 20)
+            job = await queue.claim()
+            with patch("scraper.youtube_scraper.afetch_and_store_videos",
+                       AsyncMock(side_effect=RuntimeError("youtube down"))):
+                return await run_job(job, queue, _session_factory(session))
+
+        assert asyncio.run(run()) == "queued"
+        session.rollback.assert_awaited_once()
+        session.commit.assert_not_awaited()
+        assert iq.ingestion_metrics.stats()["retried"] == 1
+
+    def test_worker_leaves_jobs_queued_without_quota(self):
+        queue = MemoryQueue()
+
+        async def run():
+            with patch.object(iq.youtube_quota, "available", return_value=False), \
+                 patch("scraper.youtube_scraper.afetch_and_store_videos") as mock_fetch:
+                await queue.enqueue("atom", "any", 20)
+                worker = asyncio.get_running_loop().create_task(
+                    ingestion_loop(queue, workers=1, poll_interval=0.01)
+                )
+                await asyncio.sleep(0.05)
+                worker.cancel()
+                return mock_fetch, await queue.depth()
+
+        mock_fetch, depth = asyncio.run(run())
+        mock_fetch.assert_not_called()
+        assert depth == 1
+
+    def test_worker_survives_quota_check_errors(self):
+        queue = MemoryQueue()
+        checks = []
+
+        def available(cost):
+            checks.append(cost)
+            if len(checks) == 1:
+                raise RuntimeError("db down")
+            return True
+
+        async def run():
+            with patch.object(iq.youtube_quota, "available", side_effect=available), \
+                 patch.object(iq, "AsyncSessionLocal", _session_factory(_session())), \
+                 patch("scraper.youtube_scraper.afetch_and_store_videos",
+                       AsyncMock(return_value=1)):
+                job, _ = await queue.enqueue("atom", "any", 20)
+                worker = asyncio.get_running_loop().create_task(
+                    ingestion_loop(queue, workers=1, poll_interval=0.01)
+                )
+                finished = await queue.wait_finished(job["id"], timeout=2)
+                worker.cancel()
+                return finished
+
+        assert asyncio.run(run())["status"] == "done"
+        assert len(checks) >= 2
+
+    def test_worker_loop_drains_queue(self):
+        queue = MemoryQueue()
+
+        async def run():
+            with patch.object(iq, "AsyncSessionLocal", _session_factory(_session())), \
+                 patch("scraper.youtube_scraper.afetch_and_store_videos",
+                       AsyncMock(return_value=1)):
+                worker = asyncio.get_running_loop().create_task(
+                    ingestion_loop(queue, workers=2, poll_interval=5)
+                )
+                await asyncio.sleep(0)  # workers are idle, waiting for a job
+                job, _ = await queue.enqueue("atom", "any", 20)
+                finished = await queue.wait_finished(job["id"], timeout=2)
+                worker.cancel()
+                return finished
+
+        assert asyncio.run(run())["status"] == "done"
+
+
+class TestPostgresQueue:
+    def test_claim_skips_locked_rows(self):
+        session = _session()
+        result = MagicMock()
+        result.first.return_value = None
+        session.execute = AsyncMock(return_value=result)
+        queue = PostgresQueue(session_factory=_session_factory(session), lease=120,
+                              max_attempts=3)
+
+        assert asyncio.run(queue.claim()) is None
+        sql, params = session.execute.await_args[0]
+        assert "FOR UPDATE SKIP LOCKED" in str(sql)
+        assert params == {"lease": 120, "max_attempts": 3}
+
+    def test_expired_lease_at_max_attempts_fails_instead_of_reclaim(self):
+        session = _session()
+        session.execute = AsyncMock(return_value=MagicMock())
+        queue = PostgresQueue(session_factory=_session_factory(session), lease=120,
+                              max_attempts=3)
+
+        asyncio.run(queue.claim())
+
+        (expire, expire_params), (claim, _) = (
+            call[0] for call in session.execute.await_args_list
+        )
+        assert str(expire) == iq.EXPIRE_SQL and str(claim) == iq.CLAIM_SQL
+        assert expire_params == {"lease": 120, "max_attempts": 3}
+        assert "SET status = 'failed'" in iq.EXPIRE_SQL
+        assert "attempts >= :max_attempts" in iq.EXPIRE_SQL
+        # The reclaim branch only takes jobs with attempts left
+        assert "status = 'running' AND attempts < :max_attempts" in iq.CLAIM_SQL
+
+    def test_enqueue_targets_active_job_index(self):
+        session = _session()
+        result = MagicMock()
+        result.first.return_value = MagicMock(
+            _mapping={"id": 7, "status": "queued", "created": False}
+        )
+        session.execute = AsyncMock(return_value=result)
+        queue = PostgresQueue(session_factory=_session_factory(session))
+
+        job, created = asyncio.run(queue.enqueue("Atom", "any", 20, priority=2.5))
+
+        assert not created and job == {"id": 7, "status": "queued"}
+        stmt = session.execute.await_args[0][0]
+        sql = str(stmt.compile(dialect=postgresql.dialect()))
+        assert ("ON CONFLICT (query, video_duration) "
+                "WHERE status IN ('queued', 'running') DO UPDATE") in sql
+        assert "greatest(ingestion_jobs.priority, excluded.priority)" in sql
+
+    def test_claim_orders_by_priority(self):
+        assert "ORDER BY priority DESC, id" in iq.CLAIM_SQL
+
+
+class TestRefreshEndpoints:
+    def _client_overrides(self):
+        async def override_user():
+            return "test-user-123"
+
+        async def override_db():
+            yield None
+
+        app.dependency_overrides[get_current_user_id] = override_user
+        app.dependency_overrides[get_async_db] = override_db
+
+    def test_recommend_reports_active_refresh(self, client, sample_videos):
+        queue = MemoryQueue()
+        asyncio.run(queue.enqueue("atom class 11", "any", 20))
+        self._client_overrides()
+        try:
+            recommend = AsyncMock(return_value=sample_videos)
+            with patch("backend.app.arecommend", recommend), \
+                 patch("backend.app.alog_search", AsyncMock()), \
+                 patch("backend.app.ingestion_queue", queue):
+                response = client.get("/api/recommend",
+                                      params={"query": "Atom class 11"})
+        finally:
+            app.dependency_overrides.clear()
+
+        refresh = response.json()["refresh"]
+        assert refresh["status"] == "queued"
+        assert refresh["poll"] == f"/api/recommend/refresh/{refresh['job_id']}"
+
+    def test_poll_reports_job_and_404s_unknown(self, client):
+        queue = MemoryQueue()
+        job, _ = asyncio.run(queue.enqueue("atom", "short", 20))
+        self._client_overrides()
+        try:
+            with patch("backend.app.ingestion_queue", queue):
+                found = client.get(f"/api/recommend/refresh/{job['id']}")
+                missing = client.get("/api/recommend/refresh/999")
+        finally:
+            app.dependency_overrides.clear()
+
+        assert found.status_code == 200
+        assert found.json()["status"] == "queued"
+        assert found.json()["duration"] == "short"
+        assert missing.status_code == 404
+
+    def test_metrics_expose_queue(self, client):
+        response = client.get("/api/metrics")
+        ingestion = response.json()["ingestion"]
+        assert {"depth", "success_rate", "queue_wait", "run"} <= set(ingestion)
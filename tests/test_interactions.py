@@ -1,11 +1,12 @@
 """
 Tests for POST /api/interactions endpoint.
 """
-from unittest.mock import MagicMock, patch
+from unittest.mock import AsyncMock, MagicMock
 
 import pytest
 
 from backend.app import app, get_current_user_id
+from backend.database import get_async_db
 
 
 # Override auth dependency for testing
@@ -13,6 +14,25 @@ async def mock_get_user_id():
     return "test-user-123"
 
 
+def _async_session(video, interaction_id=None):
+    """AsyncSession stand-in whose video lookup returns `video`."""
+    session = MagicMock()
+    result = MagicMock()
+    result.scalars.return_value.first.return_value = video
+    session.execute = AsyncMock(return_value=result)
+    session.commit = AsyncMock()
+    session.rollback = AsyncMock()
+
+    async def _set_id(obj):
+        obj.id = interaction_id
+    session.refresh = AsyncMock(side_effect=_set_id)
+
+    async def override():
+        yield session
+    app.dependency_overrides[get_async_db] = override
+    return session
+
+
 class TestInteractionEndpoint:
     """Tests for the interaction logging endpoint."""
 
@@ -20,7 +40,7 @@ class TestInteractionEndpoint:
         """POST /api/interactions without auth should return 401."""
         response = client.post(
             "/api/interactions",
-            json={"video_id": 1, "interaction_type": "click"},
+            json={"video_id": "abc123", "interaction_type": "click"},
         )
         assert response.status_code == 401
 
@@ -28,22 +48,13 @@ class TestInteractionEndpoint:
         """Logging a click interaction for an existing video returns 201."""
         app.dependency_overrides[get_current_user_id] = mock_get_user_id
 
-        fake_video = MagicMock(id=1)
-        mock_session = MagicMock()
-        mock_session.query.return_value.filter.return_value.first.return_value = fake_video
+        mock_session = _async_session(MagicMock(id=1), interaction_id=42)
 
-        def _set_id(obj):
-            obj.id = 42
-        mock_session.refresh.side_effect = _set_id
-
-        with patch("backend.app.get_db") as mock_get_db:
-            mock_get_db.return_value = iter([mock_session])
-
-            response = client.post(
-                "/api/interactions",
-                json={"video_id": 1, "interaction_type": "click"},
-                headers={"Authorization": "Bearer fake-token"},
-            )
+        response = client.post(
+            "/api/interactions",
+            json={"video_id": "abc123", "interaction_type": "click"},
+            headers={"Authorization": "Bearer fake-token"},
+        )
 
         assert response.status_code == 201
         data = response.json()
@@ -58,22 +69,13 @@ class TestInteractionEndpoint:
         """Logging a watch interaction returns 201."""
         app.dependency_overrides[get_current_user_id] = mock_get_user_id
 
-        fake_video = MagicMock(id=1)
-        mock_session = MagicMock()
-        mock_session.query.return_value.filter.return_value.first.return_value = fake_video
-
-        def _set_id(obj):
-            obj.id = 99
-        mock_session.refresh.side_effect = _set_id
+        _async_session(MagicMock(id=1), interaction_id=99)
 
-        with patch("backend.app.get_db") as mock_get_db:
-            mock_get_db.return_value = iter([mock_session])
-
-            response = client.post(
-                "/api/interactions",
-                json={"video_id": 1, "interaction_type": "watch"},
-                headers={"Authorization": "Bearer fake-token"},
-            )
+        response = client.post(
+            "/api/interactions",
+            json={"video_id": "abc123", "interaction_type": "watch"},
+            headers={"Authorization": "Bearer fake-token"},
+        )
 
         assert response.status_code == 201
         assert response.json()["interaction_id"] == 99
@@ -84,22 +86,13 @@ class TestInteractionEndpoint:
         """Rating interaction with a valid rating returns 201."""
         app.dependency_overrides[get_current_user_id] = mock_get_user_id
 
-        fake_video = MagicMock(id=1)
-        mock_session = MagicMock()
-        mock_session.query.return_value.filter.return_value.first.return_value = fake_video
-
-        def _set_id(obj):
-            obj.id = 7
-        mock_session.refresh.side_effect = _set_id
-
-        with patch("backend.app.get_db") as mock_get_db:
-            mock_get_db.return_value = iter([mock_session])
+        _async_session(MagicMock(id=1), interaction_id=7)
 
-            response = client.post(
-                "/api/interactions",
-                json={"video_id": 1, "interaction_type": "rating", "rating": 4},
-                headers={"Authorization": "Bearer fake-token"},
-            )
+        response = client.post(
+            "/api/interactions",
+            json={"video_id": "abc123", "interaction_type": "rating", "rating": 4},
+            headers={"Authorization": "Bearer fake-token"},
+        )
 
         assert response.status_code == 201
         assert response.json()["interaction_id"] == 7
@@ -112,7 +105,7 @@ class TestInteractionEndpoint:
 
         response = client.post(
             "/api/interactions",
-            json={"video_id": 1, "interaction_type": "rating"},
+            json={"video_id": "abc123", "interaction_type": "rating"},
             headers={"Authorization": "Bearer fake-token"},
         )
         assert response.status_code == 422
@@ -125,14 +118,14 @@ class TestInteractionEndpoint:
 
         response = client.post(
             "/api/interactions",
-            json={"video_id": 1, "interaction_type": "rating", "rating": 0},
+            json={"video_id": "abc123", "interaction_type": "rating", "rating": 0},
             headers={"Authorization": "Bearer fake-token"},
         )
         assert response.status_code == 422
 
         response = client.post(
             "/api/interactions",
-            json={"video_id": 1, "interaction_type": "rating", "rating": 6},
+            json={"video_id": "abc123", "interaction_type": "rating", "rating": 6},
             headers={"Authorization": "Bearer fake-token"},
         )
         assert response.status_code == 422
@@ -145,7 +138,7 @@ class TestInteractionEndpoint:
 
         response = client.post(
             "/api/interactions",
-            json={"video_id": 1, "interaction_type": "bookmark"},
+            json={"video_id": "abc123", "interaction_type": "bookmark"},
             headers={"Authorization": "Bearer fake-token"},
         )
         assert response.status_code == 422
@@ -156,17 +149,13 @@ class TestInteractionEndpoint:
         """Interaction for a nonexistent video returns 404."""
         app.dependency_overrides[get_current_user_id] = mock_get_user_id
 
-        mock_session = MagicMock()
-        mock_session.query.return_value.filter.return_value.first.return_value = None
-
-        with patch("backend.app.get_db") as mock_get_db:
-            mock_get_db.return_value = iter([mock_session])
+        _async_session(None)
 
-            response = client.post(
-                "/api/interactions",
-                json={"video_id": 9999, "interaction_type": "click"},
-                headers={"Authorization": "Bearer fake-token"},
-            )
+        response = client.post(
+            "/api/interactions",
+            json={"video_id": "missing999", "interaction_type": "click"},
+            headers={"Authorization": "Bearer fake-token"},
+        )
 
         assert response.status_code == 404
         assert "not found" in response.json()["error"]
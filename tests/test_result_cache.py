@@ -0,0 +1,268 @@
+"""
+Tests for the recommendation result cache: TTL, coalescing of concurrent
+misses, selective invalidation and the Redis backend (against a local fake).
+"""
+import asyncio
+import fnmatch
+from unittest.mock import AsyncMock, patch
+
+import pytest
+
+from scraper.result_cache import InProcessBackend, RedisBackend, ResultCache
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class FakeRedis:
+    """The subset of redis.Redis the backend uses; no expiry."""
+
+    def __init__(self):
+        self.strings = {}
+        self.sets = {}
+
+    def pipeline(self, transaction=True):
+        return self
+
+    def execute(self):
+        return []
+
+    def get(self, key):
+        return self.strings.get(key)
+
+    def set(self, key, value, ex=None):
+        self.strings[key] = value.encode()
+
+    def sadd(self, key, member):
+        self.sets.setdefault(key, set()).add(member.encode())
+
+    def expire(self, key, seconds):
+        pass
+
+    def sunion(self, keys):
+        return set().union(*(self.sets.get(k, set()) for k in keys))
+
+    def delete(self, *keys):
+        for key in keys:
+            key = key.decode() if isinstance(key, bytes) else key
+            self.strings.pop(key, None)
+            self.sets.pop(key, None)
+
+    def scan_iter(self, match):
+        keys = list(self.strings) + list(self.sets)
+        return [k.encode() for k in keys if fnmatch.fnmatch(k, match)]
+
+
+RESULTS = [{"video_id": "v1", "score": 0.9}, {"video_id": "v2", "score": 0.8}]
+
+
+def _cache(backend=None, clock=None, ttl=60):
+    backend = backend or InProcessBackend(clock=clock or FakeClock())
+    return ResultCache(backend, ttl=ttl, enabled=True)
+
+
+def _get(cache, query, duration="any", compute=None):
+    compute = compute or AsyncMock(return_value=RESULTS)
+    key = cache.key(query, duration, 10, "model-a")
+    tags = cache.tags(query, duration)
+    return asyncio.run(cache.aget_or_compute(key, compute, tags=tags)), compute
+
+
+@pytest.fixture(params=["memory", "redis"])
+def cache(request):
+    if request.param == "redis":
+        return _cache(RedisBackend(FakeRedis()))
+    return _cache()
+
+
+class TestKeys:
+    def test_key_normalizes_query(self):
+        assert (ResultCache.key("Atom  Class 11", "any", 10, "m")
+                == ResultCache.key("atom class 11", "any", 10, "m"))
+
+    def test_key_separates_duration_top_n_and_model(self):
+        base = ResultCache.key("atom", "any", 10, "m")
+        assert base != ResultCache.key("atom", "short", 10, "m")
+        assert base != ResultCache.key("atom", "any", 5, "m")
+        assert base != ResultCache.key("atom", "any", 10, "other")
+        assert base != ResultCache.key("atom", "any", 10, "m", ef_search=100)
+
+    def test_tags_drop_stopwords(self):
+        assert ResultCache.tags("What is the atom", "short") == {"short:atom"}
+
+
+class TestResultCache:
+    def test_second_call_is_served_from_cache(self, cache):
+        first, compute = _get(cache, "atom class 11")
+        second, _ = _get(cache, "Atom class 11", compute=compute)
+
+        compute.assert_awaited_once()
+        assert first == second == RESULTS
+        assert cache.stats()["hits"] == 1
+
+    def test_empty_results_are_not_cached(self, cache):
+        compute = AsyncMock(return_value=[])
+        _get(cache, "atom", compute=compute)
+        _get(cache, "atom", compute=compute)
+        assert compute.await_count == 2
+
+    def test_entries_expire_after_ttl(self):
+        clock = FakeClock()
+        cache = _cache(clock=clock, ttl=60)
+        _, compute = _get(cache, "atom")
+        clock.now = 61
+        _get(cache, "atom", compute=compute)
+        assert compute.await_count == 2
+
+    def test_cached_values_are_copies(self):
+        cache = _cache()
+        first, compute = _get(cache, "atom")
+        first[0]["score"] = 0.0
+        second, _ = _get(cache, "atom", compute=compute)
+        assert second[0]["score"] == 0.9
+
+    def test_lru_evicts_oldest(self):
+        backend = InProcessBackend(max_size=1, clock=FakeClock())
+        backend.set("a", RESULTS, 60, {"any:a"})
+        backend.set("b", RESULTS, 60, {"any:b"})
+        assert backend.get("a") is None
+        assert backend.invalidate_tags({"any:a"}) == 0
+
+    def test_disabled_cache_always_computes(self):
+        cache = ResultCache(InProcessBackend(), enabled=False)
+        compute = AsyncMock(return_value=RESULTS)
+        _get(cache, "atom", compute=compute)
+        _get(cache, "atom", compute=compute)
+        assert compute.await_count == 2
+
+
+class TestCoalescing:
+    def test_concurrent_misses_share_one_computation(self):
+        cache = _cache()
+        calls = []
+
+        async def compute():
+            calls.append(1)
+            await asyncio.sleep(0.05)
+            return RESULTS
+
+        async def run():
+            key = cache.key("atom class 11", "any", 10, "m")
+            return await asyncio.gather(
+                *(cache.aget_or_compute(key, compute) for _ in range(5))
+            )
+
+        results = asyncio.run(run())
+
+        assert len(calls) == 1
+        assert all(r == RESULTS for r in results)
+        assert cache.stats()["coalesced"] == 4
+
+    def test_followers_compute_when_leader_fails(self):
+        cache = _cache()
+        calls = []
+
+        async def compute():
+            calls.append(1)
+            await asyncio.sleep(0.01)
+            if len(calls) == 1:
+                raise RuntimeError("upstream down")
+            return RESULTS
+
+        async def run():
+            key = cache.key("atom", "any", 10, "m")
+            return await asyncio.gather(
+                cache.aget_or_compute(key, compute),
+                cache.aget_or_compute(key, compute),
+                return_exceptions=True,
+            )
+
+        leader, follower = asyncio.run(run())
+
+        assert isinstance(leader, RuntimeError)
+        assert follower == RESULTS
+
+
+class TestInvalidation:
+    def test_only_matching_queries_and_durations_are_dropped(self, cache):
+        _, atom_any = _get(cache, "atom class 11")
+        _, atom_long = _get(cache, "atom structure", duration="long")
+        _, biology = _get(cache, "photosynthesis")
+
+        removed = cache.invalidate_videos([("Atomic models | atom explained", 300)])
+
+        assert removed == 1  # "atom" in the any and medium buckets only
+        _get(cache, "atom class 11", compute=atom_any)
+        _get(cache, "atom structure", duration="long", compute=atom_long)
+        _get(cache, "photosynthesis", compute=biology)
+        assert atom_any.await_count == 2
+        assert atom_long.await_count == 1
+        assert biology.await_count == 1
+
+    def test_fetching_query_tokens_invalidate(self, cache):
+        _, compute = _get(cache, "electron shells")
+        cache.invalidate_videos([("Chemistry lesson", 300)], query="electron shells")
+        _get(cache, "electron shells", compute=compute)
+        assert compute.await_count == 2
+
+    def test_async_invalidation_drops_the_same_entries(self, cache):
+        _, atom = _get(cache, "atom class 11")
+        _, biology = _get(cache, "photosynthesis")
+
+        removed = asyncio.run(cache.ainvalidate_videos([("Atom explained", 300)]))
+
+        assert removed == 1
+        _get(cache, "atom class 11", compute=atom)
+        _get(cache, "photosynthesis", compute=biology)
+        assert atom.await_count == 2
+        assert biology.await_count == 1
+        assert cache.stats()["invalidated"] == 1
+
+    def test_ingestion_invalidates_cached_results(self):
+        from scraper import youtube_scraper
+
+        cache = _cache()
+        _, compute = _get(cache, "atom class 11")
+        video = {
+            "snippet": {"title": "Atom class 11 full chapter", "description": ""},
+            "contentDetails": {"duration": "PT30M"},
+        }
+
+        with patch.object(youtube_scraper, "result_cache", cache), \
+             patch.object(youtube_scraper.corpus_state, "invalidate"):
+            youtube_scraper._after_commit("model-a", "atom class 11", [video])
+
+        _get(cache, "atom class 11", compute=compute)
+        assert compute.await_count == 2
+
+
+class TestEndpoint:
+    def test_repeated_request_skips_recompute(self, client, sample_videos):
+        async def override_user():
+            return "test-user-123"
+
+        from backend.app import get_current_user_id
+        from backend.database import get_async_db
+
+        async def override_db():
+            yield None
+
+        client.app.dependency_overrides[get_current_user_id] = override_user
+        client.app.dependency_overrides[get_async_db] = override_db
+        try:
+            recommend = AsyncMock(return_value=sample_videos)
+            with patch("backend.app.arecommend", recommend) as mock_recommend, \
+                 patch("backend.app.alog_search", AsyncMock()) as mock_log:
+                first = client.get("/api/recommend", params={"query": "atom class 11"})
+                second = client.get("/api/recommend", params={"query": "Atom Class 11"})
+        finally:
+            client.app.dependency_overrides.clear()
+
+        assert first.json() == second.json()
+        mock_recommend.assert_awaited_once()
+        assert mock_log.await_count == 2  # every search is still logged
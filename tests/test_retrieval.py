@@ -0,0 +1,363 @@
+"""
+Tests for the single-round-trip retrieval plan.
+"""
+from unittest.mock import MagicMock, patch
+
+import numpy as np
+import pytest
+
+from backend.models import duration_bucket
+from scraper import semantic_search
+from scraper.retrieval import (
+    RankedResult,
+    RetrievalResult,
+    build_ranked_sql,
+    build_retrieval_sql,
+    duration_filter,
+    duration_filter_sql,
+    rank_candidates,
+    retrieve_candidates,
+)
+
+FETCH = "scraper.youtube_scraper.fetch_and_store_videos"
+
+
+def _row(youtube_id, similarity, source):
+    return (youtube_id, f"title {youtube_id}", "desc", "thumb", 300, 1000, 10,
+            similarity, source)
+
+
+def _ranked(youtube_id, score, vector_rank=None, lexical_rank=None, vector_supply=0,
+            text_supply=0):
+    return (youtube_id, f"title {youtube_id}", "desc", "thumb", 300, 1000, 10,
+            vector_rank, lexical_rank, score, vector_supply, text_supply)
+
+
+def _query_embedding():
+    return patch.object(semantic_search, "create_query_embedding",
+                        return_value=np.ones(4))
+
+
+class TestBuildRetrievalSql:
+    def test_vector_plan_is_one_statement_with_both_branches(self):
+        sql = build_retrieval_sql("AND duration < 240", with_vector=True)
+
+        assert sql.startswith("SELECT set_config('hnsw.ef_search'")
+        assert sql.count("WITH") == 1
+        assert "vector_hits AS" in sql and "text_hits AS" in sql
+        assert "UNION ALL" in sql
+        assert "COUNT(" not in sql
+        assert sql.count("AND duration < 240") == 2
+
+    def test_text_only_plan_skips_vector_branch(self):
+        sql = build_retrieval_sql("", with_vector=False)
+
+        assert "vector_hits" not in sql
+        assert "set_config" not in sql
+        assert "text_hits AS" in sql
+
+    def test_text_branch_uses_full_text_relevance(self):
+        sql = build_retrieval_sql("", with_vector=False, fuzzy=False)
+
+        assert "ILIKE" not in sql
+        assert "search_vector @@ websearch_to_tsquery('english', :query_text)" in sql
+        assert "ts_rank_cd(search_vector" in sql
+        assert "ORDER BY similarity_score DESC" in sql
+        assert "similarity(title" not in sql
+
+    def test_fuzzy_adds_trigram_title_match(self):
+        sql = build_retrieval_sql("", with_vector=False, fuzzy=True)
+
+        assert "title % :query_text" in sql
+        assert "similarity(title, :query_text)" in sql
+
+    def test_index_plan_looks_up_precomputed_neighbours(self):
+        sql = build_retrieval_sql("AND duration < 240", with_vector=True,
+                                  from_index=True)
+
+        assert "set_config" not in sql
+        assert "unnest(CAST(:hit_ids AS integer[])" in sql
+        assert "<=>" not in sql
+        # the index already applied the duration filter to its hits
+        assert sql.count("AND duration < 240") == 1
+
+    def test_halfvec_storage_searches_half_precision_column(self):
+        sql = build_retrieval_sql("", with_vector=True, storage="halfvec")
+
+        query = "CAST(:query_embedding AS halfvec(384))"
+        assert f"ORDER BY embedding_half <=> {query}" in sql
+        assert "embedding <=>" not in sql
+
+    def test_binary_storage_reranks_hamming_shortlist(self):
+        sql = build_retrieval_sql("AND duration < 240", with_vector=True,
+                                  storage="binary")
+
+        assert "ORDER BY embedding_bit <~> binary_quantize(" in sql
+        assert "LIMIT :rerank_k" in sql
+        assert sql.index("LIMIT :rerank_k") < sql.index("ORDER BY embedding_half <=>")
+        assert "LIMIT :k" in sql
+
+    def test_unknown_storage_rejected(self):
+        with pytest.raises(ValueError):
+            build_retrieval_sql("", storage="pq")
+
+
+class TestDurationFilter:
+    def test_bucket_filter_targets_partial_index_predicate(self):
+        assert duration_filter_sql("short") == "AND duration_bucket = 'short'"
+        assert duration_filter_sql("any") == ""
+        assert duration_filter_sql("short'; DROP TABLE videos; --") == ""
+
+    def test_orm_filter_compares_bucket_column(self):
+        assert (str(duration_filter("long"))
+                == "videos.duration_bucket = :duration_bucket_1")
+        assert duration_filter("any") is None
+
+    def test_bucket_boundaries(self):
+        assert [duration_bucket(s) for s in (0, 239, 240, 1199, 1200)] == [
+            "short", "short", "medium", "medium", "long",
+        ]
+
+
+class TestRetrievalResult:
+    def test_rows_split_by_source(self):
+        result = RetrievalResult.from_rows([
+            _row("v1", 0.9, "vector"), _row("t1", 0.0, "text"),
+            _row("v2", 0.7, "vector"),
+        ])
+
+        assert [r[0] for r in result.vector_rows] == ["v1", "v2"]
+        assert [r[0] for r in result.text_rows] == ["t1"]
+        assert len(result.vector_rows[0]) == 8
+
+    def test_supply_counts_only_neighbours_above_threshold(self):
+        result = RetrievalResult.from_rows([
+            _row("a", 0.95, "vector"), _row("b", 0.61, "vector"),
+            _row("c", 0.6, "vector"),
+        ])
+
+        assert result.semantic_supply(3) == 2
+        assert result.needs_youtube(3, with_vector=True)
+        assert not result.needs_youtube(2, with_vector=True)
+
+    def test_keyword_supply_counts_text_rows(self):
+        result = RetrievalResult.from_rows([
+            _row("t1", 0.0, "text"), _row("t2", 0.0, "text"),
+        ])
+
+        assert not result.needs_youtube(2, with_vector=False)
+        assert result.needs_youtube(3, with_vector=False)
+
+    def test_supply_gap_is_unfilled_share(self):
+        result = RetrievalResult.from_rows([
+            _row("a", 0.95, "vector"), _row("b", 0.3, "vector"),
+            _row("t1", 0.0, "text"),
+        ])
+
+        assert result.supply_gap(4, with_vector=True) == 0.75
+        assert result.supply_gap(1, with_vector=False) == 0.0
+
+
+class TestRetrieveCandidates:
+    def test_single_execute_with_clamped_ef_search(self):
+        session = MagicMock()
+        session.execute.return_value = [_row("v1", 0.9, "vector")]
+
+        result = retrieve_candidates(session, "math", [0.1, 0.2], "model-a", "",
+                                     k=50, text_limit=5, ef_search=40)
+
+        session.execute.assert_called_once()
+        params = session.execute.call_args[0][1]
+        assert params["query_text"] == "math"
+        assert params["ef_search"] == "50"
+        assert params["k"] == 50
+        assert params["embedding_model"] == "model-a"
+        assert result.vector_rows[0][0] == "v1"
+
+    def test_binary_storage_widens_scan_for_rerank(self):
+        session = MagicMock()
+        session.execute.return_value = []
+
+        retrieve_candidates(session, "math", [0.1, 0.2], "model-a", "", k=50,
+                            text_limit=5, ef_search=40, storage="binary",
+                            rerank_factor=4)
+
+        params = session.execute.call_args[0][1]
+        assert params["k"] == 50
+        assert params["rerank_k"] == 200
+        assert params["ef_search"] == "200"
+
+    def test_index_hits_replace_pgvector_params(self):
+        session = MagicMock()
+        session.execute.return_value = [
+            _row("v2", 0.7, "vector"), _row("v1", 0.9, "vector"),
+        ]
+
+        result = retrieve_candidates(session, "math", [0.1], "model-a", "", k=5,
+                                     text_limit=5, ef_search=40,
+                                     index_hits=[(1, 0.9), (2, 0.7)])
+
+        params = session.execute.call_args[0][1]
+        assert params["hit_ids"] == [1, 2]
+        assert params["hit_scores"] == [0.9, 0.7]
+        assert "query_embedding" not in params
+        assert [r[0] for r in result.vector_rows] == ["v1", "v2"]
+
+
+class TestBuildRankedSql:
+    def test_fuses_blends_and_limits_in_one_statement(self):
+        sql = build_ranked_sql("AND duration_bucket = 'short'", with_vector=True,
+                               method="rrf")
+
+        assert sql.startswith("SELECT set_config('hnsw.ef_search'")
+        assert sql.count("WITH") == 1
+        assert "UNION ALL" not in sql
+        assert "FULL JOIN lexical_ranked USING (youtube_id)" in sql
+        assert ":rrf_k + vector_rank" in sql
+        assert "COALESCE(popularity_prior, 0) AS score" in sql
+        assert sql.rstrip().endswith("ORDER BY score DESC, youtube_id\nLIMIT :top_n")
+        assert sql.count("AND duration_bucket = 'short'") == 2
+
+    def test_weighted_fusion_sums_component_scores(self):
+        sql = build_ranked_sql("", method="weighted")
+
+        assert "COALESCE(similarity, 0)" in sql and "COALESCE(relevance, 0)" in sql
+        assert ":rrf_k" not in sql
+
+    def test_keyword_only_ranking_reuses_earlier_matches(self):
+        sql = build_ranked_sql("AND duration_bucket = 'short'", with_vector=False,
+                               text_from_hits=True)
+
+        assert "set_config" not in sql
+        assert "websearch_to_tsquery" not in sql
+        assert "unnest(CAST(:text_ids AS text[])" in sql
+        assert "0 AS vector_supply" in sql
+        # the earlier search already applied the duration filter
+        assert "duration_bucket" not in sql
+
+    def test_unknown_method_rejected(self):
+        with pytest.raises(ValueError):
+            build_ranked_sql("", method="borda")
+
+
+class TestRankCandidates:
+    def test_rows_come_back_in_final_order_with_supply(self):
+        session = MagicMock()
+        session.execute.return_value = [
+            _ranked("a", 0.9, 1, None, vector_supply=3, text_supply=4),
+            _ranked("b", 0.4, None, 1, vector_supply=3, text_supply=4),
+        ]
+
+        result = rank_candidates(session, "math", [0.1, 0.2], "model-a", "", top_n=2,
+                                 k=50, text_limit=50, ef_search=40,
+                                 popularity_weight=0.3)
+
+        session.execute.assert_called_once()
+        params = session.execute.call_args[0][1]
+        assert params["top_n"] == 2
+        assert params["k"] == 50
+        assert params["popularity_weight"] == 0.3
+        assert [row[0] for row in result.rows] == ["a", "b"]
+        assert len(result.rows[0]) == 10
+        assert (result.vector_supply, result.text_supply) == (3, 4)
+
+    def test_text_hits_replace_the_lexical_search(self):
+        session = MagicMock()
+        session.execute.return_value = []
+
+        result = rank_candidates(session, "math", None, "model-a", "", top_n=5, k=5,
+                                 text_limit=5, ef_search=40,
+                                 text_hits=[("t1", 0.7), ("t2", 0.2)])
+
+        params = session.execute.call_args[0][1]
+        assert params["text_ids"] == ["t1", "t2"]
+        assert params["text_scores"] == [0.7, 0.2]
+        assert "query_text" not in params and "query_embedding" not in params
+        assert result.rows == [] and result.text_supply == 0
+
+    def test_supply_decision_matches_candidate_result(self):
+        result = RankedResult.from_rows([
+            _ranked("a", 0.9, 1, None, vector_supply=1, text_supply=2),
+        ])
+
+        assert result.semantic_supply(3) == 1
+        assert result.supply_gap(4, with_vector=True) == 0.75
+        assert result.needs_youtube(2, with_vector=False) is False
+        assert result.needs_youtube(3, with_vector=False)
+
+
+class TestRecommendRoundTrips:
+    @pytest.fixture(autouse=True)
+    def corpus_has_embeddings(self):
+        with patch.object(semantic_search.corpus_state, "has_embeddings",
+                          return_value=True):
+            yield
+
+    def test_sufficient_supply_uses_one_retrieval_statement(self):
+        session = MagicMock()
+        session.execute.return_value = [
+            _ranked("v1", 0.95, 1, 1, vector_supply=2),
+            _ranked("v2", 0.6, 2, None, vector_supply=2),
+        ]
+
+        with _query_embedding(), patch(FETCH) as mock_fetch:
+            results = semantic_search.recommend("math", top_n=2, db_session=session)
+
+        session.execute.assert_called_once()
+        mock_fetch.assert_not_called()
+        assert [v["video_id"] for v in results] == ["v1", "v2"]
+        assert (results[0]["vector_rank"], results[0]["lexical_rank"]) == (1, 1)
+
+    def test_candidate_depth_independent_of_top_n(self):
+        session = MagicMock()
+        session.execute.return_value = [_ranked("v1", 1.0, 1)]
+
+        with _query_embedding(), patch(FETCH, return_value=0):
+            semantic_search.recommend("math", top_n=2, db_session=session,
+                                      candidate_k=30)
+
+        params = session.execute.call_args_list[0][0][1]
+        assert params["k"] == 30
+        assert params["text_limit"] == 30
+        assert params["top_n"] == 2
+
+    def test_duration_filter_uses_bucket_column(self):
+        session = MagicMock()
+        session.execute.return_value = [_ranked("v1", 1.0, 1)]
+
+        with _query_embedding(), patch(FETCH, return_value=0):
+            semantic_search.recommend("math", top_n=1, video_duration="medium",
+                                      db_session=session)
+
+        sql = str(session.execute.call_args_list[0][0][0])
+        assert sql.count("AND duration_bucket = 'medium'") == 2
+
+    def test_results_keep_the_database_order(self):
+        session = MagicMock()
+        session.execute.return_value = [
+            _ranked("relevant", 0.8, None, 1, text_supply=2),
+            _ranked("popular", 0.5, None, 2, text_supply=2),
+        ]
+
+        with patch.object(semantic_search.corpus_state, "has_embeddings",
+                          return_value=False):
+            results = semantic_search.recommend("math", top_n=2, db_session=session)
+
+        session.execute.assert_called_once()
+        assert [v["video_id"] for v in results] == ["relevant", "popular"]
+        assert [v["score"] for v in results] == [0.8, 0.5]
+
+    def test_short_supply_fetches_and_retrieves_again(self):
+        session = MagicMock()
+        session.execute.side_effect = [
+            [_ranked("v1", 1.0, 1)],
+            [_ranked("new", 0.9, 1, vector_supply=1),
+             _ranked("v1", 0.2, 2, vector_supply=1)],
+        ]
+
+        with _query_embedding(), patch(FETCH, return_value=1) as mock_fetch:
+            results = semantic_search.recommend("math", top_n=2, db_session=session)
+
+        mock_fetch.assert_called_once()
+        assert session.execute.call_count == 2
+        assert {v["video_id"] for v in results} == {"v1", "new"}
@@ -0,0 +1,88 @@
+"""
+Tests for the recommend stage graph: overlap, cancellation and
+the aggregated stage timings.
+"""
+import asyncio
+import time
+
+import pytest
+
+from scraper.stages import StageGraph, StageTimings
+
+
+def _sleeper(seconds, value):
+    async def stage():
+        await asyncio.sleep(seconds)
+        return value
+    return stage
+
+
+class TestStageGraph:
+    def test_independent_stages_overlap(self):
+        async def run():
+            graph = StageGraph()
+            graph.start("a", _sleeper(0.1, "a"))
+            graph.start("b", _sleeper(0.1, "b"))
+            graph.start("c", _sleeper(0.1, "c"))
+            results = [await graph.result(name) for name in ("a", "b", "c")]
+            await graph.aclose()
+            return graph, results
+
+        started = time.perf_counter()
+        graph, results = asyncio.run(run())
+        elapsed = time.perf_counter() - started
+
+        assert results == ["a", "b", "c"]
+        assert elapsed < 0.25  # ~max of the stages, not their sum
+        assert set(graph.durations) == {"a", "b", "c", "total"}
+
+    def test_cancelled_stage_stops_and_is_recorded(self):
+        finished = []
+
+        async def slow():
+            await asyncio.sleep(5)
+            finished.append(True)
+
+        async def run():
+            graph = StageGraph()
+            graph.start("embed", slow)
+            await asyncio.sleep(0)
+            graph.cancel("embed")
+            await graph.aclose()
+            return graph
+
+        graph = asyncio.run(run())
+        assert graph.cancelled == {"embed"}
+        assert finished == []
+
+    def test_aclose_cancels_unfinished_stages(self):
+        async def run():
+            graph = StageGraph()
+            graph.start("done", _sleeper(0, "x"))
+            graph.start("text", _sleeper(5, "rows"))
+            await graph.result("done")
+            await graph.aclose()
+            return graph
+
+        graph = asyncio.run(run())
+        assert graph.cancelled == {"text"}
+
+
+class TestStageTimings:
+    def test_stats_skip_cancelled_samples(self):
+        graph = StageGraph()
+        graph.durations = {"embed": 0.02, "text": 0.5, "total": 0.03}
+        graph.cancelled = {"text"}
+        timings = StageTimings()
+
+        timings.record(graph)
+        stats = timings.stats()
+
+        assert stats["embed"]["count"] == 1
+        assert stats["embed"]["ms_avg"] == pytest.approx(20.0)
+        assert stats["text"] == {
+            "count": 0, "cancelled": 1, "ms_avg": 0.0, "ms_p95": 0.0,
+        }
+
+        timings.clear()
+        assert timings.stats() == {}
@@ -0,0 +1,143 @@
+"""
+Tests for the periodic video statistics refresh.
+"""
+from datetime import datetime, timedelta, timezone
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from scraper import stats_refresh
+from scraper.stats_refresh import run_stats_refresh
+from scraper.youtube_quota import QuotaLedger
+
+NOW = datetime(2026, 10, 16, 12, 0, tzinfo=timezone.utc)
+
+
+class FakeVideos:
+    """In-memory stand-in for the due-keyset query, videos.list and the bulk UPDATE."""
+
+    def __init__(self, count, hot=(), gone=()):
+        self.refreshed_at = {i: None for i in range(1, count + 1)}
+        self.counts = {i: (0, 0) for i in range(1, count + 1)}
+        self.hot = set(hot)
+        self.gone = set(gone)
+        self.calls = []
+
+    def due_chunk(self, session, after_id, cutoff, limit, hot_since=None):
+        due = [
+            (i, f"yt{i}", f"Video {i}", None, 300, *self.counts[i])
+            for i, at in sorted(self.refreshed_at.items())
+            if i > after_id and (at is None or at < cutoff)
+            and (hot_since is None or i in self.hot)
+        ]
+        return due[:limit]
+
+    def details(self, ids, part, use_headroom):
+        self.calls.append((list(ids), part, use_headroom))
+        return [
+            {"id": yid, "statistics": {"viewCount": "1000", "likeCount": "10"}}
+            for yid in ids if int(yid[2:]) not in self.gone
+        ]
+
+    def write(self, session, ids, counts, refreshed_at):
+        for video_id, count in zip(ids, counts, strict=True):
+            self.refreshed_at[video_id] = refreshed_at
+            if count is not None:
+                self.counts[video_id] = count
+
+
+@pytest.fixture
+def ledger():
+    return QuotaLedger(budget=10_000, headroom=0, persistent=False)
+
+
+def patched(fake, ledger):
+    def fake_session():
+        yield MagicMock()
+
+    return (
+        patch.object(stats_refresh, "_due_chunk", side_effect=fake.due_chunk),
+        patch.object(stats_refresh, "write_statistics", side_effect=fake.write),
+        patch.object(stats_refresh, "get_video_details", side_effect=fake.details),
+        patch.object(stats_refresh, "get_session", side_effect=fake_session),
+        patch.object(stats_refresh, "youtube_quota", ledger),
+    )
+
+
+def run(fake, ledger, **kwargs):
+    patches = patched(fake, ledger)
+    for p in patches:
+        p.start()
+    try:
+        return run_stats_refresh(now=NOW, quota_reserve=kwargs.pop("quota_reserve", 0),
+                                 **kwargs)
+    finally:
+        for p in patches:
+            p.stop()
+
+
+class TestRunStatsRefresh:
+    def test_refreshes_hot_videos_first_in_batches_of_50(self, ledger):
+        fake = FakeVideos(120, hot={90, 110})
+
+        stats = run(fake, ledger)
+
+        assert stats["rows"] == 120
+        assert stats["hot"] == 2
+        assert stats["stopped"] == "done"
+        assert fake.calls[0][0] == ["yt90", "yt110"]
+        assert [len(ids) for ids, _, _ in fake.calls[1:]] == [50, 50, 18]
+        assert all(part == "statistics" and not headroom
+                   for _, part, headroom in fake.calls)
+        assert fake.counts[1] == (1000, 10)
+
+    def test_hot_and_cold_intervals(self, ledger):
+        fake = FakeVideos(3, hot={1})
+        fake.refreshed_at = {i: NOW - timedelta(days=2) for i in (1, 2, 3)}
+        fake.refreshed_at[3] = NOW - timedelta(days=30)
+
+        stats = run(fake, ledger)
+
+        # 1 is hot and a day overdue; 2 is cold and not due yet; 3 is overdue
+        assert stats["rows"] == 2
+        assert fake.refreshed_at[2] == NOW - timedelta(days=2)
+        assert fake.refreshed_at[1] == fake.refreshed_at[3] == NOW
+
+    def test_resumes_with_only_unrefreshed_rows(self, ledger):
+        fake = FakeVideos(80)
+        first = run(fake, ledger, limit=50)
+        second = run(fake, ledger)
+
+        assert (first["rows"], first["stopped"]) == (50, "limit")
+        assert second["rows"] == 30
+        assert fake.calls[-1][0][0] == "yt51"
+
+    def test_gone_videos_are_stamped_without_counts(self, ledger):
+        fake = FakeVideos(3, gone={2})
+
+        stats = run(fake, ledger)
+
+        assert stats["missing"] == 1
+        assert fake.counts[2] == (0, 0)
+        assert fake.refreshed_at[2] == NOW
+
+    def test_changed_counts_invalidate_cached_results(self, ledger):
+        fake = FakeVideos(3, gone={3})
+        fake.counts[2] = (1000, 10)  # already current
+
+        with patch.object(stats_refresh.result_cache,
+                          "invalidate_videos") as mock_invalidate:
+            run(fake, ledger)
+
+        texts = list(mock_invalidate.call_args.args[0])
+        assert texts == [("Video 1 ", 300)]
+
+    def test_stops_at_quota_reserve(self, ledger):
+        fake = FakeVideos(100)
+        ledger.charge("search")  # 9900 units left
+
+        stats = run(fake, ledger, quota_reserve=9900)
+
+        assert stats["stopped"] == "quota"
+        assert stats["rows"] == 0
+        assert fake.calls == []
@@ -0,0 +1,192 @@
+"""
+Tests for the in-process memory-mapped vector index.
+"""
+from datetime import datetime, timezone
+from unittest.mock import MagicMock, patch
+
+import numpy as np
+import pytest
+
+from scraper.vector_index import VectorIndex, _normalize
+
+MODEL = "hashing-v1-384"
+
+
+class FakeCorpus:
+    """Stands in for the videos table: id -> (youtube_id, duration, vector)."""
+
+    def __init__(self, count, dim=384, seed=0):
+        rng = np.random.default_rng(seed)
+        self.rows = {}
+        for i in range(1, count + 1):
+            vector = rng.standard_normal(dim).astype(np.float32)
+            self.rows[i] = (f"yt{i}", 60 * i, vector)
+
+    def count(self, session, model_id):
+        return len(self.rows)
+
+    def export(self, session, model_id, after_id):
+        ids = sorted(i for i in self.rows if i > after_id)
+        if not ids:
+            return
+        yield (
+            np.array(ids, dtype=np.int64),
+            np.array([self.rows[i][0] for i in ids], dtype="U50"),
+            np.array([self.rows[i][1] for i in ids], dtype=np.int32),
+            _normalize(np.array([self.rows[i][2] for i in ids], dtype=np.float32)),
+            datetime(2026, 1, 1, tzinfo=timezone.utc),
+        )
+
+    def brute_force(self, query, k, allowed=lambda duration: True):
+        query = query / np.linalg.norm(query)
+        scored = [
+            (i, float(vector @ query / np.linalg.norm(vector)))
+            for i, (_, duration, vector) in self.rows.items() if allowed(duration)
+        ]
+        return [i for i, _ in sorted(scored, key=lambda x: -x[1])[:k]]
+
+
+@pytest.fixture
+def corpus():
+    fake = FakeCorpus(40)
+    with patch.object(VectorIndex, "_embedded_count", side_effect=fake.count), \
+         patch.object(VectorIndex, "_export", side_effect=fake.export):
+        yield fake
+
+
+def _refresh(index, **kwargs):
+    return index.refresh(session=MagicMock(), model_id=MODEL, **kwargs)
+
+
+class TestVectorIndex:
+    def test_exact_search_matches_brute_force(self, corpus, tmp_path):
+        index = VectorIndex(path=str(tmp_path))
+        assert _refresh(index)["mode"] == "rebuild"
+        query = corpus.rows[7][2] + 0.1
+
+        hits = index.search(query, k=5, model_id=MODEL)
+
+        assert [video_id for video_id, _ in hits] == corpus.brute_force(query, 5)
+        assert hits[0][1] == pytest.approx(max(s for _, s in hits))
+
+    def test_duration_filter_is_applied(self, corpus, tmp_path):
+        index = VectorIndex(path=str(tmp_path))
+        _refresh(index)
+        query = corpus.rows[1][2]
+
+        hits = index.search(query, k=5, video_duration="short", model_id=MODEL)
+
+        # Durations are 60 * id seconds, so only ids 1-3 are under 4 minutes
+        assert {video_id for video_id, _ in hits} == {1, 2, 3}
+
+    def test_batched_queries(self, corpus, tmp_path):
+        index = VectorIndex(path=str(tmp_path))
+        _refresh(index)
+        queries = [corpus.rows[3][2], corpus.rows[30][2]]
+
+        hits = index.search_many(queries, k=1, model_id=MODEL)
+
+        assert [row[0][0] for row in hits] == [3, 30]
+
+    def test_incremental_refresh_appends_new_rows(self, corpus, tmp_path):
+        index = VectorIndex(path=str(tmp_path))
+        _refresh(index)
+        corpus.rows[41] = ("yt41", 100, np.ones(384, dtype=np.float32))
+
+        stats = _refresh(index)
+
+        assert stats == {"mode": "incremental", "added": 1, "count": 41}
+        assert index.search(np.ones(384), k=1, model_id=MODEL)[0][0] == 41
+        assert _refresh(index)["mode"] == "unchanged"
+
+    def test_count_divergence_triggers_rebuild(self, corpus, tmp_path):
+        index = VectorIndex(path=str(tmp_path))
+        _refresh(index)
+        del corpus.rows[5]
+
+        stats = _refresh(index)
+
+        assert stats["mode"] == "rebuild"
+        assert stats["count"] == 39
+
+    def test_readers_pick_up_new_generation(self, corpus, tmp_path):
+        now = [0.0]
+        writer = VectorIndex(path=str(tmp_path))
+        reader = VectorIndex(
+            path=str(tmp_path), reload_interval=5, clock=lambda: now[0]
+        )
+        _refresh(writer)
+        assert reader.search(corpus.rows[2][2], k=1, model_id=MODEL)[0][0] == 2
+
+        corpus.rows[41] = ("yt41", 100, np.ones(384, dtype=np.float32))
+        _refresh(writer)
+
+        # CURRENT is only re-checked once the reload interval has passed
+        assert reader.stats()["count"] == 40
+        reader.search(np.ones(384), k=1, model_id=MODEL)
+        assert reader.stats()["reloads"] == 1
+
+        now[0] += 5
+        assert reader.search(np.ones(384), k=1, model_id=MODEL)[0][0] == 41
+        assert reader.stats()["count"] == 41
+        assert reader.stats()["reloads"] == 2
+
+    def test_incremental_refresh_only_writes_new_segment(self, corpus, tmp_path):
+        index = VectorIndex(path=str(tmp_path))
+        _refresh(index)
+        generation = (tmp_path / "CURRENT").read_text()
+        base = next((tmp_path / generation).glob("seg-*/vectors.npy"))
+        base_stat = base.stat()
+        corpus.rows[41] = ("yt41", 100, np.ones(384, dtype=np.float32))
+        corpus.rows[42] = ("yt42", 100, -np.ones(384, dtype=np.float32))
+
+        _refresh(index)
+
+        assert (tmp_path / "CURRENT").read_text() == generation
+        segments = sorted((tmp_path / generation).glob("seg-*"))
+        assert len(segments) == 2
+        assert base.stat().st_mtime_ns == base_stat.st_mtime_ns
+        assert list(np.load(segments[1] / "ids.npy")) == [41, 42]
+        assert index.search(-np.ones(384), k=1, model_id=MODEL)[0][0] == 42
+
+    def test_segment_limit_triggers_compaction(self, corpus, tmp_path):
+        index = VectorIndex(path=str(tmp_path), max_segments=2)
+        _refresh(index)
+        corpus.rows[41] = ("yt41", 100, np.ones(384, dtype=np.float32))
+        assert _refresh(index)["mode"] == "incremental"
+        corpus.rows[42] = ("yt42", 100, -np.ones(384, dtype=np.float32))
+
+        stats = _refresh(index)
+
+        assert stats == {"mode": "rebuild", "added": 42, "count": 42}
+        assert index.search(np.ones(384), k=1, model_id=MODEL)[0][0] == 41
+        assert index.stats()["segments"] == 1
+
+    def test_float16_storage(self, corpus, tmp_path):
+        index = VectorIndex(path=str(tmp_path), dtype="float16")
+        _refresh(index)
+        query = corpus.rows[12][2]
+
+        hits = index.search(query, k=3, model_id=MODEL)
+
+        assert index.stats()["dtype"] == "float16"
+        assert hits[0][0] == 12
+        assert hits[0][1] == pytest.approx(1.0, abs=1e-2)
+
+    def test_unusable_without_generation_or_for_other_model(self, corpus, tmp_path):
+        index = VectorIndex(path=str(tmp_path))
+        assert index.search(np.ones(384), k=1) is None
+
+        _refresh(index)
+
+        assert index.search(np.ones(384), k=1, model_id="other-model") is None
+
+    def test_empty_generation_defers_to_pgvector(self, tmp_path):
+        empty = FakeCorpus(0)
+        index = VectorIndex(path=str(tmp_path))
+        with patch.object(VectorIndex, "_embedded_count", side_effect=empty.count), \
+             patch.object(VectorIndex, "_export", side_effect=empty.export):
+            assert _refresh(index)["count"] == 0
+
+        assert index.search(np.ones(384), k=1, model_id=MODEL) is None
+        assert index.search_many([np.ones(384)], k=1, model_id=MODEL) is None
@@ -0,0 +1,127 @@
+"""
+Tests for the bulk video upsert and COPY paths in scraper.video_store.
+"""
+import asyncio
+from unittest.mock import AsyncMock, MagicMock
+
+import numpy as np
+from sqlalchemy.dialects import postgresql
+
+from scraper import video_store
+from tests.test_ingestion import make_item
+
+
+def _session(*flags):
+    """Sync session mock whose upsert reports `flags` (True = inserted)."""
+    session = MagicMock()
+    session.execute.return_value.scalars.return_value = iter(flags)
+    return session
+
+
+class TestVideoRows:
+    def test_normalizes_items(self):
+        rows = video_store.video_rows(
+            [make_item("vid1")], embeddings=[np.zeros(384, dtype=np.float32)],
+            embedding_model="m",
+        )
+
+        assert rows[0]["youtube_id"] == "vid1"
+        assert rows[0]["duration"] == 600
+        assert rows[0]["view_count"] == 100
+        assert rows[0]["embedding_model"] == "m"
+        assert len(rows[0]["embedding_half"]) == 384
+
+    def test_duplicates_keep_last_and_malformed_are_skipped(self):
+        first, second = make_item("vid1"), make_item("vid1")
+        second["statistics"]["viewCount"] = "200"
+
+        rows = video_store.video_rows([first, {"id": "broken"}, second])
+
+        assert len(rows) == 1
+        assert rows[0]["view_count"] == 200
+
+    def test_counts_clamped_to_column_range(self):
+        item = make_item("vid1")
+        item["statistics"] = {"viewCount": "15000000000"}
+
+        row = video_store.video_row(item)
+
+        assert row["view_count"] == video_store.MAX_COUNT
+        assert row["like_count"] == 0
+
+
+class TestUpsert:
+    def test_statement_updates_only_changed_statistics(self):
+        rows = video_store.video_rows([make_item("vid1")])
+
+        stmt = video_store.upsert_statement(rows)
+        sql = str(stmt.compile(dialect=postgresql.dialect()))
+
+        assert ("ON CONFLICT (youtube_id) DO UPDATE "
+                "SET view_count = excluded.view_count") in sql
+        assert "IS DISTINCT FROM excluded.like_count" in sql
+        assert "IS DISTINCT FROM" in video_store.MERGE_STAGING_SQL
+        assert "title" not in sql.split("DO UPDATE")[1]
+        assert "RETURNING xmax = 0" in sql
+
+    def test_counts_inserted_and_updated(self):
+        session = _session(True, False, True)
+        rows = video_store.video_rows([make_item(f"vid{i}") for i in range(3)])
+
+        assert video_store.upsert_videos(session, rows) == (2, 1)
+        session.execute.assert_called_once()
+        session.commit.assert_not_called()  # caller owns the transaction
+
+    def test_batches_and_dedupes(self):
+        session = MagicMock()
+        session.execute.side_effect = lambda stmt: MagicMock(
+            scalars=MagicMock(return_value=[True] * len(stmt._multi_values[0]))
+        )
+        rows = video_store.video_rows([make_item(f"vid{i}") for i in range(5)])
+
+        counts = video_store.upsert_videos(session, rows + rows[:2], batch_size=2)
+
+        assert counts == (5, 0)
+        assert session.execute.call_count == 3
+
+    def test_async_upsert(self):
+        session = MagicMock()
+        result = MagicMock(scalars=MagicMock(return_value=[False]))
+        session.execute = AsyncMock(return_value=result)
+
+        rows = video_store.video_rows([make_item("v")])
+        counts = asyncio.run(video_store.aupsert_videos(session, rows))
+
+        assert counts == (0, 1)
+
+
+class TestCopy:
+    def test_buffer_escapes_text_format(self):
+        item = make_item("vid1", title="Tabs\tand\nnewlines \\")
+        row = video_store.video_rows([item])[0]
+
+        line = video_store.copy_buffer([row]).read()
+
+        fields = line.rstrip("\n").split("\t")
+        assert len(fields) == len(video_store.COPY_COLUMNS)
+        assert fields[1] == "Tabs\\tand\\nnewlines \\\\"
+        assert fields[video_store.COPY_COLUMNS.index("embedding")] == "\\N"
+
+    def test_stages_and_merges_per_batch(self):
+        cursor = MagicMock()
+        cursor.fetchone.side_effect = [(2, 0), (0, 1)]
+        session = MagicMock()
+        session.connection.return_value.connection.cursor.return_value = cursor
+        rows = video_store.video_rows(
+            [make_item(f"vid{i}") for i in range(3)],
+            embeddings=[np.ones(384, dtype=np.float32)] * 3, embedding_model="m",
+        )
+
+        counts = video_store.copy_videos(session, iter(rows), batch_size=2)
+
+        assert counts == (2, 1)
+        assert cursor.copy_expert.call_count == 2
+        copied = cursor.copy_expert.call_args_list[0][0][1].read()
+        assert copied.count("\n") == 2
+        assert "[1.0,1.0" in copied
+        cursor.close.assert_called_once()
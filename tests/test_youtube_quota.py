@@ -0,0 +1,105 @@
+"""
+Tests for YouTube quota accounting: budget and headroom, the day boundary,
+the shared ledger and quota enforcement in the scraper.
+"""
+import datetime
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from scraper import youtube_scraper
+from scraper.youtube_quota import QuotaExhausted, QuotaLedger, quota_day
+
+
+class FakeDay:
+    def __init__(self):
+        self.day = datetime.date(2026, 1, 1)
+
+    def __call__(self):
+        return self.day
+
+
+def _ledger(budget=1000, headroom=200, **kwargs):
+    return QuotaLedger(budget=budget, headroom=headroom, persistent=False, **kwargs)
+
+
+class TestQuotaLedger:
+    def test_charges_units_per_endpoint(self):
+        ledger = _ledger()
+        ledger.charge("search")
+        ledger.charge("videos")
+
+        stats = ledger.stats()
+        assert stats["spent"] == 101
+        assert stats["remaining"] == 899
+        assert stats["by_endpoint"]["search"] == {"units": 100, "calls": 1}
+
+    def test_headroom_is_kept_free(self):
+        ledger = _ledger(budget=1000, headroom=200)
+        for _ in range(8):
+            ledger.charge("search")
+
+        with pytest.raises(QuotaExhausted):
+            ledger.charge("search")
+        # completes a search already paid for
+        ledger.charge("videos", use_headroom=True)
+        stats = ledger.stats()
+        assert stats["spent"] == 801
+        assert stats["rejected"] == 1
+        assert stats["exhausted"]
+
+    def test_new_quota_day_resets_usage(self):
+        today = FakeDay()
+        ledger = _ledger(budget=100, headroom=0, today=today)
+        ledger.charge("search")
+        assert not ledger.available(100)
+
+        today.day += datetime.timedelta(days=1)
+        assert ledger.available(100)
+
+    def test_mark_exhausted_spends_the_rest(self):
+        ledger = _ledger()
+        ledger.charge("search")
+        ledger.mark_exhausted()
+
+        assert ledger.remaining() == 0
+        assert ledger.stats()["by_endpoint"]["external"]["units"] == 900
+
+    def test_shared_ledger_totals_replace_local_view(self):
+        ledger = QuotaLedger(budget=1000, headroom=0, persistent=True, refresh=60)
+        # Another worker already spent 500 units today
+        totals = [{"search": [500, 5]}, {"search": [600, 6]}]
+        with patch.object(ledger, "_db_sync", side_effect=totals) as sync:
+            assert ledger.remaining() == 500
+            ledger.charge("search")
+
+        assert ledger.remaining() == 400
+        assert sync.call_args_list[1][0][1:] == ("search", 100, 1)
+
+    def test_quota_day_is_pacific(self):
+        assert isinstance(quota_day(), datetime.date)
+
+
+class TestScraperQuota:
+    def test_search_refused_when_budget_spent(self):
+        ledger = _ledger(budget=100, headroom=50)
+        with patch.object(youtube_scraper, "youtube_quota", ledger), \
+             patch.object(youtube_scraper, "get_client") as mock_client:
+            with pytest.raises(QuotaExhausted):
+                youtube_scraper.fetch_videos("atom")
+
+        mock_client.assert_not_called()
+
+    def test_quota_exceeded_response_marks_ledger(self):
+        ledger = _ledger()
+        response = MagicMock()
+        response.json.return_value = {
+            "error": {"message": "quota", "errors": [{"reason": "quotaExceeded"}]}
+        }
+        with patch.object(youtube_scraper, "youtube_quota", ledger), \
+             patch.object(youtube_scraper, "get_client") as mock_client:
+            mock_client.return_value.get.return_value = response
+            with pytest.raises(youtube_scraper.YouTubeAPIError):
+                youtube_scraper.fetch_videos("atom")
+
+        assert ledger.remaining() == 0